@@ -0,0 +1,206 @@
+"""
+告警汇总模块
+在时间窗口内收集未单独通知的错误（超过频率限制、流水线已满、通知发送失败等），
+每个窗口汇总为一条消息，错误风暴期间的通知次数有上限且不会静默丢弃错误
+"""
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+# 错误进入汇总的原因
+REASON_RATE_LIMITED = 'rate_limited'
+REASON_TEMPLATE_RATE_LIMITED = 'template_rate_limited'
+REASON_GLOBAL_RATE_LIMITED = 'global_rate_limited'
+REASON_PIPELINE_FULL = 'pipeline_full'
+REASON_NOTIFY_FAILED = 'notify_failed'
+REASON_DIGEST = 'digest'
+
+# 频率限制级别 -> 汇总原因
+RATE_LIMIT_REASONS = {
+    'template': REASON_TEMPLATE_RATE_LIMITED,
+    'container': REASON_RATE_LIMITED,
+    'global': REASON_GLOBAL_RATE_LIMITED
+}
+
+REASON_LABELS = {
+    REASON_RATE_LIMITED: '超过容器频率限制',
+    REASON_TEMPLATE_RATE_LIMITED: '超过模板频率限制',
+    REASON_GLOBAL_RATE_LIMITED: '超过全局频率限制',
+    REASON_PIPELINE_FULL: '流水线已满',
+    REASON_NOTIFY_FAILED: '通知发送失败',
+    REASON_DIGEST: '汇总模式'
+}
+
+# 分组数超过上限后，新出现的模板归入这个分组
+OTHER_GROUP = '__other__'
+
+
+class DigestGroup:
+    """同一日志模板在一个窗口内的汇总"""
+
+    __slots__ = ('template_id', 'template', 'error_type', 'count', 'containers',
+                 'first_seen', 'last_seen', 'samples')
+
+    def __init__(self, template_id: Optional[str], template: str, error_type: str):
+        self.template_id = template_id
+        self.template = template
+        self.error_type = error_type
+        self.count = 0
+        self.containers: Counter = Counter()
+        self.first_seen: Optional[datetime] = None
+        self.last_seen: Optional[datetime] = None
+        self.samples: List[str] = []
+
+    def to_dict(self, top_containers: int) -> dict:
+        """转换为字典"""
+        return {
+            'template_id': self.template_id,
+            'template': self.template,
+            'error_type': self.error_type,
+            'count': self.count,
+            'containers': self.containers.most_common(top_containers),
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'samples': list(self.samples)
+        }
+
+
+class AlertDigest:
+    """
+    告警汇总（线程安全）
+
+    第一条错误到达时开始一个窗口，窗口结束后 flush 返回汇总结果并清空；
+    没有错误时不产生汇总。跟踪的模板数有上限，超出部分只计数
+    """
+
+    def __init__(self, window: float = 60.0, max_groups: int = 10, max_samples: int = 3,
+                 max_tracked: int = 1000, top_containers: int = 5,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        初始化告警汇总
+
+        Args:
+            window: 汇总窗口长度（秒）
+            max_groups: 汇总结果中列出的模板数，其余合并为"其它"
+            max_samples: 每个模板保留的示例日志行数
+            max_tracked: 一个窗口内跟踪的最大模板数
+            top_containers: 汇总结果中列出的容器数
+            clock: 时钟函数，返回单调递增的秒数
+        """
+        self.window = window
+        self.max_groups = max_groups
+        self.max_samples = max_samples
+        self.max_tracked = max_tracked
+        self.top_containers = top_containers
+        self.clock = clock
+        self._groups: Dict[str, DigestGroup] = {}
+        self._reasons: Counter = Counter()
+        self._containers: Counter = Counter()
+        self._window_start: Optional[float] = None
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.digests = 0
+        self.summarized = 0
+
+    def add(self, container_name: str, template_id: Optional[str], template: str,
+            error_type: str, log_line: str, timestamp: datetime, reason: str = REASON_DIGEST):
+        """
+        记录一条错误
+
+        Args:
+            container_name: 容器名称
+            template_id: 日志模板 ID
+            template: 日志模板
+            error_type: 错误类型
+            log_line: 日志行
+            timestamp: 错误时间戳
+            reason: 进入汇总的原因
+        """
+        key = template_id or error_type
+        with self._lock:
+            if self._window_start is None:
+                self._window_start = self.clock()
+            group = self._groups.get(key)
+            if group is None:
+                if len(self._groups) >= self.max_tracked:
+                    key = OTHER_GROUP
+                    group = self._groups.get(key)
+                if group is None:
+                    if key == OTHER_GROUP:
+                        group = DigestGroup(None, '(模板数超过上限)', '其它错误')
+                    else:
+                        group = DigestGroup(template_id, template, error_type)
+                    self._groups[key] = group
+            group.count += 1
+            group.containers[container_name] += 1
+            if group.first_seen is None or timestamp < group.first_seen:
+                group.first_seen = timestamp
+            if group.last_seen is None or timestamp > group.last_seen:
+                group.last_seen = timestamp
+            if len(group.samples) < self.max_samples:
+                group.samples.append(log_line)
+            self._containers[container_name] += 1
+            self._reasons[reason] += 1
+
+    def due(self) -> bool:
+        """当前窗口是否已结束"""
+        with self._lock:
+            return self._window_start is not None and self.clock() - self._window_start >= self.window
+
+    def flush(self, force: bool = False) -> Optional[dict]:
+        """
+        窗口结束时取出汇总结果并开始新窗口
+
+        Args:
+            force: 不等窗口结束，立即取出（用于退出前发送剩余错误）
+
+        Returns:
+            汇总结果字典，窗口未结束或没有错误时返回 None
+        """
+        with self._lock:
+            if self._window_start is None:
+                return None
+            if not force and self.clock() - self._window_start < self.window:
+                return None
+            groups, reasons, containers = self._groups, self._reasons, self._containers
+            self._groups, self._reasons, self._containers = {}, Counter(), Counter()
+            self._window_start = None
+
+        ranked = sorted(groups.values(), key=lambda g: g.count, reverse=True)
+        listed = ranked[:self.max_groups]
+        rest = ranked[self.max_groups:]
+        total = sum(reasons.values())
+        self.digests += 1
+        self.summarized += total
+        return {
+            'total': total,
+            'first_seen': min(g.first_seen for g in ranked),
+            'last_seen': max(g.last_seen for g in ranked),
+            'reasons': dict(reasons),
+            'containers': containers.most_common(self.top_containers),
+            'container_count': len(containers),
+            'groups': [g.to_dict(self.top_containers) for g in listed],
+            'other_groups': len(rest),
+            'other_count': sum(g.count for g in rest)
+        }
+
+    def __len__(self) -> int:
+        """当前窗口中的错误数"""
+        with self._lock:
+            return sum(self._reasons.values())
+
+    def get_metrics(self) -> dict:
+        """
+        获取汇总统计信息
+
+        Returns:
+            统计信息字典
+        """
+        return {
+            'pending': len(self),
+            'digests': self.digests,
+            'summarized': self.summarized
+        }
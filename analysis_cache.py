@@ -0,0 +1,232 @@
+"""
+AI 分析结果缓存模块
+把分析结果持久化到 SQLite，重启后和同一镜像的其它容器都可以复用；
+带 TTL 和容量上限（按最近使用时间淘汰），并发的相同未命中请求只调用一次 API
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    key BLOB PRIMARY KEY,
+    analysis TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_analysis_cache_created_at ON analysis_cache (created_at);
+CREATE INDEX IF NOT EXISTS ix_analysis_cache_last_used ON analysis_cache (last_used);
+"""
+
+# 超出容量时一次多淘汰的比例，避免之后每次写入都触发淘汰
+EVICT_SLACK = 0.1
+
+
+class _Flight:
+    """一次进行中的 API 调用，等待者共享它的结果"""
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+class AnalysisCache:
+    """持久化的 AI 分析结果缓存（线程安全）"""
+
+    def __init__(self, path: str = 'logs/analysis_cache.db', ttl: float = 7 * 24 * 3600,
+                 max_entries: int = 10000, clock: Callable[[], float] = time.time):
+        """
+        初始化分析结果缓存
+
+        Args:
+            path: SQLite 数据库文件路径
+            ttl: 分析结果的有效期（秒），从写入时开始计算
+            max_entries: 最大记录数，超出时淘汰最久未使用的记录
+            clock: 时钟函数，返回秒数（持久化的时间戳，需要使用墙上时间）
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.clock = clock
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._count = self._conn.execute('SELECT COUNT(*) FROM analysis_cache').fetchone()[0]
+
+        # 进行中的未命中请求: 键 -> _Flight
+        self._inflight: Dict[bytes, _Flight] = {}
+        self._inflight_lock = threading.Lock()
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        logger.info(f"AI 分析缓存已打开: {path} ({self._count} 条)")
+
+    def get(self, key: bytes) -> Optional[str]:
+        """
+        读取未过期的分析结果，并刷新最近使用时间，计入命中率统计
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            分析结果，不存在或已过期时返回 None
+        """
+        analysis = self._lookup(key)
+        if analysis is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return analysis
+
+    def _lookup(self, key: bytes) -> Optional[str]:
+        """读取未过期的分析结果并刷新最近使用时间，不计入统计"""
+        now = self.clock()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT analysis, created_at FROM analysis_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            analysis, created_at = row
+            if created_at + self.ttl <= now:
+                self._conn.execute('DELETE FROM analysis_cache WHERE key = ?', (key,))
+                self._count -= 1
+                self.expirations += 1
+                return None
+            self._conn.execute('UPDATE analysis_cache SET last_used = ? WHERE key = ?', (now, key))
+            return analysis
+
+    def put(self, key: bytes, analysis: str):
+        """
+        写入分析结果，必要时清理过期记录并按最近使用时间淘汰
+
+        Args:
+            key: 缓存键
+            analysis: 分析结果
+        """
+        now = self.clock()
+        with self._lock:
+            existed = self._conn.execute('SELECT 1 FROM analysis_cache WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO analysis_cache (key, analysis, created_at, last_used) VALUES (?, ?, ?, ?)',
+                (key, analysis, now, now)
+            )
+            if not existed:
+                self._count += 1
+            if self._count > self.max_entries:
+                self._evict(now)
+
+    def get_or_compute(self, key: bytes, compute: Callable[[], Optional[str]]) -> Optional[str]:
+        """
+        读取缓存，未命中时调用 compute 并缓存结果
+
+        同一个键同时只有一个线程调用 compute，其余线程等待并共享它的结果（包括异常）；
+        compute 返回空结果或抛出异常时不缓存
+
+        Args:
+            key: 缓存键
+            compute: 生成分析结果的函数（如调用 AI 接口）
+
+        Returns:
+            分析结果
+        """
+        analysis = self._lookup(key)
+        if analysis is not None:
+            self.hits += 1
+            return analysis
+
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            self.coalesced += 1
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            # 在拿到调用权之前，上一个调用者可能刚写入结果
+            analysis = self._lookup(key)
+            if analysis is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                analysis = compute()
+                if analysis:
+                    self.put(key, analysis)
+            flight.value = analysis
+            return analysis
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    def _evict(self, now: float):
+        """先删除过期记录，仍超出上限时按最近使用时间淘汰，调用方持有锁"""
+        expired = self._conn.execute(
+            'DELETE FROM analysis_cache WHERE created_at <= ?', (now - self.ttl,)
+        ).rowcount
+        self._count -= expired
+        self.expirations += expired
+
+        excess = self._count - self.max_entries
+        if excess > 0:
+            excess += int(self.max_entries * EVICT_SLACK)
+            evicted = self._conn.execute(
+                'DELETE FROM analysis_cache WHERE key IN '
+                '(SELECT key FROM analysis_cache ORDER BY last_used LIMIT ?)', (excess,)
+            ).rowcount
+            self._count -= evicted
+            self.evictions += evicted
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    def get_metrics(self) -> dict:
+        """
+        获取缓存统计信息
+
+        Returns:
+            统计信息字典，hit_rate 把等待同一请求的调用也算作命中
+        """
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'entries': self._count,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
@@ -0,0 +1,451 @@
+"""
+基于 asyncio 的 Docker 日志监控模块
+在单个事件循环中通过 Docker Engine API 复用读取所有容器的日志流，避免每个容器一个线程；
+读到的日志行按数据块交给一个处理线程调用回调，回调阻塞（如流水线队列已满）时不会卡住事件循环
+"""
+import asyncio
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlparse
+
+from checkpoint import CheckpointStore
+from docker_monitor import DockerLogMonitor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DOCKER_HOST = 'unix:///var/run/docker.sock'
+
+# 非 TTY 容器的日志流为多路复用格式: 8 字节头（流类型 + 3 字节填充 + 4 字节大端长度）+ 数据
+STREAM_HEADER = struct.Struct('>BxxxL')
+# 等待处理线程处理的数据块数上限，超过后读取任务暂停
+HANDLER_QUEUE_SIZE = 1000
+
+
+class DockerAPIError(Exception):
+    """Docker Engine API 请求失败"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+class AsyncDockerLogMonitor(DockerLogMonitor):
+    """使用单个 asyncio 事件循环复用读取所有容器日志的监控器"""
+
+    def __init__(self, containers: List[str], error_callback: Callable,
+                 tail: str = "latest", follow: bool = True, timestamps: bool = True,
+                 docker_host: Optional[str] = None, discovery: Optional[dict] = None,
+                 checkpoints: Optional[CheckpointStore] = None):
+        """
+        初始化异步 Docker 日志监控器
+
+        Args:
+            containers: 要监控的容器名称或 ID 列表
+            error_callback: 每行日志的回调函数，在处理线程中按读取顺序调用，可以阻塞（阻塞期间日志读取暂停）
+            tail: 从哪里开始读取日志 ("latest" 或数字)
+            follow: 是否持续跟随日志流
+            timestamps: 是否包含时间戳
+            docker_host: Docker 守护进程地址，默认读取 DOCKER_HOST 环境变量
+            discovery: 按标签和名称模式自动发现容器的配置，见 ContainerSelector
+            checkpoints: 日志读取位置检查点，启动时从上次处理到的位置继续读取
+        """
+        super().__init__(containers, error_callback, tail, follow, timestamps, discovery, checkpoints)
+        self.docker_host = docker_host or os.environ.get('DOCKER_HOST') or DEFAULT_DOCKER_HOST
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[threading.Thread] = None
+        # 事件循环读到的 (容器元数据, 日志行列表)，由处理线程调用回调；日志行列表为 None 表示新的日志流开始
+        self.handler_queue: queue.Queue = queue.Queue(maxsize=HANDLER_QUEUE_SIZE)
+        self.handler_thread: Optional[threading.Thread] = None
+        # 正在读取日志的容器: 完整容器 ID -> 读取任务（只在事件循环线程中访问）
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    def start_monitoring(self):
+        """在后台线程中启动事件循环，开始监控所有配置的容器"""
+        if not self.client:
+            if not self.connect():
+                raise Exception("无法连接到 Docker 守护进程")
+
+        if self.selector.discovery:
+            logger.info(f"开始以 asyncio 模式监控 {len(self.containers)} 个固定容器，并自动发现匹配的容器")
+        else:
+            logger.info(f"开始以 asyncio 模式监控 {len(self.containers)} 个容器的日志")
+
+        self.handler_thread = threading.Thread(target=self._handler_loop, name='docker-log-handler', daemon=True)
+        self.handler_thread.start()
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self.loop_thread = threading.Thread(
+            target=self._run_loop,
+            args=(ready,),
+            name='docker-log-loop',
+            daemon=True
+        )
+        self.loop_thread.start()
+        ready.wait()
+
+        if self.checkpoints is not None:
+            self.checkpoints.start(self.checkpoint_positions)
+        self.container_cache.add_listener(self._on_container_event)
+        self.reconcile()
+
+    def stop_monitoring(self):
+        """停止监控所有容器"""
+        logger.info("正在停止日志监控...")
+        self.stop_flag.set()
+
+        if self.loop and self.loop.is_running():
+            future = asyncio.run_coroutine_threadsafe(self._cancel_all(), self.loop)
+            try:
+                future.result(timeout=5)
+            except Exception as e:
+                logger.warning(f"取消日志读取任务时出错: {e}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+        if self.loop_thread:
+            self.loop_thread.join(timeout=5)
+        # 处理线程跳过尚未处理的日志行后退出（未处理的行没有记录读取位置，下次启动时重新读取）
+        if self.handler_thread:
+            self.handler_queue.put(None)
+            self.handler_thread.join(timeout=5)
+
+        if self.checkpoints is not None:
+            self.checkpoints.stop()
+        if self.container_cache is not None:
+            self.container_cache.stop()
+
+        logger.info("所有日志读取任务已停止")
+
+    def get_metrics(self) -> dict:
+        """
+        获取日志读取统计信息
+
+        Returns:
+            统计信息字典
+        """
+        metrics = super().get_metrics()
+        metrics['following'] = len(self.tasks)
+        return metrics
+
+    def _run_loop(self, ready: threading.Event):
+        """事件循环线程主函数"""
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def is_following(self, container_id: str) -> bool:
+        """容器是否正在读取日志"""
+        return container_id in self.tasks
+
+    def following_ids(self) -> List[str]:
+        """正在读取日志的容器 ID（任务字典只在事件循环线程中修改，复制时遇到并发修改则重试）"""
+        while True:
+            try:
+                return list(self.tasks)
+            except RuntimeError:
+                continue
+
+    def attach(self, info: dict, since: Optional[int] = None):
+        """
+        开始读取容器日志（可在任意线程调用）
+
+        Args:
+            info: 容器元数据
+            since: 从该纳秒时间戳开始读取，None 时按 tail 设置读取
+        """
+        if self.stop_flag.is_set() or not self.loop:
+            return
+        self.names[info['full_id']] = info['name']
+        self.loop.call_soon_threadsafe(self._start_follow, info, since)
+
+    def detach(self, container_id: str):
+        """
+        停止读取容器日志（可在任意线程调用）
+
+        Args:
+            container_id: 完整容器 ID
+        """
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._cancel_follow, container_id)
+
+    def _start_follow(self, info: dict, since: Optional[int]):
+        """为容器创建日志读取任务"""
+        container_id = info['full_id']
+        if self.stop_flag.is_set():
+            return
+        if container_id in self.tasks:
+            # 上一次的读取还没结束（容器刚重启），结束后再接入
+            self.pending_reattach[container_id] = (info, since)
+            return
+        task = self.loop.create_task(self._follow_container(info, since))
+        self.tasks[container_id] = task
+        self.attached += 1
+        task.add_done_callback(lambda _: self._follow_done(container_id))
+
+    def _follow_done(self, container_id: str):
+        """读取任务结束: 期间容器重启过时从上次位置继续，已删除的容器清理读取位置"""
+        self.tasks.pop(container_id, None)
+        pending = self.pending_reattach.pop(container_id, None)
+        if pending and not self.stop_flag.is_set():
+            info, since = pending
+            self.reattached += 1
+            self._start_follow(info, self.positions.get(container_id) or since)
+        elif container_id in self.removed:
+            self.removed.discard(container_id)
+            self._forget(container_id)
+
+    def _container_removed(self, container_id: str):
+        """容器已删除（可在任意线程调用）"""
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._mark_removed, container_id)
+
+    def _mark_removed(self, container_id: str):
+        """容器已删除: 不再重新接入，读取结束后清理读取位置"""
+        self.pending_reattach.pop(container_id, None)
+        if container_id in self.tasks:
+            self.removed.add(container_id)
+        else:
+            self._forget(container_id)
+
+    def _cancel_follow(self, container_id: str):
+        """取消容器的日志读取任务"""
+        self.pending_reattach.pop(container_id, None)
+        task = self.tasks.get(container_id)
+        if task:
+            self.detached += 1
+            task.cancel()
+
+    async def _cancel_all(self):
+        """取消所有日志读取任务"""
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _follow_container(self, info: dict, since: Optional[int] = None):
+        """
+        读取单个容器的日志流
+
+        Args:
+            info: 容器元数据
+            since: 从该纳秒时间戳开始读取
+        """
+        container_id = info['full_id']
+        name = info['name']
+        try:
+            details = await self._get_json(f"/containers/{container_id}/json")
+            tty = details.get('Config', {}).get('Tty', False)
+            logger.info(f"开始监控容器: {name} ({info['id']})")
+
+            # 始终请求时间戳，用于重新接入时定位；timestamps 关闭时在回调前去掉
+            params = {
+                'stdout': 1,
+                'stderr': 1,
+                'follow': int(self.follow),
+                'timestamps': 1,
+                'tail': self._tail_param(since)
+            }
+            if since:
+                params['since'] = f"{since // 1_000_000_000}.{since % 1_000_000_000:09d}"
+            reader, writer, headers = await self._open(
+                'GET', f"/containers/{container_id}/logs?{urlencode(params)}")
+            try:
+                # 与上一次读取还没处理完的日志行按顺序排队，处理线程处理到这里时再确定重读的范围
+                await self._enqueue((info, None))
+                body = self._iter_body(reader, headers)
+                chunks = body if tty else self._demux(body)
+                async for lines in self._iter_lines(chunks):
+                    if self.stop_flag.is_set():
+                        break
+                    await self._enqueue((info, lines))
+            finally:
+                writer.close()
+
+            logger.info(f"容器 {name} 的日志流已结束")
+
+        except asyncio.CancelledError:
+            raise
+        except DockerAPIError as e:
+            if e.status == 404:
+                logger.error(f"容器未找到: {name}")
+            else:
+                logger.error(f"监控容器 {name} 时发生错误: {e}")
+        except Exception as e:
+            logger.error(f"监控容器 {name} 时发生错误: {e}")
+
+    async def _enqueue(self, item: tuple):
+        """
+        把读到的日志行交给处理线程
+
+        Args:
+            item: (容器元数据, 日志行列表)
+        """
+        try:
+            self.handler_queue.put_nowait(item)
+        except queue.Full:
+            # 处理线程跟不上（如流水线队列已满）: 在线程池中等待，只暂停这个容器的读取，事件循环照常运行
+            await self.loop.run_in_executor(None, self.handler_queue.put, item)
+
+    def _handler_loop(self):
+        """处理线程主函数: 按读取顺序处理日志行，收到 None 时退出"""
+        while True:
+            item = self.handler_queue.get()
+            if item is None:
+                return
+            self._handle_lines(*item)
+
+    def _handle_lines(self, info: dict, lines: Optional[List[bytes]]):
+        """
+        处理一个数据块中的日志行（在处理线程中运行）
+
+        Args:
+            info: 容器元数据
+            lines: 日志行，None 表示新的日志流开始
+        """
+        container_id = info['full_id']
+        if lines is None:
+            self._begin_stream(container_id)
+            return
+        for line in lines:
+            if self.stop_flag.is_set():
+                return
+            try:
+                log_text = line.decode('utf-8').strip()
+                if log_text:
+                    self.handle_log_line(container_id, info['id'], log_text)
+            except Exception as e:
+                logger.error(f"处理容器 {info['name']} 的日志时出错: {e}")
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """建立到 Docker 守护进程的连接"""
+        url = urlparse(self.docker_host)
+        if url.scheme == 'unix':
+            return await asyncio.open_unix_connection(url.path)
+        if url.scheme in ('tcp', 'http'):
+            return await asyncio.open_connection(url.hostname, url.port or 2375)
+        raise ValueError(f"不支持的 Docker 地址: {self.docker_host}")
+
+    async def _open(self, method: str, path: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter, Dict[str, str]]:
+        """
+        发送 HTTP 请求并读取响应头
+
+        Args:
+            method: HTTP 方法
+            path: 请求路径
+
+        Returns:
+            (reader, writer, 响应头)
+        """
+        reader, writer = await self._connect()
+        request = f"{method} {path} HTTP/1.1\r\nHost: docker\r\nConnection: close\r\n\r\n"
+        writer.write(request.encode('ascii'))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        parts = status_line.decode('latin-1').split(' ', 2)
+        if len(parts) < 2:
+            writer.close()
+            raise DockerAPIError(0, f"无效的响应: {status_line!r}")
+        status = int(parts[1])
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        if status >= 400:
+            body = b''.join([chunk async for chunk in self._iter_body(reader, headers)])
+            writer.close()
+            try:
+                message = json.loads(body).get('message', '')
+            except ValueError:
+                message = body.decode('utf-8', 'replace')
+            raise DockerAPIError(status, message)
+
+        return reader, writer, headers
+
+    async def _get_json(self, path: str) -> dict:
+        """发送 GET 请求并解析 JSON 响应"""
+        reader, writer, headers = await self._open('GET', path)
+        try:
+            body = b''.join([chunk async for chunk in self._iter_body(reader, headers)])
+        finally:
+            writer.close()
+        return json.loads(body)
+
+    @staticmethod
+    async def _iter_body(reader: asyncio.StreamReader, headers: Dict[str, str]) -> AsyncIterator[bytes]:
+        """按 chunked / Content-Length / 读到连接关闭三种方式读取响应体"""
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size_line = await reader.readline()
+                if not size_line:
+                    return
+                size = int(size_line.split(b';', 1)[0].strip() or b'0', 16)
+                if size == 0:
+                    return
+                data = await reader.readexactly(size)
+                await reader.readline()
+                yield data
+        elif 'content-length' in headers:
+            remaining = int(headers['content-length'])
+            while remaining > 0:
+                data = await reader.read(min(remaining, 65536))
+                if not data:
+                    return
+                remaining -= len(data)
+                yield data
+        else:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    return
+                yield data
+
+    @staticmethod
+    async def _demux(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """
+        解析多路复用的 stdout/stderr 日志流，每读到一块数据输出其中完整帧的数据部分
+
+        按偏移量逐帧解析，每块数据只把不完整的最后一帧复制到下一轮，追读大量历史日志时不会反复复制缓冲区
+        """
+        buffer = b''
+        header_size = STREAM_HEADER.size
+        async for chunk in chunks:
+            buffer = buffer + chunk if buffer else chunk
+            offset = 0
+            frames = []
+            while len(buffer) - offset >= header_size:
+                _, size = STREAM_HEADER.unpack_from(buffer, offset)
+                end = offset + header_size + size
+                if len(buffer) < end:
+                    break
+                frames.append(buffer[offset + header_size:end])
+                offset = end
+            buffer = buffer[offset:]
+            if frames:
+                yield b''.join(frames)
+
+    @staticmethod
+    async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[bytes]]:
+        """将数据流切分为日志行，每块数据输出一次其中的完整行"""
+        pending = b''
+        async for chunk in chunks:
+            pending += chunk
+            if b'\n' not in chunk:
+                continue
+            *lines, pending = pending.split(b'\n')
+            yield lines
+        if pending:
+            yield [pending]
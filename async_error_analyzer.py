@@ -0,0 +1,473 @@
+"""
+异步 Azure OpenAI 错误分析模块
+在单个后台事件循环中使用异步客户端和共享连接池调用 AI 接口，
+由 AIMD 自适应并发限制控制同时进行的请求数，遇到 429 或延迟升高时自动退让；
+submit_analysis 提交后立即返回 Future，调用线程不等待分析结果
+"""
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from openai import AsyncAzureOpenAI, RateLimitError
+
+from analysis_cache import AnalysisCache
+from error_analyzer import ANALYSIS_TIMEOUT_MESSAGE, AnalysisTimeout, ErrorAnalyzer, error_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# 429 响应没有 Retry-After 时的默认等待时间（秒）
+DEFAULT_RETRY_AFTER = 1.0
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """
+    解析 Retry-After（秒数或 HTTP 日期）以及 Azure 的 retry-after-ms 响应头
+
+    Args:
+        headers: 响应头
+
+    Returns:
+        需要等待的秒数，没有或无法解析时返回 None
+    """
+    if headers is None:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD 自适应并发限制（只在事件循环线程中使用）
+
+    请求正常完成时并发上限加性增长（每轮约 +1），遇到 429 或延迟超过阈值时乘性减小；
+    同一轮中已经发出的请求返回的信号只减小一次。429 带 Retry-After 时在该时间之前不再发出新请求
+    """
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 16,
+                 latency_threshold: float = 20.0, backoff_ratio: float = 0.5,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        初始化并发限制
+
+        Args:
+            initial: 初始并发上限
+            min_limit: 最小并发上限
+            max_limit: 最大并发上限
+            latency_threshold: 单个请求的延迟阈值（秒），超过视为拥塞
+            backoff_ratio: 拥塞时并发上限的缩小比例
+            clock: 时钟函数，返回单调递增的秒数
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.latency_threshold = latency_threshold
+        self.backoff_ratio = backoff_ratio
+        self.clock = clock
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._last_decrease = float('-inf')
+        self._condition: Optional[asyncio.Condition] = None
+
+        # 统计信息
+        self.throttled = 0
+        self.slow = 0
+        self.decreases = 0
+        self.peak_in_flight = 0
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        """在事件循环中首次使用时创建条件变量"""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self, deadline: float) -> float:
+        """
+        等待并发许可
+
+        Args:
+            deadline: 截止时间（clock 时间），到期仍未获得许可时抛出 AnalysisTimeout
+
+        Returns:
+            获得许可的时间，释放时传回
+        """
+        async with self.condition:
+            while True:
+                now = self.clock()
+                blocked = self.blocked_until - now
+                if blocked <= 0 and self.in_flight < int(self.limit):
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise AnalysisTimeout("等待 AI 接口并发许可超时")
+                try:
+                    await asyncio.wait_for(self.condition.wait(),
+                                           min(remaining, blocked) if blocked > 0 else remaining)
+                except asyncio.TimeoutError:
+                    pass
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return self.clock()
+
+    async def release(self, started_at: float, latency: Optional[float] = None,
+                      throttled: bool = False, retry_after: Optional[float] = None):
+        """
+        释放许可并根据结果调整并发上限
+
+        Args:
+            started_at: acquire 返回的时间
+            latency: 请求耗时（秒），None 表示请求失败且与拥塞无关，不调整上限
+            throttled: 是否收到 429
+            retry_after: 429 响应要求的等待时间（秒）
+        """
+        async with self.condition:
+            self.in_flight -= 1
+            now = self.clock()
+            if throttled:
+                self.throttled += 1
+                self.blocked_until = max(self.blocked_until, now + (retry_after or DEFAULT_RETRY_AFTER))
+                self._decrease(started_at, now)
+            elif latency is not None and latency > self.latency_threshold:
+                self.slow += 1
+                self._decrease(started_at, now)
+            elif latency is not None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def _decrease(self, started_at: float, now: float):
+        """乘性减小并发上限；上次减小之前发出的请求属于同一轮，不再重复减小"""
+        if started_at < self._last_decrease:
+            return
+        self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        self._last_decrease = now
+        self.decreases += 1
+
+    def get_metrics(self) -> dict:
+        """
+        获取并发限制统计信息
+
+        Returns:
+            统计信息字典
+        """
+        return {
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'peak_in_flight': self.peak_in_flight,
+            'throttled': self.throttled,
+            'slow': self.slow,
+            'decreases': self.decreases
+        }
+
+
+class AsyncErrorAnalyzer(ErrorAnalyzer):
+    """使用异步客户端、共享连接池和自适应并发限制的错误分析器"""
+
+    def __init__(self, endpoint: str, api_key: str, deployment_name: str,
+                 api_version: str = "2024-02-15-preview", cache: Optional[AnalysisCache] = None,
+                 max_connections: int = 20, limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+                 deadline: float = 30.0, max_retries: int = 3):
+        """
+        初始化异步错误分析器
+
+        Args:
+            endpoint: Azure OpenAI 端点
+            api_key: API 密钥
+            deployment_name: 模型部署名称
+            api_version: API 版本
+            cache: 分析结果缓存，None 表示不缓存
+            max_connections: 连接池最大连接数
+            limiter: 自适应并发限制，默认使用 AdaptiveConcurrencyLimiter()
+            deadline: 单次分析的时限（秒，含排队和重试），超时后不等待分析结果
+            max_retries: 收到 429 时的最大重试次数
+        """
+        super().__init__(endpoint, api_key, deployment_name, api_version, cache)
+        self.max_connections = max_connections
+        self.limiter = limiter or AdaptiveConcurrencyLimiter()
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[threading.Thread] = None
+        self._connect_lock = threading.Lock()
+        # 缓存键 -> 进行中的分析，相同的未命中请求共用一个 Future
+        self._flights: Dict[bytes, concurrent.futures.Future] = {}
+        self._flights_lock = threading.Lock()
+        # --profile 模式下记录每次接口调用耗时的直方图
+        self.api_timer = None
+
+        # 统计信息
+        self.timeouts = 0
+        self.retries = 0
+
+    def connect(self):
+        """启动事件循环线程，初始化异步客户端和连接池"""
+        with self._connect_lock:
+            if self.client:
+                return True
+            try:
+                self.loop = asyncio.new_event_loop()
+                ready = threading.Event()
+                self.loop_thread = threading.Thread(
+                    target=self._run_loop,
+                    args=(ready,),
+                    name='ai-analyzer-loop',
+                    daemon=True
+                )
+                self.loop_thread.start()
+                ready.wait()
+
+                # 连接池在连接时才需要，缺少 HTTP 客户端包时连接失败而不是导入本模块失败
+                try:
+                    import httpx
+                except ImportError:  # 新版 openai 使用 httpx2
+                    import httpx2 as httpx
+                http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=self.max_connections,
+                                        max_keepalive_connections=self.max_connections),
+                    timeout=httpx.Timeout(self.deadline, connect=5.0)
+                )
+                self.client = AsyncAzureOpenAI(
+                    azure_endpoint=self.endpoint,
+                    api_key=self.api_key,
+                    api_version=self.api_version,
+                    http_client=http_client,
+                    # 重试由本类按 Retry-After 和时限处理
+                    max_retries=0
+                )
+                logger.info(f"Azure OpenAI 异步客户端初始化成功 (连接池 {self.max_connections})")
+                return True
+            except Exception as e:
+                logger.error(f"初始化 Azure OpenAI 异步客户端失败: {e}")
+                return False
+
+    def close(self):
+        """关闭客户端和事件循环"""
+        if not self.loop or not self.loop.is_running():
+            return
+        if self.client:
+            future = asyncio.run_coroutine_threadsafe(self.client.close(), self.loop)
+            try:
+                future.result(timeout=5)
+            except Exception as e:
+                logger.warning(f"关闭 Azure OpenAI 异步客户端时出错: {e}")
+            self.client = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.loop_thread:
+            self.loop_thread.join(timeout=5)
+
+    def _run_loop(self, ready: threading.Event):
+        """事件循环线程主函数"""
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def submit_analysis(self, error_log: str, container_name: str, container_image: str = "unknown",
+                        fingerprint: Optional[str] = None) -> concurrent.futures.Future:
+        """
+        提交错误分析，不等待结果
+
+        缓存命中时返回已完成的 Future；未命中时请求在事件循环中进行，相同缓存键的请求共用一个 Future。
+        Future 的结果与 analyze_error 的返回值相同，超时和失败也作为结果返回，不会抛出异常。
+        Future 的回调在事件循环线程中执行，不能阻塞
+
+        Args:
+            error_log: 错误日志内容
+            container_name: 容器名称
+            container_image: 容器镜像
+            fingerprint: 日志模板 ID
+
+        Returns:
+            分析结果的 Future
+        """
+        if not self.client and not self.connect():
+            return self._completed("AI 分析服务不可用")
+
+        key = None
+        if self.cache is not None:
+            key = self.cache_key(fingerprint or error_fingerprint(error_log), container_image)
+            with self._flights_lock:
+                future = self._flights.get(key)
+            if future is not None:
+                self.cache.coalesced += 1
+                return future
+            cached = self.cache.get(key)
+            if cached is not None:
+                return self._completed(cached)
+            with self._flights_lock:
+                future = self._flights.get(key)
+                if future is not None:
+                    return future
+                future = self._submit(key, error_log, container_name, container_image)
+                self._flights[key] = future
+                return future
+        return self._submit(key, error_log, container_name, container_image)
+
+    def _submit(self, key: Optional[bytes], error_log: str, container_name: str,
+                container_image: str) -> concurrent.futures.Future:
+        """把分析协程提交到事件循环"""
+        messages = self._analysis_messages(error_log, container_name, container_image)
+        return asyncio.run_coroutine_threadsafe(
+            self._analyze_async(key, messages, container_name), self.loop
+        )
+
+    @staticmethod
+    def _completed(analysis: str) -> concurrent.futures.Future:
+        """已完成的 Future"""
+        future = concurrent.futures.Future()
+        future.set_result(analysis)
+        return future
+
+    async def _analyze_async(self, key: Optional[bytes], messages: List[dict], container_name: str) -> str:
+        """
+        在事件循环中分析一条错误，记录统计信息并写入缓存
+
+        Args:
+            key: 缓存键，None 表示不缓存
+            messages: 对话消息
+            container_name: 容器名称
+
+        Returns:
+            分析结果，超时或失败时返回对应的提示
+        """
+        try:
+            analysis, cacheable = await self._request_async(messages, container_name)
+            if key is not None and cacheable and analysis:
+                # SQLite 写入放到线程池，不阻塞事件循环；写入完成前相同的请求继续共用这个 Future
+                try:
+                    await asyncio.get_running_loop().run_in_executor(None, self.cache.put, key, analysis)
+                except Exception as e:
+                    logger.warning(f"写入分析结果缓存失败: {e}")
+            return analysis
+        finally:
+            self._forget(key)
+
+    async def _request_async(self, messages: List[dict], container_name: str) -> Tuple[str, bool]:
+        """调用接口并记录耗时、token 用量和失败次数，返回 (分析结果, 是否可以缓存)，超时和失败时返回对应的提示"""
+        clock = self.limiter.clock
+        started_at = time.monotonic()
+        try:
+            # 协程内部按截止时间超时，这里多等一点作为兜底
+            analysis, total_tokens = await asyncio.wait_for(
+                self._complete_async(messages, 1000, clock() + self.deadline), self.deadline + 1
+            )
+        except (AnalysisTimeout, asyncio.TimeoutError):
+            self.api_failures += 1
+            self.timeouts += 1
+            logger.warning(f"分析错误日志超时，不等待分析结果: [{container_name}]")
+            return ANALYSIS_TIMEOUT_MESSAGE, False
+        except Exception as e:
+            self.api_failures += 1
+            logger.error(f"分析错误日志失败: {e}")
+            return f"AI 分析失败: {str(e)}", False
+        finally:
+            elapsed = time.monotonic() - started_at
+            self.request_latency.observe(elapsed)
+            if self.api_timer is not None:
+                self.api_timer.observe(elapsed)
+
+        self.tokens += total_tokens or 0
+        self.requests += 1
+        logger.info(f"成功分析错误日志 (token 使用: {total_tokens})")
+        return analysis, True
+
+    def _forget(self, key: Optional[bytes]):
+        """结束缓存键对应的进行中分析"""
+        if key is not None:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+
+    def _complete(self, messages: List[dict], max_tokens: int) -> Tuple[str, int]:
+        """
+        在事件循环中调用接口并等待结果，超过时限时取消请求并抛出 AnalysisTimeout
+
+        Args:
+            messages: 对话消息
+            max_tokens: 最大输出 token 数
+
+        Returns:
+            (回复内容, 总 token 数)
+        """
+        deadline = self.limiter.clock() + self.deadline
+        future = asyncio.run_coroutine_threadsafe(
+            self._complete_async(messages, max_tokens, deadline), self.loop
+        )
+        try:
+            # 协程内部按截止时间超时，这里多等一点作为兜底
+            return future.result(timeout=self.deadline + 1)
+        except (AnalysisTimeout, concurrent.futures.TimeoutError):
+            future.cancel()
+            self.timeouts += 1
+            raise AnalysisTimeout(f"AI 分析超过 {self.deadline} 秒时限")
+
+    async def _complete_async(self, messages: List[dict], max_tokens: int,
+                              deadline: float) -> Tuple[str, int]:
+        """带并发限制、429 重试和截止时间的接口调用"""
+        clock = self.limiter.clock
+        attempt = 0
+        while True:
+            started_at = await self.limiter.acquire(deadline)
+            try:
+                response = await asyncio.wait_for(
+                    self.client.chat.completions.create(
+                        model=self.deployment_name,
+                        messages=messages,
+                        temperature=0.3,
+                        max_tokens=max_tokens
+                    ),
+                    max(0.0, deadline - clock())
+                )
+            except RateLimitError as e:
+                retry_after = parse_retry_after(getattr(e.response, 'headers', None))
+                await self.limiter.release(started_at, throttled=True, retry_after=retry_after)
+                attempt += 1
+                wait = retry_after or DEFAULT_RETRY_AFTER
+                if clock() + wait >= deadline:
+                    raise AnalysisTimeout("AI 接口限流，等待时间超过时限")
+                if attempt > self.max_retries:
+                    raise
+                self.retries += 1
+                logger.warning(f"AI 接口限流 (429)，{wait:.1f} 秒后第 {attempt} 次重试")
+                continue
+            except asyncio.TimeoutError:
+                await self.limiter.release(started_at, latency=clock() - started_at)
+                raise AnalysisTimeout("AI 接口响应超过时限")
+            except BaseException:
+                await self.limiter.release(started_at)
+                raise
+
+            await self.limiter.release(started_at, latency=clock() - started_at)
+            return response.choices[0].message.content, response.usage.total_tokens
+
+    def get_metrics(self) -> dict:
+        """
+        获取 API 调用、并发限制和分析结果缓存统计信息
+
+        Returns:
+            统计信息字典，concurrency 为并发限制统计
+        """
+        metrics = super().get_metrics()
+        metrics['timeouts'] = self.timeouts
+        metrics['retries'] = self.retries
+        metrics['concurrency'] = self.limiter.get_metrics()
+        return metrics
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+告警汇总测试 - 向 LogMonitorApp 回放一次错误风暴（多个容器、多个日志模板），
+对比不汇总、汇总超限错误（overflow）和只发汇总（all）三种方式的 Webhook 调用次数和被静默丢弃的错误数
+
+Docker、Azure OpenAI 和飞书 Webhook 都使用 benchmarks/stubs.py 中的本地模拟服务
+
+用法: python benchmarks/bench_alert_digest.py [--errors 2000] [--duration 6] [--containers 20] [--templates 30] [--window 2]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import yaml
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# main 模块导入时在当前目录的 logs/ 下创建日志文件，切换到临时目录运行
+logging.basicConfig(level=logging.CRITICAL)
+os.chdir(tempfile.mkdtemp(prefix='bench-alert-digest-'))
+os.makedirs('logs')
+
+import main as monitor_main
+from main import LogMonitorApp
+from stubs import FakeDockerAPI, FakeFeishuWebhook, FakeOpenAI
+
+
+def write_config(path: str, openai: FakeOpenAI, webhook: FakeFeishuWebhook, digest: dict):
+    """生成指向模拟服务的配置文件"""
+    with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'config', 'config.yaml'), encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config['azure_openai'].update(endpoint=openai.endpoint, api_key='stub', cache={'enabled': False})
+    config['feishu']['webhook_url'] = webhook.url
+    config['notification']['digest'] = digest
+    with open(path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+
+
+def generate_storm(count: int, containers: int, templates: int, seed: int = 42) -> list:
+    """生成 (容器名, 日志行)"""
+    rng = random.Random(seed)
+    return [(f'api-{rng.randint(1, containers)}',
+             f'ERROR worker{rng.randint(1, templates)} crashed: upstream timeout after '
+             f'{rng.randint(1, 5000)}ms (request {rng.getrandbits(64):016x})')
+            for _ in range(count)]
+
+
+def run(config_path: str, webhook: FakeFeishuWebhook, storm: list, duration: float) -> dict:
+    """按 duration 秒均匀回放错误，期间每秒检查一次汇总窗口（与主循环相同）"""
+    app = LogMonitorApp(config_path)
+    app.load_config()
+    app.initialize_components()
+    app.docker_monitor.connect()
+    app.feishu_notifier.start()
+    app.pipeline.start()
+
+    requests_before = webhook.requests
+    interval = duration / len(storm)
+    start = time.monotonic()
+    next_flush = start + 1
+    for i, (container, line) in enumerate(storm):
+        app.on_log_line(container, 'c' * 12, line, datetime.now())
+        delay = start + (i + 1) * interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        if time.monotonic() >= next_flush:
+            app.flush_digest()
+            next_flush += 1
+    elapsed = time.monotonic() - start
+
+    # 与 stop() 相同的关闭顺序，发送队列按 feishu.rate_per_second 限速，等待全部发送完毕
+    app.pipeline.stop()
+    app.feishu_notifier.stop(timeout=300)
+    app.flush_digest(force=True)
+    if hasattr(app.error_analyzer, 'close'):
+        app.error_analyzer.close()
+
+    cache = app.error_cache.get_metrics()
+    notifier = app.feishu_notifier.get_metrics()
+    digest = app.digest.get_metrics() if app.digest is not None else {'digests': 0, 'summarized': 0}
+    unique = len(storm) - cache['hits']
+    single = notifier['delivered'] - digest['digests']
+    return {
+        'unique': unique,
+        'webhook_calls': webhook.requests - requests_before,
+        'single': single,
+        'digests': digest['digests'],
+        'summarized': digest['summarized'],
+        'dropped': unique - single - digest['summarized'],
+        'elapsed': elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='告警汇总测试')
+    parser.add_argument('--errors', type=int, default=2000, help='错误风暴中的错误行数 (默认: 2000)')
+    parser.add_argument('--duration', type=float, default=6.0, help='回放时长（秒）(默认: 6)')
+    parser.add_argument('--containers', type=int, default=20, help='容器数 (默认: 20)')
+    parser.add_argument('--templates', type=int, default=30, help='日志模板数 (默认: 30)')
+    parser.add_argument('--window', type=float, default=2.0, help='汇总窗口（秒）(默认: 2)')
+    args = parser.parse_args()
+
+    # 不写入 Web 数据库
+    monitor_main.WEB_APP_AVAILABLE = False
+
+    docker = FakeDockerAPI()
+    docker.start()
+    os.environ['DOCKER_HOST'] = docker.docker_host
+    openai = FakeOpenAI(latency=0.05)
+    openai.start()
+    webhook = FakeFeishuWebhook(latency=0.01, handshake_delay=0.0)
+    webhook.start()
+
+    storm = generate_storm(args.errors, args.containers, args.templates)
+    config_path = os.path.abspath('config.yaml')
+
+    print(f"错误风暴: {args.errors} 行, {args.duration:g} 秒, {args.containers} 个容器, "
+          f"{args.templates} 个模板, 汇总窗口 {args.window:g} 秒\n")
+    print(f"{'方式':<14}{'去重后':>8}{'Webhook':>10}{'单独通知':>10}{'汇总次数':>10}{'汇总错误':>10}{'静默丢弃':>10}")
+
+    rounds = [
+        ('不汇总', {'enabled': False}),
+        ('overflow', {'enabled': True, 'mode': 'overflow', 'window': args.window}),
+        ('all', {'enabled': True, 'mode': 'all', 'window': args.window}),
+    ]
+    for name, digest in rounds:
+        write_config(config_path, openai, webhook, digest)
+        r = run(config_path, webhook, storm, args.duration)
+        print(f"{name:<14}{r['unique']:>8}{r['webhook_calls']:>10}{r['single']:>10}"
+              f"{r['digests']:>10}{r['summarized']:>10}{r['dropped']:>10}")
+
+
+if __name__ == '__main__':
+    main()
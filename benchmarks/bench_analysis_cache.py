@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+AI 分析缓存测试 - 在本地模拟的 OpenAI 服务上回放错误流，对比不缓存、冷缓存和重启后（热缓存）的 API 调用次数和耗时
+
+错误来自少量日志模板、分布在同一镜像的多个副本中，由多个工作线程并发分析（与流水线 analyze 阶段相同）
+
+用法: python benchmarks/bench_analysis_cache.py [--errors 400] [--templates 20] [--workers 4] [--latency 0.2]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis_cache import AnalysisCache
+from error_analyzer import ErrorAnalyzer
+from stubs import FakeOpenAI
+from template_miner import TemplateMiner
+
+
+def generate_errors(count: int, templates: int, replicas: int, seed: int = 42) -> list:
+    """生成 (容器名, 日志行)"""
+    rng = random.Random(seed)
+    return [(f'api-{rng.randint(1, replicas)}',
+             f'ERROR handler{rng.randint(1, templates)} failed after {rng.randint(1, 5000)}ms '
+             f'for request {rng.getrandbits(64):016x}')
+            for _ in range(count)]
+
+
+def run(stub: FakeOpenAI, errors: list, workers: int, cache) -> dict:
+    """用指定缓存分析全部错误"""
+    analyzer = ErrorAnalyzer(endpoint=stub.endpoint, api_key='stub', deployment_name='gpt-4', cache=cache)
+    miner = TemplateMiner()
+    fingerprints = [miner.add(line).template_id for _, line in errors]
+    requests_before = stub.requests
+
+    def analyze(i):
+        container, line = errors[i]
+        return analyzer.analyze_error(line, container, 'registry/api:1.0', fingerprint=fingerprints[i])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(analyze, range(len(errors))))
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for r in results if not r or r.startswith('AI 分析'))
+    return {
+        'api_calls': stub.requests - requests_before,
+        'elapsed': elapsed,
+        'failed': failed,
+        'hit_rate': cache.get_metrics()['hit_rate'] if cache else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AI 分析缓存测试')
+    parser.add_argument('--errors', type=int, default=400, help='错误数量 (默认: 400)')
+    parser.add_argument('--templates', type=int, default=20, help='日志模板数量 (默认: 20)')
+    parser.add_argument('--replicas', type=int, default=5, help='同一镜像的容器副本数 (默认: 5)')
+    parser.add_argument('--workers', type=int, default=4, help='并发分析线程数 (默认: 4)')
+    parser.add_argument('--latency', type=float, default=0.2, help='模拟 API 延迟（秒）(默认: 0.2)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    stub = FakeOpenAI(latency=args.latency)
+    stub.start()
+    errors = generate_errors(args.errors, args.templates, args.replicas)
+    path = os.path.join(tempfile.mkdtemp(prefix='bench-analysis-cache-'), 'analysis_cache.db')
+
+    print(f"{args.errors} 条错误, {args.templates} 个模板, {args.replicas} 个副本, "
+          f"{args.workers} 个线程, API 延迟 {args.latency * 1000:.0f} ms\n")
+    print(f"{'方式':<16}{'API 调用':>10}{'命中率':>10}{'耗时(s)':>10}{'失败':>6}")
+
+    rounds = [('不缓存', lambda: None), ('冷缓存', lambda: AnalysisCache(path)),
+              ('重启后', lambda: AnalysisCache(path))]
+    for name, make_cache in rounds:
+        cache = make_cache()
+        r = run(stub, errors, args.workers, cache)
+        if cache:
+            cache.close()
+        print(f"{name:<16}{r['api_calls']:>10}{r['hit_rate']:>10.1%}{r['elapsed']:>10.2f}{r['failed']:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+AI 分析负载测试 - 在注入延迟和限流的模拟 OpenAI 服务上对比同步分析器与异步分析器
+
+两个场景:
+  限流: 服务同时只处理 max-concurrent 个请求，超出返回 429 + Retry-After
+  延迟突增: 服务延迟超过分析时限，异步分析器到时限即返回，通知不再等待
+两个分析器都在有 threads 个工作线程的 analyze 流水线阶段中运行
+
+用法: python benchmarks/bench_async_analysis.py [--requests 200] [--threads 16] [--max-concurrent 4] [--max-limit 32]
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_error_analyzer import AdaptiveConcurrencyLimiter, AsyncErrorAnalyzer
+from error_analyzer import ANALYSIS_TIMEOUT_MESSAGE, ErrorAnalyzer
+from pipeline import PipelineStage
+from stubs import FakeOpenAI
+
+
+def run(analyzer, requests: int, threads: int) -> dict:
+    """
+    通过有 threads 个工作线程的 analyze 流水线阶段分析 requests 条不同的错误
+
+    同步分析器每个工作线程同时只等待一个请求；异步分析器的工作线程只提交请求，由完成线程收取结果。
+    延迟从放入阶段队列开始计算，包含排队时间
+    """
+    results = []
+    finished = threading.Event()
+
+    def record(event, analysis):
+        results.append((time.perf_counter() - event['submitted'], analysis))
+        if len(results) == requests:
+            finished.set()
+
+    def analyze(event):
+        record(event, analyzer.analyze_error(event['error_log'], 'api', 'registry/api:1.0'))
+
+    def submit(event):
+        return analyzer.submit_analysis(event['error_log'], 'api', 'registry/api:1.0')
+
+    if isinstance(analyzer, AsyncErrorAnalyzer):
+        stage = PipelineStage('analyze', submit, workers=threads, queue_size=requests,
+                              max_in_flight=requests, complete=record)
+    else:
+        stage = PipelineStage('analyze', analyze, workers=threads, queue_size=requests)
+    stage.start()
+
+    start = time.perf_counter()
+    for i in range(requests):
+        stage.queue.put({'error_log': f'ERROR job{i} failed', 'submitted': time.perf_counter()})
+    finished.wait()
+    elapsed = time.perf_counter() - start
+    stage.stop()
+
+    latencies = sorted(r[0] for r in results)
+    return {
+        'ok': sum(1 for _, a in results if a and not a.startswith('AI 分析')),
+        'timeout': sum(1 for _, a in results if a == ANALYSIS_TIMEOUT_MESSAGE),
+        'failed': sum(1 for _, a in results if a and a.startswith('AI 分析失败')),
+        'elapsed': elapsed,
+        'p50': latencies[len(latencies) // 2],
+        'p95': latencies[int(len(latencies) * 0.95)]
+    }
+
+
+def make_analyzers(stub: FakeOpenAI, deadline: float, max_limit: int) -> list:
+    return [
+        ('同步', ErrorAnalyzer(endpoint=stub.endpoint, api_key='stub', deployment_name='gpt-4')),
+        ('异步 AIMD', AsyncErrorAnalyzer(
+            endpoint=stub.endpoint, api_key='stub', deployment_name='gpt-4', deadline=deadline,
+            limiter=AdaptiveConcurrencyLimiter(initial=4, max_limit=max_limit, latency_threshold=deadline / 2)
+        ))
+    ]
+
+
+def print_row(name: str, stub: FakeOpenAI, before: tuple, r: dict, analyzer):
+    concurrency = analyzer.get_metrics().get('concurrency')
+    limit = concurrency['limit'] if concurrency else '-'
+    print(f"{name:<12}{r['ok']:>6}{r['timeout']:>6}{r['failed']:>6}{stub.rate_limited - before[1]:>8}"
+          f"{stub.requests - before[0]:>8}{r['elapsed']:>9.1f}{r['p50']:>8.2f}{r['p95']:>8.2f}{limit:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AI 分析负载测试')
+    parser.add_argument('--requests', type=int, default=200, help='每轮分析的错误数 (默认: 200)')
+    parser.add_argument('--threads', type=int, default=16, help='analyze 阶段工作线程数 (默认: 16)')
+    parser.add_argument('--max-concurrent', type=int, default=4, help='模拟服务的并发上限 (默认: 4)')
+    parser.add_argument('--max-limit', type=int, default=32, help='异步分析器的自适应并发上限 (默认: 32)')
+    parser.add_argument('--latency', type=float, default=0.3, help='正常 API 延迟（秒）(默认: 0.3)')
+    parser.add_argument('--spike', type=float, default=5.0, help='延迟突增时的 API 延迟（秒）(默认: 5)')
+    parser.add_argument('--deadline', type=float, default=2.0, help='异步分析器的分析时限（秒）(默认: 2)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    header = (f"{'分析器':<12}{'成功':>6}{'超时':>6}{'失败':>6}{'429':>8}{'API 请求':>8}"
+              f"{'耗时(s)':>9}{'p50':>8}{'p95':>8}{'并发':>6}")
+
+    print(f"场景一: 限流（服务并发上限 {args.max_concurrent}, 延迟 {args.latency}s, "
+          f"{args.threads} 个线程, {args.requests} 条错误）")
+    print(header)
+    stub = FakeOpenAI(latency=args.latency, max_concurrent=args.max_concurrent, retry_after=1)
+    stub.start()
+    for name, analyzer in make_analyzers(stub, 30.0, args.max_limit):
+        before = (stub.requests, stub.rate_limited)
+        r = run(analyzer, args.requests, args.threads)
+        print_row(name, stub, before, r, analyzer)
+
+    spike_requests = max(args.threads, args.requests // 10)
+    print(f"\n场景二: 延迟突增（延迟 {args.spike}s, 异步分析时限 {args.deadline}s, {spike_requests} 条错误）")
+    print(header)
+    stub = FakeOpenAI(latency=args.spike)
+    stub.start()
+    for name, analyzer in make_analyzers(stub, args.deadline, args.max_limit):
+        before = (stub.requests, stub.rate_limited)
+        r = run(analyzer, spike_requests, args.threads)
+        print_row(name, stub, before, r, analyzer)
+
+
+if __name__ == '__main__':
+    main()
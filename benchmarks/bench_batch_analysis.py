@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+批量 AI 分析测试 - 模拟故障期间的错误突发，对比逐条分析与批量分析的 API 请求数和端到端延迟
+
+错误事件经过与监控程序相同的 analyze 流水线阶段，AI 接口使用本地模拟服务（benchmarks/stubs.py）
+
+用法: python benchmarks/bench_batch_analysis.py [--errors 200] [--burst 2] [--batch-size 20] [--latency 1.0]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from error_analyzer import ErrorAnalyzer
+from pipeline import EventPipeline
+from stubs import FakeOpenAI
+
+COMPONENTS = ['OrderService', 'PaymentClient', 'InventoryRepo', 'AuthFilter', 'CacheLoader',
+              'MailSender', 'ReportJob', 'SearchIndexer', 'GatewayRoute', 'SessionStore']
+FAILURES = ['connection refused', 'timed out', 'returned malformed response', 'raised NullPointerException',
+            'exceeded retry budget', 'lost leader election', 'rejected credentials', 'ran out of memory']
+
+
+def generate_errors(count: int, seed: int = 42) -> list:
+    """生成互不相同的错误日志（不同组件和失败原因的组合）"""
+    rng = random.Random(seed)
+    return [f"ERROR {rng.choice(COMPONENTS)}.{rng.choice(['load', 'save', 'call', 'sync'])}{i} "
+            f"{rng.choice(FAILURES)}" for i in range(count)]
+
+
+def run(stub: FakeOpenAI, errors: list, burst: float, batch_size: int, max_latency: float,
+        workers: int) -> dict:
+    """把错误在 burst 秒内均匀提交到 analyze 阶段，等待全部分析完成"""
+    analyzer = ErrorAnalyzer(endpoint=stub.endpoint, api_key='stub', deployment_name='gpt-4')
+    latencies = []
+    done = threading.Event()
+
+    def analyze_one(event):
+        event['analysis'] = analyzer.analyze_error(event['log_line'], 'api', 'registry/api:1.0')
+        return event
+
+    def analyze_many(events):
+        results = analyzer.analyze_error_batch([
+            {'error_log': e['log_line'], 'container_name': 'api', 'container_image': 'registry/api:1.0'}
+            for e in events
+        ], max_batch=len(events))
+        for event, result in zip(events, results):
+            event['analysis'] = result['analysis']
+        return events
+
+    def finish(event):
+        latencies.append(time.perf_counter() - event['submitted'])
+        if len(latencies) == len(errors):
+            done.set()
+
+    pipeline = EventPipeline()
+    pipeline.add_stage('analyze', analyze_many if batch_size > 1 else analyze_one, workers=workers,
+                       batch_size=batch_size, max_latency=max_latency)
+    pipeline.add_stage('sink', finish)
+    pipeline.start()
+
+    requests_before = stub.requests
+    start = time.perf_counter()
+    for i, line in enumerate(errors):
+        delay = start + burst * i / len(errors) - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pipeline.submit({'log_line': line, 'submitted': time.perf_counter()})
+    done.wait()
+    elapsed = time.perf_counter() - start
+    pipeline.stop()
+
+    latencies.sort()
+    metrics = analyzer.get_metrics()
+    return {
+        'api_calls': stub.requests - requests_before,
+        'fallbacks': metrics['batch_fallbacks'],
+        'elapsed': elapsed,
+        'p50': latencies[len(latencies) // 2],
+        'p95': latencies[int(len(latencies) * 0.95)]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量 AI 分析测试')
+    parser.add_argument('--errors', type=int, default=200, help='突发的不同错误数量 (默认: 200)')
+    parser.add_argument('--burst', type=float, default=2.0, help='错误在多少秒内到达 (默认: 2)')
+    parser.add_argument('--batch-size', type=int, default=20, help='批量分析的批次大小 (默认: 20)')
+    parser.add_argument('--max-latency', type=float, default=2.0, help='凑批最长等待时间（秒）(默认: 2)')
+    parser.add_argument('--workers', type=int, default=4, help='analyze 阶段并发数 (默认: 4)')
+    parser.add_argument('--latency', type=float, default=1.0, help='模拟 API 延迟（秒）(默认: 1.0)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    errors = generate_errors(args.errors)
+    print(f"{args.errors} 条不同错误在 {args.burst} 秒内到达, {args.workers} 个线程, "
+          f"API 延迟 {args.latency * 1000:.0f} ms\n")
+    print(f"{'方式':<22}{'API 请求':>10}{'回退':>6}{'总耗时(s)':>11}{'p50(s)':>9}{'p95(s)':>9}")
+
+    rounds = [('逐条', 1, False), (f'批量 {args.batch_size}', args.batch_size, False),
+              (f'批量 {args.batch_size}（解析失败）', args.batch_size, True)]
+    for name, batch_size, malformed in rounds:
+        stub = FakeOpenAI(latency=args.latency, malformed_batches=malformed)
+        stub.start()
+        r = run(stub, errors, args.burst, batch_size, args.max_latency, args.workers)
+        print(f"{name:<22}{r['api_calls']:>10}{r['fallbacks']:>6}{r['elapsed']:>11.1f}"
+              f"{r['p50']:>9.1f}{r['p95']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+日志检查点测试 - 监控器运行一段时间后停止、停机若干秒再启动，对比不保存检查点（tail=latest）和
+保存检查点（since= 续读）两种方式漏读、重复的日志行数，以及回调收到的时间与日志实际时间的偏差；
+并测试大量容器时检查点批量写入的耗时
+
+用法: python benchmarks/bench_checkpoint.py [--containers 20] [--downtime 2] [--rate 20]
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoint import CheckpointStore
+from docker_monitor import DockerLogMonitor, split_docker_timestamp
+from metrics import Histogram
+from stubs import FakeDockerAPI
+
+SEQUENCE = re.compile(r'seq=(\d+)')
+# 时间偏差分桶（秒）
+SKEW_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30)
+
+
+def run(server: FakeDockerAPI, names: list, checkpoint_path, args) -> dict:
+    """监控 → 停机 → 再次监控，返回漏读、重复和时间偏差"""
+    received = defaultdict(list)
+    # 事件时间与日志实际时间的偏差；以及原实现使用 datetime.now() 时的偏差
+    skew = Histogram(SKEW_BUCKETS)
+    now_skew = Histogram(SKEW_BUCKETS)
+    lock = threading.Lock()
+
+    def on_line(container_name, container_id, log_line, timestamp):
+        stamp, content = split_docker_timestamp(log_line)
+        with lock:
+            received[container_name].append(int(SEQUENCE.search(content).group(1)))
+            skew.observe(abs(timestamp.timestamp() - stamp / 1e9))
+            now_skew.observe(abs(time.time() - stamp / 1e9))
+
+    def start_monitor():
+        checkpoints = CheckpointStore(checkpoint_path, flush_interval=0.5) if checkpoint_path else None
+        monitor = DockerLogMonitor(containers=names, error_callback=on_line, tail='latest', checkpoints=checkpoints)
+        monitor.start_monitoring()
+        return monitor
+
+    monitor = start_monitor()
+    time.sleep(args.duration)
+    # 模拟进程退出
+    monitor.stop_monitoring()
+    first_run_end = {name: len(server.containers[server.container_id(name)]['log']) for name in names}
+    time.sleep(args.downtime)
+    monitor = start_monitor()
+    time.sleep(args.duration)
+    monitor.stop_monitoring()
+
+    lost = duplicated = total = 0
+    for name in names:
+        seen = received[name]
+        first = min(seen)
+        last = max(seen)
+        # 第一次启动前已有的日志（tail=latest 不读）和第二次停止后产生的日志不计
+        expected = set(range(first, last + 1))
+        lost += len(expected - set(seen))
+        duplicated += len(seen) - len(set(seen))
+        total += len(expected)
+    return {
+        'total': total,
+        'lost': lost,
+        'duplicated': duplicated,
+        'downtime_lines': sum(len(server.containers[server.container_id(name)]['log']) for name in names)
+        - sum(first_run_end.values()),
+        'skew_max': skew.quantile(1.0),
+        'now_skew_p99': now_skew.quantile(0.99),
+        'now_skew_max': now_skew.quantile(1.0)
+    }
+
+
+def bench_flush(path: str, containers: int, rounds: int) -> dict:
+    """大量容器时每次批量写入检查点的耗时"""
+    store = CheckpointStore(path)
+    now = time.time_ns()
+    latency = Histogram((0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+    for i in range(rounds):
+        positions = {f'app-{c}': (f'{c:064x}', now + i * 1_000_000 + c, 1) for c in range(containers)}
+        start = time.perf_counter()
+        store.save(positions)
+        latency.observe(time.perf_counter() - start)
+    store.stop()
+    return {'p50': latency.quantile(0.5), 'p99': latency.quantile(0.99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='日志检查点测试')
+    parser.add_argument('--containers', type=int, default=20, help='容器数 (默认: 20)')
+    parser.add_argument('--duration', type=float, default=3.0, help='每次运行时长（秒）(默认: 3)')
+    parser.add_argument('--downtime', type=float, default=2.0, help='停机时长（秒）(默认: 2)')
+    parser.add_argument('--rate', type=float, default=20.0, help='每个容器每秒输出的行数 (默认: 20)')
+    parser.add_argument('--flush-containers', type=int, default=5000, help='批量写入测试的容器数 (默认: 5000)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    directory = tempfile.mkdtemp(prefix='bench-checkpoint-')
+    print(f"{args.containers} 个容器, 每个 {args.rate} 行/秒, 运行 {args.duration}s → 停机 {args.downtime}s → "
+          f"运行 {args.duration}s\n")
+    print(f"{'方式':<20}{'应处理':>8}{'停机期间':>10}{'漏读':>8}{'重复':>8}"
+          f"{'事件时间偏差':>14}{'now() 偏差 p99':>16}{'最大':>8}")
+    for label, path in (('不保存检查点', None), ('检查点 + since=', os.path.join(directory, 'checkpoints.db'))):
+        server = FakeDockerAPI(lines_per_second=args.rate)
+        server.start()
+        os.environ['DOCKER_HOST'] = server.docker_host
+        names = [f'app-{i}' for i in range(args.containers)]
+        for name in names:
+            server.add_container(name)
+        r = run(server, names, path, args)
+        print(f"{label:<20}{r['total']:>8}{r['downtime_lines']:>10}{r['lost']:>8}{r['duplicated']:>8}"
+              f"{r['skew_max'] * 1000:>12.3f}ms{r['now_skew_p99']:>15.3f}s{r['now_skew_max']:>7.1f}s")
+
+    r = bench_flush(os.path.join(directory, 'flush.db'), args.flush_containers, 20)
+    print(f"\n批量写入 {args.flush_containers} 个容器的检查点: p50 {r['p50'] * 1000:.1f} ms, p99 {r['p99'] * 1000:.1f} ms "
+          f"(后台定期写入，读取日志时只更新内存)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+配置热加载测试 - LogMonitorApp 在本地模拟 Docker API 上读取多个容器的日志时反复修改配置文件并重新加载
+（交替更换错误关键词、增减一个容器），检查: 重新加载的耗时、容器集合不变的日志流是否被重新接入、
+是否漏读或重复读取日志，以及日志行回调读取到的检测配置是否始终完整一致
+
+用法: python benchmarks/bench_config_reload.py [--containers 20] [--reloads 50] [--interval 0.1] [--modes threaded asyncio]
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import yaml
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# main 模块导入时在当前目录的 logs/ 下创建日志文件，切换到临时目录运行
+logging.basicConfig(level=logging.CRITICAL)
+os.chdir(tempfile.mkdtemp(prefix='bench-config-reload-'))
+os.makedirs('logs')
+
+import main as monitor_main
+from main import LogMonitorApp
+from stubs import FakeDockerAPI
+
+SEQUENCE = re.compile(r'seq=(\d+)')
+# 交替使用的两组关键词: 模拟服务的错误行含 "refused"，普通行含 "handled"
+KEYWORD_SETS = [['error', 'refused'], ['handled']]
+
+
+def write_config(path: str, mode: str, containers: list, keywords: list):
+    """生成配置文件: 固定容器列表，不使用检查点和多行合并"""
+    with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'config', 'config.yaml'), encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config['docker'].update(containers=containers, discovery={'enabled': False}, checkpoint={'enabled': False})
+    config['docker']['log_settings'].update(mode=mode, tail='latest')
+    config['azure_openai'].update(endpoint='http://127.0.0.1:9/', api_key='stub', cache={'enabled': False})
+    config['error_detection'].update(keywords=keywords, multiline={'enabled': False})
+    with open(path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+
+
+def wait_until(predicate, timeout: float) -> bool:
+    """等待 predicate 为真"""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def run(mode: str, args) -> dict:
+    """运行一轮: 常驻容器持续输出日志，期间反复重新加载配置"""
+    server = FakeDockerAPI(lines_per_second=args.rate)
+    server.start()
+    os.environ['DOCKER_HOST'] = server.docker_host
+
+    services = [f'svc-{i}' for i in range(args.containers)]
+    for name in services:
+        server.add_container(name)
+    extras = [f'extra-{i}' for i in range(args.reloads)]
+    for name in extras:
+        server.add_container(name)
+    logs = {name: server.containers[server.container_id(name)]['log'] for name in services}
+
+    config_path = os.path.abspath(f'config-{mode}.yaml')
+    write_config(config_path, mode, services, KEYWORD_SETS[0])
+    app = LogMonitorApp(config_path)
+    app.load_config()
+    app.initialize_components()
+
+    received = defaultdict(list)
+    inconsistent = [0]
+    lock = threading.Lock()
+
+    # 代替 on_log_line: 只做关键词匹配，核对匹配结果与同一份配置中的关键词一致
+    def on_line(container_name, container_id, log_line, timestamp):
+        settings = app.settings
+        is_error = settings.matcher.match(log_line).is_error
+        expected = any(keyword in log_line.lower() for keyword in settings.error_keywords)
+        match = SEQUENCE.search(log_line)
+        with lock:
+            if is_error != expected:
+                inconsistent[0] += 1
+            if match and container_name in logs:
+                received[container_name].append(int(match.group(1)))
+
+    app.docker_monitor.error_callback = on_line
+    app.docker_monitor.start_monitoring()
+    wait_until(lambda: app.docker_monitor.get_metrics()['following'] == len(services), 10)
+    time.sleep(0.2)
+    attached_before = app.docker_monitor.get_metrics()['attached']
+    # tail=latest: 接入前已有的日志不读取，不计入漏读
+    preexisting = {name: min(len(logs[name]), min(received[name], default=len(logs[name]) + 1) - 1)
+                   for name in services}
+
+    # 奇数次加入一个容器，偶数次把它移除；每次都更换关键词
+    durations = []
+    for i in range(args.reloads):
+        containers = services + [extras[i // 2]] if i % 2 == 0 else services
+        write_config(config_path, mode, containers, KEYWORD_SETS[(i + 1) % 2])
+        start = time.perf_counter()
+        app.reload_config()
+        durations.append(time.perf_counter() - start)
+        time.sleep(args.interval)
+
+    # 停止常驻容器，等全部日志读完后核对
+    for name in services:
+        server.emit_event('die', name)
+    wait_until(lambda: app.docker_monitor.get_metrics()['following'] == 0, 30)
+    metrics = app.docker_monitor.get_metrics()
+    app.docker_monitor.stop_monitoring()
+
+    produced = lost = duplicated = 0
+    for name in services:
+        seen = received.get(name, [])
+        expected = len(logs[name]) - preexisting[name]
+        produced += expected
+        lost += expected - len(set(seen))
+        duplicated += len(seen) - len(set(seen))
+    durations.sort()
+    return {
+        'reloads': app.config_reloads,
+        'p50': durations[len(durations) // 2],
+        'max': durations[-1],
+        # 容器集合变化的只有 extra-*，常驻容器不应再次接入
+        'reattached': metrics['attached'] - attached_before - (args.reloads + 1) // 2,
+        'produced': produced,
+        'lost': lost,
+        'duplicated': duplicated,
+        'inconsistent': inconsistent[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='配置热加载测试')
+    parser.add_argument('--containers', type=int, default=20, help='常驻容器数 (默认: 20)')
+    parser.add_argument('--reloads', type=int, default=50, help='重新加载次数 (默认: 50)')
+    parser.add_argument('--interval', type=float, default=0.1, help='两次重新加载之间的间隔（秒）(默认: 0.1)')
+    parser.add_argument('--rate', type=float, default=200.0, help='每个容器每秒输出的日志行数 (默认: 200)')
+    parser.add_argument('--modes', nargs='+', default=['threaded', 'asyncio'], choices=['threaded', 'asyncio'],
+                        help='日志读取模式 (默认: threaded asyncio)')
+    args = parser.parse_args()
+
+    # 不写入 Web 数据库
+    monitor_main.WEB_APP_AVAILABLE = False
+
+    print(f"{args.containers} 个常驻容器, 每个 {args.rate:g} 行/秒, 重新加载 {args.reloads} 次\n")
+    print(f"{'模式':<10}{'重新加载':>10}{'P50':>10}{'最大':>10}{'重新接入':>10}{'日志行':>10}"
+          f"{'漏读':>8}{'重复':>8}{'配置不一致':>12}")
+    for mode in args.modes:
+        r = run(mode, args)
+        print(f"{mode:<10}{r['reloads']:>10}{r['p50'] * 1000:>8.2f}ms{r['max'] * 1000:>8.2f}ms"
+              f"{r['reattached']:>10}{r['produced']:>10}{r['lost']:>8}{r['duplicated']:>8}{r['inconsistent']:>12}")
+
+
+if __name__ == '__main__':
+    main()
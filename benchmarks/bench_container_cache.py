@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+容器元数据缓存测试 - 对比每条错误都查询 Docker API 和从元数据缓存读取的 API 调用次数与延迟，
+对比 /api/containers 每次列出容器和从缓存读取的开销，并测量 Docker 事件更新缓存的延迟
+
+用法: python benchmarks/bench_container_cache.py [--errors 2000] [--containers 20] [--api-latency 0.002]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import docker
+
+from container_cache import ContainerMetadataCache
+from metrics import Histogram
+from stubs import FakeDockerAPI
+
+# 查询延迟分桶（秒）
+LOOKUP_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5)
+
+
+def legacy_container_info(client, name: str) -> dict:
+    """原实现: 每次 inspect 容器和镜像"""
+    container = client.containers.get(name)
+    return {
+        'name': container.name,
+        'id': container.short_id,
+        'status': container.status,
+        'image': container.image.tags[0] if container.image.tags else 'unknown'
+    }
+
+
+def legacy_container_list(client) -> list:
+    """原 /api/containers 实现: 列出容器（SDK 会逐个 inspect）并读取镜像标签"""
+    return [{
+        'id': container.id[:12],
+        'name': container.name,
+        'status': container.status,
+        'image': container.image.tags[0] if container.image.tags else 'unknown',
+        'created': container.attrs['Created']
+    } for container in client.containers.list(all=True)]
+
+
+def measure(server: FakeDockerAPI, lookup, count: int) -> dict:
+    """调用 lookup(i) count 次，返回 API 调用次数和延迟"""
+    latency = Histogram(LOOKUP_BUCKETS)
+    before = sum(server.requests.values())
+    start = time.perf_counter()
+    for i in range(count):
+        begin = time.perf_counter()
+        lookup(i)
+        latency.observe(time.perf_counter() - begin)
+    elapsed = time.perf_counter() - start
+    return {
+        'api_calls': sum(server.requests.values()) - before,
+        'elapsed': elapsed,
+        'p50': latency.quantile(0.5),
+        'p99': latency.quantile(0.99)
+    }
+
+
+def wait_until(predicate, timeout: float = 5.0) -> float:
+    """等待 predicate 为真，返回等待时间（秒）"""
+    start = time.perf_counter()
+    while not predicate():
+        if time.perf_counter() - start > timeout:
+            return float('inf')
+        time.sleep(0.0005)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='容器元数据缓存测试')
+    parser.add_argument('--errors', type=int, default=2000, help='错误事件数 (默认: 2000)')
+    parser.add_argument('--containers', type=int, default=20, help='容器数 (默认: 20)')
+    parser.add_argument('--requests', type=int, default=50, help='/api/containers 请求数 (默认: 50)')
+    parser.add_argument('--api-latency', type=float, default=0.002, help='模拟 Docker API 延迟（秒）(默认: 0.002)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    server = FakeDockerAPI(api_latency=args.api_latency)
+    server.start()
+    names = [f'app-{i}' for i in range(args.containers)]
+    for name in names:
+        server.add_container(name)
+    client = docker.DockerClient(base_url=server.docker_host)
+
+    cache = ContainerMetadataCache(client)
+    before = sum(server.requests.values())
+    start = time.perf_counter()
+    cache.start()
+    print(f"首次填充: {len(cache)} 个容器, {sum(server.requests.values()) - before} 次 API 调用, "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+    print(f"{'场景':<30}{'API 调用':>10}{'总耗时(s)':>12}{'p50(ms)':>10}{'p99(ms)':>10}")
+    rounds = [
+        (f'错误事件 x{args.errors}（原实现）', lambda i: legacy_container_info(client, names[i % len(names)]), args.errors),
+        (f'错误事件 x{args.errors}（缓存）', lambda i: cache.get(names[i % len(names)]), args.errors),
+        (f'/api/containers x{args.requests}（原实现）', lambda i: legacy_container_list(client), args.requests),
+        (f'/api/containers x{args.requests}（缓存）', lambda i: cache.list(), args.requests),
+    ]
+    for name, lookup, count in rounds:
+        r = measure(server, lookup, count)
+        print(f"{name:<30}{r['api_calls']:>10}{r['elapsed']:>12.3f}{r['p50'] * 1000:>10.3f}{r['p99'] * 1000:>10.3f}")
+
+    # 事件更新缓存的延迟
+    print()
+    cases = [
+        ('start（新容器）', lambda: server.emit_event('start', 'new-app'),
+         lambda: any(info['name'] == 'new-app' for info in cache.list())),
+        ('die', lambda: server.emit_event('die', names[0]),
+         lambda: cache.get(names[0])['status'] == 'exited'),
+        ('rename', lambda: server.emit_event('rename', names[1], new_name='renamed-app'),
+         lambda: any(info['name'] == 'renamed-app' for info in cache.list())),
+        ('destroy', lambda: server.emit_event('destroy', names[2]),
+         lambda: all(info['name'] != names[2] for info in cache.list())),
+    ]
+    for name, emit, applied in cases:
+        emit()
+        elapsed = wait_until(applied)
+        print(f"事件 {name:<14} 生效耗时 {elapsed * 1000:.2f} ms")
+
+    metrics = cache.get_metrics()
+    print(f"\n缓存统计: 命中 {metrics['hits']}, 未命中 {metrics['misses']}, 事件 {metrics['events']}, "
+          f"API 调用 {metrics['api_calls']}")
+    cache.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+容器自动发现测试 - 在本地模拟 Docker API 上连续启动和销毁大量短生命周期容器，同时反复重启常驻容器，
+检查日志读取的接入和断开: 是否漏读或重复读取日志、是否监控了不匹配的容器、结束后线程和文件描述符是否回落
+
+用法: python benchmarks/bench_container_discovery.py [--jobs 1000] [--concurrency 50] [--modes threaded asyncio]
+"""
+import argparse
+import heapq
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stubs import FakeDockerAPI
+
+SEQUENCE = re.compile(r'seq=(\d+)')
+DISCOVERY = {'enabled': True, 'labels': ['bench.monitor=true'], 'names': ['job-*', 're:^svc-\\d+$']}
+LABELS = {'bench.monitor': 'true'}
+
+
+def count_fds() -> int:
+    """当前进程打开的文件描述符数"""
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return -1
+
+
+def wait_until(predicate, timeout: float) -> bool:
+    """等待 predicate 为真"""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def run(mode: str, args) -> dict:
+    """运行一轮: 常驻容器反复重启，短生命周期容器持续启动和销毁"""
+    from docker_monitor import DockerLogMonitor
+    from async_docker_monitor import AsyncDockerLogMonitor
+
+    server = FakeDockerAPI(lines_per_second=args.rate)
+    server.start()
+    os.environ['DOCKER_HOST'] = server.docker_host
+
+    services = [f'svc-{i}' for i in range(args.services)]
+    for name in services:
+        server.add_container(name, labels=LABELS)
+    # 名称匹配但没有标签、有标签但名称不匹配的容器都不应被监控
+    for i in range(args.services):
+        server.add_container(f'job-unlabeled-{i}')
+        server.add_container(f'other-{i}', labels=LABELS)
+
+    # 容器名 -> 模拟服务中的日志历史（容器删除后仍保留引用，用于核对）
+    logs = {name: server.containers[server.container_id(name)]['log'] for name in services}
+    received = defaultdict(list)
+    lock = threading.Lock()
+
+    def on_line(container_name, container_id, log_line, timestamp):
+        match = SEQUENCE.search(log_line)
+        if match:
+            with lock:
+                received[container_name].append(int(match.group(1)))
+
+    monitor_class = AsyncDockerLogMonitor if mode == 'asyncio' else DockerLogMonitor
+    monitor = monitor_class(containers=[], error_callback=on_line, tail='latest', discovery=DISCOVERY)
+    threads_before = threading.active_count()
+    fds_before = count_fds()
+    monitor.start_monitoring()
+    wait_until(lambda: monitor.get_metrics()['following'] == args.services, 10)
+    threads_base = threading.active_count()
+    fds_base = count_fds()
+    # tail=latest: 接入前已有的日志不读取，不计入漏读
+    preexisting = {name: min(len(logs[name]), min(received[name], default=len(logs[name]) + 1) - 1)
+                   for name in services}
+
+    # 短生命周期容器: 同时最多 concurrency 个，每个运行 lifetime 秒后退出并删除
+    start = time.perf_counter()
+    deadlines = []
+    peak_threads = peak_fds = 0
+    next_restart = time.monotonic() + args.restart_interval
+    restarts = 0
+    for i in range(args.jobs):
+        while len(deadlines) >= args.concurrency or (deadlines and deadlines[0][0] <= time.monotonic()):
+            due, name = heapq.heappop(deadlines)
+            time.sleep(max(0.0, due - time.monotonic()))
+            server.emit_event('die', name)
+            server.emit_event('destroy', name)
+        name = f'job-{i}'
+        logs[name] = server.containers[server.add_container(name, status='created', labels=LABELS)]['log']
+        server.emit_event('start', name)
+        heapq.heappush(deadlines, (time.monotonic() + args.lifetime, name))
+        if time.monotonic() >= next_restart:
+            # 常驻容器重启: 停止后很快再次启动
+            for service in services:
+                server.emit_event('die', service)
+            time.sleep(args.restart_gap)
+            for service in services:
+                server.emit_event('start', service)
+            restarts += 1
+            next_restart = time.monotonic() + args.restart_interval
+        peak_threads = max(peak_threads, threading.active_count())
+        peak_fds = max(peak_fds, count_fds())
+    for due, name in sorted(deadlines):
+        time.sleep(max(0.0, due - time.monotonic()))
+        server.emit_event('die', name)
+        server.emit_event('destroy', name)
+    churn_elapsed = time.perf_counter() - start
+
+    # 短生命周期容器全部结束后，读取数应回落到常驻容器数
+    settled = wait_until(lambda: monitor.get_metrics()['following'] == args.services, 30)
+    time.sleep(0.5)
+    threads_after = threading.active_count()
+    fds_after = count_fds()
+
+    # 停止常驻容器，等全部日志读完后核对
+    for service in services:
+        server.emit_event('die', service)
+    wait_until(lambda: monitor.get_metrics()['following'] == 0, 30)
+    metrics = monitor.get_metrics()
+    monitor.stop_monitoring()
+
+    def check(names):
+        produced = lost = duplicated = 0
+        for name in names:
+            seen = received.get(name, [])
+            expected = len(logs[name]) - preexisting.get(name, 0)
+            produced += expected
+            lost += expected - len(set(seen))
+            duplicated += len(seen) - len(set(seen))
+        return produced, lost, duplicated
+
+    service_lines, service_lost, service_duplicated = check(services)
+    job_lines, job_lost, job_duplicated = check(f'job-{i}' for i in range(args.jobs))
+    unexpected = sum(len(seen) for name, seen in received.items() if name.startswith(('job-unlabeled', 'other')))
+
+    return {
+        'mode': mode,
+        'churn_elapsed': churn_elapsed,
+        'restarts': restarts,
+        'attached': metrics['attached'],
+        'reattached': metrics['reattached'],
+        'duplicates_skipped': metrics['duplicates_skipped'],
+        'service_lines': service_lines,
+        'service_lost': service_lost,
+        'service_duplicated': service_duplicated,
+        'job_lines': job_lines,
+        'job_lost': job_lost,
+        'job_duplicated': job_duplicated,
+        'unexpected': unexpected,
+        'settled': settled,
+        'threads': (threads_before, threads_base, peak_threads, threads_after),
+        'fds': (fds_before, fds_base, peak_fds, fds_after),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='容器自动发现测试')
+    parser.add_argument('--jobs', type=int, default=1000, help='短生命周期容器数 (默认: 1000)')
+    parser.add_argument('--concurrency', type=int, default=50, help='同时运行的短生命周期容器数 (默认: 50)')
+    parser.add_argument('--lifetime', type=float, default=0.5, help='短生命周期容器的运行时长（秒）(默认: 0.5)')
+    parser.add_argument('--services', type=int, default=5, help='常驻容器数 (默认: 5)')
+    parser.add_argument('--restart-interval', type=float, default=1.0, help='常驻容器重启间隔（秒）(默认: 1)')
+    parser.add_argument('--restart-gap', type=float, default=0.05, help='常驻容器停止到再次启动的间隔（秒）(默认: 0.05)')
+    parser.add_argument('--rate', type=float, default=20.0, help='每个容器每秒输出的行数 (默认: 20)')
+    parser.add_argument('--modes', nargs='+', default=['threaded', 'asyncio'], help='测试的日志读取模式')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    print(f"短生命周期容器 {args.jobs} 个（同时 {args.concurrency} 个，各运行 {args.lifetime}s），"
+          f"常驻容器 {args.services} 个（每 {args.restart_interval}s 重启一次），每个容器 {args.rate} 行/秒\n")
+    for mode in args.modes:
+        r = run(mode, args)
+        print(f"[{r['mode']}] 耗时 {r['churn_elapsed']:.1f}s, 接入 {r['attached']} 次, 重启后重新接入 {r['reattached']} 次, "
+              f"常驻容器重启 {r['restarts']} 轮")
+        print(f"  常驻容器: 产生 {r['service_lines']} 行, 漏读 {r['service_lost']}, 重复 {r['service_duplicated']} "
+              f"(按位置跳过重复行 {r['duplicates_skipped']})")
+        print(f"  短生命周期容器: 产生 {r['job_lines']} 行, 漏读 {r['job_lost']}, 重复 {r['job_duplicated']}")
+        print(f"  不匹配容器读到的行: {r['unexpected']}")
+        threads, fds = r['threads'], r['fds']
+        print(f"  线程数: 启动前 {threads[0]}, 稳定 {threads[1]}, 峰值 {threads[2]}, 结束后 {threads[3]}"
+              f"{'' if r['settled'] else ' (未回落)'}")
+        print(f"  文件描述符: 启动前 {fds[0]}, 稳定 {fds[1]}, 峰值 {fds[2]}, 结束后 {fds[3]}\n")
+
+
+if __name__ == '__main__':
+    main()
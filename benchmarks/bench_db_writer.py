@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+错误日志写入性能测试 - 对比逐条提交与后台批量写入的吞吐量
+
+用法: python benchmarks/bench_db_writer.py [--rows 5000] [--batch-size 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 使用临时数据库，必须在导入 web_app 之前设置
+DB_DIR = tempfile.mkdtemp(prefix='bench-db-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(DB_DIR, 'bench.db')}"
+
+from web_app import app, db, ErrorLog, add_error_log, insert_error_logs
+from db_writer import BatchedDBWriter
+
+
+def make_row(i: int) -> dict:
+    """生成一条模拟错误记录"""
+    return {
+        'container_name': f'api-{i % 20}',
+        'error_message': f'ERROR request {i} failed: connection refused',
+        'error_type': 'Connection Error',
+        'log_content': f'2024-05-01T12:00:00Z ERROR request {i} failed: connection refused',
+        'severity': 'error',
+        'ai_analysis': '数据库连接被拒绝，可能是服务未启动',
+        'ai_solution': '检查数据库服务状态'
+    }
+
+
+def clear_table():
+    """清空错误日志表"""
+    with app.app_context():
+        ErrorLog.query.delete()
+        db.session.commit()
+
+
+def bench_single(rows: int) -> float:
+    """逐条提交"""
+    start = time.perf_counter()
+    for i in range(rows):
+        add_error_log(**make_row(i))
+    return time.perf_counter() - start
+
+
+def bench_batched(rows: int, batch_size: int, max_latency: float) -> float:
+    """后台批量写入（包含停止时的最后一次提交）"""
+    writer = BatchedDBWriter(insert_error_logs, batch_size=batch_size, max_latency=max_latency)
+    writer.start()
+    start = time.perf_counter()
+    for i in range(rows):
+        writer.submit(make_row(i))
+    writer.stop()
+    elapsed = time.perf_counter() - start
+    print(f"    批次数: {writer.batches}，失败: {writer.rows_failed}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='错误日志写入性能测试')
+    parser.add_argument('--rows', type=int, default=5000, help='写入条数 (默认: 5000)')
+    parser.add_argument('--batch-size', type=int, default=200, help='批量写入的批次大小 (默认: 200)')
+    parser.add_argument('--max-latency', type=float, default=0.5, help='批量写入的最大延迟（秒）(默认: 0.5)')
+    args = parser.parse_args()
+
+    print(f"数据库: {os.environ['DATABASE_URL']}")
+    results = {}
+
+    clear_table()
+    print("逐条提交 (add_error_log)...")
+    results['single'] = bench_single(args.rows)
+
+    clear_table()
+    print(f"批量写入 (BatchedDBWriter, 批次 {args.batch_size})...")
+    results['batched'] = bench_batched(args.rows, args.batch_size, args.max_latency)
+
+    with app.app_context():
+        total = ErrorLog.query.count()
+    print(f"\n写入 {args.rows} 条（校验: 表中 {total} 条）")
+    for name, elapsed in results.items():
+        print(f"{name:<10} {elapsed:8.3f}s  {args.rows / elapsed:10.0f} 行/秒")
+    print(f"提升: {results['single'] / results['batched']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+去重缓存内存测试 - 用模拟时钟回放 24 小时的错误日志流，对比原先不淘汰的 dict 与 DedupCache
+
+原实现以 "容器名:日志前200字符" 为键且从不删除；Docker 日志行带时间戳和请求 ID，几乎每行都是新键
+
+用法: python benchmarks/bench_dedup_cache.py [--hours 24] [--rate 5] [--max-entries 100000]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup_cache import DedupCache, make_key
+from template_miner import TemplateMiner
+
+TEMPLATES = [
+    'ERROR Timeout after {ms}ms waiting for upstream req={req}',
+    'ERROR Connection refused: db-{shard}.internal:5432 (attempt {n})',
+    'ERROR java.lang.NullPointerException at com.example.OrderService.process(OrderService.java:{line})',
+    'ERROR request_id={uuid} failed with HTTP 500',
+    'WARN slow query took {ms}ms: SELECT * FROM orders WHERE id = {n}',
+    'ERROR Failed to publish message {uuid} to topic orders-{shard}',
+]
+
+
+def generate_stream(hours: float, rate: float, containers: int, seed: int = 42):
+    """生成 (模拟时间秒数, 容器名, 日志行)；少量一次性的独特错误混在大量重复模板中"""
+    rng = random.Random(seed)
+    start = datetime(2024, 5, 1)
+    total = int(hours * 3600 * rate)
+    for i in range(total):
+        elapsed = i / rate
+        ts = (start + timedelta(seconds=elapsed)).isoformat() + 'Z'
+        if rng.random() < 0.02:
+            # 真正不同的错误
+            body = f'ERROR unexpected state {uuid.UUID(int=rng.getrandbits(128))} in module m{rng.randint(1, 10**6)}x'
+        else:
+            body = rng.choice(TEMPLATES).format(
+                ms=rng.randint(1000, 30000), req=f'{rng.getrandbits(64):016x}', shard=rng.randint(1, 8),
+                n=rng.randint(1000, 10**6), line=rng.choice([42, 118, 377]),
+                uuid=uuid.UUID(int=rng.getrandbits(128))
+            )
+        yield elapsed, f'svc-{rng.randint(1, containers)}', f'{ts} {body}'
+
+
+def run_legacy(stream, window: float) -> dict:
+    """原实现: 不淘汰的 dict"""
+    cache = {}
+    hits = 0
+    for elapsed, container, line in stream:
+        key = f"{container}:{line[:200]}"
+        last = cache.get(key)
+        if last is not None and elapsed - last < window:
+            hits += 1
+            continue
+        cache[key] = elapsed
+    return {'entries': len(cache), 'hits': hits, 'holder': cache}
+
+
+def run_dedup(stream, window: float, max_entries: int) -> dict:
+    """DedupCache: 与监控器相同，按容器名和日志模板 ID 生成哈希键 + TTL + LRU"""
+    cache = DedupCache(ttl=window, max_entries=max_entries)
+    miner = TemplateMiner()
+    for elapsed, container, line in stream:
+        cache.check_and_add(make_key(container, miner.add(line).template_id), now=elapsed)
+    metrics = cache.get_metrics()
+    metrics['holder'] = cache
+    return metrics
+
+
+def measure(func, *args) -> tuple:
+    """返回 (结果, 峰值内存 MB, 结束时占用 MB, 耗时)"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak / 1024 / 1024, current / 1024 / 1024, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='去重缓存内存测试')
+    parser.add_argument('--hours', type=float, default=24, help='模拟时长（小时）(默认: 24)')
+    parser.add_argument('--rate', type=float, default=5, help='每秒错误行数 (默认: 5)')
+    parser.add_argument('--containers', type=int, default=20, help='容器数量 (默认: 20)')
+    parser.add_argument('--window', type=float, default=300, help='去重窗口（秒）(默认: 300)')
+    parser.add_argument('--max-entries', type=int, default=100000, help='DedupCache 最大记录数 (默认: 100000)')
+    args = parser.parse_args()
+
+    total = int(args.hours * 3600 * args.rate)
+    print(f"模拟 {args.hours} 小时, {total} 行, {args.containers} 个容器, 去重窗口 {args.window} 秒\n")
+
+    def stream():
+        return generate_stream(args.hours, args.rate, args.containers)
+
+    legacy, legacy_peak, legacy_end, legacy_time = measure(run_legacy, stream(), args.window)
+    dedup, dedup_peak, dedup_end, dedup_time = measure(run_dedup, stream(), args.window, args.max_entries)
+
+    print(f"{'实现':<12}{'记录数':>10}{'重复命中':>10}{'淘汰':>8}{'过期':>10}{'峰值(MB)':>10}{'结束(MB)':>10}{'耗时(s)':>9}")
+    print(f"{'dict':<12}{legacy['entries']:>10}{legacy['hits']:>10}{'-':>8}{'-':>10}"
+          f"{legacy_peak:>10.1f}{legacy_end:>10.1f}{legacy_time:>9.1f}")
+    print(f"{'DedupCache':<12}{dedup['entries']:>10}{dedup['hits']:>10}{dedup['evictions']:>8}"
+          f"{dedup['expirations']:>10}{dedup_peak:>10.1f}{dedup_end:>10.1f}{dedup_time:>9.1f}")
+    print(f"\nDedupCache 命中率 {dedup['hit_rate']:.1%}（dict {legacy['hits'] / total:.1%}）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+错误类型分类测试 - 用标注样本（benchmarks/fixtures/error_types.yaml）对比原有的 extract_error_type
+（Java、Python、HTTP 三个正则依次搜索 + 类型提示）和按规则包合并为一个正则的分类器的准确率和每条耗时，
+并测试规则重新编译的耗时
+
+用法: python benchmarks/bench_error_classifier.py [--rounds 2000] [--verbose]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+import yaml
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from error_classifier import ErrorClassifier
+from keyword_matcher import KeywordMatcher
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'error_types.yaml')
+
+JAVA_EXCEPTION_PATTERN = re.compile(r'(\w+Exception|\w+Error):')
+PYTHON_EXCEPTION_PATTERN = re.compile(r'(\w+Error|\w+Exception)')
+HTTP_STATUS_PATTERN = re.compile(r'HTTP\s+(\d{3})', re.IGNORECASE)
+
+
+def legacy_extract(log_line: str, matcher: KeywordMatcher) -> str:
+    """原有实现: 三个正则依次搜索，再退回类型提示"""
+    java_match = JAVA_EXCEPTION_PATTERN.search(log_line)
+    if java_match:
+        return java_match.group(1)
+    python_match = PYTHON_EXCEPTION_PATTERN.search(log_line)
+    if python_match:
+        return python_match.group(1)
+    http_match = HTTP_STATUS_PATTERN.search(log_line)
+    if http_match:
+        return f'HTTP {http_match.group(1)}'
+    return matcher.classify(log_line).type_hint or 'Unknown Error'
+
+
+def classifier_extract(log_line: str, matcher: KeywordMatcher, classifier: ErrorClassifier) -> str:
+    """新实现: 与 LogMonitorApp.extract_error_type 相同"""
+    return classifier.classify(log_line) or matcher.classify(log_line).type_hint or 'Unknown Error'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='错误类型分类测试')
+    parser.add_argument('--rounds', type=int, default=2000, help='计时时重复全部样本的轮数 (默认: 2000)')
+    parser.add_argument('--verbose', action='store_true', help='列出分类错误的样本')
+    args = parser.parse_args()
+
+    with open(FIXTURE, 'r', encoding='utf-8') as f:
+        samples = yaml.safe_load(f)['samples']
+    matcher = KeywordMatcher([])
+    classifier = ErrorClassifier()
+    methods = {
+        '原有实现': lambda line: legacy_extract(line, matcher),
+        '规则分类器': lambda line: classifier_extract(line, matcher, classifier),
+    }
+
+    runtimes = sorted({sample['runtime'] for sample in samples})
+    print(f"{len(samples)} 条标注样本, 运行时: {', '.join(runtimes)}\n")
+    print(f"{'方式':<12}{'准确率':>8}" + ''.join(f'{runtime:>9}' for runtime in runtimes) + f"{'每条耗时':>12}")
+    for label, extract in methods.items():
+        correct = defaultdict(int)
+        total = defaultdict(int)
+        misses = []
+        for sample in samples:
+            result = extract(sample['log'])
+            total[sample['runtime']] += 1
+            if result == sample['type']:
+                correct[sample['runtime']] += 1
+            else:
+                misses.append((sample['type'], result, sample['log'].split('\n')[0][:80]))
+
+        logs = [sample['log'] for sample in samples]
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for log in logs:
+                extract(log)
+        elapsed = (time.perf_counter() - start) / (args.rounds * len(logs))
+
+        accuracy = sum(correct.values()) / len(samples)
+        print(f"{label:<12}{accuracy:>8.1%}"
+              + ''.join(f'{correct[runtime] / total[runtime]:>9.0%}' for runtime in runtimes)
+              + f"{elapsed * 1e6:>9.1f} µs")
+        if args.verbose:
+            for expected, result, head in misses:
+                print(f"    期望 {expected!r:<32} 得到 {result!r:<32} {head}")
+
+    start = time.perf_counter()
+    classifier.reload()
+    print(f"\n重新编译 {classifier.get_metrics()['rules']} 条规则: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
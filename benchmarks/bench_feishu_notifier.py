@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+飞书通知投递测试 - 在本地模拟的飞书 Webhook 上对比逐条 requests.post、连接池同步发送和发送队列异步投递
+
+两个场景:
+  吞吐: 模拟服务每个新连接有握手开销，对比连接数、吞吐量、调用方阻塞时间和投递延迟
+  限流: 模拟服务每秒只接受 rate-limit 条消息，超出返回错误码 9499，对比送达数和限流次数
+
+用法: python benchmarks/bench_feishu_notifier.py [--messages 200] [--threads 2] [--handshake 0.05] [--rate-limit 10]
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feishu_notifier import FeishuNotifier
+from metrics import Histogram
+from stubs import FakeFeishuWebhook
+
+
+def legacy_send(url: str, message: dict) -> bool:
+    """改造前的发送方式: 每条消息单独 requests.post，不重试"""
+    try:
+        response = requests.post(url, json=message, timeout=10)
+        return response.status_code == 200 and response.json().get('code') == 0
+    except requests.RequestException:
+        return False
+
+
+def notification(i: int) -> dict:
+    """生成第 i 条错误通知的参数"""
+    return dict(container_name=f'api-{i % 5}', container_id=f'{i:012x}',
+                error_log=f'ERROR request {i} failed: connection refused',
+                analysis='**错误类型**: 模拟分析\n**可能原因**: 无\n**解决建议**: 无',
+                timestamp=datetime.now(), container_image='registry/api:1.0')
+
+
+def run_sync(stub: FakeFeishuWebhook, messages: int, threads: int, send) -> dict:
+    """用 threads 个线程（相当于 notify 阶段的工作线程）同步发送"""
+    latency = Histogram()
+
+    def deliver(i):
+        start = time.perf_counter()
+        ok = send(i)
+        latency.observe(time.perf_counter() - start)
+        return ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        delivered = sum(pool.map(deliver, range(messages)))
+    elapsed = time.perf_counter() - start
+    # 同步发送时调用方一直阻塞到送达
+    return {'delivered': delivered, 'elapsed': elapsed, 'blocked': elapsed, 'latency': latency.snapshot()}
+
+
+def run_queued(notifier: FeishuNotifier, messages: int) -> dict:
+    """单个线程把通知放入发送队列，等待全部投递完成"""
+    done = threading.Semaphore(0)
+    results = []
+
+    def on_delivered(success: bool):
+        results.append(success)
+        done.release()
+
+    start = time.perf_counter()
+    for i in range(messages):
+        notifier.submit_error_notification(callback=on_delivered, **notification(i))
+    blocked = time.perf_counter() - start
+    for _ in range(messages):
+        done.acquire()
+    elapsed = time.perf_counter() - start
+    notifier.stop()
+    return {'delivered': sum(results), 'elapsed': elapsed, 'blocked': blocked,
+            'latency': notifier.get_metrics()['delivery_latency']}
+
+
+def print_row(name: str, stub: FakeFeishuWebhook, before: tuple, r: dict):
+    """输出一行结果"""
+    connections = stub.connections - before[0]
+    limited = stub.rate_limited - before[1]
+    latency = r['latency']
+    print(f"{name:<18}{r['delivered']:>8}{connections:>8}{limited:>8}{r['delivered'] / r['elapsed']:>10.1f}"
+          f"{r['blocked']:>10.2f}{latency['p50'] * 1000:>10.0f}{latency['p95'] * 1000:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='飞书通知投递测试')
+    parser.add_argument('--messages', type=int, default=200, help='吞吐场景的消息数 (默认: 200)')
+    parser.add_argument('--threads', type=int, default=2, help='同步发送的线程数，与 notify 阶段工作线程数相同 (默认: 2)')
+    parser.add_argument('--workers', type=int, default=2, help='发送队列的工作线程数 (默认: 2)')
+    parser.add_argument('--latency', type=float, default=0.02, help='模拟 Webhook 的响应延迟（秒）(默认: 0.02)')
+    parser.add_argument('--handshake', type=float, default=0.05, help='每个新连接的建立开销（秒）(默认: 0.05)')
+    parser.add_argument('--rate-limit', type=float, default=10, help='限流场景每秒允许的消息数 (默认: 10)')
+    parser.add_argument('--limited-messages', type=int, default=60, help='限流场景的消息数 (默认: 60)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    stub = FakeFeishuWebhook(latency=args.latency, handshake_delay=args.handshake)
+    stub.start()
+    card = FeishuNotifier(stub.url)._build_error_card(**notification(0))
+
+    header = (f"{'方式':<18}{'送达':>8}{'连接数':>8}{'限流':>8}{'条/秒':>10}"
+              f"{'阻塞(s)':>10}{'p50(ms)':>10}{'p95(ms)':>10}")
+
+    print(f"吞吐: {args.messages} 条消息, 响应延迟 {args.latency * 1000:.0f} ms, "
+          f"建连开销 {args.handshake * 1000:.0f} ms, 不限流\n")
+    print(header)
+    rounds = [
+        ('逐条 post', lambda: run_sync(stub, args.messages, args.threads, lambda i: legacy_send(stub.url, card))),
+        ('连接池同步', lambda: run_sync(stub, args.messages, args.threads,
+                                   lambda i, n=FeishuNotifier(stub.url, rate_per_second=1e6):
+                                   n.send_error_notification(**notification(i)))),
+        ('连接池 + 队列', lambda: run_queued(FeishuNotifier(stub.url, workers=args.workers, rate_per_second=1e6),
+                                        args.messages)),
+    ]
+    for name, run in rounds:
+        before = (stub.connections, stub.rate_limited)
+        print_row(name, stub, before, run())
+
+    stub.rate_limit = args.rate_limit
+    print(f"\n限流: {args.limited_messages} 条消息, 服务端每秒最多接受 {args.rate_limit:g} 条, "
+          f"发送端配置速率为其 2 倍\n")
+    print(header)
+    rounds = [
+        ('逐条 post', lambda: run_sync(stub, args.limited_messages, args.threads,
+                                     lambda i: legacy_send(stub.url, card))),
+        ('连接池 + 队列', lambda: run_queued(FeishuNotifier(stub.url, workers=args.workers, backoff_base=0.2,
+                                                        rate_per_second=args.rate_limit * 2),
+                                        args.limited_messages)),
+    ]
+    for name, run in rounds:
+        time.sleep(1.0)  # 等待限流窗口重置
+        before = (stub.connections, stub.rate_limited)
+        print_row(name, stub, before, run())
+
+
+if __name__ == '__main__':
+    main()
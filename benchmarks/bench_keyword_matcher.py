@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+关键词匹配性能测试 - 对比原有的逐关键词检测路径与 KeywordMatcher（检测方式相同，用于确认没有变慢、结果一致）
+
+用法: python benchmarks/bench_keyword_matcher.py [--lines 1000000] [--error-ratio 0.02]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_matcher import KeywordMatcher
+
+KEYWORDS = ['error', 'exception', 'fatal', 'fail', 'panic', 'traceback']
+
+JAVA_EXCEPTION_PATTERN = re.compile(r'(\w+Exception|\w+Error):')
+PYTHON_EXCEPTION_PATTERN = re.compile(r'(\w+Error|\w+Exception)')
+HTTP_STATUS_PATTERN = re.compile(r'HTTP\s+(\d{3})', re.IGNORECASE)
+
+NORMAL_WORDS = ['GET', 'POST', '/api/v1/orders', 'user', 'request', 'handled', 'in', 'ms',
+                'status=200', 'cache', 'hit', 'db', 'query', 'served', 'session', 'worker',
+                'started', 'job', 'completed', 'INFO', 'DEBUG', 'payload', 'bytes']
+EXTRA_KEYWORDS = ['denied', 'refused', 'unavailable', 'deadlock', 'segfault', 'sigsegv', 'sigkill',
+                  'oomkilled', 'aborted', 'unreachable', 'invalid', 'corrupt', 'overflow', 'rejected',
+                  'unauthorized', 'forbidden', 'timed out', 'unhealthy', 'stacktrace', 'critical',
+                  'severe', 'emergency', 'crashed', 'broken pipe', 'undefined', 'nullpointer',
+                  'nil pointer', 'dereference', 'econnreset', 'epipe', 'enoent', 'eacces',
+                  'no such file', 'killed']
+ERROR_SNIPPETS = [
+    'ERROR Connection refused while connecting to redis:6379',
+    'java.lang.NullPointerException: value was null',
+    'Traceback (most recent call last):',
+    'FATAL out of memory, killing worker',
+    'request failed: Timeout after 3000ms',
+    'HTTP 503 upstream error',
+    'open /data/file: permission denied (error)',
+    'panic: runtime error: index out of range'
+]
+
+
+def legacy_is_error(log_line: str, keywords, case_sensitive=False) -> bool:
+    """原有实现的 is_error_log"""
+    check_line = log_line if case_sensitive else log_line.lower()
+    for keyword in keywords:
+        if keyword in check_line:
+            return True
+    return False
+
+
+def legacy_severity(log_line: str) -> str:
+    """原有实现的 determine_severity"""
+    log_lower = log_line.lower()
+    for keyword in ['fatal', 'critical', 'panic', 'segmentation fault',
+                    'out of memory', 'oom', 'core dumped']:
+        if keyword in log_lower:
+            return 'critical'
+    for keyword in ['error', 'exception', 'failed', 'failure', 'crash']:
+        if keyword in log_lower:
+            return 'error'
+    return 'warning'
+
+
+def legacy_match(log_line: str, keywords, case_sensitive=False):
+    """原有实现中的关键词部分: is_error_log + determine_severity + 类型提示的子串判断"""
+    if not legacy_is_error(log_line, keywords, case_sensitive):
+        return None
+
+    severity = legacy_severity(log_line)
+    if 'timeout' in log_line.lower():
+        return severity, 'Timeout'
+    elif 'connection' in log_line.lower() and ('refused' in log_line.lower() or 'failed' in log_line.lower()):
+        return severity, 'Connection Error'
+    elif 'permission denied' in log_line.lower():
+        return severity, 'Permission Error'
+    elif 'not found' in log_line.lower():
+        return severity, 'Not Found'
+    return severity, None
+
+
+def matcher_match(log_line: str, matcher: KeywordMatcher):
+    """新实现中的关键词部分: 一次匹配得到检测结果、严重度和类型提示"""
+    match = matcher.match(log_line)
+    if not match.is_error:
+        return None
+    return match.severity, match.type_hint
+
+
+def legacy_path(log_line: str, keywords, case_sensitive=False):
+    """原有实现: is_error_log + determine_severity + extract_error_type"""
+    if not legacy_is_error(log_line, keywords, case_sensitive):
+        return None
+
+    severity = legacy_severity(log_line)
+    java_match = re.search(r'(\w+Exception|\w+Error):', log_line)
+    if java_match:
+        return severity, java_match.group(1)
+    python_match = re.search(r'(\w+Error|\w+Exception)', log_line)
+    if python_match:
+        return severity, python_match.group(1)
+    http_match = re.search(r'HTTP\s+(\d{3})', log_line, re.IGNORECASE)
+    if http_match:
+        return severity, f'HTTP {http_match.group(1)}'
+    if 'timeout' in log_line.lower():
+        return severity, 'Timeout'
+    elif 'connection' in log_line.lower() and ('refused' in log_line.lower() or 'failed' in log_line.lower()):
+        return severity, 'Connection Error'
+    elif 'permission denied' in log_line.lower():
+        return severity, 'Permission Error'
+    elif 'not found' in log_line.lower():
+        return severity, 'Not Found'
+    return severity, 'Unknown Error'
+
+
+def matcher_path(log_line: str, matcher: KeywordMatcher):
+    """新实现: 关键词匹配器 + 预编译的异常类型正则"""
+    match = matcher.match(log_line)
+    if not match.is_error:
+        return None
+
+    java_match = JAVA_EXCEPTION_PATTERN.search(log_line)
+    if java_match:
+        return match.severity, java_match.group(1)
+    python_match = PYTHON_EXCEPTION_PATTERN.search(log_line)
+    if python_match:
+        return match.severity, python_match.group(1)
+    http_match = HTTP_STATUS_PATTERN.search(log_line)
+    if http_match:
+        return match.severity, f'HTTP {http_match.group(1)}'
+    return match.severity, match.type_hint or 'Unknown Error'
+
+
+def generate_lines(count: int, error_ratio: float, seed: int = 42):
+    """生成合成日志行"""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        words = ' '.join(rng.choice(NORMAL_WORDS) for _ in range(rng.randint(6, 16)))
+        line = f"2024-05-01T12:{i // 60 % 60:02d}:{i % 60:02d}.{rng.randint(0, 999999):06d}Z {words} req={rng.getrandbits(48):x}"
+        if rng.random() < error_ratio:
+            line += ' ' + rng.choice(ERROR_SNIPPETS)
+        lines.append(line)
+    return lines
+
+
+def run(name: str, func, lines, rounds: int = 3):
+    """计时（取多轮中最快的一轮，减少机器负载的干扰）并返回结果列表"""
+    elapsed = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        results = [func(line) for line in lines]
+        elapsed = min(elapsed, time.perf_counter() - start)
+    print(f"{name:<10} {elapsed:8.3f}s  {len(lines) / elapsed / 1e6:6.2f}M 行/秒  "
+          f"{elapsed / len(lines) * 1e9:7.1f} ns/行")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='关键词匹配性能测试')
+    parser.add_argument('--lines', type=int, default=1_000_000, help='合成日志行数 (默认: 1000000)')
+    parser.add_argument('--error-ratio', type=float, default=0.02, help='错误行比例 (默认: 0.02)')
+    parser.add_argument('--extra-keywords', type=int, default=0,
+                        help=f'额外追加的检测关键词数量（最多 {len(EXTRA_KEYWORDS)} 个），用于观察关键词增多时的表现 (默认: 0)')
+    args = parser.parse_args()
+
+    keywords = KEYWORDS + EXTRA_KEYWORDS[:args.extra_keywords]
+
+    print(f"生成 {args.lines} 行合成日志（错误比例 {args.error_ratio:.1%}，检测关键词 {len(keywords)} 个）...")
+    lines = generate_lines(args.lines, args.error_ratio)
+    matcher = KeywordMatcher(keywords)
+
+    print("\n[关键词检测 + 严重度 + 类型提示]")
+    legacy_results = run('legacy', lambda line: legacy_match(line, keywords), lines)
+    matcher_results = run('matcher', lambda line: matcher_match(line, matcher), lines)
+    mismatches = sum(1 for a, b in zip(legacy_results, matcher_results) if a != b)
+    print(f"命中错误行: {sum(1 for r in matcher_results if r)}，结果不一致: {mismatches}")
+
+    print("\n[完整路径，含异常类型正则]")
+    legacy_results = run('legacy', lambda line: legacy_path(line, keywords), lines)
+    matcher_results = run('matcher', lambda line: matcher_path(line, matcher), lines)
+    mismatches = sum(1 for a, b in zip(legacy_results, matcher_results) if a != b)
+    print(f"命中错误行: {sum(1 for r in matcher_results if r)}，结果不一致: {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
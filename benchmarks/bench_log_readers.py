@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+日志读取模式性能测试 - 对比 threaded 与 asyncio 两种模式在大量容器下的内存和 CPU 占用
+
+使用本地模拟 Docker API 服务，每种模式在独立子进程中运行，统计稳定阶段的 RSS 和 CPU 时间
+
+用法: python benchmarks/bench_log_readers.py [--streams 10 100 500] [--duration 10] [--rate 5]
+"""
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# 添加项目根目录到 Python 路径
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import FakeDockerAPI
+
+
+def read_rss_kb() -> int:
+    """读取当前进程的常驻内存 (KB)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_worker(mode: str, streams: int, duration: float, warmup: float):
+    """子进程: 启动指定模式的监控器并输出统计结果"""
+    logging.basicConfig(level=logging.WARNING)
+    from docker_monitor import DockerLogMonitor
+    from async_docker_monitor import AsyncDockerLogMonitor
+
+    counter = itertools.count()
+
+    def on_line(container_name, container_id, log_line, timestamp):
+        next(counter)
+
+    monitor_class = AsyncDockerLogMonitor if mode == 'asyncio' else DockerLogMonitor
+    monitor = monitor_class(
+        containers=[f'bench-{i}' for i in range(streams)],
+        error_callback=on_line,
+        tail='latest'
+    )
+
+    rss_before = read_rss_kb()
+    monitor.start_monitoring()
+    time.sleep(warmup)
+
+    lines_start = next(counter)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    time.sleep(duration)
+    cpu_used = time.process_time() - cpu_start
+    wall_used = time.perf_counter() - wall_start
+    lines = next(counter) - lines_start
+
+    result = {
+        'mode': mode,
+        'streams': streams,
+        'threads': threading.active_count(),
+        'rss_kb': read_rss_kb(),
+        'rss_delta_kb': read_rss_kb() - rss_before,
+        'cpu_percent': cpu_used / wall_used * 100,
+        'lines_per_second': lines / wall_used,
+        'cpu_us_per_line': cpu_used / lines * 1e6 if lines else 0.0
+    }
+    monitor.stop_monitoring()
+    print(json.dumps(result))
+
+
+def run_server(port_queue, rate: float):
+    """子进程: 运行模拟 Docker API 服务"""
+    server = FakeDockerAPI(lines_per_second=rate)
+    threading.Thread(target=lambda: port_queue.put(server.wait_ready()), daemon=True).start()
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='日志读取模式性能测试')
+    parser.add_argument('--streams', type=int, nargs='+', default=[10, 100, 500],
+                        help='模拟的容器日志流数量 (默认: 10 100 500)')
+    parser.add_argument('--modes', nargs='+', default=['threaded', 'asyncio'], help='测试的模式')
+    parser.add_argument('--duration', type=float, default=10.0, help='每轮统计时长（秒）(默认: 10)')
+    parser.add_argument('--warmup', type=float, default=3.0, help='统计前的预热时长（秒）(默认: 3)')
+    parser.add_argument('--rate', type=float, default=5.0, help='每个日志流每秒输出的行数 (默认: 5)')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.streams[0], args.duration, args.warmup)
+        return
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=run_server, args=(port_queue, args.rate), daemon=True)
+    server.start()
+    docker_host = f"tcp://127.0.0.1:{port_queue.get(timeout=10)}"
+    print(f"模拟 Docker API: {docker_host}，每个日志流 {args.rate} 行/秒\n")
+
+    print(f"{'模式':<10}{'日志流':>8}{'线程数':>8}{'RSS(MB)':>10}{'RSS增量(MB)':>13}"
+          f"{'CPU%':>8}{'行/秒':>10}{'CPU us/行':>11}")
+    try:
+        for streams in args.streams:
+            for mode in args.modes:
+                proc = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--worker', mode,
+                     '--streams', str(streams), '--duration', str(args.duration),
+                     '--warmup', str(args.warmup)],
+                    env=dict(os.environ, DOCKER_HOST=docker_host),
+                    capture_output=True, text=True
+                )
+                if proc.returncode != 0 or not proc.stdout.strip():
+                    print(f"{mode:<10}{streams:>8}  运行失败: {proc.stderr.strip()[-300:]}")
+                    continue
+                r = json.loads(proc.stdout.strip().splitlines()[-1])
+                print(f"{r['mode']:<10}{r['streams']:>8}{r['threads']:>8}{r['rss_kb'] / 1024:>10.1f}"
+                      f"{r['rss_delta_kb'] / 1024:>13.1f}{r['cpu_percent']:>8.1f}"
+                      f"{r['lines_per_second']:>10.0f}{r['cpu_us_per_line']:>11.1f}")
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+运行指标开销测试 - 多个线程同时对日志行做关键词匹配（与 on_log_line 中的检测相同），对比:
+不记录指标、用全局锁保护的计数字典和 Histogram、按线程分片的 ShardedCounter 和 ShardedHistogram
+三种方式的吞吐量，并测试生成 /metrics 输出的耗时
+
+用法: python benchmarks/bench_metrics.py [--lines 200000] [--containers 50] [--threads 1 4 8]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# main 模块导入时在当前目录的 logs/ 下创建日志文件，切换到临时目录运行
+logging.basicConfig(level=logging.CRITICAL)
+os.chdir(tempfile.mkdtemp(prefix='bench-metrics-'))
+os.makedirs('logs')
+
+from keyword_matcher import KeywordMatcher
+from main import MATCH_TIMING_SAMPLE
+from metrics import (FAST_LATENCY_BUCKETS, Histogram, ShardedCounter, ShardedHistogram, counter, histogram,
+                     render_text)
+
+KEYWORDS = ['error', 'exception', 'fatal', 'fail', 'panic', 'traceback']
+
+
+class LockedCounter:
+    """用一个全局锁保护的计数字典"""
+
+    def __init__(self):
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def inc(self, label: str = '', amount: float = 1) -> float:
+        with self.lock:
+            value = self.counts[label] = self.counts.get(label, 0) + amount
+            return value
+
+    def values(self) -> dict:
+        with self.lock:
+            return dict(self.counts)
+
+
+def generate_lines(count: int, containers: int, seed: int = 1) -> list:
+    """生成 (容器名, 日志行)，约 5% 是错误"""
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        container = f'app-{rng.randrange(containers)}'
+        if rng.random() < 0.05:
+            line = f'ERROR request {rng.getrandbits(32):08x} failed: connection refused'
+        else:
+            line = f'INFO GET /api/items/{rng.randint(1, 10 ** 6)} 200 {rng.randint(1, 300)}ms'
+        lines.append((container, line))
+    return lines
+
+
+def run(method: str, lines: list, threads: int) -> tuple:
+    """每个线程处理 lines 的一部分，返回 (吞吐量, 指标)"""
+    matcher = KeywordMatcher(KEYWORDS)
+    if method == '全局锁':
+        events, errors, latency = LockedCounter(), LockedCounter(), Histogram(FAST_LATENCY_BUCKETS)
+    else:
+        events, errors, latency = ShardedCounter(), ShardedCounter(), ShardedHistogram(FAST_LATENCY_BUCKETS)
+    instrument = method != '不记录'
+
+    def worker(part: list):
+        perf_counter = time.perf_counter
+        for container, line in part:
+            if instrument:
+                # 与 on_log_line 相同: 每个容器每 MATCH_TIMING_SAMPLE 个事件记录一次匹配耗时
+                if events.inc(container) % MATCH_TIMING_SAMPLE == 0:
+                    started = perf_counter()
+                    match = matcher.match(line)
+                    latency.observe(perf_counter() - started)
+                else:
+                    match = matcher.match(line)
+                if match.is_error:
+                    errors.inc(container)
+            else:
+                matcher.match(line)
+
+    parts = [lines[i::threads] for i in range(threads)]
+    workers = [threading.Thread(target=worker, args=(part,)) for part in parts]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return len(lines) / elapsed, (events, errors, latency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='运行指标开销测试')
+    parser.add_argument('--lines', type=int, default=200000, help='日志行数 (默认: 200000)')
+    parser.add_argument('--containers', type=int, default=50, help='容器数 (默认: 50)')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 8], help='线程数 (默认: 1 4 8)')
+    args = parser.parse_args()
+
+    lines = generate_lines(args.lines, args.containers)
+    methods = ('不记录', '全局锁', '线程分片')
+    print(f"{args.lines} 行, {args.containers} 个容器\n")
+    print(f"{'线程数':<8}" + ''.join(f'{name:>16}' for name in methods) + f"{'分片开销':>10}")
+    last = None
+    for threads in args.threads:
+        results = {}
+        for method in methods:
+            results[method], metrics = run(method, lines, threads)
+            if method == '线程分片':
+                last = metrics
+                assert metrics[0].total() == len(lines)
+        overhead = results['不记录'] / results['线程分片'] - 1
+        print(f"{threads:<8}" + ''.join(f"{results[name]:>12,.0f} 行/s" for name in methods) + f"{overhead:>10.0%}")
+
+    # 生成 /metrics 输出: 合并线程分片并格式化
+    events, errors, latency = last
+    start = time.perf_counter()
+    rounds = 100
+    for _ in range(rounds):
+        text = render_text([
+            counter('log_monitor_events_total', '检测的日志事件数', events.values(), 'container'),
+            counter('log_monitor_error_events_total', '匹配错误关键词的日志事件数', errors.values(), 'container'),
+            histogram('log_monitor_match_seconds', '关键词匹配耗时', latency.snapshot())
+        ])
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"\n生成 /metrics 输出 ({len(text.splitlines())} 行): {elapsed * 1000:.2f} ms, "
+          f"匹配耗时 p50 {latency.snapshot()['p50'] * 1e6:.1f} µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+多行日志合并测试 - 生成夹杂 Python Traceback（含 logger.exception 和异常链）、Java 异常调用栈（含 Caused by）
+的多容器日志流，对比逐行检测和合并后检测的错误事件数、每个调用栈产生的错误事件数、
+去重后需要 AI 分析的次数和吞吐量，并核对合并结果与生成的事件是否一致
+
+用法: python benchmarks/bench_multiline.py [--events 20000] [--containers 20] [--trace-ratio 0.1]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_matcher import KeywordMatcher
+from multiline import MultilineAssembler, event_signature
+from template_miner import TemplateMiner
+
+KEYWORDS = ['error', 'exception', 'fatal', 'fail', 'panic', 'traceback']
+
+
+def python_trace(rng: random.Random, chained: bool) -> list:
+    """logger.exception() 输出的 Python 调用栈，可选异常链"""
+    user = rng.randint(1, 10 ** 6)
+    lines = [f'ERROR handler failed for user {user}', 'Traceback (most recent call last):']
+    for depth in range(rng.randint(3, 12)):
+        lines.append(f'  File "/app/service/module_{depth}.py", line {rng.randint(10, 900)}, in step_{depth}')
+        lines.append(f'    result = step_{depth + 1}(request, user_id={user})')
+    lines.append(f"KeyError: 'session-{user}'")
+    if chained:
+        lines += ['', 'During handling of the above exception, another exception occurred:', '',
+                  'Traceback (most recent call last):',
+                  '  File "/app/service/api.py", line 42, in handle',
+                  '    raise ServiceError("lookup failed")',
+                  'service.errors.ServiceError: lookup failed']
+    return lines
+
+
+def java_trace(rng: random.Random) -> list:
+    """日志消息之后的 Java 异常调用栈，带 Caused by"""
+    order = rng.randint(1, 10 ** 6)
+    lines = [f'2026-10-17 08:00:00.{rng.randint(100, 999)} ERROR [http-nio-8080-exec-{rng.randint(1, 50)}] '
+             f'c.e.OrderController - order {order} failed',
+             f'java.lang.IllegalStateException: order {order} is not payable']
+    for depth in range(rng.randint(5, 30)):
+        lines.append(f'\tat com.example.order.Service{depth}.process(Service{depth}.java:{rng.randint(10, 500)})')
+    lines.append('Caused by: java.sql.SQLTransientConnectionException: pool exhausted after 30000ms')
+    for depth in range(rng.randint(3, 10)):
+        lines.append(f'\tat com.zaxxer.hikari.pool.HikariPool.getConnection(HikariPool.java:{rng.randint(100, 200)})')
+    lines.append(f'\t... {rng.randint(5, 40)} more')
+    return lines
+
+
+def generate_events(count: int, containers: int, trace_ratio: float, seed: int = 1) -> list:
+    """
+    生成日志事件，返回 [(容器名, 事件的行列表)]
+
+    约 trace_ratio 的事件是多行调用栈，其余是普通日志和少量单行错误
+    """
+    rng = random.Random(seed)
+    events = []
+    for _ in range(count):
+        container = f'app-{rng.randrange(containers)}'
+        roll = rng.random()
+        if roll < trace_ratio / 2:
+            lines = python_trace(rng, chained=rng.random() < 0.3)
+        elif roll < trace_ratio:
+            lines = java_trace(rng)
+        elif roll < trace_ratio + 0.02:
+            lines = [f'ERROR connection to 10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}:5432 failed: timeout']
+        else:
+            lines = [f'INFO GET /api/items/{rng.randint(1, 10 ** 6)} 200 {rng.randint(1, 300)}ms']
+        events.append((container, lines))
+    return events
+
+
+def interleave(events: list, seed: int = 2) -> list:
+    """按容器保持顺序、不同容器的事件交错，返回 [(容器名, 带 Docker 时间戳的日志行)]"""
+    rng = random.Random(seed)
+    stream = []
+    base = 1_792_224_000_000_000_000
+    for container, lines in events:
+        # 同一事件的行可能与其他容器的行交错
+        for line in lines:
+            ns = base + len(stream) * 1000
+            stamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(ns // 10 ** 9)) + f'.{ns % 10 ** 9:09d}Z'
+            stream.append((container, f'{stamp} {line}'))
+        if rng.random() < 0.5 and len(stream) > 2:
+            j = rng.randrange(len(stream) - 1)
+            if stream[j][0] != stream[j + 1][0]:
+                stream[j], stream[j + 1] = stream[j + 1], stream[j]
+    return stream
+
+
+def detect(matcher: KeywordMatcher, miner: TemplateMiner, errors: list, keys: set, signature):
+    """返回与 main.on_log_line 相同的 检测 → 模板 → 去重 回调"""
+    def on_event(container_name, container_id, log_line, timestamp, context=None):
+        if not matcher.match(log_line).is_error:
+            return
+        key = (container_name, miner.add(signature(log_line)).template_id)
+        errors.append(log_line)
+        keys.add(key)
+    return on_event
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多行日志合并测试')
+    parser.add_argument('--events', type=int, default=20000, help='日志事件数 (默认: 20000)')
+    parser.add_argument('--containers', type=int, default=20, help='容器数 (默认: 20)')
+    parser.add_argument('--trace-ratio', type=float, default=0.1, help='调用栈事件的比例 (默认: 0.1)')
+    args = parser.parse_args()
+
+    events = generate_events(args.events, args.containers, args.trace_ratio)
+    stream = interleave(events)
+    traces = sum(1 for _, lines in events if len(lines) > 1)
+    print(f"{len(events)} 个事件 ({traces} 个调用栈), {len(stream)} 行, {args.containers} 个容器\n")
+
+    results = {}
+    for label in ('逐行检测', '多行合并'):
+        matcher = KeywordMatcher(KEYWORDS)
+        miner = TemplateMiner()
+        errors, keys = [], set()
+        on_event = detect(matcher, miner, errors, keys, event_signature if label == '多行合并' else str)
+        assembled = []
+        if label == '多行合并':
+            def emit(*event):
+                assembled.append(event)
+                on_event(*event)
+            assembler = MultilineAssembler(emit, context_lines=5)
+            handler = assembler.add
+        else:
+            handler = on_event
+        start = time.perf_counter()
+        for container, line in stream:
+            handler(container, container, line, None)
+        if label == '多行合并':
+            assembler.flush(force=True)
+        elapsed = time.perf_counter() - start
+        results[label] = (len(errors), len(keys), len(stream) / elapsed, assembled)
+
+    # 单行错误事件数，其余错误事件都来自调用栈
+    single_errors = sum(1 for _, lines in events if len(lines) == 1 and lines[0].startswith('ERROR'))
+    print(f"{'方式':<12}{'错误事件':>10}{'每个调用栈':>12}{'AI 分析次数':>14}{'吞吐量':>16}")
+    for label, (error_count, key_count, throughput, _) in results.items():
+        print(f"{label:<12}{error_count:>10}{(error_count - single_errors) / max(traces, 1):>12.1f}{key_count:>14}"
+              f"{throughput:>12,.0f} 行/s")
+
+    # 核对: 按容器合并出的事件应与生成的事件一一对应（去掉时间戳后逐行相同）
+    expected = {}
+    for container, lines in events:
+        expected.setdefault(container, []).append('\n'.join(lines))
+    actual = {}
+    for container, _, text, _, _ in results['多行合并'][3]:
+        first, _, rest = text.partition('\n')
+        actual.setdefault(container, []).append(first.partition(' ')[2] + ('\n' + rest if rest else ''))
+    mismatched = sum(1 for container in expected for a, b in zip(expected[container], actual.get(container, []))
+                     if a != b) + sum(abs(len(expected[c]) - len(actual.get(c, []))) for c in expected)
+    print(f"\n合并结果与生成的事件不一致: {mismatched}")
+
+
+if __name__ == '__main__':
+    main()
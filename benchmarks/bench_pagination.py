@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+错误列表分页性能测试 - 对比 OFFSET 分页与游标分页在不同页码下的 /api/errors 耗时
+
+用法: python benchmarks/bench_pagination.py [--rows 300000] [--pages 1 100 1000 10000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 使用临时数据库，必须在导入 web_app 之前设置
+DB_DIR = tempfile.mkdtemp(prefix='bench-page-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(DB_DIR, 'bench.db')}"
+
+from web_app import app, ErrorLog, encode_cursor, insert_error_logs
+
+PER_PAGE = 20
+
+
+def populate(rows: int, batch_size: int = 10000):
+    """写入模拟数据"""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    for offset in range(0, rows, batch_size):
+        insert_error_logs([{
+            'timestamp': now - timedelta(seconds=rows - i),
+            'container_name': f'svc-{rng.randint(1, 30)}',
+            'error_message': f'Timeout waiting for response after {i}ms',
+            'error_type': 'Timeout',
+            'log_content': f'ERROR request {i} timed out\n    at frame_{rng.randint(1, 999)}',
+            'severity': rng.choice(['critical', 'error', 'warning']),
+            'ai_analysis': None,
+            'ai_solution': None,
+        } for i in range(offset, min(rows, offset + batch_size))])
+
+
+def measure(client, params: dict, repeat: int) -> float:
+    """请求 /api/errors，返回最佳耗时"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get('/api/errors', query_string=params)
+        best = min(best, time.perf_counter() - start)
+        assert response.status_code == 200 and response.get_json()['errors']
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='错误列表分页性能测试')
+    parser.add_argument('--rows', type=int, default=300000, help='模拟错误记录数 (默认: 300000)')
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 100, 1000, 10000],
+                        help='测试的页码 (默认: 1 100 1000 10000)')
+    parser.add_argument('--repeat', type=int, default=5, help='每个页码重复次数，取最佳值 (默认: 5)')
+    args = parser.parse_args()
+
+    print(f"数据库: {os.environ['DATABASE_URL']}")
+    with app.app_context():
+        print(f"生成 {args.rows} 条模拟数据...")
+        populate(args.rows)
+
+        client = app.test_client()
+        print(f"\n{'页码':>8}{'OFFSET(ms)':>14}{'游标(ms)':>12}")
+        for page in args.pages:
+            offset = (page - 1) * PER_PAGE
+            if offset >= args.rows:
+                print(f"{page:>8}  超出数据范围")
+                continue
+            offset_time = measure(client, {'page': page, 'per_page': PER_PAGE}, args.repeat)
+            # 游标即上一页最后一条记录，相当于从第一页逐页翻到该页
+            params = {'per_page': PER_PAGE}
+            if page > 1:
+                previous = ErrorLog.query.order_by(
+                    ErrorLog.timestamp.desc(), ErrorLog.id.desc()
+                ).offset(offset - 1).first()
+                params['cursor'] = encode_cursor(previous)
+            cursor_time = measure(client, params, args.repeat)
+            print(f"{page:>8}{offset_time * 1000:>14.1f}{cursor_time * 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+通知频率限制测试 - 用模拟时钟对比原有的固定一分钟窗口计数和三级令牌桶:
+窗口边界处的突发（任意 60 秒、任意 1 秒内放行的通知数）、大量容器同时出错时每分钟的通知总数，
+并测试多线程检查的吞吐量
+
+用法: python benchmarks/bench_rate_limiter.py [--containers 200] [--minutes 5] [--threads 1 4 8]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import RateLimits, TokenBucketLimiter, parse_limit
+
+
+class FixedWindowLimiter:
+    """原有实现: 每个容器、每个模板每分钟的计数，所有计数在整分钟处一起清零"""
+
+    def __init__(self, clock, per_container: int, per_template: int):
+        self.clock = clock
+        self.per_container = per_container
+        self.per_template = per_template
+        self.container_counter = defaultdict(int)
+        self.template_counter = defaultdict(int)
+        self.last_reset = clock()
+        self.lock = threading.Lock()
+
+    def allow(self, container_name: str, template_id: str) -> bool:
+        with self.lock:
+            now = self.clock()
+            if now - self.last_reset >= 60:
+                self.container_counter.clear()
+                self.template_counter.clear()
+                self.last_reset = now
+            if self.container_counter[container_name] >= self.per_container:
+                return False
+            if self.template_counter[template_id] >= self.per_template:
+                return False
+            self.container_counter[container_name] += 1
+            self.template_counter[template_id] += 1
+            return True
+
+
+class FakeClock:
+    """模拟时钟"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def max_in_window(times: list, window: float) -> int:
+    """任意 window 秒内的最大通知数"""
+    best = 0
+    recent = deque()
+    for t in times:
+        recent.append(t)
+        while recent[0] <= t - window:
+            recent.popleft()
+        best = max(best, len(recent))
+    return best
+
+
+def make_methods(clock, limits: RateLimits):
+    """返回 {名称: allow(容器, 模板) -> bool}"""
+    fixed = FixedWindowLimiter(clock, per_container=10, per_template=3)
+    bucket = TokenBucketLimiter(clock=clock)
+    return {
+        '固定窗口': fixed.allow,
+        '令牌桶': lambda container, template: bucket.acquire(limits, container, template) is None
+    }
+
+
+def edge_burst(limits: RateLimits) -> dict:
+    """单个容器持续报错（每 0.01 秒一条、模板各不相同），统计窗口边界处的突发"""
+    results = {}
+    for name in ('固定窗口', '令牌桶'):
+        clock = FakeClock()
+        allow = make_methods(clock, limits)[name]
+        # 整分钟前半秒开始的错误风暴跨过窗口边界
+        allowed = []
+        for i in range(30000):
+            clock.now = 59.5 + i * 0.01
+            if allow('api-1', f'template-{i}'):
+                allowed.append(clock.now)
+        results[name] = (max_in_window(allowed, 60), max_in_window(allowed, 1), len(allowed) / 5)
+    return results
+
+
+def fleet_storm(limits: RateLimits, containers: int, minutes: int) -> dict:
+    """大量容器同时出错: 每个容器每秒一条，模板各不相同，统计每分钟的通知总数"""
+    results = {}
+    for name in ('固定窗口', '令牌桶'):
+        clock = FakeClock()
+        allow = make_methods(clock, limits)[name]
+        allowed = 0
+        sequence = 0
+        for second in range(minutes * 60):
+            for c in range(containers):
+                clock.now = second + c / containers
+                sequence += 1
+                if allow(f'api-{c}', f'template-{sequence}'):
+                    allowed += 1
+        results[name] = allowed / minutes
+    return results
+
+
+def throughput(limits: RateLimits, threads: int, checks: int) -> dict:
+    """多线程检查吞吐量，每个线程检查不同的容器"""
+    results = {}
+    for name in ('固定窗口', '令牌桶'):
+        allow = make_methods(time.monotonic, limits)[name]
+
+        def worker(index: int):
+            for i in range(checks // threads):
+                allow(f'api-{index}-{i % 50}', f'template-{i % 200}')
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        results[name] = checks / (time.perf_counter() - start)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='通知频率限制测试')
+    parser.add_argument('--containers', type=int, default=200, help='同时出错的容器数 (默认: 200)')
+    parser.add_argument('--minutes', type=int, default=5, help='错误风暴持续的分钟数 (默认: 5)')
+    parser.add_argument('--checks', type=int, default=400000, help='吞吐量测试的检查次数 (默认: 400000)')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 8], help='吞吐量测试的线程数 (默认: 1 4 8)')
+    args = parser.parse_args()
+
+    # 与 config/config.yaml 中的默认值相同
+    limits = RateLimits(
+        template=parse_limit({'rate': 3, 'burst': 1}),
+        container=parse_limit({'rate': 10, 'burst': 2}),
+        total=parse_limit({'rate': 60, 'burst': 6})
+    )
+    print("限制: 每个模板 3/分钟 (突发 1), 每个容器 10/分钟 (突发 2), 全局 60/分钟 (突发 6; 固定窗口没有全局限制)\n")
+
+    print("单个容器跨过整分钟边界持续报错 5 分钟:")
+    print(f"{'方式':<12}{'任意 60 秒最多':>16}{'任意 1 秒最多':>16}{'平均每分钟':>12}")
+    for name, (per_minute, per_second, average) in edge_burst(limits).items():
+        print(f"{name:<12}{per_minute:>16}{per_second:>16}{average:>12.1f}")
+
+    print(f"\n{args.containers} 个容器同时报错 {args.minutes} 分钟:")
+    print(f"{'方式':<12}{'每分钟通知数':>14}")
+    for name, per_minute in fleet_storm(limits, args.containers, args.minutes).items():
+        print(f"{name:<12}{per_minute:>14.1f}")
+
+    print(f"\n多线程检查吞吐量（{args.checks} 次）:")
+    print(f"{'线程数':<8}" + ''.join(f'{name:>16}' for name in ('固定窗口', '令牌桶')))
+    for threads in args.threads:
+        r = throughput(limits, threads, args.checks)
+        print(f"{threads:<8}" + ''.join(f"{r[name]:>12,.0f} 次/s" for name in ('固定窗口', '令牌桶')))
+
+
+if __name__ == '__main__':
+    main()
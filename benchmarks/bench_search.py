@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+错误搜索性能测试 - 对比 LIKE '%...%' 与 FTS5 全文索引的 /api/errors 搜索耗时
+
+每次请求 /api/errors 第一页，包含分页数据和总数
+
+用法: python benchmarks/bench_search.py [--rows 1000000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 使用临时数据库，必须在导入 web_app 之前设置
+DB_DIR = tempfile.mkdtemp(prefix='bench-search-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(DB_DIR, 'bench.db')}"
+
+import web_app
+from web_app import app, insert_error_logs
+
+MESSAGES = [
+    'Connection refused while connecting to upstream {host}:{port}',
+    'Timeout waiting for response from {host} after {n}ms',
+    'java.lang.NullPointerException at com.example.OrderService.process(OrderService.java:{n})',
+    'Deadlock found when trying to get lock; try restarting transaction (order {n})',
+    'OutOfMemoryError: Java heap space while handling request {n}',
+    'HTTP 500 Internal Server Error on /api/orders/{n}',
+    'Permission denied: cannot open /var/data/{host}/segment-{n}.log',
+    'Traceback (most recent call last): KeyError: user_{n}',
+]
+ERROR_TYPES = ['Connection Error', 'Timeout', 'NullPointerException', 'SQLException',
+               'OutOfMemoryError', 'HTTP 500', 'Permission Error', 'KeyError']
+ANALYSES = ['上游服务不可用或网络异常', '数据库事务竞争导致死锁', '堆内存不足', '请求处理超时']
+
+# (名称, 搜索框输入)，LIKE 模式下按原样作为子串匹配
+QUERIES = [
+    ('稀有词', '{rare}'),
+    ('常见词', 'timeout'),
+    ('短语', '"connection refused"'),
+    ('前缀', 'deadl*'),
+    ('无结果', 'kubernetes'),
+]
+
+
+def populate(rows: int, batch_size: int = 10000):
+    """写入模拟数据（经过与生产相同的批量写入路径，触发器同步全文索引）"""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    written = 0
+    while written < rows:
+        batch = []
+        for i in range(written, min(rows, written + batch_size)):
+            message = rng.choice(MESSAGES).format(
+                host=f'db-{rng.randint(1, 50)}', port=rng.choice([3306, 5432, 6379]), n=i
+            )
+            batch.append({
+                'timestamp': now - timedelta(seconds=rows - i),
+                'container_name': f'svc-{rng.randint(1, 30)}',
+                'error_message': message,
+                'error_type': rng.choice(ERROR_TYPES),
+                'log_content': f'{now.isoformat()} ERROR [worker-{rng.randint(1, 64)}] {message}\n'
+                               f'    at frame_{rng.randint(1, 999)}\n    at frame_{rng.randint(1, 999)}',
+                'severity': rng.choice(['critical', 'error', 'warning']),
+                'ai_analysis': rng.choice(ANALYSES),
+                'ai_solution': '检查服务状态',
+            })
+        insert_error_logs(batch)
+        written += len(batch)
+        print(f"\r  已写入 {written}/{rows}", end='', flush=True)
+    print()
+
+
+def measure(client, params: dict, repeat: int):
+    """请求 /api/errors 第一页，返回 (最佳耗时, 总数)"""
+    best = float('inf')
+    total = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = client.get('/api/errors', query_string=params).get_json()
+        best = min(best, time.perf_counter() - start)
+        total = data['total']
+    return best, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='错误搜索性能测试')
+    parser.add_argument('--rows', type=int, default=1000000, help='模拟错误记录数 (默认: 1000000)')
+    parser.add_argument('--repeat', type=int, default=5, help='每条查询重复次数，取最佳值 (默认: 5)')
+    args = parser.parse_args()
+
+    print(f"数据库: {os.environ['DATABASE_URL']}")
+    if not web_app.fts_enabled:
+        print("当前 SQLite 不支持 FTS5，无法对比")
+        return
+
+    with app.app_context():
+        print(f"生成 {args.rows} 条模拟数据...")
+        start = time.perf_counter()
+        populate(args.rows)
+        print(f"  耗时 {time.perf_counter() - start:.1f}s\n")
+
+        client = app.test_client()
+        print(f"{'查询':<8}{'LIKE(ms)':>12}{'FTS 时间序(ms)':>16}{'FTS 相关度(ms)':>16}{'命中(LIKE/FTS)':>20}")
+        for name, search in QUERIES:
+            search = search.format(rare=args.rows // 2 + 7)
+            # 关闭全文索引即为旧的 LIKE 搜索路径
+            web_app.fts_enabled = False
+            like_time, like_total = measure(client, {'search': search.strip('"*')}, args.repeat)
+            web_app.fts_enabled = True
+            time_time, fts_total = measure(client, {'search': search}, args.repeat)
+            rank_time, _ = measure(client, {'search': search, 'sort': 'relevance'}, args.repeat)
+            print(f"{name:<8}{like_time * 1000:>12.1f}{time_time * 1000:>16.1f}{rank_time * 1000:>16.1f}"
+                  f"{f'{like_total}/{fts_total}':>20}")
+
+if __name__ == '__main__':
+    main()
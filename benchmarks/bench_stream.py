@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+实时推送负载测试 - 统计不同在线浏览器数量下 Web 进程执行的 SQL 语句数和 CPU 占用
+
+每轮启动 N 个 SSE 连接，同时由另一个线程模拟监控程序持续写入错误记录，
+对比原先定时轮询方式（每个浏览器每 30 秒请求一次 /api/errors，打开仪表盘时另请求 /api/stats）的理论查询数
+
+用法: python benchmarks/bench_stream.py [--viewers 1 10 100] [--duration 10] [--rate 20]
+"""
+import argparse
+import logging
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 使用临时数据库，必须在导入 web_app 之前设置
+DB_DIR = tempfile.mkdtemp(prefix='bench-stream-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(DB_DIR, 'bench.db')}"
+
+from sqlalchemy import event
+from werkzeug.serving import make_server
+
+from web_app import app, db, insert_error_logs, stream_broadcaster
+
+statements = 0
+
+
+def count_statement(*args):
+    """统计 Web 进程内执行的 SQL 语句"""
+    global statements
+    statements += 1
+
+
+def viewer(port: int, received: list, stop_flag: threading.Event):
+    """模拟一个打开页面的浏览器，统计收到的错误事件数"""
+    sock = socket.create_connection(('127.0.0.1', port))
+    sock.sendall(b'GET /api/stream HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n')
+    sock.settimeout(0.5)
+    buffer = b''
+    while not stop_flag.is_set():
+        try:
+            chunk = sock.recv(65536)
+        except socket.timeout:
+            continue
+        if not chunk:
+            break
+        buffer += chunk
+        received[0] += buffer.count(b'event: error_log')
+        buffer = buffer[buffer.rfind(b'\n') + 1:]
+    sock.close()
+
+
+def writer(rate: float, stop_flag: threading.Event, written: list):
+    """模拟监控程序按固定速率写入错误记录"""
+    while not stop_flag.wait(1.0 / rate):
+        insert_error_logs([{
+            'container_name': 'api', 'error_message': f'ERROR request {written[0]} failed',
+            'error_type': 'Timeout', 'log_content': 'ERROR', 'severity': 'error',
+            'ai_analysis': None, 'ai_solution': None
+        }])
+        written[0] += 1
+
+
+def run_round(port: int, viewers: int, duration: float, rate: float) -> dict:
+    """运行一轮测试"""
+    global statements
+    stop_flag = threading.Event()
+    counters = [[0] for _ in range(viewers)]
+    threads = [threading.Thread(target=viewer, args=(port, counters[i], stop_flag), daemon=True)
+               for i in range(viewers)]
+    for t in threads:
+        t.start()
+    while len(stream_broadcaster.subscribers) < viewers:
+        time.sleep(0.05)
+
+    written = [0]
+    writer_thread = threading.Thread(target=writer, args=(rate, stop_flag, written), daemon=True)
+    # 写入线程模拟的是另一个进程，它的语句不计入 Web 进程
+    statements_start = statements
+    cpu_start = time.process_time()
+    writer_thread.start()
+    time.sleep(duration)
+    stop_flag.set()
+    writer_thread.join()
+    time.sleep(stream_broadcaster.poll_interval * 2)
+    web_statements = statements - statements_start - written[0] * 2
+    cpu_used = time.process_time() - cpu_start
+    for t in threads:
+        t.join()
+    return {
+        'viewers': viewers,
+        'written': written[0],
+        'delivered': sum(c[0] for c in counters) / viewers,
+        'statements_per_second': web_statements / duration,
+        'cpu_percent': cpu_used / duration * 100
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='实时推送负载测试')
+    parser.add_argument('--viewers', type=int, nargs='+', default=[1, 10, 100],
+                        help='同时在线的浏览器数量 (默认: 1 10 100)')
+    parser.add_argument('--duration', type=float, default=10.0, help='每轮时长（秒）(默认: 10)')
+    parser.add_argument('--rate', type=float, default=20.0, help='每秒写入的错误记录数 (默认: 20)')
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+
+    print(f"写入速率 {args.rate} 条/秒，每轮 {args.duration} 秒\n")
+    print(f"{'浏览器':>6}{'写入':>8}{'每连接收到':>12}{'SSE 语句/秒':>14}{'轮询 语句/秒':>14}{'CPU%':>8}")
+    for viewers in args.viewers:
+        r = run_round(server.server_port, viewers, args.duration, args.rate)
+        # 原轮询方式: 每个浏览器每 30 秒一次 /api/errors（分页查询 + COUNT）
+        polling = viewers * 2 / 30
+        print(f"{r['viewers']:>6}{r['written']:>8}{r['delivered']:>12.0f}{r['statements_per_second']:>14.1f}"
+              f"{polling:>14.1f}{r['cpu_percent']:>8.1f}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
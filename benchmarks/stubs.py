@@ -0,0 +1,594 @@
+"""
+性能测试使用的本地模拟服务
+"""
+import asyncio
+import bisect
+import json
+import re
+import struct
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import parse_qs
+
+# 去掉 /v1.43 这类 API 版本前缀
+API_VERSION_PREFIX = re.compile(r'^/v[\d.]+(?=/)')
+
+
+class FakeDockerAPI:
+    """
+    模拟 Docker Engine API 的本地服务
+
+    支持 /_ping、/version、容器列表、容器 inspect、镜像列表、镜像 inspect、事件流和持续输出的容器日志流，
+    任意容器名都视为存在的运行中容器，日志按固定速率输出，每隔若干行输出一条错误；
+    通过 add_container / emit_event 登记容器并推送容器事件。登记的容器只在运行期间产生日志并保存全部历史，
+    日志流支持 since / tail / timestamps 参数，容器停止后输出完剩余日志即结束
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 lines_per_second: float = 5.0, error_every: int = 50, tty: bool = False,
+                 api_latency: float = 0.0):
+        """
+        初始化模拟服务
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示随机端口
+            lines_per_second: 每个日志流每秒输出的行数
+            error_every: 每隔多少行输出一条错误日志
+            tty: 容器是否为 TTY 模式（非 TTY 时日志使用多路复用格式）
+            api_latency: 普通 API 请求的模拟延迟（秒）
+        """
+        self.host = host
+        self.port = port
+        self.lines_per_second = lines_per_second
+        self.error_every = error_every
+        self.tty = tty
+        self.api_latency = api_latency
+        self.active_streams = 0
+        self.lines_sent = 0
+        # 各类 API 请求的次数
+        self.requests = Counter()
+        # 已登记的容器: 容器 ID -> {'name', 'status', 'image'}
+        self.containers = {}
+        # 已删除的容器 ID，之后的请求返回 404
+        self.removed = set()
+        self._subscribers = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._ready = threading.Event()
+
+    @property
+    def docker_host(self) -> str:
+        """供 DOCKER_HOST 使用的地址"""
+        return f"tcp://{self.host}:{self.port}"
+
+    def start(self):
+        """在后台线程中启动服务"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        self.wait_ready()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> int:
+        """等待服务开始监听，返回实际端口"""
+        self._ready.wait(timeout)
+        return self.port
+
+    def serve_forever(self):
+        """在当前线程中运行服务"""
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, backlog=4096))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._loop.create_task(self._produce_logs())
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理单个 HTTP 连接（支持 keep-alive）"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+
+                path = API_VERSION_PREFIX.sub('', target.split('?', 1)[0])
+                if path.startswith('/containers/') and path.split('/')[2] in self.removed:
+                    await self._respond(writer, 404, {'message': 'No such container'}, None)
+                    continue
+                if path.endswith('/logs') and path.startswith('/containers/'):
+                    ref = path.split('/')[2]
+                    container_id, info = self._find(ref)
+                    if container_id in self.containers:
+                        query = parse_qs(target.partition('?')[2])
+                        await self._stream_history(info, {key: values[0] for key, values in query.items()}, writer)
+                    else:
+                        await self._stream_logs(ref, writer)
+                    return
+                if path == '/events':
+                    await self._stream_events(writer)
+                    return
+                if self.api_latency:
+                    await asyncio.sleep(self.api_latency)
+                await self._respond(writer, *self._route(path))
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def container_id(name: str) -> str:
+        """由容器名生成固定的容器 ID"""
+        return (name.encode().hex() * 64)[:64]
+
+    def add_container(self, name: str, status: str = 'running', image: str = 'fake/app:latest',
+                      labels: Optional[dict] = None) -> str:
+        """登记容器（出现在容器列表中），返回容器 ID；已登记的容器只更新状态，保留日志历史"""
+        container_id = self.container_id(name)
+        info = self.containers.get(container_id)
+        if info:
+            info['status'] = status
+        else:
+            # log: [(纳秒时间戳, 日志内容)]; runs: 启动次数，重启后旧的日志流随之结束
+            info = self.containers[container_id] = {'name': name, 'status': status, 'image': image,
+                                                    'labels': labels or {}, 'log': [], 'runs': 0}
+        if status == 'running':
+            info['runs'] += 1
+        return container_id
+
+    def emit_event(self, action: str, name: str, new_name: Optional[str] = None):
+        """
+        更新登记的容器并推送容器事件（可在任意线程调用，在服务的事件循环中执行）
+
+        Args:
+            action: start / die / rename / destroy
+            name: 容器名
+            new_name: rename 时的新名称
+        """
+        self._loop.call_soon_threadsafe(self._apply_event, action, name, new_name, time.time_ns())
+
+    def _apply_event(self, action: str, name: str, new_name: Optional[str], time_ns: int):
+        """在事件循环中更新容器状态，与日志产生不会交错"""
+        container_id = self.container_id(name)
+        attributes = {'name': name}
+        if action == 'start':
+            self.add_container(name)
+            # 与 Docker 一致，start 事件带有镜像和全部标签
+            info = self.containers[container_id]
+            attributes = dict(info['labels'], name=name, image=info['image'])
+        elif action == 'die':
+            self.containers[container_id]['status'] = 'exited'
+        elif action == 'rename':
+            # 容器 ID 不变，新名称放在 Attributes.name 中
+            self.containers[container_id]['name'] = new_name
+            attributes = {'name': new_name, 'oldName': f'/{name}'}
+        elif action == 'destroy':
+            info = self.containers.pop(container_id, None)
+            if info:
+                info['status'] = 'removed'
+                self.removed.add(container_id)
+        event = {
+            'status': action, 'id': container_id, 'from': 'fake/app:latest',
+            'Type': 'container', 'Action': action,
+            'Actor': {'ID': container_id, 'Attributes': attributes},
+            'scope': 'local', 'time': time_ns // 1_000_000_000, 'timeNano': time_ns
+        }
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    def _find(self, ref: str):
+        """按容器 ID、ID 前缀或名称查找登记的容器"""
+        if ref in self.containers:
+            return ref, self.containers[ref]
+        for container_id, info in self.containers.items():
+            if container_id.startswith(ref) or info['name'] == ref:
+                return container_id, info
+        return self.container_id(ref), {'name': ref, 'status': 'running', 'image': 'fake/app:latest', 'labels': {}}
+
+    def _route(self, path: str):
+        """处理普通 JSON 请求"""
+        if path == '/_ping':
+            return 200, b'OK', 'text/plain'
+        if path == '/version':
+            return 200, {'ApiVersion': '1.43', 'MinAPIVersion': '1.12', 'Version': '24.0.0'}, None
+        if path == '/containers/json':
+            self.requests['containers'] += 1
+            return 200, [{
+                'Id': container_id,
+                'Names': [f"/{info['name']}"],
+                'Image': info['image'],
+                'ImageID': 'sha256:' + 'ab' * 32,
+                'State': info['status'],
+                'Labels': info['labels'],
+                'Created': 1704067200
+            } for container_id, info in self.containers.items()], None
+        if path == '/images/json':
+            self.requests['images'] += 1
+            return 200, [{'Id': 'sha256:' + 'ab' * 32, 'RepoTags': ['fake/app:latest']}], None
+        match = re.match(r'^/containers/([^/]+)/json$', path)
+        if match:
+            self.requests['inspect'] += 1
+            container_id, info = self._find(match.group(1))
+            return 200, {
+                'Id': container_id,
+                'Name': f"/{info['name']}",
+                'Image': 'sha256:' + 'ab' * 32,
+                'State': {'Status': info['status'], 'Running': info['status'] == 'running'},
+                'Config': {'Tty': self.tty, 'Image': info['image'], 'Labels': info['labels']},
+                'Created': '2024-01-01T00:00:00Z'
+            }, None
+        if path.startswith('/images/'):
+            self.requests['image_inspect'] += 1
+            return 200, {'Id': 'sha256:' + 'ab' * 32, 'RepoTags': ['fake/app:latest']}, None
+        return 404, {'message': f'No such object: {path}'}, None
+
+    async def _stream_events(self, writer: asyncio.StreamWriter):
+        """以 chunked 编码持续输出事件，直到客户端断开"""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                     b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        queue = asyncio.Queue()
+        self._subscribers.append(queue)
+        try:
+            while True:
+                payload = json.dumps(await queue.get()).encode() + b'\n'
+                writer.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+                await writer.drain()
+        finally:
+            self._subscribers.remove(queue)
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, body, content_type: Optional[str],
+                       headers: Optional[dict] = None):
+        """输出完整的 HTTP 响应"""
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+            content_type = 'application/json'
+        extra = ''.join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n{extra}\r\n".encode() + body)
+        await writer.drain()
+
+    async def _produce_logs(self):
+        """为运行中的登记容器按固定速率产生日志"""
+        interval = 1.0 / self.lines_per_second
+        while True:
+            for info in list(self.containers.values()):
+                if info['status'] != 'running':
+                    continue
+                sequence = len(info['log']) + 1
+                if self.error_every and sequence % self.error_every == 0:
+                    text = f"ERROR [{info['name']}] seq={sequence} request failed: connection refused"
+                else:
+                    text = f"INFO [{info['name']}] seq={sequence} handled request"
+                info['log'].append((time.time_ns(), text))
+            await asyncio.sleep(interval)
+
+    @staticmethod
+    def format_timestamp(ns: int) -> str:
+        """纳秒时间戳转为 Docker 的 RFC3339Nano 格式（省略小数末尾的 0）"""
+        seconds = datetime.fromtimestamp(ns // 1_000_000_000, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+        fraction = f"{ns % 1_000_000_000:09d}".rstrip('0')
+        return f"{seconds}.{fraction}Z" if fraction else f"{seconds}Z"
+
+    async def _stream_history(self, info: dict, params: dict, writer: asyncio.StreamWriter):
+        """输出登记容器的日志历史并跟随新日志，容器停止后输出完剩余日志即结束"""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/vnd.docker.raw-stream\r\n"
+                     b"Connection: close\r\n\r\n")
+        self.requests['logs'] += 1
+        self.active_streams += 1
+        log = info['log']
+        if params.get('since'):
+            seconds, _, fraction = params['since'].partition('.')
+            since = int(seconds) * 1_000_000_000 + int(fraction.ljust(9, '0')[:9])
+            index = bisect.bisect_left(log, (since,))
+        elif params.get('tail', 'all') != 'all':
+            index = max(0, len(log) - int(params['tail']))
+        else:
+            index = 0
+        timestamps = params.get('timestamps') in ('1', 'true', 'True')
+        runs = info['runs']
+        follow = params.get('follow') in ('1', 'true', 'True')
+        try:
+            while True:
+                while index < len(log):
+                    ns, text = log[index]
+                    index += 1
+                    payload = (f"{self.format_timestamp(ns)} {text}\n" if timestamps else f"{text}\n").encode()
+                    if not self.tty:
+                        payload = struct.pack('>BxxxL', 1, len(payload)) + payload
+                    writer.write(payload)
+                    self.lines_sent += 1
+                await writer.drain()
+                if not follow or info['status'] != 'running' or info['runs'] != runs:
+                    return
+                await asyncio.sleep(0.5 / self.lines_per_second)
+        finally:
+            self.active_streams -= 1
+
+    async def _stream_logs(self, name: str, writer: asyncio.StreamWriter):
+        """持续输出容器日志，直到客户端断开"""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/vnd.docker.raw-stream\r\n"
+                     b"Connection: close\r\n\r\n")
+        self.active_streams += 1
+        interval = 1.0 / self.lines_per_second
+        sequence = 0
+        try:
+            while True:
+                sequence += 1
+                now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f000Z')
+                if self.error_every and sequence % self.error_every == 0:
+                    text = f"{now} ERROR [{name}] request {sequence} failed: connection refused\n"
+                else:
+                    text = f"{now} INFO [{name}] handled request {sequence} in {sequence % 97}ms\n"
+                payload = text.encode()
+                if not self.tty:
+                    payload = struct.pack('>BxxxL', 1, len(payload)) + payload
+                writer.write(payload)
+                await writer.drain()
+                self.lines_sent += 1
+                await asyncio.sleep(interval)
+        finally:
+            self.active_streams -= 1
+
+
+class FakeOpenAI:
+    """
+    模拟 Azure OpenAI chat completions 接口的本地服务
+
+    每个请求按固定延迟返回固定格式的分析结果，并统计收到的请求数；批量请求（带编号的多条错误）
+    返回 JSON 数组。同时处理的请求超过 max_concurrent 时返回 429 和 Retry-After，模拟接口限流。
+    latency 可以在运行中修改以模拟延迟突增。endpoint 可以直接作为 ErrorAnalyzer 的端点
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.2,
+                 malformed_batches: bool = False, max_concurrent: int = 0, retry_after: float = 1.0):
+        """
+        初始化模拟服务
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示随机端口
+            latency: 每个请求的响应延迟（秒）
+            malformed_batches: 批量请求是否返回无法解析的内容（用于测试逐条分析的回退）
+            max_concurrent: 同时处理的最大请求数，超出时返回 429（0 表示不限流）
+            retry_after: 429 响应的 Retry-After（秒）
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.malformed_batches = malformed_batches
+        self.max_concurrent = max_concurrent
+        self.retry_after = retry_after
+        self.requests = 0
+        self.batch_requests = 0
+        self.rate_limited = 0
+        self.active = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._ready = threading.Event()
+
+    @property
+    def endpoint(self) -> str:
+        """供 azure_openai.endpoint 使用的地址"""
+        return f"http://{self.host}:{self.port}/"
+
+    def start(self):
+        """在后台线程中启动服务"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        self.wait_ready()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> int:
+        """等待服务开始监听，返回实际端口"""
+        self._ready.wait(timeout)
+        return self.port
+
+    def serve_forever(self):
+        """在当前线程中运行服务"""
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, backlog=4096))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理单个 HTTP 连接（支持 keep-alive）"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                length = 0
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'content-length':
+                        length = int(value)
+                body = json.loads(await reader.readexactly(length) or b'{}')
+                if self.max_concurrent and self.active >= self.max_concurrent:
+                    self.rate_limited += 1
+                    await FakeDockerAPI._respond(
+                        writer, 429, {'error': {'code': '429', 'message': 'Rate limit exceeded'}}, None,
+                        {'Retry-After': f'{self.retry_after:g}'})
+                    continue
+                self.requests += 1
+                self.active += 1
+                try:
+                    await asyncio.sleep(self.latency)
+                finally:
+                    self.active -= 1
+                await FakeDockerAPI._respond(writer, 200, self._completion(body), None)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _completion(self, body: dict) -> dict:
+        """生成 chat completion 响应"""
+        prompt = body.get('messages', [{}])[-1].get('content', '')
+        count = len(re.findall(r'^### 错误 \d+', prompt, re.MULTILINE))
+        if count:
+            self.batch_requests += 1
+            if self.malformed_batches:
+                content = '抱歉，我无法按要求的格式输出。'
+            else:
+                content = '```json\n' + json.dumps([
+                    {'id': i, 'error_type': '模拟分析', 'causes': ['无'], 'solution': '无'}
+                    for i in range(1, count + 1)
+                ], ensure_ascii=False) + '\n```'
+        else:
+            content = '**错误类型**: 模拟分析\n**可能原因**: 无\n**解决建议**: 无'
+        return {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'fake'),
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': content}
+            }],
+            'usage': {'prompt_tokens': len(prompt), 'completion_tokens': 20, 'total_tokens': len(prompt) + 20}
+        }
+
+
+class FakeFeishuWebhook:
+    """
+    模拟飞书自定义机器人 Webhook 的本地服务
+
+    每个新连接先等待 handshake_delay（模拟 TLS 握手开销），每个请求按固定延迟返回 {"code": 0}；
+    每秒收到的消息超过 rate_limit 时返回飞书的限流错误码 9499。url 可以直接作为 feishu.webhook_url
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.02,
+                 handshake_delay: float = 0.05, rate_limit: float = 0):
+        """
+        初始化模拟服务
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示随机端口
+            latency: 每个请求的响应延迟（秒）
+            handshake_delay: 每个新连接的建立开销（秒）
+            rate_limit: 每秒允许的消息数，超出时返回限流错误码（0 表示不限流）
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.handshake_delay = handshake_delay
+        self.rate_limit = rate_limit
+        self.connections = 0
+        self.requests = 0
+        self.delivered = 0
+        self.rate_limited = 0
+        self._window_start = 0.0
+        self._window_count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self) -> str:
+        """供 feishu.webhook_url 使用的地址"""
+        return f"http://{self.host}:{self.port}/open-apis/bot/v2/hook/fake"
+
+    def start(self):
+        """在后台线程中启动服务"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        self.wait_ready()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> int:
+        """等待服务开始监听，返回实际端口"""
+        self._ready.wait(timeout)
+        return self.port
+
+    def serve_forever(self):
+        """在当前线程中运行服务"""
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, backlog=4096))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    def _allow(self) -> bool:
+        """按一秒的固定窗口统计消息数"""
+        if not self.rate_limit:
+            return True
+        now = time.monotonic()
+        if now - self._window_start >= 1.0:
+            self._window_start, self._window_count = now, 0
+        self._window_count += 1
+        return self._window_count <= self.rate_limit
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理单个 HTTP 连接（支持 keep-alive）"""
+        self.connections += 1
+        try:
+            await asyncio.sleep(self.handshake_delay)
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                length = 0
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'content-length':
+                        length = int(value)
+                await reader.readexactly(length)
+                self.requests += 1
+                await asyncio.sleep(self.latency)
+                if self._allow():
+                    self.delivered += 1
+                    body = {'code': 0, 'msg': 'success', 'data': {}}
+                else:
+                    self.rate_limited += 1
+                    body = {'code': 9499, 'msg': 'too many request', 'data': {}}
+                await FakeDockerAPI._respond(writer, 200, body, None)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='本地模拟服务')
+    parser.add_argument('service', choices=['docker', 'openai', 'feishu'], help='要启动的模拟服务')
+    parser.add_argument('--port', type=int, default=None, help='监听端口 (默认: docker 2375, openai 8080)')
+    parser.add_argument('--rate', type=float, default=5.0, help='每个日志流每秒输出的行数 (默认: 5)')
+    parser.add_argument('--latency', type=float, default=0.2, help='模拟 OpenAI 的响应延迟（秒）(默认: 0.2)')
+    args = parser.parse_args()
+
+    if args.service == 'docker':
+        server = FakeDockerAPI(port=args.port or 2375, lines_per_second=args.rate)
+        server.start()
+        print(f"模拟 Docker API 已启动: DOCKER_HOST={server.docker_host}")
+    elif args.service == 'openai':
+        server = FakeOpenAI(port=args.port or 8080, latency=args.latency)
+        server.start()
+        print(f"模拟 Azure OpenAI 已启动: endpoint={server.endpoint}")
+    else:
+        server = FakeFeishuWebhook(port=args.port or 8081)
+        server.start()
+        print(f"模拟飞书 Webhook 已启动: webhook_url={server.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
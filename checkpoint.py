@@ -0,0 +1,177 @@
+"""
+日志读取位置检查点模块
+把每个容器读到的最大 Docker 日志时间戳（以及这一时刻读到的行数）保存到 SQLite，重启后从该位置继续读取；
+读取日志时只更新内存，后台线程定期把有变化的位置在一个事务中批量写入
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS log_checkpoints (
+    container_name TEXT PRIMARY KEY,
+    container_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    lines INTEGER NOT NULL DEFAULT 1,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class CheckpointStore:
+    """按容器名保存日志读取位置（纳秒时间戳和该时刻已读的行数）的检查点（线程安全）"""
+
+    def __init__(self, path: str = 'logs/checkpoints.db', flush_interval: float = 2.0,
+                 max_age: float = 7 * 24 * 3600, clock: Callable[[], float] = time.time):
+        """
+        初始化检查点存储
+
+        Args:
+            path: SQLite 数据库文件路径
+            flush_interval: 后台写入间隔（秒），进程崩溃时最多重复读取这段时间内的日志
+            max_age: 超过该时间（秒）没有更新的检查点在打开时删除（容器已不存在）
+            clock: 时钟函数，返回秒数
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.clock = clock
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(log_checkpoints)')}
+        if 'lines' not in columns:
+            # 旧版本的检查点没有行数，按检查点那一时刻只有一行处理
+            self._conn.execute('ALTER TABLE log_checkpoints ADD COLUMN lines INTEGER NOT NULL DEFAULT 1')
+        self._conn.execute('DELETE FROM log_checkpoints WHERE updated_at < ?', (clock() - max_age,))
+        self._lock = threading.Lock()
+
+        # 已写入数据库的位置: 容器名 -> (容器 ID, 纳秒时间戳, 该时刻已读的行数)
+        self._saved: Dict[str, tuple] = {
+            name: (container_id, position, lines)
+            for name, container_id, position, lines in self._conn.execute(
+                'SELECT container_name, container_id, position, lines FROM log_checkpoints')
+        }
+        self._snapshot: Optional[Callable[[], Dict[str, tuple]]] = None
+        self._stop_flag = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 统计信息
+        self.flushes = 0
+        self.written = 0
+
+        logger.info(f"日志检查点已打开: {path} ({len(self._saved)} 个容器)")
+
+    def get(self, container_name: str) -> Optional[Tuple[int, int]]:
+        """
+        获取容器上次读到的位置
+
+        Args:
+            container_name: 容器名
+
+        Returns:
+            (纳秒时间戳, 该时刻已读的行数)，没有检查点时返回 None
+        """
+        with self._lock:
+            saved = self._saved.get(container_name)
+        return saved[1:] if saved else None
+
+    def save(self, positions: Dict[str, tuple]) -> int:
+        """
+        写入有变化的位置（一个事务）
+
+        Args:
+            positions: 容器名 -> (容器 ID, 纳秒时间戳, 该时刻已读的行数)
+
+        Returns:
+            写入的记录数
+        """
+        with self._lock:
+            changed = [(name, container_id, position, lines)
+                       for name, (container_id, position, lines) in positions.items()
+                       if self._saved.get(name) != (container_id, position, lines)]
+            if not changed:
+                return 0
+            now = self.clock()
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.executemany(
+                    'INSERT INTO log_checkpoints (container_name, container_id, position, lines, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?) ON CONFLICT(container_name) DO UPDATE SET '
+                    'container_id = excluded.container_id, position = excluded.position, '
+                    'lines = excluded.lines, updated_at = excluded.updated_at',
+                    [(name, container_id, position, lines, now) for name, container_id, position, lines in changed]
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            for name, container_id, position, lines in changed:
+                self._saved[name] = (container_id, position, lines)
+            self.flushes += 1
+            self.written += len(changed)
+            return len(changed)
+
+    def start(self, snapshot: Callable[[], Dict[str, tuple]]):
+        """
+        启动后台写入线程
+
+        Args:
+            snapshot: 返回当前读取位置的函数，容器名 -> (容器 ID, 纳秒时间戳, 该时刻已读的行数)
+        """
+        self._snapshot = snapshot
+        if self._thread:
+            return
+        self._stop_flag.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name='log-checkpoints', daemon=True)
+        self._thread.start()
+
+    def _flush_loop(self):
+        """后台线程: 定期写入有变化的位置"""
+        while not self._stop_flag.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """立即写入当前读取位置"""
+        if not self._snapshot:
+            return
+        try:
+            self.save(self._snapshot())
+        except Exception as e:
+            logger.error(f"写入日志检查点失败: {e}")
+
+    def stop(self):
+        """停止后台线程，写入最后的位置并关闭数据库"""
+        self._stop_flag.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._saved)
+
+    def get_metrics(self) -> dict:
+        """
+        获取检查点统计信息
+
+        Returns:
+            统计信息字典
+        """
+        return {
+            'containers': len(self),
+            'flushes': self.flushes,
+            'written': self.written
+        }
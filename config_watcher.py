@@ -0,0 +1,67 @@
+"""
+配置文件变化检测模块
+按修改时间和文件大小轮询配置文件，也可以由 SIGHUP 等信号请求重新加载；
+只负责判断何时重新加载，重新读取和应用配置由调用方在主循环中完成，不占用日志读取线程
+"""
+import os
+import time
+from typing import Callable, Optional, Tuple
+
+
+class ConfigWatcher:
+    """配置文件变化检测"""
+
+    def __init__(self, path: str, interval: Optional[float] = 2.0, clock: Callable[[], float] = time.monotonic):
+        """
+        初始化检测器
+
+        Args:
+            path: 配置文件路径
+            interval: 检查文件修改时间的最小间隔（秒），None 时不轮询，只响应 request_reload
+            clock: 单调时钟函数，返回秒数
+        """
+        self.path = path
+        self.interval = interval
+        self.clock = clock
+        self._signature = self._stat()
+        self._last_check = clock()
+        self._requested = False
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        """文件的 (修改时间, 大小)，文件不存在时返回 None"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def request_reload(self):
+        """请求立即重新加载（可在信号处理函数中调用，只设置标志）"""
+        self._requested = True
+
+    def poll(self) -> bool:
+        """
+        判断是否需要重新加载
+
+        收到重新加载请求，或者距上次检查超过 interval 且文件修改时间或大小变化时返回 True；
+        文件暂时不存在（编辑器先删除再写入）时不触发
+
+        Returns:
+            是否需要重新加载
+        """
+        if self._requested:
+            self._requested = False
+            self._signature = self._stat()
+            self._last_check = self.clock()
+            return True
+        if self.interval is None:
+            return False
+        now = self.clock()
+        if now - self._last_check < self.interval:
+            return False
+        self._last_check = now
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        return True
@@ -0,0 +1,316 @@
+"""
+容器元数据缓存模块
+启动时通过一次容器列表和一次镜像列表请求填充缓存，之后订阅 Docker 事件流（start、die、rename、destroy）
+保持缓存最新；查询容器信息时直接读取内存，不再调用 Docker API
+"""
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 订阅的容器事件
+CONTAINER_EVENTS = ('start', 'die', 'rename', 'destroy')
+# 容器事件 Actor.Attributes 中除标签以外的字段
+EVENT_ATTRIBUTES = ('name', 'image', 'exitCode', 'signal', 'oldName')
+# 事件流断开后的重连等待时间（秒），每次失败翻倍
+RECONNECT_BASE = 1.0
+RECONNECT_MAX = 30.0
+
+
+class ContainerMetadataCache:
+    """由 Docker 事件流保持更新的容器元数据缓存（线程安全）"""
+
+    def __init__(self, client):
+        """
+        初始化容器元数据缓存
+
+        Args:
+            client: docker.DockerClient
+        """
+        self.client = client
+        # 完整容器 ID -> 容器信息
+        self._containers: Dict[str, dict] = {}
+        # 容器名 -> 完整容器 ID
+        self._names: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stop_flag = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stream = None
+        self._ready = threading.Event()
+        # 事件监听器: listener(action, container_id, info, event)，在事件线程中调用
+        self._listeners: List[Callable] = []
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.events = 0
+        self.refreshes = 0
+        self.api_calls = 0
+
+    def start(self, timeout: float = 10.0):
+        """
+        填充缓存并启动事件订阅线程
+
+        Args:
+            timeout: 等待首次填充完成的时间（秒）
+        """
+        if self._thread:
+            return
+        self._stop_flag.clear()
+        self._thread = threading.Thread(target=self._run, name='docker-events', daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            logger.warning("容器元数据缓存首次填充超时，查询时将直接请求 Docker API")
+
+    def add_listener(self, listener: Callable):
+        """
+        注册容器事件监听器，缓存更新后调用
+
+        Args:
+            listener: listener(action, container_id, info, event)；全量刷新后以 action='refresh' 调用，
+                      用于补上事件流断开期间错过的变化
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, action: str, container_id: str, info: Optional[dict], event: dict):
+        """调用所有监听器，单个监听器出错不影响事件处理"""
+        for listener in self._listeners:
+            try:
+                listener(action, container_id, dict(info) if info else None, event)
+            except Exception as e:
+                logger.error(f"处理容器事件 {action} 时出错: {e}")
+
+    def stop(self):
+        """停止事件订阅"""
+        self._stop_flag.set()
+        stream = self._stream
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def _run(self):
+        """事件订阅线程主循环: 先订阅事件再全量刷新，断开后重连并重新刷新，不会漏掉期间的变化"""
+        delay = RECONNECT_BASE
+        while not self._stop_flag.is_set():
+            try:
+                self._stream = self.client.api.events(
+                    decode=True,
+                    filters={'type': 'container', 'event': list(CONTAINER_EVENTS)}
+                )
+                self.refresh()
+                if self._ready.is_set():
+                    self._notify('refresh', '', None, {})
+                self._ready.set()
+                delay = RECONNECT_BASE
+                for event in self._stream:
+                    if self._stop_flag.is_set():
+                        break
+                    self.apply_event(event)
+            except Exception as e:
+                if self._stop_flag.is_set():
+                    break
+                logger.warning(f"Docker 事件流中断，{delay:.0f} 秒后重连: {e}")
+            finally:
+                self._stream = None
+            if self._stop_flag.wait(delay):
+                break
+            delay = min(RECONNECT_MAX, delay * 2)
+
+    def refresh(self):
+        """全量刷新: 一次容器列表请求和一次镜像列表请求"""
+        containers = self.client.api.containers(all=True)
+        images = self.client.api.images()
+        self.api_calls += 2
+        tags = {image['Id']: image['RepoTags'][0] for image in images
+                if image.get('RepoTags') and image['RepoTags'][0] != '<none>:<none>'}
+
+        entries = {}
+        for item in containers:
+            # 列表接口返回的创建时间是 Unix 时间戳，转换为与 inspect 一致的 ISO 格式
+            created = item.get('Created')
+            if isinstance(created, (int, float)):
+                created = datetime.fromtimestamp(created, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+            name = (item.get('Names') or ['/' + item['Id'][:12]])[0].lstrip('/')
+            entries[item['Id']] = {
+                'name': name,
+                'id': item['Id'][:12],
+                'full_id': item['Id'],
+                'status': item.get('State', 'unknown'),
+                'image': tags.get(item.get('ImageID'), item.get('Image') or 'unknown'),
+                'created': created,
+                'labels': item.get('Labels') or {}
+            }
+        with self._lock:
+            self._containers = entries
+            self._names = {info['name']: container_id for container_id, info in entries.items()}
+        self.refreshes += 1
+        logger.info(f"容器元数据缓存已刷新: {len(entries)} 个容器")
+
+    def apply_event(self, event: dict):
+        """
+        根据 Docker 事件更新缓存
+
+        Args:
+            event: 事件流中的一条事件
+        """
+        action = event.get('Action') or event.get('status', '')
+        actor = event.get('Actor', {})
+        container_id = actor.get('ID') or event.get('id')
+        attributes = actor.get('Attributes', {})
+        if not container_id:
+            return
+        self.events += 1
+
+        if action == 'start':
+            info = self._apply_start(container_id, attributes)
+        elif action == 'die':
+            with self._lock:
+                info = self._containers.get(container_id)
+                if info:
+                    info['status'] = 'exited'
+        elif action == 'rename':
+            with self._lock:
+                info = self._containers.get(container_id)
+                if info:
+                    self._names.pop(info['name'], None)
+                    info['name'] = attributes.get('name', info['name'])
+                    self._names[info['name']] = container_id
+        elif action == 'destroy':
+            with self._lock:
+                info = self._containers.pop(container_id, None)
+                if info and self._names.get(info['name']) == container_id:
+                    del self._names[info['name']]
+        else:
+            return
+        self._notify(action, container_id, info, event)
+
+    def _apply_start(self, container_id: str, attributes: dict) -> dict:
+        """
+        根据 start 事件更新容器信息
+
+        start 事件的 Attributes 中带有容器名、镜像和全部标签，直接用于更新缓存，
+        不必再查询一次容器；大量短生命周期容器同时启动时事件处理不会落后
+
+        Args:
+            container_id: 完整容器 ID
+            attributes: 事件的 Actor.Attributes
+
+        Returns:
+            更新后的容器信息
+        """
+        labels = {key: value for key, value in attributes.items() if key not in EVENT_ATTRIBUTES}
+        with self._lock:
+            info = self._containers.get(container_id)
+            if info:
+                self._names.pop(info['name'], None)
+            else:
+                info = self._containers[container_id] = {
+                    'id': container_id[:12],
+                    'full_id': container_id,
+                    'created': None
+                }
+            info['name'] = attributes.get('name', info.get('name') or container_id[:12])
+            info['image'] = attributes.get('image', info.get('image') or 'unknown')
+            info['labels'] = labels
+            info['status'] = 'running'
+            self._names[info['name']] = container_id
+            return info
+
+    def _load(self, container_ref: str) -> Optional[dict]:
+        """查询单个容器并写入缓存"""
+        try:
+            container = self.client.containers.get(container_ref)
+            self.api_calls += 1
+            image = container.attrs.get('Config', {}).get('Image') or 'unknown'
+        except Exception as e:
+            logger.error(f"获取容器信息失败: {e}")
+            return None
+
+        info = {
+            'name': container.name,
+            'id': container.id[:12],
+            'full_id': container.id,
+            'status': container.status,
+            'image': image,
+            'created': container.attrs.get('Created'),
+            'labels': container.labels
+        }
+        with self._lock:
+            old = self._containers.get(container.id)
+            if old and self._names.get(old['name']) == container.id:
+                del self._names[old['name']]
+            self._containers[container.id] = info
+            self._names[info['name']] = container.id
+        return info
+
+    def _find(self, container_ref: str) -> Optional[dict]:
+        """按名称、完整 ID 或 ID 前缀查找（调用方持有锁）"""
+        container_id = self._names.get(container_ref.lstrip('/'))
+        if container_id:
+            return self._containers[container_id]
+        info = self._containers.get(container_ref)
+        if info:
+            return info
+        if len(container_ref) >= 12:
+            for container_id, info in self._containers.items():
+                if container_id.startswith(container_ref):
+                    return info
+        return None
+
+    def get(self, container_ref: str) -> Optional[dict]:
+        """
+        获取容器信息，缓存中没有时查询一次 Docker API
+
+        Args:
+            container_ref: 容器名称或 ID
+
+        Returns:
+            容器信息字典 (name, id, full_id, status, image, created, labels) 或 None
+        """
+        with self._lock:
+            info = self._find(container_ref)
+            if info:
+                self.hits += 1
+                return dict(info)
+        self.misses += 1
+        info = self._load(container_ref)
+        return dict(info) if info else None
+
+    def list(self) -> List[dict]:
+        """
+        获取所有容器的信息
+
+        Returns:
+            容器信息字典列表
+        """
+        with self._lock:
+            return [dict(info) for info in self._containers.values()]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._containers)
+
+    def get_metrics(self) -> dict:
+        """
+        获取缓存统计信息
+
+        Returns:
+            统计信息字典
+        """
+        lookups = self.hits + self.misses
+        return {
+            'containers': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'events': self.events,
+            'refreshes': self.refreshes,
+            'api_calls': self.api_calls
+        }
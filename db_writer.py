@@ -0,0 +1,208 @@
+"""
+数据库批量写入模块
+在后台线程中收集待写入的记录，按批次大小或最大延迟合并为一个事务提交；
+提交失败时退避重试，仍然失败时逐条写入，逐条写入也失败的记录交给 on_failed（如写入暂存队列）
+"""
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Callable, List, Optional
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class BatchedDBWriter:
+    """后台批量写入器"""
+
+    def __init__(self, flush_func: Callable[[List[dict]], int], batch_size: int = 200,
+                 max_latency: float = 0.5, max_queue: int = 10000, name: str = 'db-writer',
+                 max_retries: int = 3, backoff_base: float = 0.1, backoff_max: float = 2.0,
+                 on_failed: Optional[Callable[[List[dict]], None]] = None):
+        """
+        初始化批量写入器
+
+        Args:
+            flush_func: 批量写入函数，接收记录列表，在一个事务中写入并返回写入条数
+            batch_size: 单批最大记录数
+            max_latency: 记录在队列中等待的最长时间（秒），超时即提交当前批次
+            max_queue: 队列最大长度，队列满时 submit 会阻塞
+            name: 写入线程名称
+            max_retries: 批次提交失败（如数据库被锁）时的最大重试次数
+            backoff_base: 退避的基础等待时间（秒），第 n 次重试最多等待 backoff_base * 2^n
+            backoff_max: 单次退避的最长等待时间（秒）
+            on_failed: 重试和逐条写入后仍然失败的记录列表交给 on_failed，为空时只计数
+        """
+        self.flush_func = flush_func
+        self.batch_size = max(1, batch_size)
+        self.max_latency = max_latency
+        self.name = name
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.on_failed = on_failed
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stop_flag = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 统计信息
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.batches = 0
+        self.retries = 0
+        self.row_fallbacks = 0
+        self.last_batch_size = 0
+        self.last_flush_seconds = 0.0
+        self.flush_latency = Histogram()
+
+    def start(self):
+        """启动写入线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_flag.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        logger.info(f"批量写入器已启动 (批次 {self.batch_size} 条, 最大延迟 {self.max_latency}秒)")
+
+    def stop(self, timeout: float = 10.0):
+        """
+        停止写入线程，并提交队列中剩余的记录
+
+        Args:
+            timeout: 等待超时时间（秒）
+        """
+        if not self._thread:
+            return
+        self._stop_flag.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"批量写入器停止超时，队列中仍有 {self._queue.qsize()} 条记录")
+        else:
+            logger.info(f"批量写入器已停止，共写入 {self.rows_written} 条记录 ({self.batches} 批)")
+        self._thread = None
+
+    def submit(self, row: dict):
+        """
+        提交一条待写入的记录
+
+        Args:
+            row: 记录字段字典
+        """
+        self._queue.put(row)
+
+    @property
+    def pending(self) -> int:
+        """队列中等待写入的记录数"""
+        return self._queue.qsize()
+
+    def _run(self):
+        """写入线程主循环"""
+        while True:
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+            elif self._stop_flag.is_set() and self._queue.empty():
+                break
+
+    def _collect(self) -> List[dict]:
+        """收集一个批次: 等待第一条记录，再在最大延迟内尽量凑满批次"""
+        try:
+            batch = [self._queue.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.batch_size:
+            # 停止时不再等待，直接取出剩余记录
+            remaining = 0 if self._stop_flag.is_set() else deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: List[dict]):
+        """在一个事务中写入一个批次，失败时退避重试，仍然失败时逐条写入"""
+        start = time.perf_counter()
+        try:
+            error = self._write(batch)
+            if error is None:
+                self.rows_written += len(batch)
+                self.batches += 1
+                self.last_batch_size = len(batch)
+                return
+
+            failed = batch
+            if len(batch) > 1:
+                # 逐条写入，只有自身有问题的记录失败，不连累同一批次的其它记录
+                self.row_fallbacks += 1
+                logger.warning(f"批量写入 {len(batch)} 条记录失败，改为逐条写入: {error}")
+                failed = []
+                for row in batch:
+                    try:
+                        self.flush_func([row])
+                        self.rows_written += 1
+                    except Exception as e:
+                        error = e
+                        failed.append(row)
+            if failed:
+                self.rows_failed += len(failed)
+                logger.error(f"写入 {len(failed)} 条记录失败: {error}")
+                if self.on_failed is not None:
+                    try:
+                        self.on_failed(failed)
+                    except Exception as e:
+                        logger.error(f"处理写入失败的记录时出错: {e}")
+        finally:
+            self.last_flush_seconds = time.perf_counter() - start
+            self.flush_latency.observe(self.last_flush_seconds)
+
+    def _write(self, batch: List[dict]) -> Optional[Exception]:
+        """
+        提交一个批次，失败时退避重试
+
+        Args:
+            batch: 记录列表
+
+        Returns:
+            成功时返回 None，重试后仍然失败时返回最后一次的异常
+        """
+        attempt = 0
+        while True:
+            try:
+                self.flush_func(batch)
+                return None
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    return e
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"批量写入 {len(batch)} 条记录失败，{delay:.2f} 秒后第 {attempt} 次重试: {e}")
+                # 停止时不再等待
+                self._stop_flag.wait(delay)
+
+    def get_metrics(self) -> dict:
+        """
+        获取写入统计信息
+
+        Returns:
+            统计信息字典
+        """
+        return {
+            'pending': self.pending,
+            'rows_written': self.rows_written,
+            'rows_failed': self.rows_failed,
+            'batches': self.batches,
+            'retries': self.retries,
+            'row_fallbacks': self.row_fallbacks,
+            'last_batch_size': self.last_batch_size,
+            'last_flush_seconds': self.last_flush_seconds,
+            'flush_latency': self.flush_latency.snapshot()
+        }
@@ -0,0 +1,143 @@
+"""
+错误去重缓存模块
+有上限的去重存储: 定长哈希键、按 TTL 过期（最小堆）、超出容量时按 LRU 淘汰
+"""
+import hashlib
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+# 哈希键长度（字节），16 字节 blake2b 的碰撞概率可以忽略
+KEY_DIGEST_SIZE = 16
+
+
+def make_key(*parts: str) -> bytes:
+    """
+    把若干字符串哈希为定长键
+
+    Args:
+        parts: 组成键的字符串，如容器名和日志模板 ID
+
+    Returns:
+        定长字节串
+    """
+    digest = hashlib.blake2b(digest_size=KEY_DIGEST_SIZE)
+    for part in parts:
+        digest.update(part.encode('utf-8', 'replace'))
+        digest.update(b'\x00')
+    return digest.digest()
+
+
+class DedupCache:
+    """带 TTL 和容量上限的去重缓存（线程安全）"""
+
+    def __init__(self, ttl: float = 300, max_entries: int = 100000,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        初始化去重缓存
+
+        Args:
+            ttl: 记录的有效期（秒），有效期内再次出现视为重复
+            max_entries: 最大记录数，超出时淘汰最久未出现的记录
+            clock: 时钟函数，返回单调递增的秒数
+        """
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.clock = clock
+        # 键 -> 过期时间，顺序即 LRU 顺序（末尾为最近出现）
+        self._entries: 'OrderedDict[bytes, float]' = OrderedDict()
+        # (过期时间, 键) 最小堆；记录被重新写入或删除后旧的堆项在弹出时跳过
+        self._expiry_heap: List[Tuple[float, bytes]] = []
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def check_and_add(self, key: bytes, now: Optional[float] = None) -> bool:
+        """
+        检查是否重复，不重复时记录该键
+
+        重复出现只刷新 LRU 顺序，不延长有效期: 有效期从第一次记录开始计算
+
+        Args:
+            key: make_key 生成的键
+            now: 当前时间，默认取 clock()
+
+        Returns:
+            是否是有效期内的重复
+        """
+        now = self.clock() if now is None else now
+        with self._lock:
+            self._expire(now)
+            expires_at = self._entries.get(key)
+            if expires_at is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True
+
+            self.misses += 1
+            expires_at = now + self.ttl
+            self._entries[key] = expires_at
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._compact()
+            return False
+
+    def discard(self, key: bytes):
+        """
+        删除记录（如通知失败，允许下次重新通知）
+
+        Args:
+            key: make_key 生成的键
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __contains__(self, key: bytes) -> bool:
+        with self._lock:
+            self._expire(self.clock())
+            return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expire(self, now: float):
+        """弹出所有已过期的记录，调用方持有锁"""
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            # 只有堆项与当前记录一致时才删除，否则是已删除或已重新写入的旧堆项
+            if self._entries.get(key) == expires_at:
+                del self._entries[key]
+                self.expirations += 1
+
+    def _compact(self):
+        """淘汰和删除会在堆中留下旧堆项，数量过多时重建堆，调用方持有锁"""
+        if len(self._expiry_heap) > 2 * len(self._entries) + 1024:
+            self._expiry_heap = [(expires_at, key) for key, expires_at in self._entries.items()]
+            heapq.heapify(self._expiry_heap)
+
+    def get_metrics(self) -> dict:
+        """
+        获取缓存统计信息
+
+        Returns:
+            统计信息字典
+        """
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
@@ -3,19 +3,117 @@ Docker 日志监控模块
 监控 Docker 容器日志并检测错误
 """
 import docker
+import fnmatch
 import logging
-from typing import List, Callable, Optional
+import re
+from typing import Dict, List, Callable, Optional, Tuple
 from datetime import datetime
 import threading
 
+from checkpoint import CheckpointStore
+from container_cache import ContainerMetadataCache
+from metrics import ShardedCounter
+
 logger = logging.getLogger(__name__)
 
+# Docker 日志时间戳 (RFC3339Nano)，小数部分末尾的 0 会被省略
+DOCKER_TIMESTAMP = re.compile(r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d{1,9}))?(Z|[+-]\d{2}:\d{2})$')
+
+
+def parse_docker_timestamp(text: str) -> Optional[int]:
+    """
+    解析 Docker 日志时间戳
+
+    Args:
+        text: RFC3339Nano 格式的时间戳，如 2024-01-01T00:00:00.123456789Z
+
+    Returns:
+        Unix 纳秒时间戳，格式不符时返回 None
+    """
+    match = DOCKER_TIMESTAMP.match(text)
+    if not match:
+        return None
+    seconds, fraction, zone = match.groups()
+    moment = datetime.fromisoformat(seconds + ('+00:00' if zone == 'Z' else zone))
+    return int(moment.timestamp()) * 1_000_000_000 + int((fraction or '').ljust(9, '0'))
+
+
+def split_docker_timestamp(log_line: str) -> Tuple[Optional[int], str]:
+    """
+    拆分带时间戳的日志行
+
+    Args:
+        log_line: 以 Docker 时间戳开头的日志行
+
+    Returns:
+        (纳秒时间戳或 None, 去掉时间戳后的日志内容)
+    """
+    head, _, rest = log_line.partition(' ')
+    timestamp = parse_docker_timestamp(head)
+    if timestamp is None:
+        return None, log_line
+    return timestamp, rest
+
+
+class ContainerSelector:
+    """根据固定列表、标签和名称模式判断是否监控某个容器"""
+
+    def __init__(self, containers: List[str], discovery: Optional[dict] = None):
+        """
+        初始化容器选择器
+
+        Args:
+            containers: 固定监控的容器名称或 ID 列表
+            discovery: 自动发现配置 {'enabled', 'labels', 'names'}；
+                       labels 为 "key" 或 "key=value" 列表，需全部匹配；
+                       names 为通配符（如 "api-*"）或以 "re:" 开头的正则表达式列表，匹配任意一个即可
+        """
+        self.containers = list(containers or [])
+        discovery = discovery or {}
+        self.discovery = bool(discovery.get('enabled', False))
+        self.labels = []
+        for selector in discovery.get('labels') or []:
+            key, sep, value = str(selector).partition('=')
+            self.labels.append((key, value if sep else None))
+        self.patterns = []
+        for pattern in discovery.get('names') or []:
+            if pattern.startswith('re:'):
+                self.patterns.append(re.compile(pattern[3:]))
+            else:
+                self.patterns.append(re.compile(fnmatch.translate(pattern)))
+
+    def matches(self, info: dict) -> bool:
+        """
+        判断容器是否需要监控
+
+        Args:
+            info: 容器元数据（name, full_id, labels）
+
+        Returns:
+            是否监控
+        """
+        name = info['name']
+        full_id = info['full_id']
+        for ref in self.containers:
+            if ref.lstrip('/') == name or (len(ref) >= 12 and full_id.startswith(ref)):
+                return True
+        if not self.discovery:
+            return False
+        labels = info.get('labels') or {}
+        for key, value in self.labels:
+            if key not in labels or (value is not None and labels[key] != value):
+                return False
+        if self.patterns and not any(pattern.match(name) for pattern in self.patterns):
+            return False
+        return True
+
 
 class DockerLogMonitor:
     """Docker 容器日志监控器"""
 
     def __init__(self, containers: List[str], error_callback: Callable,
-                 tail: str = "latest", follow: bool = True, timestamps: bool = True):
+                 tail: str = "latest", follow: bool = True, timestamps: bool = True,
+                 discovery: Optional[dict] = None, checkpoints: Optional[CheckpointStore] = None):
         """
         初始化 Docker 日志监控器
 
@@ -25,101 +123,458 @@ class DockerLogMonitor:
             tail: 从哪里开始读取日志 ("latest" 或数字)
             follow: 是否持续跟随日志流
             timestamps: 是否包含时间戳
+            discovery: 按标签和名称模式自动发现容器的配置，见 ContainerSelector
+            checkpoints: 日志读取位置检查点，启动时从上次处理到的位置继续读取
         """
         self.containers = containers
         self.error_callback = error_callback
         self.tail = tail
         self.follow = follow
         self.timestamps = timestamps
+        self.selector = ContainerSelector(containers, discovery)
+        self.checkpoints = checkpoints
         self.client = None
-        self.monitor_threads = []
+        # 容器元数据缓存，连接成功后填充并订阅 Docker 事件保持更新
+        self.container_cache = None
         self.stop_flag = threading.Event()
 
+        # 正在读取日志的容器: 完整容器 ID -> 读取线程
+        self.followers: Dict[str, threading.Thread] = {}
+        self.streams: Dict[str, object] = {}
+        self.followers_lock = threading.Lock()
+        # 读取结束后需要重新接入的容器（读取线程还没退出时容器又启动了）: 完整容器 ID -> (容器元数据, since)
+        self.pending_reattach: Dict[str, Tuple[dict, Optional[int]]] = {}
+        # 已要求停止、但日志流还没打开的容器
+        self.detaching = set()
+        # 已删除、等读取结束后清理的容器
+        self.removed = set()
+        # 每个容器读到的最大日志纳秒时间戳，重新接入时从这里继续
+        self.positions: Dict[str, int] = {}
+        # 时间戳等于读取位置的已读行数，时间戳相同的多行重新读取时只跳过已读的几行
+        self.position_lines: Dict[str, int] = {}
+        # 刚打开、还在重读旧日志的日志流: 完整容器 ID -> [打开时的读取位置, 该时刻还要跳过的行数]，
+        # 读到更新的行之前跳过已读过的行
+        self.resuming: Dict[str, list] = {}
+        # 容器当前名称（重命名后更新）
+        self.names: Dict[str, str] = {}
+
+        # 统计信息
+        self.attached = 0
+        self.detached = 0
+        self.reattached = 0
+        self.duplicates_skipped = 0
+        # 每个容器读取的日志行数，每行都要更新，按线程分片计数
+        self.lines_read = ShardedCounter()
+
     def connect(self):
         """连接到 Docker 守护进程"""
         try:
             self.client = docker.from_env()
             self.client.ping()
             logger.info("成功连接到 Docker 守护进程")
+            self.container_cache = ContainerMetadataCache(self.client)
+            self.container_cache.start()
             return True
         except Exception as e:
             logger.error(f"连接 Docker 守护进程失败: {e}")
             return False
 
     def start_monitoring(self):
-        """开始监控所有配置的容器"""
+        """开始监控所有配置的容器，并按 Docker 事件接入新启动的容器"""
         if not self.client:
             if not self.connect():
                 raise Exception("无法连接到 Docker 守护进程")
 
-        logger.info(f"开始监控 {len(self.containers)} 个容器的日志")
+        if self.selector.discovery:
+            logger.info(f"开始监控 {len(self.containers)} 个固定容器，并自动发现匹配的容器")
+        else:
+            logger.info(f"开始监控 {len(self.containers)} 个容器的日志")
+
+        if self.checkpoints is not None:
+            self.checkpoints.start(self.checkpoint_positions)
+        self.container_cache.add_listener(self._on_container_event)
+        self.reconcile()
+
+    def checkpoint_positions(self) -> Dict[str, tuple]:
+        """
+        当前读取位置，供检查点定期保存
+
+        Returns:
+            容器名 -> (完整容器 ID, 纳秒时间戳, 该时刻已读的行数)
+        """
+        positions = self.positions.copy()
+        lines = self.position_lines.copy()
+        names = self.names.copy()
+        return {names[container_id]: (container_id, position, lines.get(container_id, 1))
+                for container_id, position in positions.items() if container_id in names}
+
+    def resume_position(self, info: dict) -> Optional[int]:
+        """
+        容器的续读位置: 本次运行中读到的位置，或者上次运行保存的检查点
+
+        Args:
+            info: 容器元数据
+
+        Returns:
+            纳秒时间戳，没有时返回 None
+        """
+        container_id = info['full_id']
+        position = self.positions.get(container_id)
+        if position is None and self.checkpoints is not None:
+            saved = self.checkpoints.get(info['name'])
+            if saved is not None:
+                # since 包含该时刻，检查点那一时刻已读的几行重新读到时跳过
+                position, lines = saved
+                self.position_lines.setdefault(container_id, lines)
+                self.positions.setdefault(container_id, position)
+        return position
+
+    def reconcile(self) -> int:
+        """
+        接入所有正在运行且需要监控、但还没有读取日志的容器
+
+        Returns:
+            接入的容器数
+        """
+        attached = 0
+        candidates = {info['full_id']: info for info in self.container_cache.list()}
+        # 固定列表中的容器可能以 ID 前缀等形式给出，逐个查询一次
+        for ref in self.containers:
+            info = self.container_cache.get(ref)
+            if info:
+                candidates[info['full_id']] = info
+        for info in candidates.values():
+            if info['status'] == 'running' and self.selector.matches(info) and not self.is_following(info['full_id']):
+                self.attach(info, self.resume_position(info))
+                attached += 1
+        return attached
+
+    def update_selection(self, containers: List[str], discovery: Optional[dict] = None) -> Tuple[int, int]:
+        """
+        替换监控的容器集合（配置重新加载时调用）
+
+        新的选择器构建完成后一次赋值替换；不再匹配的容器断开，新匹配的正在运行的容器接入，
+        其余容器的日志流不受影响。断开的容器保留读取位置，之后重新匹配时从该位置继续读取
+
+        Args:
+            containers: 固定监控的容器名称或 ID 列表
+            discovery: 自动发现配置，见 ContainerSelector
+
+        Returns:
+            (接入的容器数, 断开的容器数)
+        """
+        selector = ContainerSelector(containers, discovery)
+        self.containers = selector.containers
+        self.selector = selector
+        if self.container_cache is None:
+            return 0, 0
+        detached = 0
+        for container_id in self.following_ids():
+            info = self.container_cache.get(container_id)
+            if info and not selector.matches(info):
+                self.detach(container_id)
+                detached += 1
+        return self.reconcile(), detached
+
+    def _on_container_event(self, action: str, container_id: str, info: Optional[dict], event: dict):
+        """
+        处理容器事件（在 Docker 事件线程中调用）
+
+        Args:
+            action: start / die / rename / destroy / refresh
+            container_id: 完整容器 ID
+            info: 更新后的容器元数据，destroy 时为删除前的数据
+            event: 原始事件
+        """
+        if action == 'refresh':
+            self.reconcile()
+        elif action == 'start':
+            if info and self.selector.matches(info):
+                # 重启的容器从上次读到的位置继续，新容器从启动时刻开始读，不会漏掉启动后立即输出的日志
+                since = self.resume_position(info) or event.get('timeNano')
+                self.attach(info, since)
+        elif action == 'rename':
+            if not info:
+                return
+            self.names[container_id] = info['name']
+            following = self.is_following(container_id)
+            if following and not self.selector.matches(info):
+                self.detach(container_id)
+            elif not following and info['status'] == 'running' and self.selector.matches(info):
+                self.attach(info, self.resume_position(info))
+        elif action == 'destroy':
+            self._container_removed(container_id)
+        # die 和 destroy 时不主动断开: Docker 会在输出完容器退出前的日志后结束日志流，提前断开会丢掉最后的错误日志
+
+    def _container_removed(self, container_id: str):
+        """容器已删除: 不再重新接入，读取结束后清理读取位置"""
+        with self.followers_lock:
+            self.pending_reattach.pop(container_id, None)
+            if container_id in self.followers:
+                self.removed.add(container_id)
+                return
+        self._forget(container_id)
+
+    def _forget(self, container_id: str):
+        """清理已删除容器的读取位置和名称"""
+        self.positions.pop(container_id, None)
+        self.position_lines.pop(container_id, None)
+        self.resuming.pop(container_id, None)
+        self.names.pop(container_id, None)
+
+    def is_following(self, container_id: str) -> bool:
+        """容器是否正在读取日志"""
+        with self.followers_lock:
+            return container_id in self.followers
+
+    def following_ids(self) -> List[str]:
+        """正在读取日志的容器 ID"""
+        with self.followers_lock:
+            return list(self.followers)
 
-        for container_ref in self.containers:
+    def attach(self, info: dict, since: Optional[int] = None):
+        """
+        开始读取容器日志
+
+        Args:
+            info: 容器元数据
+            since: 从该纳秒时间戳开始读取，None 时按 tail 设置读取
+        """
+        container_id = info['full_id']
+        with self.followers_lock:
+            if self.stop_flag.is_set():
+                return
+            self.names[container_id] = info['name']
+            if container_id in self.followers:
+                # 上一次的读取还没结束（容器刚重启），结束后再接入
+                self.pending_reattach[container_id] = (info, since)
+                return
             thread = threading.Thread(
                 target=self._monitor_container,
-                args=(container_ref,),
+                args=(info, since),
+                name=f"logs-{info['name']}",
                 daemon=True
             )
-            thread.start()
-            self.monitor_threads.append(thread)
-            logger.info(f"已启动容器 '{container_ref}' 的监控线程")
+            self.followers[container_id] = thread
+        self.attached += 1
+        thread.start()
+
+    def detach(self, container_id: str):
+        """
+        停止读取容器日志
+
+        Args:
+            container_id: 完整容器 ID
+        """
+        with self.followers_lock:
+            self.pending_reattach.pop(container_id, None)
+            if container_id not in self.followers:
+                return
+            stream = self.streams.get(container_id)
+            if stream is None:
+                # 日志流还没打开，打开后立即关闭
+                self.detaching.add(container_id)
+        self.detached += 1
+        if stream is not None:
+            self._close_stream(stream)
+
+    def _register_stream(self, container_id: str, stream) -> bool:
+        """
+        登记已打开的日志流
+
+        Args:
+            container_id: 完整容器 ID
+            stream: 日志流
+
+        Returns:
+            是否继续读取（打开期间已被要求停止时返回 False）
+        """
+        with self.followers_lock:
+            self.streams[container_id] = stream
+            if container_id in self.detaching or self.stop_flag.is_set():
+                self.detaching.discard(container_id)
+                return False
+            return True
+
+    def _finish_follow(self, container_id: str) -> Tuple[Optional[dict], Optional[int]]:
+        """
+        读取结束后的清理，返回需要重新接入的容器元数据和起始位置
+
+        Args:
+            container_id: 完整容器 ID
+
+        Returns:
+            (容器元数据, 起始纳秒时间戳)；不需要重新接入时容器元数据为 None（此时不再视为正在读取）
+        """
+        with self.followers_lock:
+            self.streams.pop(container_id, None)
+            self.detaching.discard(container_id)
+            pending = self.pending_reattach.pop(container_id, None)
+            if pending is None or self.stop_flag.is_set():
+                self.followers.pop(container_id, None)
+                removed = container_id in self.removed
+                self.removed.discard(container_id)
+                pending = None
+        if pending is None:
+            if removed:
+                self._forget(container_id)
+            return None, None
+        self.attached += 1
+        self.reattached += 1
+        info, since = pending
+        return info, self.positions.get(container_id) or since
+
+    @staticmethod
+    def _close_stream(stream):
+        """关闭日志流，释放连接"""
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+    def _tail_param(self, since: Optional[int]):
+        """计算 Docker API 的 tail 参数"""
+        if since:
+            return 'all'
+        if self.tail == 'latest':
+            return 0
+        if str(self.tail).isdigit():
+            return int(self.tail)
+        return 'all'
+
+    def _begin_stream(self, container_id: str):
+        """
+        新的日志流开始读取（在处理日志行的线程中调用）: 读到没读过的行之前，早于读取位置的行，
+        以及与读取位置时间戳相同的前几行（已读的行数）是 since= 重新读到的日志
+
+        Args:
+            container_id: 完整容器 ID
+        """
+        position = self.positions.get(container_id)
+        if position is None:
+            self.resuming.pop(container_id, None)
+        else:
+            self.resuming[container_id] = [position, self.position_lines.get(container_id, 1)]
+
+    def handle_log_line(self, container_id: str, short_id: str, log_text: str):
+        """
+        处理一行日志: 跳过重新接入后重复读到的行，记录读取位置，以 Docker 日志时间戳作为事件时间调用回调
+
+        Args:
+            container_id: 完整容器 ID
+            short_id: 短容器 ID
+            log_text: 带 Docker 时间戳的日志行
+        """
+        timestamp, content = split_docker_timestamp(log_text)
+        if timestamp is not None:
+            resume = self.resuming.get(container_id)
+            if resume is not None:
+                resume_from, repeated = resume
+                if timestamp < resume_from or (timestamp == resume_from and repeated > 0):
+                    if timestamp == resume_from:
+                        resume[1] -= 1
+                    self.duplicates_skipped += 1
+                    return
+                # 读到没读过的行，重读部分结束，之后不再按位置跳过
+                self.resuming.pop(container_id, None)
+            # Docker 分别给 stdout 和 stderr 打时间戳，合并后的日志流不严格递增，读取位置只取最大值。
+            # 读取位置在交给回调之前更新: 检查点记录的是读到的位置，而不是处理完的位置（见 docker.checkpoint 配置说明）。
+            # 先更新行数再更新位置，检查点线程读到的行数不会多于新位置实际读过的行
+            position = self.positions.get(container_id, 0)
+            if timestamp > position:
+                self.position_lines[container_id] = 1
+                self.positions[container_id] = timestamp
+            elif timestamp == position:
+                self.position_lines[container_id] = self.position_lines.get(container_id, 0) + 1
+        if not self.timestamps:
+            log_text = content.strip()
+        if log_text:
+            container_name = self.names.get(container_id, short_id)
+            self.lines_read.inc(container_name)
+            self.error_callback(
+                container_name=container_name,
+                container_id=short_id,
+                log_line=log_text,
+                timestamp=datetime.fromtimestamp(timestamp / 1e9) if timestamp is not None else datetime.now()
+            )
 
     def stop_monitoring(self):
         """停止监控所有容器"""
         logger.info("正在停止日志监控...")
         self.stop_flag.set()
 
-        for thread in self.monitor_threads:
+        with self.followers_lock:
+            self.pending_reattach.clear()
+            streams = list(self.streams.values())
+            threads = list(self.followers.values())
+        for stream in streams:
+            self._close_stream(stream)
+        for thread in threads:
             thread.join(timeout=5)
 
+        if self.checkpoints is not None:
+            self.checkpoints.stop()
+        if self.container_cache is not None:
+            self.container_cache.stop()
+
         logger.info("所有监控线程已停止")
 
-    def _monitor_container(self, container_ref: str):
+    def _monitor_container(self, info: dict, since: Optional[int] = None):
         """
         监控单个容器的日志
 
         Args:
-            container_ref: 容器名称或 ID
+            info: 容器元数据
+            since: 从该纳秒时间戳开始读取
         """
-        try:
-            container = self.client.containers.get(container_ref)
-            logger.info(f"开始监控容器: {container.name} ({container.short_id})")
-
-            # 获取日志流
-            log_stream = container.logs(
-                stream=True,
-                follow=self.follow,
-                tail=self.tail if self.tail != "latest" else "0",
-                timestamps=self.timestamps
-            )
-
-            for log_line in log_stream:
-                if self.stop_flag.is_set():
-                    break
+        container_id = info['full_id']
+        while info:
+            name = info['name']
+            try:
+                logger.info(f"开始监控容器: {name} ({info['id']})")
 
+                # 始终请求时间戳，用于重新接入时定位；timestamps 关闭时在回调前去掉
+                log_stream = self.client.api.logs(
+                    container_id,
+                    stream=True,
+                    follow=self.follow,
+                    timestamps=True,
+                    tail=self._tail_param(since),
+                    # SDK 只接受浮点秒数: 截到微秒，浮点数可以精确表示，不会因舍入越过检查点；
+                    # 同一微秒内已处理过的行由 handle_log_line 按纳秒时间戳跳过
+                    since=(since // 1000) / 1e6 if since else None
+                )
                 try:
-                    # 解码日志行
-                    log_text = log_line.decode('utf-8').strip()
-
-                    if log_text:
-                        # 调用回调函数处理日志行
-                        self.error_callback(
-                            container_name=container.name,
-                            container_id=container.short_id,
-                            log_line=log_text,
-                            timestamp=datetime.now()
-                        )
-                except Exception as e:
-                    logger.error(f"处理容器 {container.name} 的日志时出错: {e}")
-
-        except docker.errors.NotFound:
-            logger.error(f"容器未找到: {container_ref}")
-        except Exception as e:
-            logger.error(f"监控容器 {container_ref} 时发生错误: {e}")
+                    # 打开期间已被要求停止时不再读取
+                    lines = log_stream if self._register_stream(container_id, log_stream) else ()
+                    self._begin_stream(container_id)
+                    for log_line in lines:
+                        if self.stop_flag.is_set():
+                            break
+
+                        try:
+                            # 解码日志行
+                            log_text = log_line.decode('utf-8').strip()
+                            if log_text:
+                                self.handle_log_line(container_id, info['id'], log_text)
+                        except Exception as e:
+                            logger.error(f"处理容器 {name} 的日志时出错: {e}")
+                finally:
+                    self._close_stream(log_stream)
+
+                logger.info(f"容器 {name} 的日志流已结束")
+
+            except docker.errors.NotFound:
+                logger.error(f"容器未找到: {name}")
+            except Exception as e:
+                logger.error(f"监控容器 {name} 时发生错误: {e}")
+
+            # 读取期间容器重启过，在同一线程中从上次位置继续
+            info, since = self._finish_follow(container_id)
 
     def get_container_info(self, container_ref: str) -> Optional[dict]:
         """
-        获取容器信息
+        获取容器信息，优先从元数据缓存读取
 
         Args:
             container_ref: 容器名称或 ID
@@ -127,6 +582,9 @@ class DockerLogMonitor:
         Returns:
             容器信息字典或 None
         """
+        if self.container_cache is not None:
+            return self.container_cache.get(container_ref)
+
         try:
             container = self.client.containers.get(container_ref)
             return {
@@ -138,3 +596,20 @@ class DockerLogMonitor:
         except Exception as e:
             logger.error(f"获取容器信息失败: {e}")
             return None
+
+    def get_metrics(self) -> dict:
+        """
+        获取日志读取统计信息
+
+        Returns:
+            统计信息字典
+        """
+        with self.followers_lock:
+            following = len(self.followers)
+        return {
+            'following': following,
+            'attached': self.attached,
+            'detached': self.detached,
+            'reattached': self.reattached,
+            'duplicates_skipped': self.duplicates_skipped
+        }
@@ -2,18 +2,136 @@
 Azure OpenAI 错误分析模块
 使用 AI 分析 Docker 容器错误日志
 """
+import hashlib
+import json
 import logging
-from typing import Optional
+import time
+from typing import Dict, List, Optional, Tuple
 from openai import AzureOpenAI
 
+from analysis_cache import AnalysisCache
+from dedup_cache import make_key
+from metrics import Histogram
+from template_miner import mask_line
+
 logger = logging.getLogger(__name__)
 
+# 提示词版本，修改提示词后递增，旧的缓存结果随之失效
+PROMPT_VERSION = '1'
+
+SYSTEM_PROMPT = """你是一个专业的运维和开发专家，擅长分析容器错误日志。
+请根据提供的错误日志，分析并给出：
+1. **错误类型**: 简要说明这是什么类型的错误
+2. **可能原因**: 列出 2-3 个最可能的原因
+3. **解决建议**: 提供具体的解决方案或排查方向
+
+请用中文回答，简洁明了，突出重点。"""
+
+BATCH_SYSTEM_PROMPT = """你是一个专业的运维和开发专家，擅长分析容器错误日志。
+下面给出多条相互独立、带编号的错误日志，请逐条分析。
+只输出一个 JSON 数组，不要输出任何其它内容。数组中每个元素对应一条日志，格式为:
+{"id": 编号, "error_type": "错误类型", "causes": ["可能原因1", "可能原因2"], "solution": "解决建议"}
+
+请用中文回答，每条简洁明了，原因 2-3 个，建议不超过 200 字。"""
+
+# 批量请求中每条错误预留的输出 token 数，以及单次请求的上限
+BATCH_TOKENS_PER_ERROR = 300
+BATCH_MAX_TOKENS = 4096
+
+# 超过分析时限时的分析结果，通知照常发送
+ANALYSIS_TIMEOUT_MESSAGE = "AI 分析超时，已跳过"
+# 分析未完成（服务不可用、失败、超时）时结果的统一前缀
+ANALYSIS_FAILURE_PREFIX = "AI 分析"
+
+
+class AnalysisTimeout(TimeoutError):
+    """AI 分析超过时限"""
+
+
+def is_analysis_failure(analysis: Optional[str]) -> bool:
+    """
+    判断分析结果是否表示分析未完成
+
+    Args:
+        analysis: analyze_error 或 analyze_error_batch 返回的分析结果
+
+    Returns:
+        是否需要稍后重新分析
+    """
+    return not analysis or analysis.startswith(ANALYSIS_FAILURE_PREFIX)
+
+
+def format_batch_item(item: dict) -> str:
+    """
+    把批量分析中的一条结果格式化为与单条分析相同的 Markdown 格式
+
+    Args:
+        item: JSON 数组中的一个元素
+
+    Returns:
+        分析结果
+    """
+    causes = item.get('causes') or []
+    if isinstance(causes, str):
+        causes = [causes]
+    lines = [f"**错误类型**: {item.get('error_type', '未知')}", '', '**可能原因**:']
+    lines.extend(f"{i}. {cause}" for i, cause in enumerate(causes, 1))
+    lines.extend(['', f"**解决建议**: {item.get('solution', '')}"])
+    return '\n'.join(lines)
+
+
+def parse_batch_response(content: str, count: int) -> List[Optional[str]]:
+    """
+    解析批量分析返回的 JSON 数组
+
+    Args:
+        content: 模型返回的内容，可能带有 Markdown 代码块
+        count: 请求中的错误条数
+
+    Returns:
+        按编号排列的分析结果，缺失或格式不对的条目为 None
+
+    Raises:
+        ValueError: 返回内容不是 JSON 数组
+    """
+    start, end = content.find('['), content.rfind(']')
+    if start < 0 or end < start:
+        raise ValueError("返回内容中没有 JSON 数组")
+    items = json.loads(content[start:end + 1])
+    if not isinstance(items, list):
+        raise ValueError("返回内容不是 JSON 数组")
+
+    results: List[Optional[str]] = [None] * count
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item.get('id')) - 1
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < count and item.get('error_type'):
+            results[index] = format_batch_item(item)
+    return results
+
+
+def error_fingerprint(error_log: str) -> str:
+    """
+    未提供日志模板 ID 时，用掩码后的日志内容生成错误指纹
+
+    Args:
+        error_log: 错误日志内容
+
+    Returns:
+        指纹字符串
+    """
+    return hashlib.blake2b(mask_line(error_log).encode('utf-8', 'replace'), digest_size=8).hexdigest()
+
 
 class ErrorAnalyzer:
     """使用 Azure OpenAI 分析错误的分析器"""
 
     def __init__(self, endpoint: str, api_key: str, deployment_name: str,
-                 api_version: str = "2024-02-15-preview"):
+                 api_version: str = "2024-02-15-preview", cache: Optional[AnalysisCache] = None):
         """
         初始化错误分析器
 
@@ -22,12 +140,23 @@ class ErrorAnalyzer:
             api_key: API 密钥
             deployment_name: 模型部署名称
             api_version: API 版本
+            cache: 分析结果缓存，None 表示不缓存
         """
         self.endpoint = endpoint
         self.api_key = api_key
         self.deployment_name = deployment_name
         self.api_version = api_version
         self.client = None
+        self.cache = cache
+
+        # 统计信息
+        self.requests = 0
+        self.batch_requests = 0
+        self.batched_errors = 0
+        self.batch_fallbacks = 0
+        self.api_failures = 0
+        self.tokens = 0
+        self.request_latency = Histogram()
 
     def connect(self):
         """初始化 Azure OpenAI 客户端"""
@@ -44,7 +173,7 @@ class ErrorAnalyzer:
             return False
 
     def analyze_error(self, error_log: str, container_name: str,
-                      container_image: str = "unknown") -> Optional[str]:
+                      container_image: str = "unknown", fingerprint: Optional[str] = None) -> Optional[str]:
         """
         分析错误日志并返回分析结果
 
@@ -52,6 +181,7 @@ class ErrorAnalyzer:
             error_log: 错误日志内容
             container_name: 容器名称
             container_image: 容器镜像
+            fingerprint: 日志模板 ID，同一镜像同一模板的错误复用已有的分析结果
 
         Returns:
             分析结果字符串或 None
@@ -61,16 +191,65 @@ class ErrorAnalyzer:
                 return "AI 分析服务不可用"
 
         try:
-            # 构建分析提示
-            system_prompt = """你是一个专业的运维和开发专家，擅长分析容器错误日志。
-请根据提供的错误日志，分析并给出：
-1. **错误类型**: 简要说明这是什么类型的错误
-2. **可能原因**: 列出 2-3 个最可能的原因
-3. **解决建议**: 提供具体的解决方案或排查方向
+            if self.cache is None:
+                return self._request_analysis(error_log, container_name, container_image)
+            key = self.cache_key(fingerprint or error_fingerprint(error_log), container_image)
+            return self.cache.get_or_compute(
+                key, lambda: self._request_analysis(error_log, container_name, container_image)
+            )
+        except AnalysisTimeout:
+            logger.warning(f"分析错误日志超时，不等待分析结果: [{container_name}]")
+            return ANALYSIS_TIMEOUT_MESSAGE
+        except Exception as e:
+            logger.error(f"分析错误日志失败: {e}")
+            return f"AI 分析失败: {str(e)}"
 
-请用中文回答，简洁明了，突出重点。"""
+    def cache_key(self, fingerprint: str, container_image: str) -> bytes:
+        """
+        生成分析结果的缓存键
+
+        Args:
+            fingerprint: 错误指纹（日志模板 ID）
+            container_image: 容器镜像
 
-            user_prompt = f"""容器信息:
+        Returns:
+            缓存键
+        """
+        # 模型部署和提示词版本也会改变分析结果
+        return make_key(fingerprint, container_image, self.deployment_name, PROMPT_VERSION)
+
+    def _request_analysis(self, error_log: str, container_name: str, container_image: str) -> str:
+        """
+        调用 Azure OpenAI 分析错误日志，失败时抛出异常
+
+        Args:
+            error_log: 错误日志内容
+            container_name: 容器名称
+            container_image: 容器镜像
+
+        Returns:
+            分析结果
+        """
+        analysis, total_tokens = self._call_api(
+            self._analysis_messages(error_log, container_name, container_image), max_tokens=1000
+        )
+        self.requests += 1
+        logger.info(f"成功分析错误日志 (token 使用: {total_tokens})")
+        return analysis
+
+    def _analysis_messages(self, error_log: str, container_name: str, container_image: str) -> List[dict]:
+        """
+        生成分析单条错误的对话消息
+
+        Args:
+            error_log: 错误日志内容
+            container_name: 容器名称
+            container_image: 容器镜像
+
+        Returns:
+            对话消息
+        """
+        user_prompt = f"""容器信息:
 - 容器名称: {container_name}
 - 容器镜像: {container_image}
 
@@ -81,44 +260,171 @@ class ErrorAnalyzer:
 
 请分析这个错误。"""
 
-            # 调用 Azure OpenAI API
-            response = self.client.chat.completions.create(
-                model=self.deployment_name,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.3,
-                max_tokens=1000
-            )
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ]
 
-            analysis = response.choices[0].message.content
-            logger.info(f"成功分析错误日志 (token 使用: {response.usage.total_tokens})")
-            return analysis
+    def _request_batch(self, errors: List[dict]) -> List[Optional[str]]:
+        """
+        在一个请求中分析多条错误，失败时抛出异常
 
-        except Exception as e:
-            logger.error(f"分析错误日志失败: {e}")
-            return f"AI 分析失败: {str(e)}"
+        Args:
+            errors: 错误列表，每个错误包含 error_log, container_name, container_image
+
+        Returns:
+            按顺序排列的分析结果，模型没有给出的条目为 None
+        """
+        sections = []
+        for i, error in enumerate(errors, 1):
+            sections.append(f"""### 错误 {i}
+- 容器名称: {error.get('container_name', 'unknown')}
+- 容器镜像: {error.get('container_image', 'unknown')}
+```
+{error.get('error_log', '')}
+```""")
+        user_prompt = '\n\n'.join(sections) + f"\n\n请按编号 1 到 {len(errors)} 逐条分析这些错误。"
+
+        content, total_tokens = self._call_api([
+            {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ], max_tokens=min(BATCH_MAX_TOKENS, BATCH_TOKENS_PER_ERROR * len(errors) + 200))
+        self.batch_requests += 1
+        self.batched_errors += len(errors)
+        logger.info(f"成功批量分析 {len(errors)} 条错误日志 (token 使用: {total_tokens})")
+        return parse_batch_response(content or '', len(errors))
 
-    def analyze_error_batch(self, errors: list) -> list:
+    def _call_api(self, messages: List[dict], max_tokens: int) -> Tuple[str, int]:
+        """
+        调用 _complete，并记录接口耗时、token 用量和失败次数
+
+        Args:
+            messages: 对话消息
+            max_tokens: 最大输出 token 数
+
+        Returns:
+            (回复内容, 总 token 数)
+        """
+        start = time.monotonic()
+        try:
+            content, total_tokens = self._complete(messages, max_tokens)
+        except Exception:
+            self.api_failures += 1
+            raise
+        finally:
+            self.request_latency.observe(time.monotonic() - start)
+        self.tokens += total_tokens or 0
+        return content, total_tokens
+
+    def _complete(self, messages: List[dict], max_tokens: int) -> Tuple[str, int]:
+        """
+        调用 Azure OpenAI chat completions 接口，失败时抛出异常
+
+        Args:
+            messages: 对话消息
+            max_tokens: 最大输出 token 数
+
+        Returns:
+            (回复内容, 总 token 数)
+        """
+        response = self.client.chat.completions.create(
+            model=self.deployment_name,
+            messages=messages,
+            temperature=0.3,
+            max_tokens=max_tokens
+        )
+        return response.choices[0].message.content, response.usage.total_tokens
+
+    def analyze_error_batch(self, errors: list, max_batch: int = 20) -> list:
         """
         批量分析多个错误
 
+        先查缓存，同一指纹和镜像的错误只分析一次，其余错误每 max_batch 条合并为一个请求，
+        要求模型返回 JSON 数组；解析失败或缺少的条目退回逐条请求
+
         Args:
             errors: 错误列表，每个错误是一个包含 error_log, container_name 等信息的字典
+            max_batch: 单个请求最多包含的错误数
 
         Returns:
             分析结果列表
         """
-        results = []
-        for error in errors:
-            analysis = self.analyze_error(
-                error_log=error.get('error_log', ''),
-                container_name=error.get('container_name', 'unknown'),
-                container_image=error.get('container_image', 'unknown')
-            )
-            results.append({
-                'error': error,
-                'analysis': analysis
-            })
-        return results
+        if not self.client and not self.connect():
+            return [{'error': error, 'analysis': "AI 分析服务不可用"} for error in errors]
+
+        analyses: List[Optional[str]] = [None] * len(errors)
+        # 缓存键 -> 使用该结果的错误下标
+        pending: Dict[bytes, List[int]] = {}
+        for i, error in enumerate(errors):
+            key = self.cache_key(error.get('template_id') or error_fingerprint(error.get('error_log', '')),
+                                 error.get('container_image', 'unknown'))
+            if key in pending:
+                pending[key].append(i)
+                continue
+            cached = self.cache.get(key) if self.cache else None
+            if cached is not None:
+                analyses[i] = cached
+            else:
+                pending[key] = [i]
+
+        keys = list(pending)
+        for start in range(0, len(keys), max(1, max_batch)):
+            chunk = keys[start:start + max_batch]
+            chunk_errors = [errors[pending[key][0]] for key in chunk]
+            results: List[Optional[str]] = [None] * len(chunk)
+            timed_out = False
+            if len(chunk) > 1:
+                try:
+                    results = self._request_batch(chunk_errors)
+                except AnalysisTimeout:
+                    # 超时后逐条重试只会更慢，直接放弃这一批的分析
+                    logger.warning(f"批量分析 {len(chunk)} 条错误超时，不等待分析结果")
+                    timed_out = True
+                except Exception as e:
+                    logger.warning(f"批量分析 {len(chunk)} 条错误失败，改为逐条分析: {e}")
+
+            for key, error, analysis in zip(chunk, chunk_errors, results):
+                cacheable = True
+                if timed_out:
+                    analysis = ANALYSIS_TIMEOUT_MESSAGE
+                    cacheable = False
+                elif analysis is None:
+                    if len(chunk) > 1:
+                        self.batch_fallbacks += 1
+                    try:
+                        analysis = self._request_analysis(
+                            error.get('error_log', ''),
+                            error.get('container_name', 'unknown'),
+                            error.get('container_image', 'unknown')
+                        )
+                    except AnalysisTimeout:
+                        analysis = ANALYSIS_TIMEOUT_MESSAGE
+                        cacheable = False
+                    except Exception as e:
+                        logger.error(f"分析错误日志失败: {e}")
+                        analysis = f"AI 分析失败: {str(e)}"
+                        cacheable = False
+                if self.cache and cacheable and analysis:
+                    self.cache.put(key, analysis)
+                for i in pending[key]:
+                    analyses[i] = analysis
+
+        return [{'error': error, 'analysis': analysis} for error, analysis in zip(errors, analyses)]
+
+    def get_metrics(self) -> dict:
+        """
+        获取 API 调用和分析结果缓存统计信息
+
+        Returns:
+            统计信息字典，cache 为缓存统计（未启用缓存时为 None）
+        """
+        return {
+            'requests': self.requests,
+            'batch_requests': self.batch_requests,
+            'batched_errors': self.batched_errors,
+            'batch_fallbacks': self.batch_fallbacks,
+            'api_failures': self.api_failures,
+            'tokens': self.tokens,
+            'request_latency': self.request_latency.snapshot(),
+            'cache': self.cache.get_metrics() if self.cache else None
+        }
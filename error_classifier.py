@@ -0,0 +1,282 @@
+"""
+错误类型分类模块
+按运行时划分的规则包（JVM、Python、Go、Node、nginx、通用）加上配置中的自定义规则，按优先级排序后
+逐条搜索，第一条命中的规则决定错误类型；命中规则的捕获值通过映射表或模板转换为错误类型。
+规则文件修改后可热加载，编译失败时保留原有规则
+"""
+import logging
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# 内置规则包。每条规则:
+#   name: 规则名
+#   pattern: 正则（多行模式，^ 和 $ 匹配每一行的开头和结尾），命名分组用于错误类型
+#   type: 错误类型模板，可引用命名分组，如 "HTTP {status}"；省略时取第一个命名分组
+#   map: 第一个命名分组的取值 -> 错误类型，未列出的取值使用 type
+#   ignore_case: 是否不区分大小写
+#   last: 同一规则多次命中时取最后一次（Python 异常链中最后抛出的异常）
+BUILTIN_PACKS: Dict[str, List[dict]] = {
+    'go': [
+        {'name': 'go_runtime_error',
+         'pattern': r'panic(?: serving \S+)?: runtime error: (?P<detail>[^\[\n:]+?)\s*(?:\[|:|$)',
+         'type': 'Go RuntimeError',
+         'map': {'invalid memory address or nil pointer dereference': 'Go NilPointerDereference',
+                 'index out of range': 'Go IndexOutOfRange',
+                 'slice bounds out of range': 'Go SliceBoundsOutOfRange',
+                 'integer divide by zero': 'Go DivideByZero'}},
+        {'name': 'go_fatal_error',
+         'pattern': r'^fatal error: (?P<detail>[^\n]+?)\s*$',
+         'type': 'Go FatalError',
+         'map': {'all goroutines are asleep - deadlock!': 'Go Deadlock',
+                 'concurrent map writes': 'Go ConcurrentMapWrites',
+                 'concurrent map read and map write': 'Go ConcurrentMapWrites',
+                 'out of memory': 'Go OutOfMemory',
+                 'stack overflow': 'Go StackOverflow'}},
+        {'name': 'go_panic', 'pattern': r'^panic: ', 'type': 'Go Panic'},
+    ],
+    'nginx': [
+        {'name': 'nginx_upstream_timeout', 'pattern': r'upstream timed out\b', 'type': 'Upstream Timeout'},
+        {'name': 'nginx_connect_failed',
+         'pattern': r'connect\(\) (?:to \S+ )?failed \((?P<errno>\d+): ',
+         'type': 'Upstream Connect Failed',
+         'map': {'111': 'Upstream Connection Refused', '113': 'Upstream Host Unreachable',
+                 '110': 'Upstream Timeout'}},
+        {'name': 'nginx_no_live_upstreams', 'pattern': r'no live upstreams\b', 'type': 'No Live Upstreams'},
+        {'name': 'nginx_upstream_closed', 'pattern': r'upstream prematurely closed connection\b',
+         'type': 'Upstream Closed Connection'},
+        {'name': 'nginx_open_failed',
+         'pattern': r'open\(\) "[^"\n]*" failed \((?P<errno>\d+): ',
+         'type': 'File Open Failed',
+         'map': {'2': 'Not Found', '13': 'Permission Error'}},
+        {'name': 'nginx_access_5xx', 'pattern': r'"[A-Z]+ \S+ HTTP/[\d.]+" (?P<status>5\d\d) ',
+         'type': 'HTTP {status}'},
+        {'name': 'nginx_emerg', 'pattern': r'\[emerg\] \d+#\d+: ', 'type': 'Nginx Emergency'},
+    ],
+    'node': [
+        {'name': 'node_heap_oom', 'pattern': r'JavaScript heap out of memory', 'type': 'JavaScript Heap OOM'},
+        {'name': 'node_unhandled_rejection', 'pattern': r'UnhandledPromiseRejection(?:Warning)?\b',
+         'type': 'Unhandled Promise Rejection'},
+        {'name': 'node_error_code', 'pattern': r'Error \[(?P<code>ERR_[A-Z0-9_]+)\]'},
+        {'name': 'node_syscall',
+         'pattern': r'\b(?:connect|read|write|getaddrinfo|listen|open|spawn) (?P<code>E[A-Z_]{3,})\b',
+         'map': {'ECONNREFUSED': 'Connection Error', 'ECONNRESET': 'Connection Reset', 'ETIMEDOUT': 'Timeout',
+                 'ENOTFOUND': 'DNS Lookup Failed', 'EAI_AGAIN': 'DNS Lookup Failed',
+                 'EADDRINUSE': 'Address In Use', 'EACCES': 'Permission Error', 'ENOENT': 'Not Found'}},
+    ],
+    'python': [
+        # 调用栈末尾、顶格的异常行
+        {'name': 'python_exception',
+         'pattern': r'^(?:[A-Za-z_]\w*\.)*(?P<exception>[A-Z]\w*(?:Error|Exception|Exit|Interrupt)|StopIteration)'
+                    r'(?::|$)',
+         'last': True},
+    ],
+    'jvm': [
+        {'name': 'jvm_exception',
+         'pattern': r'(?<![\w$.])(?:[a-z_$][\w$]*\.)+(?P<exception>[A-Z][\w$]*(?:Exception|Error|Throwable))\b'
+                    r'(?![.$])'},
+    ],
+    'generic': [
+        {'name': 'http_status', 'pattern': r'[Hh][Tt][Tt][Pp]\s+(?P<status>\d{3})\b', 'type': 'HTTP {status}'},
+        {'name': 'exception_name', 'pattern': r'\b(?P<exception>[A-Za-z]\w*(?:Exception|Error))\b'},
+    ],
+}
+
+# 默认启用的规则包，按优先级排列: 特征明确的运行时规则在前，通用的异常名规则在最后
+DEFAULT_PACKS = ['go', 'nginx', 'node', 'python', 'jvm', 'generic']
+
+
+class _CompiledRule(NamedTuple):
+    """编译后的规则"""
+    name: str
+    pattern: 're.Pattern'
+    type: Optional[str]
+    mapping: Dict[str, str]
+    # 命名分组，按在正则中出现的顺序
+    groups: Tuple[str, ...]
+    last: bool
+
+
+def compile_rules(rules: Iterable[dict]) -> List[_CompiledRule]:
+    """
+    逐条编译规则
+
+    每条规则单独编译而不是合并为一个带命名分组的正则: 合并后的多路分支在每个位置都要逐一尝试，
+    单独的正则可以用开头的字面量快速跳过不可能匹配的位置，按优先级逐条搜索反而更快
+
+    Args:
+        rules: 规则列表，按优先级排列
+
+    Returns:
+        编译后的规则列表
+
+    Raises:
+        ValueError: 规则缺少 pattern 或正则无法编译
+    """
+    compiled = []
+    for index, rule in enumerate(rules):
+        name = rule.get('name', f'r{index}')
+        pattern = rule.get('pattern')
+        if not pattern:
+            raise ValueError(f"规则 {name} 缺少 pattern")
+        flags = re.MULTILINE | (re.IGNORECASE if rule.get('ignore_case') else 0)
+        try:
+            regex = re.compile(pattern, flags)
+        except re.error as e:
+            raise ValueError(f"规则 {name} 的正则无法编译: {e}") from e
+        groups = tuple(sorted(regex.groupindex, key=regex.groupindex.get))
+        compiled.append(_CompiledRule(
+            name=name,
+            pattern=regex,
+            type=rule.get('type') or (f'{{{groups[0]}}}' if groups else name),
+            mapping={str(key): value for key, value in (rule.get('map') or {}).items()},
+            groups=groups,
+            last=bool(rule.get('last'))
+        ))
+    return compiled
+
+
+class ErrorClassifier:
+    """表驱动的错误类型分类器（线程安全，规则整体替换）"""
+
+    def __init__(self, packs: Optional[Iterable[str]] = None, rules: Optional[List[dict]] = None,
+                 rules_file: Optional[str] = None):
+        """
+        初始化分类器
+
+        Args:
+            packs: 启用的内置规则包，按优先级排列
+            rules: 自定义规则，优先于内置规则包
+            rules_file: 自定义规则文件（YAML，rules: 列表），优先于 rules，修改后由 reload_if_changed 热加载
+        """
+        self.packs = list(packs) if packs is not None else list(DEFAULT_PACKS)
+        self.rules = list(rules or [])
+        self.rules_file = rules_file
+        self._file_mtime: Optional[float] = None
+        self._reload_lock = threading.Lock()
+
+        # 统计信息
+        self.reloads = 0
+        self.reload_failures = 0
+
+        self._state = compile_rules(self._collect(self._read_rules_file()))
+
+    def _read_rules_file(self) -> List[dict]:
+        """读取自定义规则文件并记录修改时间，文件不存在时返回空列表"""
+        if not self.rules_file:
+            return []
+        try:
+            self._file_mtime = os.path.getmtime(self.rules_file)
+        except OSError:
+            self._file_mtime = None
+            return []
+        with open(self.rules_file, 'r', encoding='utf-8') as f:
+            data = yaml.safe_load(f) or {}
+        return list(data.get('rules') or [])
+
+    def _collect(self, file_rules: List[dict]) -> List[dict]:
+        """按优先级合并规则: 规则文件、配置中的自定义规则、内置规则包"""
+        rules = file_rules + self.rules
+        for pack in self.packs:
+            if pack not in BUILTIN_PACKS:
+                raise ValueError(f"未知的规则包: {pack}")
+            rules.extend(BUILTIN_PACKS[pack])
+        return rules
+
+    def reload(self, packs: Optional[Iterable[str]] = None, rules: Optional[List[dict]] = None) -> bool:
+        """
+        重新编译规则并整体替换；编译失败时保留原有规则
+
+        Args:
+            packs: 新的规则包列表，为空时不变
+            rules: 新的自定义规则，为空时不变
+
+        Returns:
+            是否替换成功
+        """
+        with self._reload_lock:
+            old_packs, old_rules = self.packs, self.rules
+            if packs is not None:
+                self.packs = list(packs)
+            if rules is not None:
+                self.rules = list(rules)
+            try:
+                state = compile_rules(self._collect(self._read_rules_file()))
+            except Exception as e:
+                self.packs, self.rules = old_packs, old_rules
+                self.reload_failures += 1
+                logger.error(f"错误类型规则加载失败，继续使用原有规则: {e}")
+                return False
+            self._state = state
+            self.reloads += 1
+        logger.info(f"错误类型规则已重新加载: {len(state)} 条规则")
+        return True
+
+    def reload_if_changed(self) -> bool:
+        """
+        规则文件的修改时间变化时重新加载
+
+        Returns:
+            是否重新加载
+        """
+        if not self.rules_file:
+            return False
+        try:
+            mtime = os.path.getmtime(self.rules_file)
+        except OSError:
+            mtime = None
+        if mtime == self._file_mtime:
+            return False
+        return self.reload()
+
+    def classify(self, log_line: str) -> Optional[str]:
+        """
+        按优先级逐条搜索，返回第一条命中的规则得到的错误类型
+
+        Args:
+            log_line: 日志行或合并后的多行事件
+
+        Returns:
+            错误类型，没有规则命中时返回 None
+        """
+        for rule in self._state:
+            match = rule.pattern.search(log_line)
+            if match is None:
+                continue
+            if rule.last:
+                for match in rule.pattern.finditer(log_line, match.end()):
+                    pass
+            return self._error_type(rule, match)
+        return None
+
+    @staticmethod
+    def _error_type(rule: _CompiledRule, match: 're.Match') -> str:
+        """根据规则的映射表或类型模板得到错误类型"""
+        values = {name: match.group(name) or '' for name in rule.groups}
+        if rule.mapping and rule.groups:
+            mapped = rule.mapping.get(values[rule.groups[0]])
+            if mapped:
+                return mapped
+        try:
+            return rule.type.format(**values)
+        except (KeyError, IndexError, ValueError):
+            return rule.type
+
+    def get_metrics(self) -> dict:
+        """
+        获取分类器统计信息
+
+        Returns:
+            统计信息字典
+        """
+        return {
+            'rules': len(self._state),
+            'packs': list(self.packs),
+            'reloads': self.reloads,
+            'reload_failures': self.reload_failures
+        }
@@ -0,0 +1,225 @@
+"""
+Server-Sent Events 广播模块
+单个后台线程轮询数据源并把增量事件分发给所有订阅者，数据库查询次数与打开的浏览器数量无关
+"""
+import logging
+import queue
+import threading
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StreamEvent(NamedTuple):
+    """一条推送事件"""
+    name: str
+    data: str
+    id: Optional[int] = None
+
+    def encode(self) -> str:
+        """编码为 text/event-stream 格式"""
+        lines = []
+        if self.id is not None:
+            lines.append(f'id: {self.id}')
+        lines.append(f'event: {self.name}')
+        lines.extend(f'data: {line}' for line in self.data.split('\n'))
+        return '\n'.join(lines) + '\n\n'
+
+
+def reset_event(last_id: int) -> StreamEvent:
+    """
+    订阅者落后太多或队列溢出时发送，客户端收到后应重新加载全部数据
+
+    事件 ID 为当前位置，断线重连时从这里继续，不会再补发已跳过的记录
+    """
+    return StreamEvent('reset', '{}', last_id)
+
+# 数据源: (起始ID之后, 截止ID, 最多条数) -> (事件列表, 本批最后一条记录ID, 本批记录数)
+FetchFunc = Callable[[int, Optional[int], int], Tuple[List[StreamEvent], int, int]]
+
+
+class Subscription:
+    """一个订阅者的事件队列"""
+
+    def __init__(self, max_queue: int):
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.closed = False
+
+    def put(self, events: List[StreamEvent]) -> bool:
+        """
+        放入一批事件
+
+        Returns:
+            队列已满时返回 False
+        """
+        try:
+            for event in events:
+                self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            return False
+
+    def reset(self, last_id: int):
+        """丢弃积压的事件，只保留一条 reset 事件"""
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self.put([reset_event(last_id)])
+
+    def get(self, timeout: float) -> Optional[StreamEvent]:
+        """
+        取出一条事件
+
+        Args:
+            timeout: 等待超时时间（秒）
+
+        Returns:
+            事件，超时返回 None
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroadcaster:
+    """轮询数据源并广播增量事件"""
+
+    def __init__(self, fetch_func: FetchFunc, latest_id_func: Callable[[], int],
+                 poll_interval: float = 1.0, max_queue: int = 1000, replay_limit: int = 500):
+        """
+        初始化广播器
+
+        Args:
+            fetch_func: 数据源，读取指定 ID 之后的记录并生成事件
+            latest_id_func: 返回当前最大记录 ID，启动时从这里开始推送
+            poll_interval: 轮询间隔（秒）
+            max_queue: 每个订阅者的队列长度，溢出时向该订阅者发送 reset 并关闭订阅
+            replay_limit: 断线重连时最多补发的记录数，超过则发送 reset
+        """
+        self.fetch_func = fetch_func
+        self.latest_id_func = latest_id_func
+        self.poll_interval = poll_interval
+        self.max_queue = max_queue
+        self.replay_limit = replay_limit
+        self.last_id = 0
+        self.subscribers: List[Subscription] = []
+        # 轮询与订阅（含补发）互斥，保证每条记录对每个订阅者恰好推送一次
+        self._lock = threading.Lock()
+        self._stop_flag = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 统计信息
+        self.polls = 0
+        self.events_published = 0
+        self.subscribers_dropped = 0
+
+    def start(self):
+        """启动轮询线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self.last_id = self.latest_id_func()
+            self._stop_flag.clear()
+            self._thread = threading.Thread(target=self._run, name='event-broadcaster', daemon=True)
+            self._thread.start()
+        logger.info(f"事件广播已启动，从记录 {self.last_id} 之后开始推送")
+
+    def stop(self):
+        """停止轮询线程"""
+        self._stop_flag.set()
+        if self._thread:
+            self._thread.join(self.poll_interval * 2)
+            self._thread = None
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Subscription:
+        """
+        添加订阅者
+
+        Args:
+            last_event_id: 客户端最后收到的事件 ID（Last-Event-ID），用于补发断线期间的事件
+
+        Returns:
+            订阅
+        """
+        self.start()
+        subscription = Subscription(self.max_queue)
+        with self._lock:
+            if last_event_id is not None and last_event_id < self.last_id:
+                events, last_id, count = self.fetch_func(last_event_id, self.last_id, self.replay_limit)
+                if (count >= self.replay_limit and last_id < self.last_id) or not subscription.put(events):
+                    subscription.reset(self.last_id)
+            self.subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """移除订阅者"""
+        subscription.closed = True
+        with self._lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+
+    def publish(self, events: List[StreamEvent]):
+        """
+        直接向所有订阅者推送事件（用于本进程内产生的变更，如状态更新）
+
+        Args:
+            events: 事件列表
+        """
+        with self._lock:
+            self._dispatch(events)
+
+    def _dispatch(self, events: List[StreamEvent]):
+        """分发事件，调用方持有锁"""
+        if not events:
+            return
+        self.events_published += len(events)
+        for subscription in list(self.subscribers):
+            if not subscription.put(events):
+                # 客户端读取太慢: 让它重新加载并断开，而不是无限堆积
+                self.subscribers.remove(subscription)
+                self.subscribers_dropped += 1
+                subscription.closed = True
+                subscription.reset(self.last_id)
+
+    def _run(self):
+        """轮询线程主循环"""
+        while not self._stop_flag.wait(self.poll_interval):
+            try:
+                self._poll()
+            except Exception as e:
+                logger.error(f"事件广播轮询失败: {e}")
+
+    def _poll(self):
+        """读取上次位置之后的新记录并分发"""
+        with self._lock:
+            self.polls += 1
+            if not self.subscribers:
+                # 无人订阅时只跟进位置，不生成事件
+                self.last_id = self.latest_id_func()
+                return
+            events, last_id, count = self.fetch_func(self.last_id, None, self.replay_limit)
+            if count >= self.replay_limit:
+                # 一个周期内新增过多，逐条推送不如让客户端重新加载
+                self.last_id = self.latest_id_func()
+                self._dispatch([reset_event(self.last_id)])
+            elif count:
+                self.last_id = last_id
+                self._dispatch(events)
+
+    def get_metrics(self) -> dict:
+        """
+        获取广播统计信息
+
+        Returns:
+            统计信息字典
+        """
+        return {
+            'subscribers': len(self.subscribers),
+            'last_id': self.last_id,
+            'polls': self.polls,
+            'events_published': self.events_published,
+            'subscribers_dropped': self.subscribers_dropped
+        }
@@ -1,32 +1,174 @@
 """
 飞书消息发送模块
 发送错误日志和分析结果到飞书群聊
+
+使用保持长连接的 HTTP 连接池；消息可以同步发送，也可以放入发送队列由工作线程异步投递。
+失败时按指数退避（带随机抖动）重试，飞书返回限流错误码时自动降低发送速率
 """
 import logging
-import requests
-from typing import Optional
+import queue
+import random
+import threading
+import time
 from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from alert_digest import REASON_LABELS
+from metrics import Histogram
 
 logger = logging.getLogger(__name__)
 
+# 飞书自定义机器人的限流错误码（请求过于频繁）
+RATE_LIMIT_CODES = frozenset({9499, 11232})
+
+# 发送结果
+SEND_OK = 'ok'
+SEND_RATE_LIMITED = 'rate_limited'
+SEND_RETRY = 'retry'
+SEND_FAILED = 'failed'
+
+
+class SendRate:
+    """
+    自适应发送速率（线程安全）
+
+    按当前速率均匀安排发送时间；收到限流时速率减半并暂停，之后每次成功逐步恢复到配置的速率
+    """
+
+    def __init__(self, rate: float = 5.0, min_rate: float = 0.2,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        初始化发送速率
+
+        Args:
+            rate: 最大发送速率（条/秒）
+            min_rate: 限流后的最低发送速率（条/秒）
+            clock: 时钟函数，返回单调递增的秒数
+        """
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.clock = clock
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        预约下一个发送时间
+
+        Returns:
+            需要等待的秒数
+        """
+        with self._lock:
+            now = self.clock()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+            return slot - now
+
+    def on_success(self):
+        """发送成功，逐步恢复速率（约每 10 条恢复到配置速率的一倍）"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """
+        收到限流，速率减半并暂停
+
+        Args:
+            retry_after: 服务端要求的等待时间（秒），没有时按新的速率暂停一个间隔
+        """
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self._next_slot = max(self._next_slot, self.clock() + pause)
+
 
 class FeishuNotifier:
     """飞书消息通知器"""
 
-    def __init__(self, webhook_url: str):
+    def __init__(self, webhook_url: str, pool_size: int = 4, workers: int = 2,
+                 queue_size: int = 1000, max_retries: int = 3, backoff_base: float = 0.5,
+                 backoff_max: float = 30.0, rate_per_second: float = 5.0, timeout: float = 10.0):
         """
         初始化飞书通知器
 
         Args:
             webhook_url: 飞书自定义机器人 Webhook URL
+            pool_size: HTTP 连接池大小（保持长连接，避免每条消息重新握手）
+            workers: 异步投递的工作线程数
+            queue_size: 发送队列长度，队列满时新消息被丢弃
+            max_retries: 失败后的最大重试次数
+            backoff_base: 退避的基础等待时间（秒），第 n 次重试最多等待 backoff_base * 2^n
+            backoff_max: 单次退避的最长等待时间（秒）
+            rate_per_second: 最大发送速率（条/秒），飞书自定义机器人限制为 5 条/秒
+            timeout: 单次请求超时时间（秒）
         """
         self.webhook_url = webhook_url
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.send_rate = SendRate(rate_per_second)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, self.workers), max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # 发送队列: (消息, 回调, 入队时间)
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._threads: List[threading.Thread] = []
+        self._stop_flag = threading.Event()
+        self._start_lock = threading.Lock()
+
+        # 统计信息
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.request_latency = Histogram()
+        self.delivery_latency = Histogram()
+
+    def start(self):
+        """启动异步投递的工作线程（重复调用无副作用）"""
+        with self._start_lock:
+            if self._threads:
+                return
+            self._stop_flag.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'feishu-sender-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"飞书发送队列已启动 ({self.workers} 个工作线程)")
+
+    def stop(self, timeout: float = 10.0):
+        """
+        停止工作线程，等待队列中的消息发送完毕
+
+        Args:
+            timeout: 等待超时时间（秒）
+        """
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._stop_flag.set()
+        for thread in self._threads:
+            thread.join(timeout=max(0.1, deadline - time.monotonic()))
+        self._threads = []
+        if self._queue.qsize():
+            logger.warning(f"飞书发送队列停止时仍有 {self._queue.qsize()} 条消息未发送")
+        self.session.close()
 
     def send_error_notification(self, container_name: str, container_id: str,
                                 error_log: str, analysis: str,
                                 timestamp: datetime, container_image: str = "unknown") -> bool:
         """
-        发送错误通知到飞书群聊
+        发送错误通知到飞书群聊（同步，失败时按退避重试）
 
         Args:
             container_name: 容器名称
@@ -39,40 +181,198 @@ class FeishuNotifier:
         Returns:
             是否发送成功
         """
+        card = self._build_error_card(
+            container_name=container_name,
+            container_id=container_id,
+            container_image=container_image,
+            error_log=error_log,
+            analysis=analysis,
+            timestamp=timestamp
+        )
+        success = self._deliver(card)
+        if success:
+            logger.info(f"成功发送飞书通知: 容器 {container_name}")
+        return success
+
+    def submit_error_notification(self, container_name: str, container_id: str,
+                                  error_log: str, analysis: str, timestamp: datetime,
+                                  container_image: str = "unknown",
+                                  callback: Optional[Callable[[bool], None]] = None) -> bool:
+        """
+        把错误通知放入发送队列，立即返回
+
+        Args:
+            container_name: 容器名称
+            container_id: 容器 ID
+            error_log: 错误日志
+            analysis: AI 分析结果
+            timestamp: 错误时间戳
+            container_image: 容器镜像
+            callback: 投递完成后在工作线程中调用，参数为是否发送成功
+
+        Returns:
+            是否已放入队列（队列满时返回 False，不会调用 callback）
+        """
+        card = self._build_error_card(
+            container_name=container_name,
+            container_id=container_id,
+            container_image=container_image,
+            error_log=error_log,
+            analysis=analysis,
+            timestamp=timestamp
+        )
+        return self.submit(card, callback)
+
+    def submit(self, message: dict, callback: Optional[Callable[[bool], None]] = None) -> bool:
+        """
+        把消息放入发送队列，立即返回
+
+        Args:
+            message: 飞书消息 JSON
+            callback: 投递完成后在工作线程中调用，参数为是否发送成功
+
+        Returns:
+            是否已放入队列
+        """
+        self.start()
         try:
-            # 构建消息卡片
-            card = self._build_error_card(
-                container_name=container_name,
-                container_id=container_id,
-                container_image=container_image,
-                error_log=error_log,
-                analysis=analysis,
-                timestamp=timestamp
-            )
-
-            # 发送消息
-            response = requests.post(
-                self.webhook_url,
-                json=card,
-                timeout=10
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('code') == 0:
-                    logger.info(f"成功发送飞书通知: 容器 {container_name}")
-                    return True
-                else:
-                    logger.error(f"飞书 API 返回错误: {result}")
-                    return False
-            else:
-                logger.error(f"发送飞书消息失败: HTTP {response.status_code}")
-                return False
-
-        except Exception as e:
-            logger.error(f"发送飞书消息时发生异常: {e}")
+            self._queue.put_nowait((message, callback, time.monotonic()))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("飞书发送队列已满，丢弃消息")
             return False
 
+    def send_digest_notification(self, digest: dict) -> bool:
+        """
+        发送错误汇总到飞书群聊（同步）
+
+        Args:
+            digest: AlertDigest.flush 返回的汇总结果
+
+        Returns:
+            是否发送成功
+        """
+        success = self._deliver(self._build_digest_card(digest))
+        if success:
+            logger.info(f"成功发送飞书错误汇总: {digest['total']} 条错误")
+        return success
+
+    def submit_digest_notification(self, digest: dict,
+                                   callback: Optional[Callable[[bool], None]] = None) -> bool:
+        """
+        把错误汇总放入发送队列，立即返回
+
+        Args:
+            digest: AlertDigest.flush 返回的汇总结果
+            callback: 投递完成后在工作线程中调用，参数为是否发送成功
+
+        Returns:
+            是否已放入队列
+        """
+        return self.submit(self._build_digest_card(digest), callback)
+
+    def _worker(self):
+        """工作线程主循环"""
+        while not self._stop_flag.is_set() or self._queue.qsize():
+            try:
+                message, callback, queued_at = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                success = self._deliver(message, queued_at)
+                if callback:
+                    callback(success)
+            except Exception as e:
+                logger.error(f"飞书消息投递回调失败: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, message: dict, queued_at: Optional[float] = None) -> bool:
+        """
+        发送消息，失败时按指数退避重试
+
+        Args:
+            message: 飞书消息 JSON
+            queued_at: 入队时间，用于统计投递延迟（默认从现在开始计算）
+
+        Returns:
+            是否发送成功
+        """
+        start = queued_at if queued_at is not None else time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            wait = self.send_rate.reserve()
+            if wait > 0:
+                time.sleep(wait)
+
+            outcome, retry_after = self._post(message)
+            if outcome == SEND_OK:
+                self.send_rate.on_success()
+                self.delivered += 1
+                self.delivery_latency.observe(time.monotonic() - start)
+                return True
+            if outcome == SEND_FAILED:
+                break
+            if outcome == SEND_RATE_LIMITED:
+                self.rate_limited += 1
+                self.send_rate.on_rate_limited(retry_after)
+
+            if attempt < self.max_retries:
+                self.retries += 1
+                # 全抖动退避: 在 [0, min(上限, 基础时间 * 2^n)] 内随机等待，避免多个发送者同时重试
+                time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+
+        self.failed += 1
+        return False
+
+    def _post(self, message: dict) -> Tuple[str, Optional[float]]:
+        """
+        发送一次请求
+
+        Returns:
+            (发送结果, 服务端要求的等待时间)
+        """
+        start = time.monotonic()
+        try:
+            response = self.session.post(self.webhook_url, json=message, timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.error(f"发送飞书消息时发生异常: {e}")
+            return SEND_RETRY, None
+        finally:
+            self.request_latency.observe(time.monotonic() - start)
+
+        retry_after = None
+        if response.headers.get('Retry-After'):
+            try:
+                retry_after = float(response.headers['Retry-After'])
+            except ValueError:
+                pass
+
+        if response.status_code == 429:
+            logger.warning("飞书接口限流: HTTP 429")
+            return SEND_RATE_LIMITED, retry_after
+        if response.status_code >= 500:
+            logger.error(f"发送飞书消息失败: HTTP {response.status_code}")
+            return SEND_RETRY, retry_after
+        if response.status_code != 200:
+            logger.error(f"发送飞书消息失败: HTTP {response.status_code}")
+            return SEND_FAILED, None
+
+        try:
+            result = response.json()
+        except ValueError:
+            logger.error(f"飞书 API 返回内容无法解析: {response.text[:200]}")
+            return SEND_RETRY, None
+        code = result.get('code', result.get('StatusCode'))
+        if code == 0:
+            return SEND_OK, None
+        if code in RATE_LIMIT_CODES:
+            logger.warning(f"飞书接口限流: {result}")
+            return SEND_RATE_LIMITED, retry_after
+        # 签名、关键词等配置错误重试也不会成功
+        logger.error(f"飞书 API 返回错误: {result}")
+        return SEND_FAILED, None
+
     def _build_error_card(self, container_name: str, container_id: str,
                          container_image: str, error_log: str,
                          analysis: str, timestamp: datetime) -> dict:
@@ -95,7 +395,7 @@ class FeishuNotifier:
         if len(error_log) > max_log_length:
             error_log = error_log[:max_log_length] + "\n... (日志过长，已截断)"
 
-        time_str = timestamp.strftime("%Y-%m-%d %H:%M:%S")
+        time_str = timestamp.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
 
         card = {
             "msg_type": "interactive",
@@ -182,38 +482,136 @@ class FeishuNotifier:
 
         return card
 
-    def send_simple_message(self, content: str) -> bool:
+    def _build_digest_card(self, digest: dict) -> dict:
         """
-        发送简单文本消息
+        构建错误汇总消息卡片
 
         Args:
-            content: 消息内容
+            digest: AlertDigest.flush 返回的汇总结果
 
         Returns:
-            是否发送成功
+            消息卡片 JSON
         """
-        try:
-            message = {
-                "msg_type": "text",
-                "content": {
-                    "text": content
+        max_sample_length = 300
+        time_range = (f"{digest['first_seen'].strftime('%Y-%m-%d %H:%M:%S')} ~ "
+                      f"{digest['last_seen'].strftime('%H:%M:%S')}")
+        containers = '\n'.join(f"{name}: {count}" for name, count in digest['containers'])
+        if digest['container_count'] > len(digest['containers']):
+            containers += f"\n... 共 {digest['container_count']} 个容器"
+        reasons = '\n'.join(f"{REASON_LABELS.get(reason, reason)}: {count}"
+                             for reason, count in digest['reasons'].items())
+
+        elements = [
+            {
+                "tag": "div",
+                "fields": [
+                    {
+                        "is_short": True,
+                        "text": {
+                            "tag": "lark_md",
+                            "content": f"**时间范围**\n{time_range}"
+                        }
+                    },
+                    {
+                        "is_short": True,
+                        "text": {
+                            "tag": "lark_md",
+                            "content": f"**错误总数**\n{digest['total']}"
+                        }
+                    },
+                    {
+                        "is_short": True,
+                        "text": {
+                            "tag": "lark_md",
+                            "content": f"**主要容器**\n{containers}"
+                        }
+                    },
+                    {
+                        "is_short": True,
+                        "text": {
+                            "tag": "lark_md",
+                            "content": f"**未单独通知原因**\n{reasons}"
+                        }
+                    }
+                ]
+            }
+        ]
+
+        for group in digest['groups']:
+            samples = '\n'.join(line if len(line) <= max_sample_length else line[:max_sample_length] + '...'
+                                 for line in group['samples'])
+            group_containers = ', '.join(f"{name} ({count})" for name, count in group['containers'])
+            elements.append({"tag": "hr"})
+            elements.append({
+                "tag": "div",
+                "text": {
+                    "tag": "lark_md",
+                    "content": (
+                        f"**{group['error_type']}** × {group['count']}\n"
+                        f"模板: `{group['template'][:200]}`\n"
+                        f"容器: {group_containers}\n"
+                        f"首次 {group['first_seen'].strftime('%H:%M:%S')}，"
+                        f"最近 {group['last_seen'].strftime('%H:%M:%S')}\n"
+                        f"```\n{samples}\n```"
+                    )
                 }
+            })
+
+        if digest['other_groups']:
+            elements.append({"tag": "hr"})
+            elements.append({
+                "tag": "div",
+                "text": {
+                    "tag": "lark_md",
+                    "content": f"另有 {digest['other_groups']} 类错误共 {digest['other_count']} 条未列出"
+                }
+            })
+
+        elements.append({"tag": "hr"})
+        elements.append({
+            "tag": "note",
+            "elements": [
+                {
+                    "tag": "plain_text",
+                    "content": "由 Docker 日志监控系统自动汇总发送"
+                }
+            ]
+        })
+
+        return {
+            "msg_type": "interactive",
+            "card": {
+                "config": {
+                    "wide_screen_mode": True
+                },
+                "header": {
+                    "title": {
+                        "tag": "plain_text",
+                        "content": f"📊 Docker 容器错误汇总（{digest['total']} 条）"
+                    },
+                    "template": "orange"
+                },
+                "elements": elements
             }
+        }
 
-            response = requests.post(
-                self.webhook_url,
-                json=message,
-                timeout=10
-            )
+    def send_simple_message(self, content: str) -> bool:
+        """
+        发送简单文本消息
 
-            if response.status_code == 200:
-                result = response.json()
-                return result.get('code') == 0
-            return False
+        Args:
+            content: 消息内容
 
-        except Exception as e:
-            logger.error(f"发送飞书简单消息时发生异常: {e}")
-            return False
+        Returns:
+            是否发送成功
+        """
+        message = {
+            "msg_type": "text",
+            "content": {
+                "text": content
+            }
+        }
+        return self._deliver(message)
 
     def test_connection(self) -> bool:
         """
@@ -223,3 +621,22 @@ class FeishuNotifier:
             连接是否正常
         """
         return self.send_simple_message("✅ Docker 日志监控系统启动成功！")
+
+    def get_metrics(self) -> dict:
+        """
+        获取发送统计信息
+
+        Returns:
+            统计信息字典，request_latency 为单次请求耗时、delivery_latency 为从入队到送达的耗时直方图
+        """
+        return {
+            'queue_depth': self._queue.qsize(),
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'retries': self.retries,
+            'rate_limited': self.rate_limited,
+            'send_rate': self.send_rate.rate,
+            'request_latency': self.request_latency.snapshot(),
+            'delivery_latency': self.delivery_latency.snapshot()
+        }
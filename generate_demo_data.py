@@ -8,7 +8,7 @@ import os
 # 添加当前目录到 Python 路径
 sys.path.insert(0, os.path.dirname(__file__))
 
-from web_app import app, db, ErrorLog
+from web_app import app, db, ErrorLog, rebuild_rollups
 from datetime import datetime, timedelta
 import random
 
@@ -77,6 +77,8 @@ def generate_demo_data():
             db.session.add(error)
         
         db.session.commit()
+        # 直接写入 ORM 不会更新统计汇总表，这里全量重建
+        rebuild_rollups()
         print(f"✓ 成功生成 100 条演示数据")
         print(f"✓ 时间范围：{(now - timedelta(days=7)).strftime('%Y-%m-%d')} 至 {now.strftime('%Y-%m-%d')}")
         print(f"✓ 容器数量：{len(containers)}")
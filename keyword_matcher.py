@@ -0,0 +1,151 @@
+"""
+错误关键词匹配模块
+在配置加载时整理检测关键词、严重度关键词和错误类型提示规则，一次调用得到检测结果、严重度和类型提示；
+检测与原有实现相同（每个关键词一次子串查找，速度也相同），命中的行复用同一份小写文本计算严重度和类型提示，
+不再重复转换大小写
+"""
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+# 默认严重度关键词
+DEFAULT_CRITICAL_KEYWORDS = ['fatal', 'critical', 'panic', 'segmentation fault',
+                             'out of memory', 'oom', 'core dumped']
+DEFAULT_ERROR_KEYWORDS = ['error', 'exception', 'failed', 'failure', 'crash']
+
+# 错误类型提示规则: (类型, 必须全部包含的关键词, 至少包含其一的关键词)，按顺序匹配
+TYPE_HINT_RULES: List[Tuple[str, Tuple[str, ...], Tuple[str, ...]]] = [
+    ('Timeout', ('timeout',), ()),
+    ('Connection Error', ('connection',), ('refused', 'failed')),
+    ('Permission Error', ('permission denied',), ()),
+    ('Not Found', ('not found',), ())
+]
+
+
+class LineMatch(NamedTuple):
+    """单行日志的匹配结果"""
+    is_error: bool
+    severity: str
+    type_hint: Optional[str]
+
+
+NO_MATCH = LineMatch(False, 'warning', None)
+
+
+class KeywordMatcher:
+    """多关键词匹配器"""
+
+    def __init__(self, keywords: Iterable[str], case_sensitive: bool = False,
+                 critical_keywords: Optional[Iterable[str]] = None,
+                 error_keywords: Optional[Iterable[str]] = None,
+                 type_hint_rules: Optional[List[Tuple[str, Tuple[str, ...], Tuple[str, ...]]]] = None):
+        """
+        初始化匹配器
+
+        Args:
+            keywords: 错误检测关键词
+            case_sensitive: 检测关键词是否区分大小写（严重度和类型提示始终不区分大小写）
+            critical_keywords: 严重错误关键词
+            error_keywords: 普通错误关键词
+            type_hint_rules: 错误类型提示规则
+        """
+        self.case_sensitive = case_sensitive
+        # 与原有行为保持一致: 检测关键词统一转为小写
+        self.detect_keywords: Tuple[str, ...] = tuple(dict.fromkeys(kw.lower() for kw in keywords if kw))
+        self.critical_keywords: Tuple[str, ...] = tuple(kw.lower() for kw in (
+            critical_keywords if critical_keywords is not None else DEFAULT_CRITICAL_KEYWORDS))
+        self.error_keywords: Tuple[str, ...] = tuple(kw.lower() for kw in (
+            error_keywords if error_keywords is not None else DEFAULT_ERROR_KEYWORDS))
+        self.type_hint_rules = type_hint_rules if type_hint_rules is not None else TYPE_HINT_RULES
+
+    def is_error(self, log_line: str) -> bool:
+        """
+        判断日志行是否包含错误检测关键词
+
+        Args:
+            log_line: 日志行
+
+        Returns:
+            是否是错误日志
+        """
+        check_line = log_line if self.case_sensitive else log_line.lower()
+        for keyword in self.detect_keywords:
+            if keyword in check_line:
+                return True
+        return False
+
+    def match(self, log_line: str) -> LineMatch:
+        """
+        一次得到检测结果、严重度和错误类型提示
+
+        绝大多数日志行不是错误，检测与原有 is_error_log 相同，不匹配即返回；
+        命中的行复用同一份小写文本计算严重度和类型提示（区分大小写时才另外转换一次）
+
+        Args:
+            log_line: 日志行
+
+        Returns:
+            匹配结果，不是错误日志时返回 NO_MATCH
+        """
+        case_sensitive = self.case_sensitive
+        check_line = log_line if case_sensitive else log_line.lower()
+        for keyword in self.detect_keywords:
+            if keyword in check_line:
+                break
+        else:
+            return NO_MATCH
+
+        lower_line = log_line.lower() if case_sensitive else check_line
+        return LineMatch(True, self._severity(lower_line), self._type_hint(lower_line))
+
+    def classify(self, log_line: str) -> LineMatch:
+        """
+        不论是否命中检测关键词，计算日志行的严重度和类型提示
+
+        Args:
+            log_line: 日志行
+
+        Returns:
+            匹配结果
+        """
+        lower_line = log_line.lower()
+        return LineMatch(self.is_error(log_line), self._severity(lower_line),
+                         self._type_hint(lower_line))
+
+    def _severity(self, lower_line: str) -> str:
+        """
+        根据严重度关键词表判断严重程度
+
+        Args:
+            lower_line: 小写日志行
+
+        Returns:
+            严重度: critical, error, warning
+        """
+        for keyword in self.critical_keywords:
+            if keyword in lower_line:
+                return 'critical'
+        for keyword in self.error_keywords:
+            if keyword in lower_line:
+                return 'error'
+        return 'warning'
+
+    def _type_hint(self, lower_line: str) -> Optional[str]:
+        """
+        根据类型提示规则表得到通用错误类型
+
+        Args:
+            lower_line: 小写日志行
+
+        Returns:
+            错误类型，未命中时返回 None
+        """
+        for error_type, required, any_of in self.type_hint_rules:
+            for word in required:
+                if word not in lower_line:
+                    break
+            else:
+                if not any_of:
+                    return error_type
+                for word in any_of:
+                    if word in lower_line:
+                        return error_type
+        return None
@@ -4,22 +4,43 @@ Docker 日志监控主程序
 """
 import os
 import sys
+import argparse
 import yaml
 import logging
 import signal
 import time
-from datetime import datetime, timedelta
-from collections import defaultdict
-from typing import Dict, Set
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from typing import FrozenSet, List, NamedTuple, Optional, Set, Tuple
 from pathlib import Path
 
+from checkpoint import CheckpointStore
+from config_watcher import ConfigWatcher
 from docker_monitor import DockerLogMonitor
-from error_analyzer import ErrorAnalyzer
+from async_docker_monitor import AsyncDockerLogMonitor
+from error_analyzer import ErrorAnalyzer, is_analysis_failure
+from error_classifier import DEFAULT_PACKS, ErrorClassifier
+from async_error_analyzer import AdaptiveConcurrencyLimiter, AsyncErrorAnalyzer
+from analysis_cache import AnalysisCache
+from alert_digest import (RATE_LIMIT_REASONS, REASON_DIGEST, REASON_NOTIFY_FAILED, REASON_PIPELINE_FULL,
+                          AlertDigest)
 from feishu_notifier import FeishuNotifier
+from keyword_matcher import KeywordMatcher, LineMatch, DEFAULT_CRITICAL_KEYWORDS, DEFAULT_ERROR_KEYWORDS
+from metrics import (FAST_LATENCY_BUCKETS, MetricFamily, ShardedCounter, ShardedHistogram, counter, gauge,
+                     histogram)
+from metrics_exporter import MetricsExporter
+from multiline import MultilineAssembler, event_signature
+from pipeline import EventPipeline
+from profiler import Profiler
+from rate_limiter import RateLimits, TokenBucketLimiter, parse_limit
+from db_writer import BatchedDBWriter
+from dedup_cache import DedupCache, make_key
+from spool import DurableSpool
+from template_miner import TemplateMiner
 
 # 尝试导入 web_app 的错误日志记录功能
 try:
-    from web_app import add_error_log
+    from web_app import add_error_log, insert_error_logs, update_error_analysis, set_container_cache
     WEB_APP_AVAILABLE = True
 except ImportError:
     WEB_APP_AVAILABLE = False
@@ -37,35 +58,123 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 暂存队列中的记录类型: 未能进入流水线的错误事件、发送失败的通知、未完成的 AI 分析、写入数据库失败的记录
+SPOOL_EVENT = 'event'
+SPOOL_NOTIFY = 'notify'
+SPOOL_ANALYSIS = 'analysis'
+SPOOL_ROW = 'row'
+# 暂存错误事件时保存的字段
+SPOOL_EVENT_FIELDS = ('container_name', 'container_id', 'log_line', 'context', 'timestamp', 'template_id', 'template',
+                      'container_image', 'analysis', 'ai_analysis', 'ai_solution')
+# 关键词匹配耗时每个容器每 MATCH_TIMING_SAMPLE 个事件记录一次，计时本身比匹配还慢（--profile 模式下每个都记录）
+MATCH_TIMING_SAMPLE = 16
+# --profile 模式下记录耗时的处理阶段，按处理顺序输出
+PROFILE_STAGES = ('read', 'detect', 'match', 'template', 'enrich', 'analyze', 'openai', 'persist', 'classify',
+                  'sqlite', 'notify', 'feishu')
+# 修改后需要重启才能生效的配置项（其余检测、去重、限流和容器选择配置可以热加载）
+RESTART_REQUIRED_SECTIONS = ('docker.log_settings', 'docker.checkpoint', 'error_detection.template_mining',
+                             'error_detection.multiline.enabled', 'error_detection.context_lines',
+                             'notification.digest', 'azure_openai', 'feishu', 'database', 'pipeline', 'spool',
+                             'metrics')
+
+
+class DetectionSettings(NamedTuple):
+    """
+    日志行回调中使用的检测和限流配置
+
+    重新加载配置时在主线程中构建新的实例，再通过一次属性赋值整体替换；
+    回调只读取一次引用，始终看到一致的一组配置，不需要加锁
+    """
+    error_keywords: FrozenSet[str]
+    case_sensitive: bool
+    matcher: KeywordMatcher
+    dedup_window: float
+    rate_limits: RateLimits
+
+
+def config_value(config: dict, path: str):
+    """
+    按 "a.b.c" 形式的路径读取嵌套配置
+
+    Args:
+        config: 配置字典
+        path: 点分隔的路径
+
+    Returns:
+        配置值，不存在时返回 None
+    """
+    value = config
+    for key in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
 
 class LogMonitorApp:
     """日志监控应用主类"""
 
-    def __init__(self, config_path: str = 'config/config.yaml'):
+    def __init__(self, config_path: str = 'config/config.yaml', profiler: Optional[Profiler] = None):
         """
         初始化监控应用
 
         Args:
             config_path: 配置文件路径
+            profiler: --profile 模式下的性能分析器，为空时不记录阶段耗时
         """
         self.config_path = config_path
         self.config = None
         self.docker_monitor = None
         self.error_analyzer = None
         self.feishu_notifier = None
+        self.async_delivery = True
+        self.pipeline = None
+        self.db_writer = None
+        self.spool: Optional[DurableSpool] = None
+        self.spool_replay_interval = 5.0
+        # 已暂存、等待重新分析的 (容器名, 模板 ID)，避免同一错误重复暂存
+        self.spooled_analyses: Set[Tuple[str, str]] = set()
 
         # 错误去重缓存
-        self.error_cache: Dict[str, datetime] = {}
-        self.rate_limit_counter: Dict[str, int] = defaultdict(int)
-        self.last_rate_reset = datetime.now()
-
-        # 错误关键词
-        self.error_keywords: Set[str] = set()
-        self.case_sensitive = False
-
-        # 通知设置
-        self.dedup_window = 300  # 秒
-        self.max_rate_per_minute = 10
+        self.error_cache = DedupCache()
+        # 通知频率限制：全局、每个容器、每个模板三级令牌桶
+        self.rate_limiter = TokenBucketLimiter()
+
+        # 检测和限流配置，热加载时整体替换
+        self.settings = DetectionSettings(
+            error_keywords=frozenset(),
+            case_sensitive=False,
+            matcher=KeywordMatcher([]),
+            dedup_window=300,  # 秒
+            rate_limits=RateLimits(template=parse_limit(None, 3), container=parse_limit(None, 10), total=None)
+        )
+        self.template_miner = TemplateMiner()
+        self.classifier = ErrorClassifier()
+        # 多行日志合并：调用栈等多行日志合并为一个事件后再检测
+        self.assembler: Optional[MultilineAssembler] = None
+
+        # 运行指标：每个事件都要更新的计数和耗时按线程分片记录，不加锁
+        self.started_at = time.time()
+        self.events_checked = ShardedCounter()
+        self.error_events = ShardedCounter()
+        self.match_latency = ShardedHistogram(FAST_LATENCY_BUCKETS)
+        self.match_timing_sample = MATCH_TIMING_SAMPLE
+        self.metrics_exporter: Optional[MetricsExporter] = None
+
+        # --profile 模式下的性能分析，先登记各阶段使结果按处理顺序输出
+        self.profiler = profiler
+        if profiler is not None:
+            for stage in PROFILE_STAGES:
+                profiler.timer.stage(stage)
+
+        # 配置文件变化检测，修改后在主循环中重新加载
+        self.config_watcher: Optional[ConfigWatcher] = None
+        self.config_reloads = 0
+        self.config_reload_failures = 0
+
+        # 告警汇总：未单独通知的错误按窗口汇总发送，digest_all 时所有错误都只发汇总
+        self.digest: Optional[AlertDigest] = None
+        self.digest_all = False
 
     def load_config(self):
         """加载配置文件"""
@@ -73,24 +182,186 @@ class LogMonitorApp:
             with open(self.config_path, 'r', encoding='utf-8') as f:
                 self.config = yaml.safe_load(f)
             logger.info(f"成功加载配置文件: {self.config_path}")
+            # 配置文件修改后自动重新加载；关闭轮询时仍可用 SIGHUP 触发
+            reload_config = self.config.get('config_reload', {})
+            self.config_watcher = ConfigWatcher(
+                self.config_path,
+                interval=reload_config.get('interval', 2.0) if reload_config.get('enabled', True) else None
+            )
 
-            # 加载错误检测配置
+            # 加载错误检测配置，构建关键词匹配器
             error_config = self.config.get('error_detection', {})
-            self.error_keywords = set(kw.lower() for kw in error_config.get('keywords', []))
-            self.case_sensitive = error_config.get('case_sensitive', False)
+            self.settings = self.build_settings(self.config)
+
+            # 日志模板提取，模板 ID 用于去重、限流、AI 分析缓存和错误分组
+            template_config = error_config.get('template_mining', {})
+            self.template_miner = TemplateMiner(
+                depth=template_config.get('depth', 4),
+                similarity_threshold=template_config.get('similarity_threshold', 0.5),
+                max_children=template_config.get('max_children', 100),
+                max_clusters=template_config.get('max_templates', 5000)
+            )
+
+            # 错误类型分类规则: 内置规则包 + 自定义规则，规则文件修改后自动重新加载
+            classification_config = error_config.get('classification', {})
+            self.classifier = ErrorClassifier(
+                packs=classification_config.get('packs'),
+                rules=classification_config.get('rules'),
+                rules_file=classification_config.get('rules_file')
+            )
+
+            # 多行日志合并，合并后的事件附带之前的 context_lines 行日志
+            multiline_config = error_config.get('multiline', {})
+            if multiline_config.get('enabled', True):
+                self.assembler = MultilineAssembler(
+                    emit=self.on_log_line,
+                    flush_timeout=multiline_config.get('flush_timeout', 0.5),
+                    max_lines=multiline_config.get('max_lines', 200),
+                    context_lines=error_config.get('context_lines', 5)
+                )
 
             # 加载通知配置
             notif_config = self.config.get('notification', {})
-            self.dedup_window = notif_config.get('dedup_window', 300)
-            self.max_rate_per_minute = notif_config.get('max_rate_per_minute', 10)
+            self.error_cache = DedupCache(
+                ttl=self.settings.dedup_window,
+                max_entries=notif_config.get('dedup_max_entries', 100000)
+            )
+            digest_config = notif_config.get('digest', {})
+            if digest_config.get('enabled', True):
+                self.digest = AlertDigest(
+                    window=digest_config.get('window', 60),
+                    max_groups=digest_config.get('max_groups', 10),
+                    max_samples=digest_config.get('max_samples', 3)
+                )
+                self.digest_all = digest_config.get('mode', 'overflow') == 'all'
 
-            logger.info(f"错误关键词: {self.error_keywords}")
-            logger.info(f"去重窗口: {self.dedup_window}秒, 最大频率: {self.max_rate_per_minute}/分钟")
+            logger.info(f"错误类型规则包: {self.classifier.packs}, 共 {self.classifier.get_metrics()['rules']} 条规则")
+            self.log_settings(self.settings)
 
         except Exception as e:
             logger.error(f"加载配置文件失败: {e}")
             sys.exit(1)
 
+    def build_settings(self, config: dict) -> DetectionSettings:
+        """
+        根据配置构建检测和限流配置（含关键词匹配器）
+
+        Args:
+            config: 完整配置
+
+        Returns:
+            检测和限流配置
+        """
+        error_config = config.get('error_detection', {})
+        notif_config = config.get('notification', {})
+        error_keywords = frozenset(kw.lower() for kw in error_config.get('keywords', []))
+        case_sensitive = error_config.get('case_sensitive', False)
+        # 检测、严重度和类型提示一次完成
+        severity_config = error_config.get('severity_keywords', {})
+        matcher = KeywordMatcher(
+            keywords=error_keywords,
+            case_sensitive=case_sensitive,
+            critical_keywords=severity_config.get('critical', DEFAULT_CRITICAL_KEYWORDS),
+            error_keywords=severity_config.get('error', DEFAULT_ERROR_KEYWORDS)
+        )
+        return DetectionSettings(
+            error_keywords=error_keywords,
+            case_sensitive=case_sensitive,
+            matcher=matcher,
+            dedup_window=notif_config.get('dedup_window', 300),
+            rate_limits=self.build_rate_limits(notif_config)
+        )
+
+    def build_rate_limits(self, notif_config: dict) -> RateLimits:
+        """
+        解析通知频率限制配置
+
+        没有 rate_limit 配置时按原有的 max_rate_per_minute、max_rate_per_template 设置容器和模板级别，
+        突发次数等于每分钟次数，不限制全局
+
+        Args:
+            notif_config: notification 配置
+
+        Returns:
+            各级别的限制
+        """
+        rate_config = notif_config.get('rate_limit', {})
+        return RateLimits(
+            template=parse_limit(rate_config.get('template'), notif_config.get('max_rate_per_template', 3)),
+            container=parse_limit(rate_config.get('container'), notif_config.get('max_rate_per_minute', 10)),
+            total=parse_limit(rate_config.get('global'))
+        )
+
+    def log_settings(self, settings: DetectionSettings):
+        """输出当前的检测和限流配置"""
+        logger.info(f"错误关键词: {set(settings.error_keywords)}")
+        logger.info(
+            f"去重窗口: {settings.dedup_window}秒, 通知频率限制: "
+            + ', '.join(f"{label} {limit.rate * 60:g}/分钟 (突发 {limit.burst:g})" if limit else f"{label} 不限制"
+                        for label, limit in zip(('同一模板', '每个容器', '全局'), settings.rate_limits))
+        )
+
+    def reload_config(self) -> bool:
+        """
+        重新读取配置文件，应用可以热加载的部分
+
+        新的关键词匹配器、错误类型规则和容器选择器都先在主线程中构建完成，再整体替换；
+        读取或构建失败时继续使用当前配置。选择的容器集合不变的容器，其日志流不受影响
+
+        Returns:
+            是否已应用新配置
+        """
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                config = yaml.safe_load(f)
+            if not isinstance(config, dict):
+                raise ValueError("配置文件内容不是字典")
+            settings = self.build_settings(config)
+        except Exception as e:
+            self.config_reload_failures += 1
+            logger.error(f"重新加载配置文件失败，继续使用当前配置: {e}")
+            return False
+
+        old_config = self.config
+        error_config = config.get('error_detection', {})
+        notif_config = config.get('notification', {})
+
+        # 错误类型规则编译失败时保留原有规则
+        classification_config = error_config.get('classification', {})
+        self.classifier.rules_file = classification_config.get('rules_file')
+        self.classifier.reload(packs=classification_config.get('packs', DEFAULT_PACKS),
+                               rules=classification_config.get('rules') or [])
+
+        # 去重有效期和容量只影响之后加入的记录
+        self.error_cache.ttl = settings.dedup_window
+        self.error_cache.max_entries = max(1, notif_config.get('dedup_max_entries', 100000))
+
+        if self.assembler is not None:
+            multiline_config = error_config.get('multiline', {})
+            self.assembler.flush_timeout = multiline_config.get('flush_timeout', 0.5)
+            self.assembler.max_lines = multiline_config.get('max_lines', 200)
+
+        # 一次赋值发布新的检测和限流配置，日志行回调下一次读取时生效
+        self.settings = settings
+        self.config = config
+        self.config_reloads += 1
+        logger.info(f"配置文件已重新加载: {self.config_path}")
+        self.log_settings(settings)
+
+        # 容器选择变化时只接入新匹配的容器、断开不再匹配的容器
+        docker_config = config.get('docker', {})
+        old_docker_config = old_config.get('docker', {})
+        if self.docker_monitor and (docker_config.get('containers') != old_docker_config.get('containers')
+                                    or docker_config.get('discovery') != old_docker_config.get('discovery')):
+            attached, detached = self.docker_monitor.update_selection(
+                docker_config.get('containers') or [], docker_config.get('discovery'))
+            logger.info(f"监控的容器已更新: 接入 {attached} 个, 断开 {detached} 个")
+
+        for section in RESTART_REQUIRED_SECTIONS:
+            if config_value(config, section) != config_value(old_config, section):
+                logger.warning(f"配置项 {section} 已修改，需要重启后生效")
+        return True
+
     def initialize_components(self):
         """初始化各个组件"""
         try:
@@ -98,28 +369,123 @@ class LogMonitorApp:
             docker_config = self.config.get('docker', {})
             log_settings = docker_config.get('log_settings', {})
 
-            self.docker_monitor = DockerLogMonitor(
+            # threaded: 每个容器一个线程; asyncio: 单个事件循环复用读取所有容器
+            monitor_mode = log_settings.get('mode', 'threaded')
+            monitor_class = AsyncDockerLogMonitor if monitor_mode == 'asyncio' else DockerLogMonitor
+            # 日志读取位置检查点: 重启后从上次处理到的位置继续读取
+            checkpoint_config = docker_config.get('checkpoint', {})
+            checkpoints = None
+            if checkpoint_config.get('enabled', True):
+                checkpoints = CheckpointStore(
+                    path=checkpoint_config.get('path', 'logs/checkpoints.db'),
+                    flush_interval=checkpoint_config.get('flush_interval', 2.0),
+                    max_age=checkpoint_config.get('max_age', 7 * 24 * 3600)
+                )
+            self.docker_monitor = monitor_class(
                 containers=docker_config.get('containers', []),
-                error_callback=self.on_log_line,
+                error_callback=self.assembler.add if self.assembler is not None else self.on_log_line,
                 tail=log_settings.get('tail', 'latest'),
                 follow=log_settings.get('follow', True),
-                timestamps=log_settings.get('timestamps', True)
+                timestamps=log_settings.get('timestamps', True),
+                discovery=docker_config.get('discovery'),
+                checkpoints=checkpoints
             )
 
             # 初始化错误分析器
             ai_config = self.config.get('azure_openai', {})
-            self.error_analyzer = ErrorAnalyzer(
-                endpoint=ai_config.get('endpoint'),
-                api_key=ai_config.get('api_key'),
-                deployment_name=ai_config.get('deployment_name'),
-                api_version=ai_config.get('api_version', '2024-02-15-preview')
-            )
+            cache_config = ai_config.get('cache', {})
+            analysis_cache = None
+            if cache_config.get('enabled', True):
+                analysis_cache = AnalysisCache(
+                    path=cache_config.get('path', 'logs/analysis_cache.db'),
+                    ttl=cache_config.get('ttl', 7 * 24 * 3600),
+                    max_entries=cache_config.get('max_entries', 10000)
+                )
+            if ai_config.get('async_client', True):
+                # 异步客户端: 共享连接池 + 自适应并发限制 + 分析时限
+                concurrency_config = ai_config.get('concurrency', {})
+                self.error_analyzer = AsyncErrorAnalyzer(
+                    endpoint=ai_config.get('endpoint'),
+                    api_key=ai_config.get('api_key'),
+                    deployment_name=ai_config.get('deployment_name'),
+                    api_version=ai_config.get('api_version', '2024-02-15-preview'),
+                    cache=analysis_cache,
+                    max_connections=ai_config.get('max_connections', 20),
+                    limiter=AdaptiveConcurrencyLimiter(
+                        initial=concurrency_config.get('initial', 4),
+                        min_limit=concurrency_config.get('min', 1),
+                        max_limit=concurrency_config.get('max', 8),
+                        latency_threshold=concurrency_config.get('latency_threshold', 20.0)
+                    ),
+                    deadline=ai_config.get('deadline', 30.0),
+                    max_retries=ai_config.get('max_retries', 3)
+                )
+            else:
+                self.error_analyzer = ErrorAnalyzer(
+                    endpoint=ai_config.get('endpoint'),
+                    api_key=ai_config.get('api_key'),
+                    deployment_name=ai_config.get('deployment_name'),
+                    api_version=ai_config.get('api_version', '2024-02-15-preview'),
+                    cache=analysis_cache
+                )
 
             # 初始化飞书通知器
             feishu_config = self.config.get('feishu', {})
             self.feishu_notifier = FeishuNotifier(
-                webhook_url=feishu_config.get('webhook_url')
+                webhook_url=feishu_config.get('webhook_url'),
+                pool_size=feishu_config.get('pool_size', 4),
+                workers=feishu_config.get('workers', 2),
+                queue_size=feishu_config.get('queue_size', 1000),
+                max_retries=feishu_config.get('max_retries', 3),
+                backoff_base=feishu_config.get('backoff_base', 0.5),
+                backoff_max=feishu_config.get('backoff_max', 30.0),
+                rate_per_second=feishu_config.get('rate_per_second', 5.0)
             )
+            self.async_delivery = feishu_config.get('async_delivery', True)
+
+            # 初始化数据库批量写入器
+            db_config = self.config.get('database', {})
+            if WEB_APP_AVAILABLE and db_config.get('batch_writes', True):
+                self.db_writer = BatchedDBWriter(
+                    flush_func=insert_error_logs,
+                    batch_size=db_config.get('batch_size', 200),
+                    max_latency=db_config.get('max_latency', 0.5),
+                    max_queue=db_config.get('max_queue', 10000),
+                    max_retries=db_config.get('max_retries', 3),
+                    backoff_base=db_config.get('backoff_base', 0.1),
+                    backoff_max=db_config.get('backoff_max', 2.0),
+                    on_failed=self.spool_failed_rows
+                )
+
+            # 初始化暂存队列，飞书或 Azure OpenAI 不可用时保存未完成的通知和分析
+            spool_config = self.config.get('spool', {})
+            if spool_config.get('enabled', True):
+                self.spool = DurableSpool(
+                    path=spool_config.get('path', 'logs/spool.db'),
+                    max_attempts=spool_config.get('max_attempts', 5),
+                    retry_base=spool_config.get('retry_base', 5.0),
+                    retry_max=spool_config.get('retry_max', 600.0),
+                    commit_interval=spool_config.get('commit_interval', 0.05)
+                )
+                self.spool_replay_interval = spool_config.get('replay_interval', 5.0)
+
+            # 初始化事件处理流水线
+            self.pipeline = self.build_pipeline(self.config.get('pipeline', {}))
+
+            # 运行指标: /metrics 端点和供 Web 界面读取的状态文件
+            metrics_config = self.config.get('metrics', {})
+            if metrics_config.get('enabled', True):
+                self.metrics_exporter = MetricsExporter(
+                    collect=self.collect_metrics,
+                    status=self.monitor_status,
+                    host=metrics_config.get('host', '0.0.0.0'),
+                    port=metrics_config.get('port', 9108),
+                    status_file=metrics_config.get('status_file', 'logs/monitor_status.json'),
+                    status_interval=metrics_config.get('status_interval', 5.0)
+                )
+
+            if self.profiler is not None:
+                self.instrument_stages()
 
             logger.info("所有组件初始化完成")
 
@@ -127,242 +493,629 @@ class LogMonitorApp:
             logger.error(f"初始化组件失败: {e}")
             sys.exit(1)
 
+    def build_pipeline(self, pipeline_config: dict) -> EventPipeline:
+        """
+        根据配置构建事件处理流水线
+
+        Args:
+            pipeline_config: pipeline 配置段
+
+        Returns:
+            事件流水线
+        """
+        queue_size = pipeline_config.get('queue_size', 1000)
+        policy = pipeline_config.get('backpressure', 'block')
+        sample_rate = pipeline_config.get('sample_rate', 10)
+        stages_config = pipeline_config.get('stages', {})
+
+        # analyze 阶段配置了 batch_size 时按批分析，一个 AI 请求处理一组错误
+        analyze_batching = stages_config.get('analyze', {}).get('batch_size', 1) > 1
+        # 异步分析器逐条分析时，工作线程只提交请求，结果在完成线程中写回事件
+        analyze_async = not analyze_batching and isinstance(self.error_analyzer, AsyncErrorAnalyzer)
+        if analyze_batching:
+            analyze_handler = self._analyze_events
+        elif analyze_async:
+            analyze_handler = self._submit_analysis
+        else:
+            analyze_handler = self._analyze_event
+        stage_handlers = [
+            ('enrich', self._enrich_event, 2),
+            ('analyze', analyze_handler, 4),
+            ('persist', self._persist_event, 1),
+            ('notify', self._notify_event, 2)
+        ]
+
+        # drop_oldest / sample 策略丢弃的事件同样释放去重记录并暂存或计入汇总
+        pipeline = EventPipeline(on_drop=self.on_pipeline_drop)
+        for name, handler, default_workers in stage_handlers:
+            if self.profiler is not None:
+                handler = self.profiler.timer.timed(name, handler)
+            stage_config = stages_config.get(name, {})
+            async_stage = name == 'analyze' and analyze_async
+            pipeline.add_stage(
+                name=name,
+                handler=handler,
+                workers=stage_config.get('workers', default_workers),
+                queue_size=stage_config.get('queue_size', queue_size),
+                policy=stage_config.get('backpressure', policy),
+                sample_rate=stage_config.get('sample_rate', sample_rate),
+                batch_size=stage_config.get('batch_size', 1),
+                max_latency=stage_config.get('max_latency', 0.0),
+                max_in_flight=stage_config.get('max_in_flight', 200) if async_stage else 0,
+                complete=self._finish_analysis if async_stage else None
+            )
+        return pipeline
+
+    def instrument_stages(self):
+        """
+        --profile 模式: 把各处理阶段替换为记录耗时的版本（流水线各阶段在 build_pipeline 中包装）
+
+        只在性能分析时替换，平时没有额外开销；阶段之间可以嵌套，如 read 包含 detect，detect 包含 match
+        """
+        timer = self.profiler.timer
+        # 日志读取线程中每一行的处理: 时间戳解析、重复行检查、多行合并和错误检测
+        timer.instrument(self.docker_monitor, 'handle_log_line', 'read')
+        # 错误检测: 关键词匹配、模板提取、去重、限流和提交流水线
+        timer.instrument(self, 'on_log_line', 'detect')
+        if self.assembler is not None:
+            self.assembler.emit = self.on_log_line
+        else:
+            self.docker_monitor.error_callback = self.on_log_line
+        # 关键词匹配每个事件都记录，/metrics 中的匹配耗时也改用更细的分桶
+        self.match_latency = timer.stage('match')
+        self.match_timing_sample = 1
+        timer.instrument(self.template_miner, 'add', 'template')
+        timer.instrument(self, 'extract_error_type', 'classify')
+        timer.instrument(self.error_analyzer, '_call_api', 'openai')
+        if isinstance(self.error_analyzer, AsyncErrorAnalyzer):
+            # 异步提交的请求不经过 _call_api，由事件循环记录耗时
+            self.error_analyzer.api_timer = timer.stage('openai')
+        timer.instrument(self.feishu_notifier, '_post', 'feishu')
+        if self.db_writer:
+            timer.instrument(self.db_writer, 'flush_func', 'sqlite')
+
     def on_log_line(self, container_name: str, container_id: str,
-                    log_line: str, timestamp: datetime):
+                    log_line: str, timestamp: datetime, context: Optional[List[str]] = None):
         """
         日志行回调函数，检测是否包含错误
 
+        只做关键词检测、去重和频率限制等轻量操作，其余耗时步骤交给事件流水线异步处理，
+        避免阻塞容器日志流的读取
+
         Args:
             container_name: 容器名称
             container_id: 容器 ID
-            log_line: 日志行
-            timestamp: 时间戳
+            log_line: 日志行，启用多行合并时是合并后的整个事件
+            timestamp: 日志时间（Docker 日志时间戳，本地时间）
+            context: 事件之前的日志行
         """
-        # 检测是否是错误日志
-        if not self.is_error_log(log_line):
+        # 检测是否是错误日志；读取一次配置引用，热加载替换配置时本行仍使用同一组配置
+        settings = self.settings
+        if self.events_checked.inc(container_name) % self.match_timing_sample == 0:
+            started = time.perf_counter()
+            match = settings.matcher.match(log_line)
+            self.match_latency.observe(time.perf_counter() - started)
+        else:
+            match = settings.matcher.match(log_line)
+        if not match.is_error:
             return
+        self.error_events.inc(container_name)
 
         logger.info(f"检测到错误日志: [{container_name}] {log_line[:100]}...")
 
-        # 检查去重
-        error_key = self.generate_error_key(container_name, log_line)
-        if self.is_duplicate_error(error_key):
-            logger.debug(f"重复错误，已跳过: {error_key}")
+        # 提取日志模板，只有数字、ID、路径等不同的错误共用一个模板 ID；多行事件只用首行和异常行，不看调用栈帧
+        template = self.template_miner.add(event_signature(log_line))
+
+        # 检查去重；不重复时同时占用去重缓存，避免同一错误在处理过程中被重复提交，限流或通知失败时再移除
+        error_key = self.generate_error_key(container_name, template.template_id)
+        if self.error_cache.check_and_add(error_key):
+            logger.debug(f"重复错误，已跳过: [{container_name}] {log_line[:100]}")
             return
 
-        # 检查发送频率限制
-        if not self.check_rate_limit(container_name):
-            logger.warning(f"容器 {container_name} 已达到最大通知频率限制")
+        event = {
+            'error_key': error_key,
+            'template_id': template.template_id,
+            'template': template.template,
+            'container_name': container_name,
+            'container_id': container_id,
+            'log_line': log_line,
+            'context': context or [],
+            'timestamp': timestamp,
+            'match': match
+        }
+
+        # 检查发送频率限制，超出的错误不单独通知，计入汇总
+        limited = self.check_rate_limit(container_name, template.template_id, settings)
+        if limited:
+            self.error_cache.discard(error_key)
+            logger.warning(f"已达到最大通知频率限制 ({limited}): [{container_name}] 模板 {template.template_id}")
+            self.add_to_digest(event, RATE_LIMIT_REASONS[limited])
             return
 
-        # 获取容器信息
-        container_info = self.docker_monitor.get_container_info(container_name)
-        container_image = container_info.get('image', 'unknown') if container_info else 'unknown'
+        if not self.pipeline.submit(event):
+            self.on_pipeline_drop(event)
+
+    def on_pipeline_drop(self, event: dict):
+        """
+        事件没有进入流水线或被流水线丢弃（队列已满）时释放去重记录，事件暂存后重放，未启用暂存队列时计入汇总
+
+        Args:
+            event: 错误事件
+        """
+        self.error_cache.discard(event['error_key'])
+        if self.spool is not None:
+            logger.warning(f"事件流水线已满，错误事件已暂存: [{event['container_name']}]")
+            self.spool.put(SPOOL_EVENT, self.serialize_event(event))
+        else:
+            logger.warning(f"事件流水线已满，丢弃错误事件: [{event['container_name']}]")
+            self.add_to_digest(event, REASON_PIPELINE_FULL)
+
+    def _enrich_event(self, event: dict) -> dict:
+        """
+        流水线阶段：补充容器信息
+
+        Args:
+            event: 错误事件
+
+        Returns:
+            补充后的事件
+        """
+        container_info = self.docker_monitor.get_container_info(event['container_name'])
+        event['container_image'] = container_info.get('image', 'unknown') if container_info else 'unknown'
+        return event
+
+    def _analyze_event(self, event: dict) -> dict:
+        """
+        流水线阶段：使用 AI 分析错误
+
+        Args:
+            event: 错误事件
 
-        # 使用 AI 分析错误
+        Returns:
+            带分析结果的事件
+        """
         analysis = self.error_analyzer.analyze_error(
-            error_log=log_line,
-            container_name=container_name,
-            container_image=container_image
+            error_log=self.analysis_log(event),
+            container_name=event['container_name'],
+            container_image=event['container_image'],
+            fingerprint=event['template_id']
         )
+        return self._finish_analysis(event, analysis)
 
-        # 提取分析结果和解决方案
-        ai_analysis = None
-        ai_solution = None
-        if analysis:
-            # 尝试从分析结果中提取说明和建议
-            lines = analysis.split('\n')
-            analysis_part = []
-            solution_part = []
-            in_solution = False
-            
-            for line in lines:
-                if '建议' in line or '解决' in line or 'solution' in line.lower():
-                    in_solution = True
-                if in_solution:
-                    solution_part.append(line)
-                else:
-                    analysis_part.append(line)
-            
-            ai_analysis = '\n'.join(analysis_part).strip() or analysis
-            ai_solution = '\n'.join(solution_part).strip() if solution_part else None
-
-        # 判断错误严重度
-        severity = self.determine_severity(log_line)
-        
-        # 记录到数据库（如果web_app可用）
-        if WEB_APP_AVAILABLE:
-            try:
-                add_error_log(
-                    container_name=container_name,
-                    error_message=log_line[:500],  # 限制长度
-                    error_type=self.extract_error_type(log_line),
-                    log_content=log_line,
-                    severity=severity,
-                    ai_analysis=ai_analysis,
-                    ai_solution=ai_solution
-                )
-                logger.debug("错误已记录到数据库")
-            except Exception as e:
-                logger.error(f"记录错误到数据库失败: {e}")
-
-        # 发送飞书通知
-        success = self.feishu_notifier.send_error_notification(
-            container_name=container_name,
-            container_id=container_id,
-            error_log=log_line,
-            analysis=analysis or "AI 分析不可用",
-            timestamp=timestamp,
-            container_image=container_image
+    def _submit_analysis(self, event: dict) -> Future:
+        """
+        流水线阶段：提交 AI 分析，不等待结果（异步分析器）
+
+        Args:
+            event: 错误事件
+
+        Returns:
+            分析结果的 Future，完成后由流水线调用 _finish_analysis
+        """
+        return self.error_analyzer.submit_analysis(
+            error_log=self.analysis_log(event),
+            container_name=event['container_name'],
+            container_image=event['container_image'],
+            fingerprint=event['template_id']
         )
 
-        if success:
-            logger.info(f"成功发送错误通知: [{container_name}]")
-            # 更新去重缓存
-            self.error_cache[error_key] = timestamp
-        else:
-            logger.error(f"发送错误通知失败: [{container_name}]")
+    def _finish_analysis(self, event: dict, analysis: Optional[str]) -> dict:
+        """
+        把分析结果写回事件，分析未完成的事件记入补分析队列
 
-    def is_error_log(self, log_line: str) -> bool:
+        Args:
+            event: 错误事件
+            analysis: 分析结果
+
+        Returns:
+            带分析结果的事件
         """
-        判断日志行是否包含错误
+        event['analysis'] = analysis
+        event['ai_analysis'], event['ai_solution'] = self.split_analysis(analysis)
+        self.spool_failed_analysis(event)
+        return event
+
+    def _analyze_events(self, events: List[dict]) -> List[dict]:
+        """
+        流水线阶段：批量使用 AI 分析一组错误
 
         Args:
-            log_line: 日志行
+            events: 错误事件列表
 
         Returns:
-            是否是错误日志
+            带分析结果的事件列表
+        """
+        results = self.error_analyzer.analyze_error_batch([{
+            'error_log': self.analysis_log(event),
+            'container_name': event['container_name'],
+            'container_image': event['container_image'],
+            'template_id': event['template_id']
+        } for event in events], max_batch=len(events))
+        for event, result in zip(events, results):
+            event['analysis'] = result['analysis']
+            event['ai_analysis'], event['ai_solution'] = self.split_analysis(result['analysis'])
+            self.spool_failed_analysis(event)
+        return events
+
+    def analysis_log(self, event: dict) -> str:
         """
-        check_line = log_line if self.case_sensitive else log_line.lower()
+        发送给 AI 分析的日志: 之前的上下文行加上错误事件本身
 
-        for keyword in self.error_keywords:
-            if keyword in check_line:
-                return True
+        Args:
+            event: 错误事件（或暂存的分析记录）
 
-        return False
+        Returns:
+            日志文本
+        """
+        context = event.get('context')
+        if not context:
+            return event['log_line']
+        return '\n'.join(context) + '\n' + event['log_line']
 
-    def generate_error_key(self, container_name: str, log_line: str) -> str:
+    def spool_failed_analysis(self, event: dict):
         """
-        生成错误的唯一标识键
+        分析未完成时暂存，稍后重新分析并补写数据库中的分析结果（通知不等待）
 
         Args:
-            container_name: 容器名称
-            log_line: 日志行
+            event: 已分析的错误事件
+        """
+        if self.spool is None or not is_analysis_failure(event['analysis']):
+            return
+        key = (event['container_name'], event['template_id'])
+        if key in self.spooled_analyses:
+            return
+        self.spooled_analyses.add(key)
+        self.spool.put(SPOOL_ANALYSIS, {
+            'container_name': event['container_name'],
+            'container_image': event['container_image'],
+            'log_line': event['log_line'],
+            'context': event.get('context', []),
+            'template_id': event['template_id']
+        })
+
+    def _persist_event(self, event: dict) -> dict:
+        """
+        流水线阶段：记录错误到数据库（如果web_app可用）
+
+        Args:
+            event: 错误事件
+
+        Returns:
+            原事件
+        """
+        if not WEB_APP_AVAILABLE:
+            return event
+
+        log_line = event['log_line']
+        match = event['match']
+        row = {
+            # 数据库中的时间为 UTC
+            'timestamp': event['timestamp'].astimezone(timezone.utc).replace(tzinfo=None),
+            'container_name': event['container_name'],
+            'error_message': log_line[:500],  # 限制长度
+            'error_type': self.extract_error_type(log_line, match),
+            'log_content': log_line,
+            'severity': match.severity,
+            'ai_analysis': event['ai_analysis'],
+            'ai_solution': event['ai_solution'],
+            'template_id': event['template_id']
+        }
+        try:
+            if self.db_writer:
+                # 交给后台写入线程合并为批次提交
+                self.db_writer.submit(row)
+            else:
+                add_error_log(**row)
+                logger.debug("错误已记录到数据库")
+        except Exception as e:
+            logger.error(f"记录错误到数据库失败: {e}")
+        return event
+
+    def _notify_event(self, event: dict) -> None:
+        """
+        流水线阶段：发送飞书通知
+
+        Args:
+            event: 错误事件
+        """
+        container_name = event['container_name']
+        if self.digest_all:
+            self.add_to_digest(event, REASON_DIGEST)
+            return
+
+        def on_delivered(success: bool):
+            if success:
+                logger.info(f"成功发送错误通知: [{container_name}]")
+                return
+            logger.error(f"发送错误通知失败: [{container_name}]")
+            # 通知失败时释放去重缓存，允许下次重新通知；本次通知暂存后重发，未启用暂存队列时计入汇总
+            self.error_cache.discard(event['error_key'])
+            if self.spool is not None:
+                self.spool.put(SPOOL_NOTIFY, self.serialize_event(event))
+            else:
+                self.add_to_digest(event, REASON_NOTIFY_FAILED)
+
+        notification = self.build_notification(event)
+        if not self.async_delivery:
+            on_delivered(self.feishu_notifier.send_error_notification(**notification))
+        elif not self.feishu_notifier.submit_error_notification(callback=on_delivered, **notification):
+            # 发送队列已满
+            on_delivered(False)
+
+    def build_notification(self, event: dict) -> dict:
+        """
+        生成 send_error_notification 的参数
+
+        Args:
+            event: 错误事件
 
         Returns:
-            错误键
+            参数字典
         """
-        # 简单使用容器名 + 日志前 200 字符作为键
-        return f"{container_name}:{log_line[:200]}"
+        return dict(
+            container_name=event['container_name'],
+            container_id=event['container_id'],
+            error_log=event['log_line'],
+            analysis=event['analysis'] or "AI 分析不可用",
+            timestamp=event['timestamp'],
+            container_image=event['container_image']
+        )
 
-    def is_duplicate_error(self, error_key: str) -> bool:
+    def serialize_event(self, event: dict) -> dict:
         """
-        检查是否是重复错误
+        把错误事件转换为可以写入暂存队列的字典
 
         Args:
-            error_key: 错误键
+            event: 错误事件
 
         Returns:
-            是否是重复错误
+            可 JSON 序列化的字典
+        """
+        payload = {field: event[field] for field in SPOOL_EVENT_FIELDS if field in event}
+        payload['timestamp'] = event['timestamp'].isoformat()
+        return payload
+
+    def restore_event(self, payload: dict) -> dict:
         """
-        if error_key not in self.error_cache:
+        从暂存队列的记录恢复错误事件
+
+        Args:
+            payload: serialize_event 生成的字典
+
+        Returns:
+            错误事件
+        """
+        event = dict(payload)
+        event['timestamp'] = datetime.fromisoformat(payload['timestamp'])
+        event['match'] = self.settings.matcher.match(payload['log_line'])
+        event['error_key'] = self.generate_error_key(payload['container_name'], payload['template_id'])
+        return event
+
+    def replay_event(self, payload: dict) -> bool:
+        """重放暂存的错误事件: 重新提交到流水线"""
+        return self.pipeline.submit(self.restore_event(payload))
+
+    def replay_notification(self, payload: dict) -> bool:
+        """重放暂存的通知: 同步重新发送"""
+        return self.feishu_notifier.send_error_notification(**self.build_notification(self.restore_event(payload)))
+
+    def replay_analysis(self, payload: dict) -> bool:
+        """重放暂存的分析: 重新分析，成功后补写数据库中同一容器同一模板的分析结果"""
+        analysis = self.error_analyzer.analyze_error(
+            error_log=self.analysis_log(payload),
+            container_name=payload['container_name'],
+            container_image=payload['container_image'],
+            fingerprint=payload['template_id']
+        )
+        if is_analysis_failure(analysis):
             return False
+        self.spooled_analyses.discard((payload['container_name'], payload['template_id']))
+        if WEB_APP_AVAILABLE:
+            ai_analysis, ai_solution = self.split_analysis(analysis)
+            count = update_error_analysis(payload['container_name'], payload['template_id'],
+                                          ai_analysis, ai_solution)
+            logger.info(f"已补写 {count} 条错误的 AI 分析: [{payload['container_name']}]")
+        return True
 
-        last_time = self.error_cache[error_key]
-        time_diff = (datetime.now() - last_time).total_seconds()
+    def spool_failed_rows(self, rows: List[dict]):
+        """
+        批量写入器重试和逐条写入后仍然失败的记录写入暂存队列，稍后重放
 
-        return time_diff < self.dedup_window
+        Args:
+            rows: 数据库记录列表
+        """
+        if self.spool is None:
+            return
+        for row in rows:
+            payload = dict(row)
+            payload['timestamp'] = row['timestamp'].isoformat() if row.get('timestamp') else None
+            self.spool.put(SPOOL_ROW, payload)
+        logger.warning(f"{len(rows)} 条写入数据库失败的记录已暂存")
+
+    def replay_row(self, payload: dict) -> bool:
+        """重放暂存的数据库记录: 同步写入"""
+        row = dict(payload)
+        if row.get('timestamp'):
+            row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+        try:
+            insert_error_logs([row])
+        except Exception as e:
+            logger.warning(f"重放数据库记录失败: {e}")
+            return False
+        return True
 
-    def check_rate_limit(self, container_name: str) -> bool:
+    def on_spool_dead_letter(self, kind: str, payload: dict):
         """
-        检查发送频率限制
+        暂存记录多次重放失败移入死信表时，把错误计入告警汇总
+
+        Args:
+            kind: 记录类型
+            payload: 记录内容
+        """
+        if kind == SPOOL_ANALYSIS:
+            self.spooled_analyses.discard((payload['container_name'], payload['template_id']))
+            return
+        if kind == SPOOL_ROW:
+            # 通知已经发出，只是没有写入数据库
+            logger.error(f"数据库记录多次重放失败，已移入死信表: [{payload.get('container_name')}]")
+            return
+        reason = REASON_NOTIFY_FAILED if kind == SPOOL_NOTIFY else REASON_PIPELINE_FULL
+        self.add_to_digest(self.restore_event(payload), reason)
+
+    def add_to_digest(self, event: dict, reason: str):
+        """
+        把未单独通知的错误计入告警汇总
+
+        Args:
+            event: 错误事件
+            reason: 未单独通知的原因
+        """
+        if self.digest is None:
+            return
+        self.digest.add(
+            container_name=event['container_name'],
+            template_id=event['template_id'],
+            template=event['template'],
+            error_type=self.extract_error_type(event['log_line'], event['match']),
+            log_line=event['log_line'],
+            timestamp=event['timestamp'],
+            reason=reason
+        )
+
+    def flush_digest(self, force: bool = False):
+        """
+        汇总窗口结束时发送错误汇总
+
+        Args:
+            force: 不等窗口结束，立即发送（退出前调用）
+        """
+        if self.digest is None:
+            return
+        digest = self.digest.flush(force)
+        if not digest:
+            return
+
+        def on_delivered(success: bool):
+            if not success:
+                logger.error(f"发送错误汇总失败，{digest['total']} 条错误未通知")
+
+        if self.async_delivery and not force:
+            if not self.feishu_notifier.submit_digest_notification(digest, on_delivered):
+                on_delivered(False)
+        else:
+            on_delivered(self.feishu_notifier.send_digest_notification(digest))
+
+    def split_analysis(self, analysis: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        """
+        从分析结果中提取说明和建议
+
+        Args:
+            analysis: AI 分析结果
+
+        Returns:
+            (分析说明, 解决方案)
+        """
+        if not analysis:
+            return None, None
+
+        analysis_part = []
+        solution_part = []
+        in_solution = False
+
+        for line in analysis.split('\n'):
+            if '建议' in line or '解决' in line or 'solution' in line.lower():
+                in_solution = True
+            if in_solution:
+                solution_part.append(line)
+            else:
+                analysis_part.append(line)
+
+        ai_analysis = '\n'.join(analysis_part).strip() or analysis
+        ai_solution = '\n'.join(solution_part).strip() if solution_part else None
+        return ai_analysis, ai_solution
+
+    def is_error_log(self, log_line: str) -> bool:
+        """
+        判断日志行是否包含错误
+
+        Args:
+            log_line: 日志行
+
+        Returns:
+            是否是错误日志
+        """
+        return self.settings.matcher.is_error(log_line)
+
+    def generate_error_key(self, container_name: str, template_id: str) -> bytes:
+        """
+        生成错误的唯一标识键
 
         Args:
             container_name: 容器名称
+            template_id: 日志模板 ID
 
         Returns:
-            是否可以发送
+            定长哈希键
+        """
+        # 同一容器内同一模板的错误视为重复
+        return make_key(container_name, template_id)
+
+    def check_rate_limit(self, container_name: str, template_id: Optional[str] = None,
+                         settings: Optional[DetectionSettings] = None) -> Optional[str]:
         """
-        now = datetime.now()
+        检查发送频率限制
 
-        # 每分钟重置计数器
-        if (now - self.last_rate_reset).total_seconds() >= 60:
-            self.rate_limit_counter.clear()
-            self.last_rate_reset = now
+        同一模板在所有容器中、每个容器、所有容器合计三级令牌桶都有剩余额度时才可以发送，
+        避免多个副本同时报同一个错误、或大量容器同时出错时刷屏
 
-        # 检查当前容器的发送次数
-        if self.rate_limit_counter[container_name] >= self.max_rate_per_minute:
-            return False
+        Args:
+            container_name: 容器名称
+            template_id: 日志模板 ID
+            settings: 调用方已读取的配置，为空时使用当前配置
 
-        self.rate_limit_counter[container_name] += 1
-        return True
+        Returns:
+            可以发送时返回 None，否则返回超出限制的级别（template / container / global）
+        """
+        settings = settings or self.settings
+        return self.rate_limiter.acquire(settings.rate_limits, container_name, template_id)
 
-    def determine_severity(self, log_line: str) -> str:
+    def determine_severity(self, log_line: str, match: Optional[LineMatch] = None) -> str:
         """
         判断错误的严重程度
 
         Args:
             log_line: 日志行
+            match: 已有的关键词匹配结果，为空时重新匹配
 
         Returns:
             严重度: critical, error, warning
         """
-        log_lower = log_line.lower()
-        
-        # 严重错误关键词
-        critical_keywords = ['fatal', 'critical', 'panic', 'segmentation fault', 
-                           'out of memory', 'oom', 'core dumped']
-        for keyword in critical_keywords:
-            if keyword in log_lower:
-                return 'critical'
-        
-        # 错误关键词
-        error_keywords = ['error', 'exception', 'failed', 'failure', 'crash']
-        for keyword in error_keywords:
-            if keyword in log_lower:
-                return 'error'
-        
-        # 默认为警告
-        return 'warning'
-
-    def extract_error_type(self, log_line: str) -> str:
+        if match is None:
+            match = self.settings.matcher.classify(log_line)
+        return match.severity
+
+    def extract_error_type(self, log_line: str, match: Optional[LineMatch] = None) -> str:
         """
         从日志中提取错误类型
 
         Args:
             log_line: 日志行
+            match: 已有的关键词匹配结果，为空时重新匹配
 
         Returns:
             错误类型
         """
-        # 尝试提取常见的错误类型
-        import re
-        
-        # Java 异常
-        java_match = re.search(r'(\w+Exception|\w+Error):', log_line)
-        if java_match:
-            return java_match.group(1)
-        
-        # Python 异常
-        python_match = re.search(r'(\w+Error|\w+Exception)', log_line)
-        if python_match:
-            return python_match.group(1)
-        
-        # HTTP 错误
-        http_match = re.search(r'HTTP\s+(\d{3})', log_line, re.IGNORECASE)
-        if http_match:
-            return f'HTTP {http_match.group(1)}'
-        
-        # 通用错误标记
-        if 'timeout' in log_line.lower():
-            return 'Timeout'
-        elif 'connection' in log_line.lower() and ('refused' in log_line.lower() or 'failed' in log_line.lower()):
-            return 'Connection Error'
-        elif 'permission denied' in log_line.lower():
-            return 'Permission Error'
-        elif 'not found' in log_line.lower():
-            return 'Not Found'
-        
+        # 按运行时规则包分类，整条日志只扫描一遍
+        error_type = self.classifier.classify(log_line)
+        if error_type:
+            return error_type
+
+        # 通用错误标记（使用匹配器预先计算的类型提示，避免反复转换大小写）
+        if match is None:
+            match = self.settings.matcher.classify(log_line)
+        if match.type_hint:
+            return match.type_hint
+
         # 默认
         return 'Unknown Error'
 
@@ -385,23 +1138,350 @@ class LogMonitorApp:
         else:
             logger.warning("飞书 Webhook 连接失败，请检查配置")
 
-        # 启动 Docker 日志监控
+        # --profile 模式: 组件启动前开始采样调用栈
+        if self.profiler is not None:
+            self.profiler.start()
+
+        # 启动事件流水线和 Docker 日志监控
+        if self.db_writer:
+            self.db_writer.start()
+        if self.async_delivery:
+            self.feishu_notifier.start()
+        self.pipeline.start()
+        if self.spool is not None:
+            self.spool.start(
+                handlers={
+                    SPOOL_EVENT: self.replay_event,
+                    SPOOL_NOTIFY: self.replay_notification,
+                    SPOOL_ANALYSIS: self.replay_analysis,
+                    SPOOL_ROW: self.replay_row
+                },
+                replay_interval=self.spool_replay_interval,
+                on_dead_letter=self.on_spool_dead_letter
+            )
+        if self.assembler is not None:
+            self.assembler.start()
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.start()
         self.docker_monitor.start_monitoring()
+        if WEB_APP_AVAILABLE and self.docker_monitor.container_cache is not None:
+            set_container_cache(self.docker_monitor.container_cache)
 
         logger.info("监控系统运行中，按 Ctrl+C 停止...")
 
-        # 保持主线程运行
+        # 保持主线程运行，定期输出流水线状态
+        metrics_interval = self.config.get('pipeline', {}).get('metrics_log_interval', 60)
+        last_metrics_log = time.monotonic()
         try:
             while True:
                 time.sleep(1)
+                self.flush_digest()
+                if self.config_watcher.poll():
+                    self.reload_config()
+                self.classifier.reload_if_changed()
+                # 收到 SIGUSR1 后输出性能分析结果
+                if self.profiler is not None:
+                    self.profiler.poll()
+                if metrics_interval and time.monotonic() - last_metrics_log >= metrics_interval:
+                    self.log_pipeline_metrics()
+                    last_metrics_log = time.monotonic()
         except KeyboardInterrupt:
             logger.info("收到停止信号，正在关闭...")
             self.stop()
 
+    def log_pipeline_metrics(self):
+        """输出流水线各阶段的队列深度等统计信息"""
+        for name, metrics in self.pipeline.get_metrics().items():
+            logger.info(
+                f"流水线阶段 {name}: 队列 {metrics['queue_depth']}/{metrics['queue_size']} "
+                f"(峰值 {metrics['high_watermark']}), 忙碌 {metrics['busy']}/{metrics['workers']}, "
+                f"已处理 {metrics['processed']}, 失败 {metrics['failed']}, 丢弃 {metrics['dropped']}"
+            )
+        cache = self.error_cache.get_metrics()
+        logger.info(
+            f"去重缓存: {cache['entries']}/{cache['max_entries']} 条, 命中率 {cache['hit_rate']:.1%}, "
+            f"淘汰 {cache['evictions']}, 过期 {cache['expirations']}"
+        )
+        templates = self.template_miner.get_metrics()
+        logger.info(
+            f"日志模板: {templates['templates']}/{templates['max_templates']} 个, "
+            f"已处理 {templates['lines']} 行, 淘汰 {templates['evictions']}"
+        )
+        classifier = self.classifier.get_metrics()
+        logger.info(
+            f"错误类型规则: {classifier['rules']} 条 (规则包 {', '.join(classifier['packs'])}), "
+            f"重新加载 {classifier['reloads']} 次, 失败 {classifier['reload_failures']}"
+        )
+        logger.info(f"配置文件: 重新加载 {self.config_reloads} 次, 失败 {self.config_reload_failures}")
+        if self.assembler is not None:
+            multiline = self.assembler.get_metrics()
+            logger.info(
+                f"多行合并: {multiline['lines']} 行合并为 {multiline['events']} 个事件 "
+                f"(多行事件 {multiline['multiline_events']}), 超时发出 {multiline['timeout_flushes']}, "
+                f"超长截断 {multiline['truncated']}, 等待续行 {multiline['pending']}"
+            )
+        readers = self.docker_monitor.get_metrics()
+        logger.info(
+            f"日志读取: 正在读取 {readers['following']} 个容器, 已接入 {readers['attached']} 次, "
+            f"断开 {readers['detached']}, 重启后重新接入 {readers['reattached']}, 跳过重复行 {readers['duplicates_skipped']}"
+        )
+        if self.docker_monitor.checkpoints is not None:
+            checkpoints = self.docker_monitor.checkpoints.get_metrics()
+            logger.info(
+                f"日志检查点: {checkpoints['containers']} 个容器, 写入 {checkpoints['flushes']} 次 "
+                f"(共 {checkpoints['written']} 条)"
+            )
+        if self.docker_monitor.container_cache is not None:
+            containers = self.docker_monitor.container_cache.get_metrics()
+            logger.info(
+                f"容器元数据缓存: {containers['containers']} 个容器, 命中率 {containers['hit_rate']:.1%}, "
+                f"Docker 事件 {containers['events']}, 全量刷新 {containers['refreshes']}, API 调用 {containers['api_calls']}"
+            )
+        analyzer = self.error_analyzer.get_metrics()
+        logger.info(
+            f"AI 分析: 单条请求 {analyzer['requests']}, 批量请求 {analyzer['batch_requests']} "
+            f"(共 {analyzer['batched_errors']} 条), 批量解析失败改为逐条 {analyzer['batch_fallbacks']}"
+        )
+        concurrency = analyzer.get('concurrency')
+        if concurrency:
+            logger.info(
+                f"AI 并发限制: 上限 {concurrency['limit']}, 进行中 {concurrency['in_flight']} "
+                f"(峰值 {concurrency['peak_in_flight']}), 限流 {concurrency['throttled']}, "
+                f"慢请求 {concurrency['slow']}, 重试 {analyzer['retries']}, 超时 {analyzer['timeouts']}"
+            )
+        cache = analyzer['cache']
+        if cache:
+            logger.info(
+                f"AI 分析缓存: {cache['entries']}/{cache['max_entries']} 条, 命中率 {cache['hit_rate']:.1%}, "
+                f"未命中 {cache['misses']}, 合并 {cache['coalesced']}, "
+                f"淘汰 {cache['evictions']}, 过期 {cache['expirations']}"
+            )
+        if self.digest is not None:
+            digest = self.digest.get_metrics()
+            logger.info(
+                f"告警汇总: 当前窗口 {digest['pending']} 条, 已发送 {digest['digests']} 次汇总 "
+                f"(共 {digest['summarized']} 条错误)"
+            )
+        limiter = self.rate_limiter.get_metrics()
+        suppressed = limiter['suppressed']
+        logger.info(
+            f"通知频率限制: 超出模板限制 {suppressed['template']}, 超出容器限制 {suppressed['container']}, "
+            f"超出全局限制 {suppressed['global']}"
+            + (f", 最多的容器 {', '.join(f'{name} {count}' for name, count in limiter['top_containers'])}"
+               if limiter['top_containers'] else "")
+        )
+        if self.spool is not None:
+            spool = self.spool.get_metrics()
+            logger.info(
+                f"暂存队列: 待重放 {spool['pending']}, 死信 {spool['dead_letters']}, 已暂存 {spool['spooled']} "
+                f"({spool['commits']} 次提交), 已重放 {spool['replayed']}, 重试 {spool['retries']}"
+            )
+        notifier = self.feishu_notifier.get_metrics()
+        latency = notifier['delivery_latency']
+        logger.info(
+            f"飞书通知: 队列 {notifier['queue_depth']}, 已送达 {notifier['delivered']}, 失败 {notifier['failed']}, "
+            f"丢弃 {notifier['dropped']}, 重试 {notifier['retries']}, 限流 {notifier['rate_limited']}, "
+            f"当前速率 {notifier['send_rate']:.1f}/s"
+            + (f", 投递延迟 p50 {latency['p50']:.2f}s p95 {latency['p95']:.2f}s" if latency['count'] else "")
+        )
+
+    def collect_metrics(self) -> List[MetricFamily]:
+        """
+        收集全部运行指标，供 /metrics 端点和状态文件使用
+
+        每行、每个事件更新的计数在读取时合并线程分片，其余指标直接取自各组件的 get_metrics()
+
+        Returns:
+            Prometheus 指标列表
+        """
+        families = [
+            gauge('log_monitor_start_time_seconds', '监控程序启动时间（Unix 时间戳）', self.started_at),
+            counter('log_monitor_events_total', '检测的日志事件数（多行日志合并为一个事件）',
+                    self.events_checked.values(), 'container'),
+            counter('log_monitor_error_events_total', '匹配错误关键词的日志事件数',
+                    self.error_events.values(), 'container'),
+            histogram('log_monitor_match_seconds',
+                      f'每个日志事件的错误关键词匹配耗时（秒，每 {self.match_timing_sample} 个事件采样一次）',
+                      self.match_latency.snapshot()),
+            counter('log_monitor_config_reloads_total', '配置文件重新加载次数', self.config_reloads),
+            counter('log_monitor_config_reload_failures_total', '配置文件重新加载失败次数',
+                    self.config_reload_failures)
+        ]
+
+        if self.docker_monitor:
+            monitor = self.docker_monitor.get_metrics()
+            families += [
+                counter('log_monitor_lines_total', '读取的日志行数', self.docker_monitor.lines_read.values(),
+                        'container'),
+                gauge('log_monitor_containers_following', '正在读取日志的容器数', monitor['following']),
+                counter('log_monitor_container_attaches_total', '接入容器日志流的次数', monitor['attached']),
+                counter('log_monitor_duplicate_lines_total', '重新接入后跳过的重复日志行数',
+                        monitor['duplicates_skipped'])
+            ]
+
+        cache = self.error_cache.get_metrics()
+        limiter = self.rate_limiter.get_metrics()
+        families += [
+            counter('log_monitor_dedup_hits_total', '去重缓存命中（重复错误）次数', cache['hits']),
+            counter('log_monitor_dedup_misses_total', '去重缓存未命中（新错误）次数', cache['misses']),
+            gauge('log_monitor_dedup_entries', '去重缓存记录数', cache['entries']),
+            counter('log_monitor_rate_limited_total', '超过通知频率限制的错误数', limiter['suppressed'], 'scope')
+        ]
+
+        if self.pipeline:
+            stages = self.pipeline.get_metrics()
+            families += [
+                gauge('log_monitor_pipeline_queue_depth', '流水线各阶段输入队列中的事件数',
+                      {name: m['queue_depth'] for name, m in stages.items()}, 'stage'),
+                gauge('log_monitor_pipeline_queue_size', '流水线各阶段输入队列长度',
+                      {name: m['queue_size'] for name, m in stages.items()}, 'stage'),
+                counter('log_monitor_pipeline_processed_total', '流水线各阶段处理的事件数',
+                        {name: m['processed'] for name, m in stages.items()}, 'stage'),
+                counter('log_monitor_pipeline_failed_total', '流水线各阶段处理失败的事件数',
+                        {name: m['failed'] for name, m in stages.items()}, 'stage'),
+                counter('log_monitor_pipeline_dropped_total', '流水线各阶段因队列满丢弃的事件数',
+                        {name: m['dropped'] for name, m in stages.items()}, 'stage')
+            ]
+
+        if self.error_analyzer:
+            analyzer = self.error_analyzer.get_metrics()
+            families += [
+                histogram('log_monitor_ai_request_seconds', 'AI 分析接口请求耗时（秒）', analyzer['request_latency']),
+                counter('log_monitor_ai_tokens_total', 'AI 分析使用的 token 数', analyzer['tokens']),
+                counter('log_monitor_ai_failures_total', 'AI 分析接口请求失败次数', analyzer['api_failures'])
+            ]
+            if analyzer['cache']:
+                families += [
+                    counter('log_monitor_ai_cache_hits_total', 'AI 分析缓存命中次数', analyzer['cache']['hits']),
+                    counter('log_monitor_ai_cache_misses_total', 'AI 分析缓存未命中次数', analyzer['cache']['misses'])
+                ]
+
+        if self.feishu_notifier:
+            notifier = self.feishu_notifier.get_metrics()
+            families += [
+                gauge('log_monitor_feishu_queue_depth', '飞书发送队列中的消息数', notifier['queue_depth']),
+                counter('log_monitor_feishu_delivered_total', '飞书消息送达数', notifier['delivered']),
+                counter('log_monitor_feishu_failed_total', '飞书消息发送失败数', notifier['failed']),
+                counter('log_monitor_feishu_dropped_total', '发送队列满时丢弃的飞书消息数', notifier['dropped']),
+                counter('log_monitor_feishu_retries_total', '飞书消息重试次数', notifier['retries']),
+                histogram('log_monitor_feishu_request_seconds', '飞书 Webhook 单次请求耗时（秒）',
+                          notifier['request_latency']),
+                histogram('log_monitor_feishu_delivery_seconds', '飞书消息从提交到送达的耗时（秒）',
+                          notifier['delivery_latency'])
+            ]
+
+        if self.db_writer:
+            writer = self.db_writer.get_metrics()
+            families += [
+                gauge('log_monitor_db_pending', '等待写入数据库的记录数', writer['pending']),
+                counter('log_monitor_db_rows_written_total', '写入数据库的记录数', writer['rows_written']),
+                counter('log_monitor_db_rows_failed_total', '写入数据库失败的记录数', writer['rows_failed']),
+                histogram('log_monitor_db_write_seconds', '数据库批量写入（一个事务）耗时（秒）', writer['flush_latency'])
+            ]
+
+        if self.spool is not None:
+            spool = self.spool.get_metrics()
+            families += [
+                gauge('log_monitor_spool_pending', '暂存队列中待重放的记录数', spool['pending']),
+                gauge('log_monitor_spool_dead_letters', '暂存队列中的死信数', spool['dead_letters'])
+            ]
+
+        if self.digest is not None:
+            families.append(counter('log_monitor_digest_errors_total', '计入告警汇总的错误数',
+                                    self.digest.get_metrics()['summarized']))
+        return families
+
+    def monitor_status(self) -> dict:
+        """
+        运行状态摘要，写入状态文件供 Web 界面的 /api/monitor/status 读取
+
+        Returns:
+            状态字典
+        """
+        checked = self.events_checked.total()
+        errors = self.error_events.total()
+        cache = self.error_cache.get_metrics()
+        status = {
+            'containers': self.docker_monitor.get_metrics()['following'] if self.docker_monitor else 0,
+            'lines': self.docker_monitor.lines_read.total() if self.docker_monitor else 0,
+            'events': checked,
+            'error_events': errors,
+            'match_rate': errors / checked if checked else 0.0,
+            'match_latency_p99': self.match_latency.snapshot()['p99'],
+            'dedup': {'hits': cache['hits'], 'hit_rate': cache['hit_rate']},
+            'rate_limited': self.rate_limiter.get_metrics()['suppressed'],
+            'config_reloads': self.config_reloads
+        }
+        if self.pipeline:
+            status['pipeline'] = {
+                name: {'queue_depth': m['queue_depth'], 'queue_size': m['queue_size']}
+                for name, m in self.pipeline.get_metrics().items()
+            }
+        if self.error_analyzer:
+            analyzer = self.error_analyzer.get_metrics()
+            status['ai'] = {
+                'requests': analyzer['request_latency']['count'],
+                'failures': analyzer['api_failures'],
+                'tokens': analyzer['tokens'],
+                'latency_p50': analyzer['request_latency']['p50'],
+                'latency_p95': analyzer['request_latency']['p95']
+            }
+        if self.feishu_notifier:
+            notifier = self.feishu_notifier.get_metrics()
+            status['notifications'] = {
+                'queue_depth': notifier['queue_depth'],
+                'delivered': notifier['delivered'],
+                'failed': notifier['failed'],
+                'dropped': notifier['dropped'],
+                'delivery_latency_p95': notifier['delivery_latency']['p95']
+            }
+        if self.db_writer:
+            writer = self.db_writer.get_metrics()
+            status['database'] = {
+                'pending': writer['pending'],
+                'rows_written': writer['rows_written'],
+                'rows_failed': writer['rows_failed'],
+                'write_latency_p95': writer['flush_latency']['p95']
+            }
+        return status
+
     def stop(self):
         """停止监控应用"""
         if self.docker_monitor:
             self.docker_monitor.stop_monitoring()
+        # 发出尚在等待续行的多行事件
+        if self.assembler is not None:
+            self.assembler.stop()
+
+        # 先停止日志读取，再排空流水线中尚未处理的事件
+        if self.pipeline:
+            self.pipeline.stop()
+
+        # 发送通知队列中剩余的消息，再发送尚未到期的错误汇总（包括刚刚发送失败的通知）
+        if self.feishu_notifier:
+            self.feishu_notifier.stop()
+            self.flush_digest(force=True)
+
+        # 提交批量写入器中尚未落盘的记录（写入失败的记录进入暂存队列，所以先于暂存队列停止）
+        if self.db_writer:
+            self.db_writer.stop()
+
+        # 提交暂存队列中尚未落盘的记录，下次启动时继续重放
+        if self.spool is not None:
+            self.spool.stop()
+
+        if isinstance(self.error_analyzer, AsyncErrorAnalyzer):
+            self.error_analyzer.close()
+        if self.error_analyzer and self.error_analyzer.cache:
+            self.error_analyzer.cache.close()
+
+        # 写入最后一次状态，Web 界面随即显示监控程序已停止
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
+
+        # 输出性能分析结果（调用栈采样和各阶段耗时）
+        if self.profiler is not None:
+            self.profiler.stop()
 
         logger.info("监控系统已停止")
         sys.exit(0)
@@ -409,15 +1489,33 @@ class LogMonitorApp:
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description='Docker 日志监控')
+    parser.add_argument('--profile', action='store_true',
+                        help='性能分析模式: 采样调用栈并记录各处理阶段耗时，停止时或收到 SIGUSR1 后输出结果')
+    parser.add_argument('--profile-dir', type=str, default='logs/profile',
+                        help='性能分析结果输出目录 (默认: logs/profile)')
+    parser.add_argument('--profile-interval', type=float, default=10.0,
+                        help='调用栈采样间隔，毫秒 (默认: 10)')
+    args = parser.parse_args()
+
     # 创建日志目录
     Path('logs').mkdir(exist_ok=True)
 
     # 创建应用实例
-    app = LogMonitorApp()
+    profiler = None
+    if args.profile:
+        profiler = Profiler(output_dir=args.profile_dir, interval=args.profile_interval / 1000)
+    app = LogMonitorApp(profiler=profiler)
 
     # 注册信号处理
     signal.signal(signal.SIGINT, lambda s, f: app.stop())
     signal.signal(signal.SIGTERM, lambda s, f: app.stop())
+    # SIGHUP: 重新加载配置文件（由主循环完成）
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda s, f: app.config_watcher and app.config_watcher.request_reload())
+    # SIGUSR1: 输出性能分析结果（由主循环完成）
+    if profiler is not None and hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda s, f: profiler.request_dump())
 
     # 启动应用
     app.start()
@@ -0,0 +1,360 @@
+"""
+运行统计模块
+固定分桶的延迟直方图，用于统计通知投递等耗时；每行日志都要更新的按线程分片计数器；
+以及 Prometheus 文本格式（/metrics）的输出
+"""
+import bisect
+import math
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+# 默认分桶上界（秒）
+DEFAULT_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 单行处理耗时的分桶上界（秒），如关键词匹配
+FAST_LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3, 1e-2)
+
+# Prometheus 文本格式的 Content-Type
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def bucket_quantile(bounds: Sequence[float], counts: Sequence[int], q: float) -> Optional[float]:
+    """
+    按分桶计数估算分位数（桶内线性插值）
+
+    Args:
+        bounds: 递增的分桶上界
+        counts: 各桶计数，最后一个是 +Inf 桶
+        q: 分位数，0 到 1
+
+    Returns:
+        估算值，没有数据时返回 None；落在 +Inf 桶时返回最大上界
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(counts):
+        if count and seen + count >= rank:
+            if i == len(bounds):
+                return bounds[-1]
+            lower = bounds[i - 1] if i > 0 else 0.0
+            return lower + (bounds[i] - lower) * (rank - seen) / count
+        seen += count
+    return bounds[-1]
+
+
+def histogram_snapshot(bounds: Sequence[float], counts: Sequence[int], value_sum: float) -> Dict:
+    """
+    由分桶计数生成直方图数据
+
+    Args:
+        bounds: 递增的分桶上界
+        counts: 各桶计数，最后一个是 +Inf 桶
+        value_sum: 观测值总和
+
+    Returns:
+        包含累计分桶计数 (le -> count)、总数、总和、p50/p95/p99 的字典
+    """
+    cumulative = {}
+    running = 0
+    for bound, count in zip(list(bounds) + [float('inf')], counts):
+        running += count
+        cumulative[bound] = running
+    return {
+        'buckets': cumulative,
+        'count': running,
+        'sum': value_sum,
+        'p50': bucket_quantile(bounds, counts, 0.5),
+        'p95': bucket_quantile(bounds, counts, 0.95),
+        'p99': bucket_quantile(bounds, counts, 0.99)
+    }
+
+
+class Histogram:
+    """固定分桶的直方图（线程安全）"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        """
+        初始化直方图
+
+        Args:
+            buckets: 递增的分桶上界，超过最大上界的值计入 +Inf 桶
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._counts: List[int] = [0] * (len(self.buckets) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        """
+        记录一个值
+
+        Args:
+            value: 观测值（秒）
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        按分桶估算分位数（桶内线性插值）
+
+        Args:
+            q: 分位数，0 到 1
+
+        Returns:
+            估算值，没有数据时返回 None；落在 +Inf 桶时返回最大上界
+        """
+        with self._lock:
+            counts = list(self._counts)
+        return bucket_quantile(self.buckets, counts, q)
+
+    def snapshot(self) -> Dict:
+        """
+        获取直方图数据
+
+        Returns:
+            包含累计分桶计数 (le -> count)、总数、总和、p50/p95/p99 的字典
+        """
+        with self._lock:
+            counts = list(self._counts)
+            value_sum = self.sum
+        return histogram_snapshot(self.buckets, counts, value_sum)
+
+
+class _ThreadShards:
+    """
+    按线程分片的统计数据
+
+    每个线程第一次写入时创建自己的分片并登记，之后只写自己的分片，不加锁；
+    读取时合并所有分片，已退出线程的分片并入 _retired 后释放
+    """
+
+    def __init__(self, new_shard: Callable[[], object], merge: Callable[[object, object], None]):
+        """
+        Args:
+            new_shard: 创建空分片
+            merge: merge(目标, 分片)，把分片累加到目标
+        """
+        self._new_shard = new_shard
+        self._merge = merge
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, object]] = []
+        self._retired = new_shard()
+        # 只在线程第一次写入和读取时使用
+        self._lock = threading.Lock()
+
+    def _register(self):
+        """创建并登记当前线程的分片（每个线程第一次写入时调用）"""
+        shard = self._local.shard = self._new_shard()
+        with self._lock:
+            self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _collect(self):
+        """合并所有分片"""
+        total = self._new_shard()
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    # 线程已退出，分片不会再被写入
+                    self._merge(self._retired, shard)
+            self._shards = alive
+            self._merge(total, self._retired)
+            for _, shard in alive:
+                self._merge(total, shard)
+        return total
+
+
+def _merge_counts(target: Dict[str, float], shard: Dict[str, float]):
+    for label, value in list(shard.items()):
+        target[label] = target.get(label, 0) + value
+
+
+class ShardedCounter(_ThreadShards):
+    """按一个标签值计数的计数器，用于每行日志都要更新的计数（计数时不加锁）"""
+
+    def __init__(self):
+        super().__init__(dict, _merge_counts)
+
+    def inc(self, label: str = '', amount: float = 1) -> float:
+        """
+        增加计数
+
+        Args:
+            label: 标签值，如容器名
+            amount: 增加量
+
+        Returns:
+            当前线程中该标签值的计数，可用于按次数采样
+        """
+        # 每行日志都会调用，直接读取线程局部变量，不再经过方法调用
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._register()
+        value = shard[label] = shard.get(label, 0) + amount
+        return value
+
+    def values(self) -> Dict[str, float]:
+        """各标签值的计数"""
+        return self._collect()
+
+    def total(self) -> float:
+        """所有标签值的合计"""
+        return sum(self._collect().values())
+
+
+class ShardedHistogram(_ThreadShards):
+    """固定分桶的直方图，每个线程写自己的分片（记录时不加锁），snapshot 与 Histogram 相同"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        """
+        初始化直方图
+
+        Args:
+            buckets: 递增的分桶上界，超过最大上界的值计入 +Inf 桶
+        """
+        self.buckets = tuple(sorted(buckets))
+        # 分片: 各桶计数（最后一个是 +Inf 桶）之后再加一项观测值总和
+        size = len(self.buckets) + 2
+        super().__init__(lambda: [0] * size, self._merge_shard)
+
+    @staticmethod
+    def _merge_shard(target: list, shard: list):
+        for i, value in enumerate(list(shard)):
+            target[i] += value
+
+    def observe(self, value: float):
+        """
+        记录一个值
+
+        Args:
+            value: 观测值（秒）
+        """
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._register()
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def snapshot(self) -> Dict:
+        """
+        获取直方图数据
+
+        Returns:
+            包含累计分桶计数 (le -> count)、总数、总和、p50/p95/p99 的字典
+        """
+        total = self._collect()
+        return histogram_snapshot(self.buckets, total[:-1], total[-1])
+
+
+class MetricFamily(NamedTuple):
+    """一个 Prometheus 指标及其全部样本"""
+    name: str
+    type: str  # counter / gauge / histogram
+    help: str
+    samples: List[Tuple[str, Dict[str, str], float]]  # (名称后缀, 标签, 值)
+
+
+def counter(name: str, help_text: str, value, label: Optional[str] = None) -> MetricFamily:
+    """
+    计数器指标
+
+    Args:
+        name: 指标名，以 _total 结尾
+        help_text: 说明
+        value: 计数，或 标签值 -> 计数 的字典（此时需要 label）
+        label: 标签名
+
+    Returns:
+        指标
+    """
+    return MetricFamily(name, 'counter', help_text, _samples(value, label))
+
+
+def gauge(name: str, help_text: str, value, label: Optional[str] = None) -> MetricFamily:
+    """当前值指标，参数与 counter 相同"""
+    return MetricFamily(name, 'gauge', help_text, _samples(value, label))
+
+
+def _samples(value, label: Optional[str]) -> list:
+    if isinstance(value, dict):
+        return [('', {label: str(key)}, v) for key, v in value.items()]
+    return [('', {}, value)]
+
+
+def histogram(name: str, help_text: str, snapshots, label: Optional[str] = None) -> MetricFamily:
+    """
+    直方图指标
+
+    Args:
+        name: 指标名
+        help_text: 说明
+        snapshots: Histogram.snapshot() 的结果，或 标签值 -> snapshot 的字典（此时需要 label）
+        label: 标签名
+
+    Returns:
+        指标
+    """
+    if not isinstance(snapshots, dict) or 'buckets' in snapshots:
+        snapshots = {None: snapshots}
+    samples = []
+    for key, snapshot in snapshots.items():
+        labels = {label: str(key)} if label else {}
+        for bound, count in snapshot['buckets'].items():
+            samples.append(('_bucket', dict(labels, le=format_value(float(bound))), count))
+        samples.append(('_sum', labels, snapshot['sum']))
+        samples.append(('_count', labels, snapshot['count']))
+    return MetricFamily(name, 'histogram', help_text, samples)
+
+
+def format_value(value: float) -> str:
+    """按 Prometheus 文本格式输出数值"""
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def render_text(families: Sequence[MetricFamily]) -> str:
+    """
+    按 Prometheus 文本格式（0.0.4）输出指标
+
+    Args:
+        families: 指标列表
+
+    Returns:
+        /metrics 响应内容
+    """
+    lines = []
+    for family in families:
+        lines.append(f"# HELP {family.name} {_escape(family.help)}")
+        lines.append(f"# TYPE {family.name} {family.type}")
+        for suffix, labels, value in family.samples:
+            if value is None:
+                continue
+            if labels:
+                label_text = ','.join(f'{key}="{_escape(str(v))}"' for key, v in labels.items())
+                lines.append(f"{family.name}{suffix}{{{label_text}}} {format_value(value)}")
+            else:
+                lines.append(f"{family.name}{suffix} {format_value(value)}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,171 @@
+"""
+监控指标输出模块
+在监控进程中提供 Prometheus /metrics 端点，并定期把指标和运行状态写入状态文件，
+供 Web 界面（另一个进程或容器，共享 logs 目录）的 /metrics 和 /api/monitor/status 读取
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+from metrics import PROMETHEUS_CONTENT_TYPE, MetricFamily, render_text
+
+logger = logging.getLogger(__name__)
+
+
+def read_status_file(path: str) -> Optional[dict]:
+    """
+    读取状态文件
+
+    Args:
+        path: 状态文件路径
+
+    Returns:
+        状态字典，文件不存在或无法解析时返回 None
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def status_families(status: dict) -> List[MetricFamily]:
+    """
+    状态文件中保存的指标
+
+    Args:
+        status: read_status_file 的结果
+
+    Returns:
+        指标列表
+    """
+    return [MetricFamily(*family) for family in status.get('metrics', [])]
+
+
+class MetricsExporter:
+    """/metrics 端点和状态文件"""
+
+    def __init__(self, collect: Callable[[], List[MetricFamily]], status: Callable[[], dict],
+                 host: str = '0.0.0.0', port: Optional[int] = 9108,
+                 status_file: Optional[str] = 'logs/monitor_status.json', status_interval: float = 5.0):
+        """
+        初始化指标输出
+
+        Args:
+            collect: 返回当前全部指标，每次抓取和写状态文件时调用
+            status: 返回运行状态摘要，写入状态文件
+            host: 监听地址
+            port: 监听端口，None 或 0 时不启动 HTTP 端点
+            status_file: 状态文件路径，None 时不写状态文件
+            status_interval: 状态文件写入间隔（秒）
+        """
+        self.collect = collect
+        self.status = status
+        self.host = host
+        self.port = port
+        self.status_file = status_file
+        self.status_interval = status_interval
+        self.started_at = time.time()
+
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._stop_flag = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+        # 统计信息
+        self.scrapes = 0
+        self.status_writes = 0
+
+    def start(self):
+        """启动 HTTP 端点和状态文件写入线程"""
+        if self.port:
+            exporter = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split('?', 1)[0] != '/metrics':
+                        self.send_error(404)
+                        return
+                    exporter.scrapes += 1
+                    body = render_text(exporter.collect()).encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    logger.debug(f"/metrics {self.client_address[0]}: {format % args}")
+
+            try:
+                self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+                self._server.daemon_threads = True
+            except OSError as e:
+                logger.error(f"启动 /metrics 端点失败 ({self.host}:{self.port}): {e}")
+            else:
+                thread = threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+                logger.info(f"/metrics 端点已启动: http://{self.host}:{self._server.server_address[1]}/metrics")
+
+        if self.status_file:
+            thread = threading.Thread(target=self._status_loop, name='metrics-status', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _status_loop(self):
+        """定期写入状态文件"""
+        while True:
+            try:
+                self.write_status()
+            except Exception as e:
+                logger.error(f"写入状态文件失败: {e}")
+            if self._stop_flag.wait(self.status_interval):
+                break
+
+    def write_status(self, stopped: bool = False):
+        """
+        写入状态文件（先写临时文件再原子替换）
+
+        Args:
+            stopped: 监控程序是否已停止
+        """
+        now = time.time()
+        data = {
+            'pid': os.getpid(),
+            'hostname': socket.gethostname(),
+            'started_at': self.started_at,
+            'updated_at': now,
+            'interval': self.status_interval,
+            'stopped': stopped,
+            'status': self.status(),
+            'metrics': [list(family) for family in self.collect()]
+        }
+        directory = os.path.dirname(self.status_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{self.status_file}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self.status_file)
+        self.status_writes += 1
+
+    def stop(self):
+        """停止 HTTP 端点，写入最后一次状态（标记为已停止）"""
+        self._stop_flag.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        if self.status_file:
+            try:
+                self.write_status(stopped=True)
+            except Exception as e:
+                logger.error(f"写入状态文件失败: {e}")
@@ -0,0 +1,254 @@
+"""
+多行日志合并模块
+按容器把 Python Traceback、Java 异常调用栈等多行日志合并为一个事件后再做错误检测，
+避免一条异常被拆成几十个“错误”分别去重、分析和通知；同时为每个容器保留最近几行日志作为上下文
+"""
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from docker_monitor import split_docker_timestamp
+
+logger = logging.getLogger(__name__)
+
+# 续行: 缩进的行、Java 调用栈帧、异常链和省略的帧
+CONTINUATION = re.compile(
+    r'^(?:\s+\S|\s*at\s|\s*\.\.\.\s*\d+\s+(?:more|common frames omitted)|\s*(?:Caused by|Suppressed):)'
+)
+# Python 调用栈开头
+TRACEBACK = re.compile(r'^Traceback \(most recent call last\):')
+# Python 异常链之间的说明行，其后是下一段 Traceback
+CHAIN = re.compile(r'^(?:During handling of the above exception|The above exception was the direct cause)')
+# Java 异常首行，如 "java.lang.IllegalStateException: boom"，通常紧跟在日志消息之后
+JAVA_EXCEPTION = re.compile(r'^(?:[a-zA-Z_$][\w$]*\.)+[\w$]*(?:Exception|Error|Throwable)(?::|$)')
+
+# 超过该时间（秒）没有新日志的容器释放其上下文，避免大量短生命周期容器占用内存
+IDLE_TTL = 300.0
+
+
+def event_signature(text: str) -> str:
+    """
+    取出多行事件中用于模板提取的行: 首行和各段异常的类型、消息，去掉调用栈帧
+
+    调用栈帧行号已被掩码，但帧数和路径不同的同一异常仍应归为一个模板；
+    模板提取只看前若干个 token，也不能让调用栈挤掉末尾的异常消息
+
+    Args:
+        text: 合并后的日志事件
+
+    Returns:
+        单行签名
+    """
+    lines = text.split('\n')
+    if len(lines) == 1:
+        return text
+    kept = [lines[0]]
+    for line in lines[1:]:
+        if (line.strip() and not line[0].isspace() and not CONTINUATION.match(line)
+                and not TRACEBACK.match(line) and not CHAIN.match(line)):
+            kept.append(line)
+    return ' '.join(kept)
+
+
+class _Buffer:
+    """单个容器正在合并的事件和上下文"""
+    __slots__ = ('container_name', 'container_id', 'lines', 'timestamp', 'updated', 'traceback', 'chained',
+                 'context')
+
+    def __init__(self, container_name: str, container_id: str, context_lines: int):
+        self.container_name = container_name
+        self.container_id = container_id
+        self.lines: List[str] = []
+        self.timestamp: Optional[datetime] = None
+        self.updated = 0.0
+        # 处于 Python 调用栈中: 之后第一个不缩进的行是异常行
+        self.traceback = False
+        # 上一个非空行是异常链说明行: 下一段 Traceback 属于同一事件
+        self.chained = False
+        self.context: deque = deque(maxlen=context_lines)
+
+
+class MultilineAssembler:
+    """按容器合并多行日志事件（线程安全）"""
+
+    def __init__(self, emit: Callable[..., None], flush_timeout: float = 0.5, max_lines: int = 200,
+                 context_lines: int = 5, clock: Callable[[], float] = time.monotonic):
+        """
+        初始化合并器
+
+        Args:
+            emit: 事件回调，参数为 (容器名, 容器 ID, 合并后的日志, 首行时间, 之前的上下文行列表)
+            flush_timeout: 事件最后一行之后等待续行的时间（秒），超时即发出
+            max_lines: 单个事件的最大行数，达到后立即发出
+            context_lines: 每个事件附带的之前的日志行数
+            clock: 单调时钟函数，返回秒数
+        """
+        self.emit = emit
+        self.flush_timeout = flush_timeout
+        self.max_lines = max_lines
+        self.context_lines = context_lines
+        self.clock = clock
+
+        self._buffers: Dict[str, _Buffer] = {}
+        self._lock = threading.Lock()
+        self._stop_flag = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 统计信息
+        self.lines = 0
+        self.events = 0
+        self.multiline_events = 0
+        self.merged_lines = 0
+        self.timeout_flushes = 0
+        self.truncated = 0
+
+    def add(self, container_name: str, container_id: str, log_line: str, timestamp: datetime):
+        """
+        加入一行日志，与 DockerLogMonitor 的日志行回调参数相同
+
+        续行并入当前事件；其他行先发出当前事件，再开始新的事件
+
+        Args:
+            container_name: 容器名称
+            container_id: 容器 ID
+            log_line: 日志行（可能以 Docker 时间戳开头）
+            timestamp: 日志时间
+        """
+        _, content = split_docker_timestamp(log_line)
+        ready = None
+        with self._lock:
+            self.lines += 1
+            buffer = self._buffers.get(container_id)
+            if buffer is None:
+                buffer = self._buffers[container_id] = _Buffer(container_name, container_id, self.context_lines)
+            buffer.container_name = container_name
+            buffer.updated = self.clock()
+
+            if buffer.lines and self._continues(buffer, content):
+                # 续行去掉时间戳，调用栈保持原样
+                buffer.lines.append(content)
+                self.merged_lines += 1
+                if len(buffer.lines) >= self.max_lines:
+                    self.truncated += 1
+                    ready = self._take(buffer)
+            else:
+                if buffer.lines:
+                    ready = self._take(buffer)
+                # 事件之间的空行不单独处理
+                if content.strip():
+                    buffer.lines.append(log_line)
+                    buffer.timestamp = timestamp
+                    buffer.traceback = bool(TRACEBACK.match(content))
+
+        if ready:
+            self.emit(*ready)
+
+    def _continues(self, buffer: _Buffer, content: str) -> bool:
+        """判断一行是否属于当前事件，同时更新调用栈状态"""
+        if not content.strip():
+            # 空行先并入，发出时去掉末尾的空行
+            return True
+        if buffer.traceback:
+            if not content[0].isspace():
+                # 调用栈之后第一个不缩进的行是异常行，调用栈到此结束
+                buffer.traceback = False
+            return True
+        if CHAIN.match(content):
+            buffer.chained = True
+            return True
+        if TRACEBACK.match(content):
+            # logger.exception() 的消息行之后、或异常链说明之后的 Traceback 属于同一事件
+            if buffer.chained or len(buffer.lines) == 1:
+                buffer.traceback = True
+                buffer.chained = False
+                return True
+            return False
+        buffer.chained = False
+        if CONTINUATION.match(content):
+            return True
+        # Java 异常首行只跟在单行日志消息之后，已有调用栈时是新的异常
+        return len(buffer.lines) == 1 and bool(JAVA_EXCEPTION.match(content))
+
+    def _take(self, buffer: _Buffer) -> tuple:
+        """取出当前事件（需持有锁），返回 emit 的参数"""
+        lines = buffer.lines
+        while lines and not lines[-1].strip():
+            lines.pop()
+        context = list(buffer.context)
+        buffer.context.extend(lines)
+        buffer.lines = []
+        buffer.traceback = buffer.chained = False
+        self.events += 1
+        if len(lines) > 1:
+            self.multiline_events += 1
+        return buffer.container_name, buffer.container_id, '\n'.join(lines), buffer.timestamp, context
+
+    def flush(self, force: bool = False):
+        """
+        发出等待续行超时的事件，并释放长时间没有日志的容器
+
+        Args:
+            force: 是否不等超时发出所有事件（停止时使用）
+        """
+        now = self.clock()
+        ready = []
+        with self._lock:
+            for container_id, buffer in list(self._buffers.items()):
+                idle = now - buffer.updated
+                if buffer.lines and (force or idle >= self.flush_timeout):
+                    if not force:
+                        self.timeout_flushes += 1
+                    ready.append(self._take(buffer))
+                elif not buffer.lines and idle >= IDLE_TTL:
+                    del self._buffers[container_id]
+        for event in ready:
+            try:
+                self.emit(*event)
+            except Exception as e:
+                logger.error(f"处理合并后的日志事件失败: [{event[0]}] {e}")
+
+    def start(self):
+        """启动后台线程，定期发出超时的事件"""
+        if self._thread:
+            return
+        self._stop_flag.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name='multiline-flush', daemon=True)
+        self._thread.start()
+
+    def _flush_loop(self):
+        """后台线程: 每半个超时时间检查一次"""
+        while not self._stop_flag.wait(self.flush_timeout / 2):
+            self.flush()
+
+    def stop(self):
+        """停止后台线程并发出所有未完成的事件"""
+        self._stop_flag.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush(force=True)
+
+    def get_metrics(self) -> dict:
+        """
+        获取合并统计信息
+
+        Returns:
+            统计信息字典
+        """
+        with self._lock:
+            pending = sum(1 for buffer in self._buffers.values() if buffer.lines)
+            containers = len(self._buffers)
+        return {
+            'lines': self.lines,
+            'events': self.events,
+            'multiline_events': self.multiline_events,
+            'merged_lines': self.merged_lines,
+            'timeout_flushes': self.timeout_flushes,
+            'truncated': self.truncated,
+            'pending': pending,
+            'containers': containers
+        }
@@ -0,0 +1,499 @@
+"""
+错误事件处理流水线模块
+将日志读取与富化、AI 分析、持久化、通知解耦，各阶段使用独立的有界队列和工作线程池
+"""
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 背压策略
+BACKPRESSURE_BLOCK = 'block'
+BACKPRESSURE_DROP_OLDEST = 'drop_oldest'
+BACKPRESSURE_SAMPLE = 'sample'
+BACKPRESSURE_POLICIES = (BACKPRESSURE_BLOCK, BACKPRESSURE_DROP_OLDEST, BACKPRESSURE_SAMPLE)
+
+
+class BoundedEventQueue:
+    """带背压策略的有界事件队列"""
+
+    def __init__(self, maxsize: int = 1000, policy: str = BACKPRESSURE_BLOCK,
+                 sample_rate: int = 10, on_drop: Optional[Callable] = None):
+        """
+        初始化有界队列
+
+        Args:
+            maxsize: 队列最大长度
+            policy: 队列满时的背压策略 (block / drop_oldest / sample)
+            sample_rate: sample 策略下，队列满时每 N 个新事件保留 1 个
+            on_drop: 为新事件腾出位置而丢弃队列中的旧事件时调用 on_drop(旧事件)（在锁外调用）；
+                     没有放入的新事件由 put 的返回值告知调用方
+        """
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"未知的背压策略: {policy}")
+
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.sample_rate = max(1, sample_rate)
+        self.on_drop = on_drop
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._all_done = threading.Condition(self._lock)
+        # 已取出但还没有调用 task_done 的事件数，与取出在同一把锁内增加
+        self._in_progress = 0
+        self._closed = False
+        self._overflow_seen = 0
+
+        # 统计信息
+        self.enqueued = 0
+        self.dropped = 0
+        self.high_watermark = 0
+
+    def put(self, item) -> bool:
+        """
+        放入事件，队列满时按背压策略处理
+
+        Args:
+            item: 事件
+
+        Returns:
+            事件是否被接收
+        """
+        dropped = None
+        with self._lock:
+            if self._closed:
+                return False
+
+            if len(self._items) >= self.maxsize:
+                if self.policy == BACKPRESSURE_BLOCK:
+                    while len(self._items) >= self.maxsize and not self._closed:
+                        self._not_full.wait()
+                    if self._closed:
+                        return False
+                elif self.policy == BACKPRESSURE_DROP_OLDEST:
+                    dropped = self._items.popleft()
+                    self.dropped += 1
+                else:
+                    # sample: 每 sample_rate 个溢出事件保留 1 个，替换最旧的事件
+                    self._overflow_seen += 1
+                    if self._overflow_seen % self.sample_rate != 0:
+                        self.dropped += 1
+                        return False
+                    dropped = self._items.popleft()
+                    self.dropped += 1
+
+            self._items.append(item)
+            self.enqueued += 1
+            if len(self._items) > self.high_watermark:
+                self.high_watermark = len(self._items)
+            self._not_empty.notify()
+
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+        return True
+
+    def get(self, timeout: Optional[float] = None):
+        """
+        取出事件
+
+        Args:
+            timeout: 等待超时时间（秒）
+
+        Returns:
+            事件，超时或队列已关闭且为空时返回 None；处理完取出的事件后需要调用 task_done
+        """
+        with self._lock:
+            if not self._items and not self._closed:
+                self._not_empty.wait(timeout)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._in_progress += 1
+            self._not_full.notify()
+            return item
+
+    def get_batch(self, max_items: int, max_latency: float, timeout: Optional[float] = None) -> list:
+        """
+        取出一批事件: 等待第一个事件，再在最大延迟内尽量凑满批次
+
+        Args:
+            max_items: 单批最大事件数
+            max_latency: 第一个事件最多等待多久（秒）
+            timeout: 等待第一个事件的超时时间（秒）
+
+        Returns:
+            事件列表，超时或队列已关闭且为空时返回空列表；处理完后需要调用 task_done(len(事件列表))
+        """
+        first = self.get(timeout)
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + max_latency
+        with self._lock:
+            while len(batch) < max_items:
+                if self._items:
+                    batch.append(self._items.popleft())
+                    self._in_progress += 1
+                    self._not_full.notify()
+                    continue
+                # 队列关闭时不再等待，直接处理已取出的事件
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closed:
+                    break
+                self._not_empty.wait(remaining)
+        return batch
+
+    def task_done(self, count: int = 1):
+        """
+        标记取出的事件已处理完毕
+
+        Args:
+            count: 处理完毕的事件数
+        """
+        with self._lock:
+            self._in_progress -= count
+            if not self._items and self._in_progress <= 0:
+                self._all_done.notify_all()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待队列为空且取出的事件都已处理完毕
+
+        Args:
+            timeout: 等待超时时间（秒）
+
+        Returns:
+            是否已全部处理完毕
+        """
+        with self._lock:
+            return self._all_done.wait_for(lambda: not self._items and self._in_progress <= 0, timeout)
+
+    def close(self):
+        """关闭队列，唤醒所有等待的线程"""
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    @property
+    def depth(self) -> int:
+        """当前队列深度"""
+        return len(self._items)
+
+    @property
+    def in_progress(self) -> int:
+        """已取出但还没有处理完毕的事件数"""
+        return self._in_progress
+
+
+class PipelineStage:
+    """流水线中的单个处理阶段"""
+
+    def __init__(self, name: str, handler: Callable, workers: int = 1,
+                 queue_size: int = 1000, policy: str = BACKPRESSURE_BLOCK,
+                 sample_rate: int = 10, batch_size: int = 1, max_latency: float = 0.0,
+                 max_in_flight: int = 0, complete: Optional[Callable] = None,
+                 on_drop: Optional[Callable] = None):
+        """
+        初始化处理阶段
+
+        Args:
+            name: 阶段名称
+            handler: 处理函数，接收事件并返回传给下一阶段的事件，返回 None 表示终止；
+                     batch_size 大于 1 时接收事件列表并返回结果列表（None 元素表示终止该事件）
+            workers: 工作线程数（并发上限）
+            queue_size: 阶段输入队列长度
+            policy: 背压策略
+            sample_rate: sample 策略的采样率
+            batch_size: 单批最大事件数，1 表示逐个处理
+            max_latency: 批处理时第一个事件最多等待多久（秒）
+            max_in_flight: 大于 0 时 handler 可以返回 concurrent.futures.Future，工作线程提交后立即处理下一个事件，
+                           Future 完成后由完成线程传给下一阶段；该值为同时未完成的 Future 数上限
+            complete: Future 完成后在完成线程中调用 complete(事件, 结果)，返回传给下一阶段的事件；
+                      None 时直接传递 Future 的结果
+            on_drop: 输入队列按背压策略丢弃事件、或下一阶段没有接收事件时调用 on_drop(事件)
+        """
+        self.name = name
+        self.handler = handler
+        self.complete = complete
+        self.max_in_flight = max(0, max_in_flight)
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.max_latency = max_latency
+        self.on_drop = on_drop
+        self.queue = BoundedEventQueue(queue_size, policy, sample_rate, on_drop)
+        self.next_stage: Optional['PipelineStage'] = None
+        self._threads: List[threading.Thread] = []
+        self._stop_flag = threading.Event()
+        # 保护 _busy、_in_flight 和统计计数
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._in_flight = 0
+        self._slots = threading.BoundedSemaphore(self.max_in_flight) if self.max_in_flight else None
+        # 已完成的 (事件, Future)，由完成线程处理，Future 的回调线程（如 AI 事件循环）不做阻塞操作
+        self._completed: queue.SimpleQueue = queue.SimpleQueue()
+
+        # 统计信息
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self):
+        """启动工作线程"""
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker,
+                name=f"pipeline-{self.name}-{i}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        if self._slots is not None:
+            thread = threading.Thread(
+                target=self._completion_worker,
+                name=f"pipeline-{self.name}-complete",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0):
+        """
+        停止阶段，等待队列中的事件处理完毕
+
+        Args:
+            timeout: 等待超时时间（秒）
+        """
+        deadline = time.monotonic() + timeout
+        # 取出事件时在队列锁内计入 in_progress，不会出现队列已空、工作线程还没开始处理的间隙
+        self.queue.join(timeout)
+
+        self._stop_flag.set()
+        self.queue.close()
+        for thread in self._threads:
+            thread.join(timeout=max(0.1, deadline - time.monotonic()))
+
+        unfinished = self.queue.depth + self.queue.in_progress
+        if unfinished:
+            logger.warning(f"流水线阶段 {self.name} 停止时仍有 {unfinished} 个事件未处理")
+
+    def _worker(self):
+        """工作线程主循环"""
+        if self.batch_size > 1:
+            self._batch_worker()
+            return
+
+        while not self._stop_flag.is_set():
+            event = self.queue.get(timeout=0.5)
+            if event is None:
+                continue
+
+            with self._lock:
+                self._busy += 1
+            slots = self._slots
+            if slots is not None:
+                # 未完成的 Future 达到上限时在这里等待，形成背压
+                slots.acquire()
+            pending = False
+            try:
+                result = self.handler(event)
+                if slots is not None and isinstance(result, concurrent.futures.Future):
+                    # 完成线程负责计数、释放许可并调用 task_done
+                    pending = True
+                    with self._lock:
+                        self._in_flight += 1
+                    result.add_done_callback(lambda future, event=event: self._completed.put((event, future)))
+                    continue
+                self._count(processed=1)
+                self._forward(result)
+            except Exception as e:
+                self._count(failed=1)
+                logger.error(f"流水线阶段 {self.name} 处理事件失败: {e}")
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                if not pending:
+                    if slots is not None:
+                        slots.release()
+                    self.queue.task_done()
+
+    def _completion_worker(self):
+        """完成线程主循环: 处理已完成的 Future 并传给下一阶段"""
+        while True:
+            try:
+                item = self._completed.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop_flag.is_set() and self._in_flight == 0:
+                    return
+                continue
+
+            event, future = item
+            try:
+                result = future.result()
+                if self.complete is not None:
+                    result = self.complete(event, result)
+                self._count(processed=1)
+                self._forward(result)
+            except Exception as e:
+                self._count(failed=1)
+                logger.error(f"流水线阶段 {self.name} 处理事件失败: {e}")
+            finally:
+                self._slots.release()
+                with self._lock:
+                    self._in_flight -= 1
+                self.queue.task_done()
+
+    def _count(self, processed: int = 0, failed: int = 0, batches: int = 0):
+        """更新统计计数"""
+        with self._lock:
+            self.processed += processed
+            self.failed += failed
+            self.batches += batches
+
+    def _forward(self, result):
+        """把处理结果传给下一阶段，None 表示终止；下一阶段没有接收时交给 on_drop"""
+        if result is None or self.next_stage is None:
+            return
+        if not self.next_stage.queue.put(result) and self.on_drop is not None:
+            self.on_drop(result)
+
+    def _batch_worker(self):
+        """批处理工作线程主循环"""
+        while not self._stop_flag.is_set():
+            events = self.queue.get_batch(self.batch_size, self.max_latency, timeout=0.5)
+            if not events:
+                continue
+
+            with self._lock:
+                self._busy += 1
+            try:
+                results = self.handler(events)
+                self._count(processed=len(events), batches=1)
+                for result in results:
+                    self._forward(result)
+            except Exception as e:
+                self._count(failed=len(events))
+                logger.error(f"流水线阶段 {self.name} 处理 {len(events)} 个事件失败: {e}")
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                self.queue.task_done(len(events))
+
+    def get_metrics(self) -> dict:
+        """
+        获取阶段统计信息
+
+        Returns:
+            统计信息字典
+        """
+        with self._lock:
+            processed, failed, batches = self.processed, self.failed, self.batches
+        return {
+            'workers': self.workers,
+            'busy': self._busy,
+            'in_flight': self._in_flight,
+            'queue_depth': self.queue.depth,
+            'queue_size': self.queue.maxsize,
+            'high_watermark': self.queue.high_watermark,
+            'enqueued': self.queue.enqueued,
+            'dropped': self.queue.dropped,
+            'processed': processed,
+            'failed': failed,
+            'batches': batches
+        }
+
+
+class EventPipeline:
+    """由多个阶段串联而成的错误事件处理流水线"""
+
+    def __init__(self, on_drop: Optional[Callable] = None):
+        """
+        初始化流水线
+
+        Args:
+            on_drop: 任一阶段按背压策略丢弃事件、或事件没能进入下一阶段时调用 on_drop(事件)，
+                     调用方据此释放去重记录、暂存事件或计入告警汇总；提交时没有被接收的事件由 submit 的返回值告知
+        """
+        self.on_drop = on_drop
+        self.stages: List[PipelineStage] = []
+        self._stages_by_name: Dict[str, PipelineStage] = {}
+        self.running = False
+
+    def add_stage(self, name: str, handler: Callable, workers: int = 1,
+                  queue_size: int = 1000, policy: str = BACKPRESSURE_BLOCK,
+                  sample_rate: int = 10, batch_size: int = 1, max_latency: float = 0.0,
+                  max_in_flight: int = 0, complete: Optional[Callable] = None) -> PipelineStage:
+        """
+        在流水线末尾追加一个阶段
+
+        Args:
+            name: 阶段名称
+            handler: 处理函数
+            workers: 工作线程数
+            queue_size: 输入队列长度
+            policy: 背压策略
+            sample_rate: sample 策略的采样率
+            batch_size: 单批最大事件数，大于 1 时 handler 按批接收事件
+            max_latency: 批处理时第一个事件最多等待多久（秒）
+            max_in_flight: 大于 0 时 handler 可以返回 Future，同时未完成的 Future 数上限
+            complete: Future 完成后调用 complete(事件, 结果)，返回传给下一阶段的事件
+
+        Returns:
+            新建的阶段
+        """
+        stage = PipelineStage(name, handler, workers, queue_size, policy, sample_rate, batch_size, max_latency,
+                              max_in_flight, complete, self.on_drop)
+        if self.stages:
+            self.stages[-1].next_stage = stage
+        self.stages.append(stage)
+        self._stages_by_name[name] = stage
+        return stage
+
+    def start(self):
+        """启动所有阶段"""
+        for stage in self.stages:
+            stage.start()
+        self.running = True
+        logger.info(f"事件流水线已启动: {' -> '.join(s.name for s in self.stages)}")
+
+    def stop(self, timeout: float = 10.0):
+        """
+        按顺序停止所有阶段，前一阶段排空后再停止后一阶段
+
+        Args:
+            timeout: 每个阶段的等待超时时间（秒）
+        """
+        self.running = False
+        for stage in self.stages:
+            stage.stop(timeout)
+        logger.info("事件流水线已停止")
+
+    def submit(self, event) -> bool:
+        """
+        提交事件到第一个阶段
+
+        Args:
+            event: 事件
+
+        Returns:
+            事件是否被接收
+        """
+        if not self.stages:
+            return False
+        return self.stages[0].queue.put(event)
+
+    def get_metrics(self) -> Dict[str, dict]:
+        """
+        获取各阶段统计信息
+
+        Returns:
+            阶段名称到统计信息的映射
+        """
+        return {stage.name: stage.get_metrics() for stage in self.stages}
@@ -0,0 +1,296 @@
+"""
+性能分析模块
+main.py --profile 模式下使用: 进程内采样分析器定期记录所有线程的调用栈，输出火焰图工具可直接使用的折叠栈文件；
+各处理阶段（读取、关键词匹配、分类、AI 分析、数据库写入、飞书发送等）按次记录耗时，输出 p50/p95/p99 表格
+"""
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import ShardedHistogram
+
+logger = logging.getLogger(__name__)
+
+# 阶段耗时分桶: 1 微秒到 100 秒，每档相差约 26%，分位数误差在一档以内
+PROFILE_BUCKETS = tuple(1e-6 * 10 ** (i / 10) for i in range(81))
+
+
+def frame_label(code) -> str:
+    """
+    折叠栈中一个栈帧的名称
+
+    Args:
+        code: 栈帧的代码对象
+
+    Returns:
+        "函数名 (文件名:起始行号)"，不含折叠栈格式使用的分号
+    """
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ',')
+
+
+class StackSampler:
+    """采样分析器: 后台线程定期读取所有线程的当前调用栈并计数"""
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 128):
+        """
+        初始化采样分析器
+
+        Args:
+            interval: 采样间隔（秒）
+            max_depth: 每个调用栈最多记录的栈帧数（从最内层算起）
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        # 折叠栈 ("线程名;外层函数;...;内层函数") -> 采样次数
+        self._stacks: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop_flag = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 统计信息
+        self.samples = 0
+        self.sample_seconds = 0.0
+
+    def start(self):
+        """启动采样线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_flag.clear()
+        self._thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+        self._thread.start()
+        logger.info(f"采样分析已启动，间隔 {self.interval * 1000:.0f} ms")
+
+    def stop(self):
+        """停止采样线程"""
+        self._stop_flag.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        """采样循环"""
+        while not self._stop_flag.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"采样调用栈失败: {e}")
+
+    def sample(self):
+        """记录一次所有线程（采样线程自身除外）的调用栈"""
+        start = time.perf_counter()
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        collected = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            labels = []
+            while frame is not None and len(labels) < self.max_depth:
+                labels.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.append(names.get(thread_id, f'thread-{thread_id}').replace(';', ','))
+            labels.reverse()
+            collected.append(';'.join(labels))
+
+        with self._lock:
+            for stack in collected:
+                self._stacks[stack] = self._stacks.get(stack, 0) + 1
+            self.samples += 1
+            self.sample_seconds += time.perf_counter() - start
+
+    def stacks(self) -> Dict[str, int]:
+        """
+        获取目前为止的采样结果
+
+        Returns:
+            折叠栈 -> 采样次数
+        """
+        with self._lock:
+            return dict(self._stacks)
+
+    def write_collapsed(self, path: str) -> int:
+        """
+        写入折叠栈文件（每行 "栈帧;栈帧;... 次数"，可直接交给 flamegraph.pl、speedscope 等工具）
+
+        Args:
+            path: 文件路径
+
+        Returns:
+            写入的调用栈数
+        """
+        stacks = sorted(self.stacks().items())
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks:
+                f.write(f"{stack} {count}\n")
+        return len(stacks)
+
+
+class StageTimer:
+    """各处理阶段的耗时统计，每个线程写自己的分片，记录时不加锁"""
+
+    def __init__(self):
+        """初始化阶段耗时统计"""
+        # 阶段名 -> 耗时直方图，按首次出现的顺序输出
+        self._stages: Dict[str, ShardedHistogram] = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name: str) -> ShardedHistogram:
+        """
+        获取阶段的耗时直方图，不存在时创建
+
+        Args:
+            name: 阶段名
+
+        Returns:
+            耗时直方图，调用 observe(秒) 记录一次耗时
+        """
+        histogram = self._stages.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(name, ShardedHistogram(PROFILE_BUCKETS))
+        return histogram
+
+    def timed(self, name: str, func: Callable) -> Callable:
+        """
+        包装函数，每次调用（包括抛出异常）都记录一次耗时
+
+        Args:
+            name: 阶段名
+            func: 被包装的函数
+
+        Returns:
+            包装后的函数
+        """
+        histogram = self.stage(name)
+        perf_counter = time.perf_counter
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(perf_counter() - started)
+
+        return wrapper
+
+    def instrument(self, obj, attr: str, name: str):
+        """
+        把对象的方法替换为记录耗时的版本（只影响这个实例）
+
+        Args:
+            obj: 对象
+            attr: 方法名
+            name: 阶段名
+        """
+        setattr(obj, attr, self.timed(name, getattr(obj, attr)))
+
+    def report(self) -> List[Tuple[str, Dict]]:
+        """
+        获取各阶段的耗时统计
+
+        Returns:
+            [(阶段名, 包含 count/sum/p50/p95/p99 的直方图数据)]，按阶段首次出现的顺序
+        """
+        with self._lock:
+            stages = list(self._stages.items())
+        return [(name, histogram.snapshot()) for name, histogram in stages]
+
+    def format_table(self) -> str:
+        """
+        生成各阶段耗时表格（毫秒）
+
+        Returns:
+            表格文本
+        """
+        def ms(value: Optional[float]) -> str:
+            return f"{value * 1000:.3f}" if value is not None else '-'
+
+        lines = [f"{'阶段':<12}{'次数':>10}{'总耗时(s)':>12}{'平均(ms)':>12}"
+                 f"{'p50(ms)':>12}{'p95(ms)':>12}{'p99(ms)':>12}"]
+        for name, data in self.report():
+            count = data['count']
+            mean = data['sum'] / count if count else None
+            lines.append(f"{name:<12}{count:>10}{data['sum']:>12.3f}{ms(mean):>12}"
+                         f"{ms(data['p50']):>12}{ms(data['p95']):>12}{ms(data['p99']):>12}")
+        return '\n'.join(lines)
+
+
+class Profiler:
+    """--profile 模式: 采样分析和阶段耗时，停止时或收到 SIGUSR1 后输出结果"""
+
+    def __init__(self, output_dir: str = 'logs/profile', interval: float = 0.01):
+        """
+        初始化性能分析
+
+        Args:
+            output_dir: 结果输出目录
+            interval: 调用栈采样间隔（秒）
+        """
+        self.output_dir = output_dir
+        self.sampler = StackSampler(interval=interval)
+        self.timer = StageTimer()
+        self.started_at = time.time()
+        self._dump_requested = threading.Event()
+        self.dumps = 0
+
+    def start(self):
+        """开始采样"""
+        self.sampler.start()
+
+    def request_dump(self):
+        """请求输出一次结果（可在信号处理函数中调用，由 poll 完成输出）"""
+        self._dump_requested.set()
+
+    def poll(self) -> Optional[Tuple[str, str]]:
+        """
+        有输出请求时输出结果，由主循环定期调用
+
+        Returns:
+            输出时返回 (折叠栈文件路径, 阶段耗时文件路径)，否则返回 None
+        """
+        if not self._dump_requested.is_set():
+            return None
+        self._dump_requested.clear()
+        return self.dump()
+
+    def dump(self) -> Tuple[str, str]:
+        """
+        输出目前为止（从启动开始累计）的采样结果和阶段耗时表格
+
+        Returns:
+            (折叠栈文件路径, 阶段耗时文件路径)
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        suffix = datetime.now().strftime('%Y%m%d-%H%M%S')
+        stacks_path = os.path.join(self.output_dir, f'profile-{suffix}.collapsed')
+        stages_path = os.path.join(self.output_dir, f'stages-{suffix}.txt')
+
+        stack_count = self.sampler.write_collapsed(stacks_path)
+        table = self.timer.format_table()
+        elapsed = time.time() - self.started_at
+        sampler = self.sampler
+        overhead = sampler.sample_seconds / sampler.samples * 1000 if sampler.samples else 0.0
+        with open(stages_path, 'w', encoding='utf-8') as f:
+            f.write(f"运行 {elapsed:.1f} 秒，调用栈采样 {sampler.samples} 次（每次 {overhead:.2f} ms）\n\n")
+            f.write(table + '\n')
+        self.dumps += 1
+
+        logger.info(f"性能分析结果已输出: {stacks_path} ({stack_count} 个调用栈, {sampler.samples} 次采样), "
+                    f"{stages_path}\n{table}")
+        return stacks_path, stages_path
+
+    def stop(self) -> Tuple[str, str]:
+        """
+        停止采样并输出最终结果
+
+        Returns:
+            (折叠栈文件路径, 阶段耗时文件路径)
+        """
+        self.sampler.stop()
+        return self.dump()
@@ -0,0 +1,225 @@
+"""
+通知频率限制模块
+全局、每个容器、每个日志模板三级令牌桶: 令牌按配置的速率连续补充，桶容量即允许的突发次数，
+没有固定窗口在整分钟处同时清零；任意 60 秒内最多放行 rate + burst 次，桶容量取得小时接近配置的速率
+"""
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, NamedTuple, Optional
+
+# 限流级别，按检查顺序排列: 先检查最具体的级别，被拒绝的错误归到最具体的原因
+SCOPE_TEMPLATE = 'template'
+SCOPE_CONTAINER = 'container'
+SCOPE_GLOBAL = 'global'
+SCOPES = (SCOPE_TEMPLATE, SCOPE_CONTAINER, SCOPE_GLOBAL)
+
+# 全局级别只有一个桶
+GLOBAL_KEY = ''
+
+# 两次清理空闲桶之间的最小间隔（秒）
+PRUNE_INTERVAL = 60.0
+
+# 未配置 burst 时桶容量为每分钟次数的 1/10（至少 1）:
+# 任意 60 秒内最多放行 rate + burst 次，容量等于 rate 时最坏情况是两倍
+DEFAULT_BURST_RATIO = 0.1
+
+
+class BucketLimit(NamedTuple):
+    """单个级别的限制"""
+    rate: float  # 每秒补充的令牌数
+    burst: float  # 桶容量
+
+
+class RateLimits(NamedTuple):
+    """三个级别的限制，为 None 的级别不限制"""
+    template: Optional[BucketLimit]
+    container: Optional[BucketLimit]
+    total: Optional[BucketLimit]
+
+
+def parse_limit(config: Optional[dict], default_per_minute: float = 0) -> Optional[BucketLimit]:
+    """
+    解析一个级别的配置
+
+    Args:
+        config: {'rate': 每分钟次数, 'burst': 突发次数}，为空时使用默认值
+        default_per_minute: 未配置 rate 时的每分钟次数
+
+    Returns:
+        限制，rate 不大于 0 时返回 None（不限制）；任意 60 秒内最多放行 rate + burst 次
+    """
+    config = config or {}
+    per_minute = float(config.get('rate', default_per_minute))
+    if per_minute <= 0:
+        return None
+    burst = float(config.get('burst', per_minute * DEFAULT_BURST_RATIO))
+    # 容量至少为 1，否则永远拿不到令牌
+    return BucketLimit(rate=per_minute / 60.0, burst=max(1.0, burst))
+
+
+class _Bucket:
+    """令牌桶，调用方持有 TokenBucketLimiter 的锁"""
+    __slots__ = ('tokens', 'updated', 'suppressed')
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.suppressed = 0
+
+    def take(self, limit: BucketLimit, now: float) -> bool:
+        """补充令牌后尝试取出一个"""
+        tokens = self.tokens + (now - self.updated) * limit.rate
+        if tokens > limit.burst:
+            tokens = limit.burst
+        self.updated = now
+        if tokens >= 1.0:
+            self.tokens = tokens - 1.0
+            return True
+        self.tokens = tokens
+        self.suppressed += 1
+        return False
+
+    def refund(self, limit: BucketLimit):
+        """退回一个令牌（后续级别拒绝时）"""
+        self.tokens = min(limit.burst, self.tokens + 1.0)
+
+    def idle_full(self, limit: Optional[BucketLimit], now: float) -> bool:
+        """是否已补满: 补满的桶与不存在的桶等价，可以删除"""
+        if limit is None:
+            return True
+        return self.tokens + (now - self.updated) * limit.rate >= limit.burst
+
+
+class TokenBucketLimiter:
+    """
+    分级令牌桶限流（线程安全）
+
+    一次检查依次从模板、容器、全局三个桶各取一个令牌，某一级没有令牌时退回已取出的令牌，
+    所以被拒绝的错误不消耗其他级别的额度。每次检查只加一次锁: 临界区只有几次浮点运算，
+    在 GIL 下每个桶单独加锁并不能让检查并行，反而每次检查要加锁三次
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        """
+        初始化限流器
+
+        Args:
+            clock: 时钟函数，返回单调递增的秒数
+        """
+        self.clock = clock
+        self._buckets: Dict[str, Dict[str, _Bucket]] = {scope: {} for scope in SCOPES}
+        # 已删除的空闲桶的拒绝次数: 各级别合计，以及容器级别每个容器的次数
+        self._pruned_suppressed: Counter = Counter()
+        self._pruned_containers: Counter = Counter()
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._last_prune = clock()
+
+    def _bucket(self, scope: str, key: str, limit: BucketLimit, now: float) -> _Bucket:
+        """取出或创建桶（调用方持有锁），新桶是满的"""
+        buckets = self._buckets[scope]
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = _Bucket(limit.burst, now)
+        return bucket
+
+    def acquire(self, limits: RateLimits, container_name: str, template_id: Optional[str] = None) -> Optional[str]:
+        """
+        检查并占用一次通知额度
+
+        Args:
+            limits: 各级别的限制（调用方读取的配置快照）
+            container_name: 容器名称
+            template_id: 日志模板 ID，为空时不检查模板级别
+
+        Returns:
+            允许时返回 None，否则返回拒绝的级别
+        """
+        now = self.clock()
+        if now - self._last_prune >= PRUNE_INTERVAL:
+            self.prune(limits, now)
+
+        template_limit, container_limit, total_limit = limits
+        with self._lock:
+            # 全局额度用完时（大量容器同时出错）不再逐级取出又退回令牌
+            if total_limit is not None:
+                total_bucket = self._buckets[SCOPE_GLOBAL].get(GLOBAL_KEY)
+                if total_bucket is not None \
+                        and total_bucket.tokens + (now - total_bucket.updated) * total_limit.rate < 1.0 \
+                        and not total_bucket.take(total_limit, now):
+                    return SCOPE_GLOBAL
+
+            # 依次取令牌，某一级拒绝时退回之前取出的令牌
+            template_bucket = container_bucket = None
+            if template_limit is not None and template_id is not None:
+                template_bucket = self._bucket(SCOPE_TEMPLATE, template_id, template_limit, now)
+                if not template_bucket.take(template_limit, now):
+                    return SCOPE_TEMPLATE
+            if container_limit is not None:
+                container_bucket = self._bucket(SCOPE_CONTAINER, container_name, container_limit, now)
+                if not container_bucket.take(container_limit, now):
+                    if template_bucket is not None:
+                        template_bucket.refund(template_limit)
+                    return SCOPE_CONTAINER
+            if total_limit is not None:
+                if not self._bucket(SCOPE_GLOBAL, GLOBAL_KEY, total_limit, now).take(total_limit, now):
+                    if template_bucket is not None:
+                        template_bucket.refund(template_limit)
+                    if container_bucket is not None:
+                        container_bucket.refund(container_limit)
+                    return SCOPE_GLOBAL
+            return None
+
+    def prune(self, limits: RateLimits, now: Optional[float] = None):
+        """
+        删除已补满的桶，容器和模板很多时限制内存占用
+
+        Args:
+            limits: 当前的限制
+            now: 当前时间，为空时读取时钟
+        """
+        # 只需一个线程清理
+        if not self._prune_lock.acquire(blocking=False):
+            return
+        try:
+            now = self.clock() if now is None else now
+            self._last_prune = now
+            for scope, limit in ((SCOPE_TEMPLATE, limits.template), (SCOPE_CONTAINER, limits.container),
+                                 (SCOPE_GLOBAL, limits.total)):
+                buckets = self._buckets[scope]
+                with self._lock:
+                    idle = [(key, bucket) for key, bucket in buckets.items() if bucket.idle_full(limit, now)]
+                    for key, _ in idle:
+                        del buckets[key]
+                for key, bucket in idle:
+                    if bucket.suppressed:
+                        self._pruned_suppressed[scope] += bucket.suppressed
+                        if scope == SCOPE_CONTAINER:
+                            self._pruned_containers[key] += bucket.suppressed
+        finally:
+            self._prune_lock.release()
+
+    def get_metrics(self, top: int = 5) -> dict:
+        """
+        获取限流统计信息
+
+        Args:
+            top: 列出的被拒绝次数最多的容器数
+
+        Returns:
+            统计信息字典
+        """
+        with self._prune_lock:
+            suppressed = Counter(self._pruned_suppressed)
+            containers = Counter(self._pruned_containers)
+        for scope in SCOPES:
+            for key, bucket in list(self._buckets[scope].items()):
+                suppressed[scope] += bucket.suppressed
+                if scope == SCOPE_CONTAINER and bucket.suppressed:
+                    containers[key] += bucket.suppressed
+        return {
+            'suppressed': {scope: suppressed[scope] for scope in SCOPES},
+            'top_containers': containers.most_common(top),
+            'buckets': {scope: len(self._buckets[scope]) for scope in SCOPES}
+        }
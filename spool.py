@@ -0,0 +1,368 @@
+"""
+持久化暂存队列模块
+飞书或 Azure OpenAI 不可用时，把发送失败的通知和未完成的分析写入 SQLite，重启后仍然保留，
+按写入顺序重放；失败按指数退避重试，超过最大次数后移入死信表
+
+写入采用组提交: put 只把记录放入内存缓冲区，由后台线程把一段时间内的记录合并为一个事务提交，
+多条记录共用一次 fsync，不阻塞日志处理
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_spool_kind_id ON spool (kind, id);
+CREATE TABLE IF NOT EXISTS dead_letter (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL,
+    failed_at REAL NOT NULL,
+    last_error TEXT
+);
+"""
+
+# 重放处理函数: 接收写入时的 payload，返回是否处理成功
+ReplayHandler = Callable[[dict], bool]
+
+
+class _Pending:
+    """一组等待提交的记录，wait=True 的调用方等待它提交完成"""
+    __slots__ = ('rows', 'done')
+
+    def __init__(self):
+        self.rows: List[Tuple[str, str, float]] = []
+        self.done = threading.Event()
+
+
+class DurableSpool:
+    """持久化暂存队列（线程安全）"""
+
+    def __init__(self, path: str = 'logs/spool.db', max_attempts: int = 5, retry_base: float = 5.0,
+                 retry_max: float = 600.0, commit_interval: float = 0.05, max_batch: int = 500,
+                 clock: Callable[[], float] = time.time):
+        """
+        初始化暂存队列
+
+        Args:
+            path: SQLite 数据库文件路径
+            max_attempts: 每条记录的最大重放次数，超过后移入死信表
+            retry_base: 重放失败后的基础等待时间（秒），第 n 次失败后等待 retry_base * 2^(n-1)
+            retry_max: 重放失败后的最长等待时间（秒）
+            commit_interval: 组提交的最长等待时间（秒），期间写入的记录在一个事务中提交
+            max_batch: 单个事务最多提交的记录数
+            clock: 时钟函数，返回秒数（持久化的时间戳，需要使用墙上时间）
+        """
+        self.path = path
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.commit_interval = commit_interval
+        self.max_batch = max(1, max_batch)
+        self.clock = clock
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # 每次提交都同步到磁盘，组提交保证多条记录共用一次 fsync
+        self._conn.execute('PRAGMA synchronous=FULL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+        self._pending = _Pending()
+        self._pending_cond = threading.Condition()
+        self._stop_flag = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self._replayer: Optional[threading.Thread] = None
+
+        # 统计信息
+        self.spooled = 0
+        self.commits = 0
+        self.replayed = 0
+        self.retries = 0
+        self.dead_lettered = 0
+        self.commit_latency = Histogram()
+
+        logger.info(f"暂存队列已打开: {path} (待重放 {self.pending()} 条, 死信 {self.dead_letter_count()} 条)")
+
+    def put(self, kind: str, payload: dict, wait: bool = False):
+        """
+        写入一条记录
+
+        Args:
+            kind: 记录类型，重放时按类型选择处理函数
+            payload: 可 JSON 序列化的记录内容（datetime 等按字符串保存）
+            wait: 是否等待记录提交到磁盘后再返回
+        """
+        row = (kind, json.dumps(payload, ensure_ascii=False, default=str), self.clock())
+        with self._pending_cond:
+            pending = self._pending
+            pending.rows.append(row)
+            self.spooled += 1
+            self._pending_cond.notify()
+        if self._writer is None:
+            # 写入线程未启动时直接提交
+            self.flush()
+        elif wait:
+            pending.done.wait()
+
+    def flush(self):
+        """立即提交缓冲区中的记录"""
+        with self._pending_cond:
+            pending, self._pending = self._pending, _Pending()
+        self._commit(pending)
+
+    def _commit(self, pending: _Pending):
+        """在一个事务中写入一组记录"""
+        if not pending.rows:
+            pending.done.set()
+            return
+        start = time.perf_counter()
+        try:
+            with self._lock:
+                self._conn.execute('BEGIN IMMEDIATE')
+                try:
+                    self._conn.executemany(
+                        'INSERT INTO spool (kind, payload, created_at) VALUES (?, ?, ?)', pending.rows
+                    )
+                    self._conn.execute('COMMIT')
+                except BaseException:
+                    self._conn.execute('ROLLBACK')
+                    raise
+            self.commits += 1
+        except Exception as e:
+            logger.error(f"写入暂存队列失败，丢失 {len(pending.rows)} 条记录: {e}")
+        finally:
+            self.commit_latency.observe(time.perf_counter() - start)
+            pending.done.set()
+
+    def _write_loop(self):
+        """写入线程主循环: 收到第一条记录后最多等待 commit_interval，把期间的记录一起提交"""
+        while True:
+            with self._pending_cond:
+                while not self._pending.rows and not self._stop_flag.is_set():
+                    self._pending_cond.wait(0.5)
+                if not self._pending.rows and self._stop_flag.is_set():
+                    return
+                deadline = time.monotonic() + self.commit_interval
+                while len(self._pending.rows) < self.max_batch and not self._stop_flag.is_set():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._pending_cond.wait(remaining)
+                pending, self._pending = self._pending, _Pending()
+            self._commit(pending)
+
+    def start(self, handlers: Dict[str, ReplayHandler], replay_interval: float = 5.0,
+              on_dead_letter: Optional[Callable[[str, dict], None]] = None):
+        """
+        启动组提交写入线程和重放线程
+
+        Args:
+            handlers: 记录类型 -> 重放处理函数
+            replay_interval: 重放检查间隔（秒）
+            on_dead_letter: 记录移入死信表时的回调，参数为 (记录类型, payload)
+        """
+        if self._writer:
+            return
+        self._stop_flag.clear()
+        self._writer = threading.Thread(target=self._write_loop, name='spool-writer', daemon=True)
+        self._writer.start()
+        self._replayer = threading.Thread(
+            target=self._replay_loop,
+            args=(handlers, replay_interval, on_dead_letter),
+            name='spool-replayer',
+            daemon=True
+        )
+        self._replayer.start()
+        logger.info(f"暂存队列已启动 (组提交间隔 {self.commit_interval}秒, 重放间隔 {replay_interval}秒)")
+
+    def stop(self, timeout: float = 10.0):
+        """
+        停止后台线程，提交缓冲区中剩余的记录并关闭数据库
+
+        Args:
+            timeout: 等待超时时间（秒）
+        """
+        self._stop_flag.set()
+        with self._pending_cond:
+            self._pending_cond.notify_all()
+        for thread in (self._replayer, self._writer):
+            if thread:
+                thread.join(timeout)
+        self._writer = None
+        self._replayer = None
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def _replay_loop(self, handlers: Dict[str, ReplayHandler], interval: float,
+                     on_dead_letter: Optional[Callable[[str, dict], None]]):
+        """重放线程主循环: 每轮有进展时立即继续，直到没有到期的记录"""
+        while not self._stop_flag.wait(interval):
+            try:
+                while self.replay(handlers, on_dead_letter=on_dead_letter) and not self._stop_flag.is_set():
+                    pass
+            except Exception as e:
+                logger.error(f"重放暂存队列失败: {e}")
+
+    def replay(self, handlers: Dict[str, ReplayHandler], limit: int = 100,
+               on_dead_letter: Optional[Callable[[str, dict], None]] = None) -> int:
+        """
+        按写入顺序重放到期的记录
+
+        同一类型的记录严格按顺序处理: 某条记录失败或还未到重试时间时，同类型后面的记录本轮都不处理。
+        成功的记录在本轮结束时一次删除，进程在此之前退出时会再次重放（至少一次）
+
+        Args:
+            handlers: 记录类型 -> 重放处理函数
+            limit: 每种类型本轮最多处理的记录数
+            on_dead_letter: 记录移入死信表时的回调，参数为 (记录类型, payload)
+
+        Returns:
+            本轮成功处理的记录数
+        """
+        succeeded: List[Tuple[int]] = []
+        try:
+            for kind, handler in handlers.items():
+                with self._lock:
+                    rows = self._conn.execute(
+                        'SELECT id, payload, attempts, next_attempt FROM spool WHERE kind = ? ORDER BY id LIMIT ?',
+                        (kind, limit)
+                    ).fetchall()
+                for row_id, payload, attempts, next_attempt in rows:
+                    if self._stop_flag.is_set() or next_attempt > self.clock():
+                        break
+                    data = json.loads(payload)
+                    try:
+                        ok, error = bool(handler(data)), None
+                    except Exception as e:
+                        ok, error = False, str(e)
+                    if ok:
+                        succeeded.append((row_id,))
+                        continue
+                    if not self._record_failure(row_id, kind, data, attempts + 1, error, on_dead_letter):
+                        break
+        finally:
+            if succeeded:
+                with self._lock:
+                    self._conn.execute('BEGIN IMMEDIATE')
+                    self._conn.executemany('DELETE FROM spool WHERE id = ?', succeeded)
+                    self._conn.execute('COMMIT')
+                self.replayed += len(succeeded)
+                logger.info(f"暂存队列重放成功 {len(succeeded)} 条")
+        return len(succeeded)
+
+    def _record_failure(self, row_id: int, kind: str, data: dict, attempts: int, error: Optional[str],
+                        on_dead_letter: Optional[Callable[[str, dict], None]]) -> bool:
+        """
+        记录一次重放失败
+
+        Returns:
+            是否移入了死信表（移入后同类型的下一条记录可以继续重放）
+        """
+        if attempts >= self.max_attempts:
+            self._move_to_dead_letter(row_id, attempts, error)
+            logger.error(f"暂存记录 {row_id} ({kind}) 重放 {attempts} 次仍失败，已移入死信表")
+            if on_dead_letter:
+                on_dead_letter(kind, data)
+            return True
+
+        delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+        with self._lock:
+            self._conn.execute(
+                'UPDATE spool SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?',
+                (attempts, self.clock() + delay, error, row_id)
+            )
+        self.retries += 1
+        logger.warning(f"暂存记录 {row_id} ({kind}) 第 {attempts} 次重放失败，{delay:.0f} 秒后重试")
+        return False
+
+    def _move_to_dead_letter(self, row_id: int, attempts: int, error: Optional[str]):
+        """把记录移入死信表"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._conn.execute(
+                'INSERT INTO dead_letter (id, kind, payload, created_at, attempts, failed_at, last_error) '
+                'SELECT id, kind, payload, created_at, ?, ?, ? FROM spool WHERE id = ?',
+                (attempts, self.clock(), error, row_id)
+            )
+            self._conn.execute('DELETE FROM spool WHERE id = ?', (row_id,))
+            self._conn.execute('COMMIT')
+        self.dead_lettered += 1
+
+    def requeue_dead_letters(self, kind: Optional[str] = None) -> int:
+        """
+        把死信表中的记录放回队列重新重放（保持原来的顺序）
+
+        Args:
+            kind: 只放回该类型的记录，None 表示全部
+
+        Returns:
+            放回的记录数
+        """
+        condition, params = ('WHERE kind = ?', (kind,)) if kind else ('', ())
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            count = self._conn.execute(
+                f'INSERT INTO spool (id, kind, payload, created_at) '
+                f'SELECT id, kind, payload, created_at FROM dead_letter {condition}', params
+            ).rowcount
+            self._conn.execute(f'DELETE FROM dead_letter {condition}', params)
+            self._conn.execute('COMMIT')
+        return count
+
+    def pending(self, kind: Optional[str] = None) -> int:
+        """
+        待重放的记录数（不含缓冲区中尚未提交的记录）
+
+        Args:
+            kind: 只统计该类型，None 表示全部
+        """
+        with self._lock:
+            if kind:
+                return self._conn.execute('SELECT COUNT(*) FROM spool WHERE kind = ?', (kind,)).fetchone()[0]
+            return self._conn.execute('SELECT COUNT(*) FROM spool').fetchone()[0]
+
+    def dead_letter_count(self) -> int:
+        """死信表中的记录数"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM dead_letter').fetchone()[0]
+
+    def get_metrics(self) -> dict:
+        """
+        获取暂存队列统计信息
+
+        Returns:
+            统计信息字典，commit_latency 为每次组提交的耗时直方图
+        """
+        return {
+            'pending': self.pending(),
+            'dead_letters': self.dead_letter_count(),
+            'spooled': self.spooled,
+            'commits': self.commits,
+            'replayed': self.replayed,
+            'retries': self.retries,
+            'dead_lettered': self.dead_lettered,
+            'commit_latency': self.commit_latency.snapshot()
+        }
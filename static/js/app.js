@@ -1,7 +1,11 @@
 // 全局变量
 let trendChart = null;
 let typeChart = null;
-let currentPage = 1;
+let currentCursor = null; // 当前页的分页游标，第一页为 null
+let dashboardStats = null; // 最近一次 /api/stats 的结果，实时推送的增量在此基础上累加
+let currentErrors = []; // 错误列表当前页
+let currentPagination = null; // 错误列表当前页的分页信息（/api/errors 的游标和总数）
+let recentErrors = []; // 仪表盘最近错误
 
 // 隐藏页面加载动画
 function hidePageLoader() {
@@ -34,8 +38,12 @@ document.addEventListener('DOMContentLoaded', function() {
     document.querySelectorAll('.nav-link').forEach(l => l.classList.remove('active'));
     document.querySelector('[data-page="errors"]').classList.add('active');
     
-    // 设置定时刷新错误日志
-    setInterval(loadErrors, 30000); // 每30秒刷新
+    // 订阅实时推送，不支持 SSE 的浏览器退回定时刷新
+    if (window.EventSource) {
+        setupEventStream();
+    } else {
+        setInterval(() => loadErrors(currentCursor), 30000); // 每30秒刷新当前页
+    }
     
     // 设置事件监听器
     setupEventListeners();
@@ -90,19 +98,8 @@ function switchPage(page) {
 async function loadDashboard() {
     try {
         const response = await fetch('/api/stats');
-        const data = await response.json();
-        
-        // 更新统计卡片
-        document.getElementById('total-errors').textContent = data.total_errors;
-        document.getElementById('today-errors').textContent = data.today_errors;
-        document.getElementById('unresolved-errors').textContent = data.unresolved;
-        document.getElementById('critical-errors').textContent = data.critical_errors;
-        
-        // 更新趋势图
-        updateTrendChart(data.daily_trend);
-        
-        // 更新类型分布图
-        updateTypeChart(data.error_types);
+        dashboardStats = await response.json();
+        displayStats(dashboardStats);
         
         // 加载最近错误
         loadRecentErrors();
@@ -112,14 +109,33 @@ async function loadDashboard() {
     }
 }
 
+// 显示仪表盘统计
+function displayStats(data) {
+    // 更新统计卡片
+    document.getElementById('total-errors').textContent = data.total_errors;
+    document.getElementById('today-errors').textContent = data.today_errors;
+    document.getElementById('unresolved-errors').textContent = data.unresolved;
+    document.getElementById('critical-errors').textContent = data.critical_errors;
+    
+    // 更新趋势图
+    updateTrendChart(data.daily_trend);
+    
+    // 更新类型分布图
+    updateTypeChart(data.error_types);
+}
+
 // 更新趋势图
 function updateTrendChart(data) {
-    const ctx = document.getElementById('trendChart').getContext('2d');
-    
+    // 图表已存在时只更新数据，避免重建图表
     if (trendChart) {
-        trendChart.destroy();
+        trendChart.data.labels = data.map(d => d.date);
+        trendChart.data.datasets[0].data = data.map(d => d.count);
+        trendChart.update('none');
+        return;
     }
     
+    const ctx = document.getElementById('trendChart').getContext('2d');
+    
     trendChart = new Chart(ctx, {
         type: 'line',
         data: {
@@ -156,14 +172,17 @@ function updateTrendChart(data) {
 
 // 更新类型分布图
 function updateTypeChart(data) {
-    const ctx = document.getElementById('typeChart').getContext('2d');
+    // 限制显示前5个
+    const topData = data.slice(0, 5);
     
     if (typeChart) {
-        typeChart.destroy();
+        typeChart.data.labels = topData.map(d => d.type);
+        typeChart.data.datasets[0].data = topData.map(d => d.count);
+        typeChart.update('none');
+        return;
     }
     
-    // 限制显示前5个
-    const topData = data.slice(0, 5);
+    const ctx = document.getElementById('typeChart').getContext('2d');
     
     typeChart = new Chart(ctx, {
         type: 'doughnut',
@@ -198,36 +217,42 @@ async function loadRecentErrors() {
         const response = await fetch('/api/errors?per_page=5');
         const data = await response.json();
         
-        const container = document.getElementById('recent-errors');
-        
-        if (data.errors.length === 0) {
-            container.innerHTML = '<p class="text-muted text-center">暂无错误记录</p>';
-            return;
-        }
-        
-        let html = '<table class="table table-hover"><thead><tr>' +
-                   '<th>时间</th><th>容器</th><th>错误信息</th><th>严重度</th><th>状态</th>' +
-                   '</tr></thead><tbody>';
-        
-        data.errors.forEach(error => {
-            html += `<tr onclick="showErrorDetail(${error.id})" style="cursor: pointer;">
-                <td>${formatDateTime(error.timestamp)}</td>
-                <td><span class="badge bg-secondary">${error.container_name}</span></td>
-                <td>${truncate(error.error_message, 80)}</td>
-                <td><span class="badge bg-${getSeverityColor(error.severity)}">${error.severity || 'N/A'}</span></td>
-                <td><span class="badge status-${error.status}">${getStatusText(error.status)}</span></td>
-            </tr>`;
-        });
-        
-        html += '</tbody></table>';
-        container.innerHTML = html;
+        recentErrors = data.errors;
+        displayRecentErrors(recentErrors);
     } catch (error) {
         console.error('加载最近错误失败:', error);
     }
 }
 
+// 显示最近错误
+function displayRecentErrors(errors) {
+    const container = document.getElementById('recent-errors');
+    
+    if (errors.length === 0) {
+        container.innerHTML = '<p class="text-muted text-center">暂无错误记录</p>';
+        return;
+    }
+    
+    let html = '<table class="table table-hover"><thead><tr>' +
+               '<th>时间</th><th>容器</th><th>错误信息</th><th>严重度</th><th>状态</th>' +
+               '</tr></thead><tbody>';
+    
+    errors.forEach(error => {
+        html += `<tr onclick="showErrorDetail(${error.id})" style="cursor: pointer;">
+            <td>${formatDateTime(error.timestamp)}</td>
+            <td><span class="badge bg-secondary">${error.container_name}</span></td>
+            <td>${truncate(error.error_message, 80)}</td>
+            <td><span class="badge bg-${getSeverityColor(error.severity)}">${error.severity || 'N/A'}</span></td>
+            <td><span class="badge status-${error.status}">${getStatusText(error.status)}</span></td>
+        </tr>`;
+    });
+    
+    html += '</tbody></table>';
+    container.innerHTML = html;
+}
+
 // 加载错误列表
-async function loadErrors(page = 1) {
+async function loadErrors(cursor = null) {
     try {
         const search = document.getElementById('search-input')?.value || '';
         const status = document.getElementById('status-filter')?.value || '';
@@ -235,23 +260,33 @@ async function loadErrors(page = 1) {
         const container = document.getElementById('container-filter')?.value || '';
         
         const params = new URLSearchParams({
-            page: page,
             per_page: 20,
             search: search,
             status: status,
             severity: severity,
             container: container
         });
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
         
         const response = await fetch(`/api/errors?${params}`);
         const data = await response.json();
         
-        displayErrors(data.errors);
-        displayPagination(data.pages, page);
-        currentPage = page;
+        // 游标所在的记录已不存在等情况，回到第一页
+        if (cursor && (!response.ok || data.errors.length === 0)) {
+            loadErrors();
+            return;
+        }
+        
+        currentErrors = data.errors;
+        currentPagination = data;
+        displayErrors(currentErrors);
+        displayPagination(data);
+        currentCursor = cursor;
         
         // 加载容器列表到过滤器
-        if (page === 1) {
+        if (!cursor) {
             loadContainerFilter();
         }
     } catch (error) {
@@ -296,34 +331,36 @@ function displayErrors(errors) {
     container.innerHTML = html;
 }
 
-// 显示分页
-function displayPagination(totalPages, currentPage) {
+// 显示分页（游标分页只有上一页/下一页）
+function displayPagination(data) {
     const container = document.getElementById('pagination-container');
     
-    if (totalPages <= 1) {
+    if (!data.prev_cursor && !data.next_cursor) {
         container.innerHTML = '';
         return;
     }
     
-    let html = '<ul class="pagination justify-content-center">';
+    let html = '<ul class="pagination justify-content-center align-items-center">';
     
-    // 上一页
-    html += `<li class="page-item ${currentPage === 1 ? 'disabled' : ''}">
-        <a class="page-link" href="#" onclick="loadErrors(${currentPage - 1}); return false;">上一页</a>
+    // 第一页
+    html += `<li class="page-item ${data.prev_cursor ? '' : 'disabled'}">
+        <a class="page-link" href="#" onclick="loadErrors(); return false;">首页</a>
     </li>`;
     
-    // 页码
-    for (let i = 1; i <= Math.min(totalPages, 10); i++) {
-        html += `<li class="page-item ${i === currentPage ? 'active' : ''}">
-            <a class="page-link" href="#" onclick="loadErrors(${i}); return false;">${i}</a>
-        </li>`;
-    }
+    // 上一页
+    html += `<li class="page-item ${data.prev_cursor ? '' : 'disabled'}">
+        <a class="page-link" href="#" onclick="loadErrors('${data.prev_cursor || ''}'); return false;">上一页</a>
+    </li>`;
     
     // 下一页
-    html += `<li class="page-item ${currentPage === totalPages ? 'disabled' : ''}">
-        <a class="page-link" href="#" onclick="loadErrors(${currentPage + 1}); return false;">下一页</a>
+    html += `<li class="page-item ${data.next_cursor ? '' : 'disabled'}">
+        <a class="page-link" href="#" onclick="loadErrors('${data.next_cursor || ''}'); return false;">下一页</a>
     </li>`;
     
+    if (data.total !== null && data.total !== undefined) {
+        html += `<li class="ms-3 text-muted small">共 ${data.total} 条</li>`;
+    }
+    
     html += '</ul>';
     container.innerHTML = html;
 }
@@ -408,7 +445,7 @@ async function updateErrorStatus(errorId, status) {
         
         if (response.ok) {
             showToast('状态已更新', 'success');
-            loadErrors(currentPage);
+            loadErrors(currentCursor);
         }
     } catch (error) {
         console.error('更新状态失败:', error);
@@ -523,6 +560,126 @@ async function saveConfig() {
     }
 }
 
+// 订阅实时推送
+function setupEventStream() {
+    // 浏览器断线后会自动重连，并通过 Last-Event-ID 补发断线期间的新错误
+    const source = new EventSource('/api/stream');
+    
+    source.addEventListener('error_log', (e) => onNewError(JSON.parse(e.data)));
+    source.addEventListener('stats', (e) => applyStatsDelta(JSON.parse(e.data)));
+    source.addEventListener('status', (e) => onStatusChanged(JSON.parse(e.data)));
+    source.addEventListener('reset', () => {
+        // 落后太多，重新加载当前页面的数据
+        if (dashboardStats) {
+            loadDashboard();
+        }
+        loadErrors(currentCursor);
+    });
+}
+
+// 累加统计增量并刷新仪表盘
+function applyStatsDelta(delta) {
+    if (!dashboardStats) {
+        return;
+    }
+    const stats = dashboardStats;
+    ['total_errors', 'today_errors', 'unresolved', 'critical_errors'].forEach(key => {
+        stats[key] += delta[key] || 0;
+    });
+    
+    Object.entries(delta.containers || {}).forEach(([name, count]) => {
+        const item = stats.containers.find(c => c.name === name);
+        if (item) {
+            item.count += count;
+        } else {
+            stats.containers.push({ name: name, count: count });
+        }
+    });
+    
+    Object.entries(delta.error_types || {}).forEach(([type, count]) => {
+        const item = stats.error_types.find(t => t.type === type);
+        if (item) {
+            item.count += count;
+        } else {
+            stats.error_types.push({ type: type, count: count });
+        }
+    });
+    stats.error_types.sort((a, b) => b.count - a.count);
+    
+    Object.entries(delta.daily_trend || {}).forEach(([date, count]) => {
+        const item = stats.daily_trend.find(d => d.date === date);
+        if (item) {
+            item.count += count;
+        } else {
+            stats.daily_trend.push({ date: date, count: count });
+            stats.daily_trend.sort((a, b) => a.date.localeCompare(b.date));
+            // 只保留最近8天（与 /api/stats 一致）
+            stats.daily_trend = stats.daily_trend.slice(-8);
+        }
+    });
+    
+    if (document.getElementById('dashboard-page').style.display !== 'none') {
+        displayStats(stats);
+    }
+}
+
+// 新错误: 插入仪表盘最近错误和错误列表第一页
+function onNewError(error) {
+    if (dashboardStats) {
+        recentErrors = [error, ...recentErrors].slice(0, 5);
+        displayRecentErrors(recentErrors);
+    }
+    
+    // 只在第一页且符合当前过滤条件时插入，搜索结果无法在前端判断，不做插入
+    const search = document.getElementById('search-input')?.value || '';
+    const status = document.getElementById('status-filter')?.value || '';
+    const severity = document.getElementById('severity-filter')?.value || '';
+    const container = document.getElementById('container-filter')?.value || '';
+    if (currentCursor || search ||
+        (status && error.status !== status) ||
+        (severity && error.severity !== severity) ||
+        (container && error.container_name !== container)) {
+        return;
+    }
+    if (currentErrors.some(e => e.id === error.id)) {
+        return;
+    }
+    const pushedOff = currentErrors.length >= 20;
+    currentErrors = [error, ...currentErrors].slice(0, 20);
+    displayErrors(currentErrors);
+    
+    // 挤出第一页的记录要能在下一页看到: 下一页游标改为当前显示的最后一条
+    if (currentPagination) {
+        if (pushedOff) {
+            currentPagination.next_cursor = encodeCursor(currentErrors[currentErrors.length - 1], 'next');
+        }
+        if (currentPagination.total !== null && currentPagination.total !== undefined) {
+            currentPagination.total += 1;
+        }
+        displayPagination(currentPagination);
+    }
+}
+
+// 生成分页游标（与 web_app.encode_cursor 格式一致）
+function encodeCursor(error, direction) {
+    const payload = JSON.stringify([error.timestamp, error.id, direction]);
+    return btoa(payload).replace(/\+/g, '-').replace(/\//g, '_').replace(/=+$/, '');
+}
+
+// 错误状态变更: 更新已显示的记录
+function onStatusChanged(change) {
+    [currentErrors, recentErrors].forEach(list => {
+        const item = list.find(e => e.id === change.id);
+        if (item) {
+            item.status = change.status;
+        }
+    });
+    displayErrors(currentErrors);
+    if (dashboardStats) {
+        displayRecentErrors(recentErrors);
+    }
+}
+
 // 加载容器过滤器选项
 async function loadContainerFilter() {
     try {
@@ -547,7 +704,7 @@ function setupEventListeners() {
     // 过滤器应用按钮
     const applyFiltersBtn = document.getElementById('apply-filters');
     if (applyFiltersBtn) {
-        applyFiltersBtn.addEventListener('click', () => loadErrors(1));
+        applyFiltersBtn.addEventListener('click', () => loadErrors());
     }
     
     // 保存配置按钮
@@ -567,7 +724,7 @@ function setupEventListeners() {
     if (searchInput) {
         searchInput.addEventListener('keypress', (e) => {
             if (e.key === 'Enter') {
-                loadErrors(1);
+                loadErrors();
             }
         });
     }
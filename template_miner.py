@@ -0,0 +1,193 @@
+"""
+日志模板挖掘模块
+Drain 风格的在线模板提取: 先把数字、UUID、IP、十六进制、路径等易变部分替换为占位符，
+再经过固定深度的前缀树找到相似的模板簇，每行日志得到一个稳定的模板 ID
+
+掩码后的模板在不同进程、不同副本中相同，因此模板 ID 可以跨重启用于分组和缓存；
+只有掩码无法识别的可变 token（如用户名）由前缀树合并，这类模板的 ID 取决于首次出现的那一行
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional
+
+# 通配符: 模板中被合并掉的可变位置
+WILDCARD = '<*>'
+
+# 易变部分的掩码规则，按顺序匹配（时间戳要在数字之前）
+MASK_RULES = [
+    ('TS', r'\d{4}-\d{2}-\d{2}[T ][\d:.,]+(?:Z|[+-]\d{2}:?\d{2})?'),
+    ('UUID', r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'),
+    ('IP', r'(?<![\w.])(?:\d{1,3}\.){3}\d{1,3}(?::\d{1,5})?(?![\w.])'),
+    ('HEX', r'\b0x[0-9a-fA-F]+\b|\b(?=[0-9a-fA-F]*\d)(?=[0-9a-fA-F]*[a-fA-F])[0-9a-fA-F]{8,}\b'),
+    ('PATH', r'(?<![\w/])(?:/[\w.\-]+){2,}/?'),
+    ('NUM', r'(?<![\w.])[-+]?\d+(?:\.\d+)?'),
+]
+MASK_PATTERN = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in MASK_RULES))
+
+# 每行最多参与模板提取的 token 数，保证单行耗时有上限
+MAX_TOKENS = 80
+
+
+def mask_line(log_line: str) -> str:
+    """
+    把日志行中的易变部分替换为 <NUM>、<UUID> 等占位符
+
+    Args:
+        log_line: 日志行
+
+    Returns:
+        掩码后的日志行
+    """
+    return MASK_PATTERN.sub(lambda m: f'<{m.lastgroup}>', log_line)
+
+
+class TemplateMatch(NamedTuple):
+    """一行日志的模板提取结果"""
+    template_id: str
+    template: str
+    size: int
+    is_new: bool
+
+
+class _Cluster:
+    """模板簇"""
+    __slots__ = ('tokens', 'size', 'template_id', 'leaf')
+
+    def __init__(self, tokens: List[str], leaf: List['_Cluster']):
+        self.tokens = tokens
+        self.size = 0
+        self.leaf = leaf
+        # ID 在建簇时由掩码后的模板确定，之后模板被泛化也保持不变，同一类日志从第一行起就共用一个 ID
+        text = ' '.join(tokens)
+        self.template_id = hashlib.blake2b(text.encode('utf-8', 'replace'), digest_size=8).hexdigest()
+
+    def similarity(self, tokens: List[str]) -> float:
+        """相同位置相等的 token 比例（通配符位置不计入）"""
+        same = 0
+        for template_token, token in zip(self.tokens, tokens):
+            if template_token == token:
+                same += 1
+        return same / len(tokens)
+
+    def merge(self, tokens: List[str]):
+        """把不同的位置替换为通配符"""
+        for i, (template_token, token) in enumerate(zip(self.tokens, tokens)):
+            if template_token != token:
+                self.tokens[i] = WILDCARD
+
+
+class _Node:
+    """前缀树节点"""
+    __slots__ = ('children', 'clusters')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.clusters: List[_Cluster] = []
+
+
+class TemplateMiner:
+    """在线日志模板提取器（线程安全）"""
+
+    def __init__(self, depth: int = 4, similarity_threshold: float = 0.5,
+                 max_children: int = 100, max_clusters: int = 5000):
+        """
+        初始化模板提取器
+
+        Args:
+            depth: 前缀树深度，按 token 数和前 depth-2 个 token 划分候选簇
+            similarity_threshold: 归入已有模板的最小相似度
+            max_children: 每个节点的最大子节点数，超出的 token 归入通配符子节点
+            max_clusters: 最大模板数，超出时淘汰最久未出现的模板
+        """
+        self.depth = max(3, depth)
+        self.similarity_threshold = similarity_threshold
+        self.max_children = max_children
+        self.max_clusters = max_clusters
+        self._root: Dict[int, _Node] = {}
+        # 所有模板簇，顺序即 LRU 顺序
+        self._clusters: 'OrderedDict[int, _Cluster]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.lines = 0
+        self.evictions = 0
+
+    def add(self, log_line: str) -> TemplateMatch:
+        """
+        提取日志行的模板，必要时新建模板或泛化已有模板
+
+        Args:
+            log_line: 日志行
+
+        Returns:
+            模板提取结果
+        """
+        tokens = mask_line(log_line).split()[:MAX_TOKENS] or ['']
+        with self._lock:
+            self.lines += 1
+            leaf = self._descend(tokens)
+            cluster = self._best_match(leaf.clusters, tokens)
+            is_new = cluster is None
+            if is_new:
+                cluster = _Cluster(list(tokens), leaf.clusters)
+                leaf.clusters.append(cluster)
+                self._clusters[id(cluster)] = cluster
+                self._evict()
+            else:
+                cluster.merge(tokens)
+                self._clusters.move_to_end(id(cluster))
+            cluster.size += 1
+            return TemplateMatch(cluster.template_id, ' '.join(cluster.tokens), cluster.size, is_new)
+
+    def _descend(self, tokens: List[str]) -> _Node:
+        """按 token 数和前几个 token 走到叶子节点，调用方持有锁"""
+        node = self._root.get(len(tokens))
+        if node is None:
+            node = self._root[len(tokens)] = _Node()
+        for token in tokens[:self.depth - 2]:
+            # 含占位符的 token 本身就是可变的，统一走通配符分支
+            key = WILDCARD if '<' in token else token
+            child = node.children.get(key)
+            if child is None:
+                if len(node.children) >= self.max_children:
+                    key = WILDCARD
+                    child = node.children.get(key)
+                if child is None:
+                    child = node.children[key] = _Node()
+            node = child
+        return node
+
+    def _best_match(self, clusters: List[_Cluster], tokens: List[str]) -> Optional[_Cluster]:
+        """在候选簇中找相似度最高且达到阈值的簇"""
+        best = None
+        best_similarity = -1.0
+        for cluster in clusters:
+            similarity = cluster.similarity(tokens)
+            if similarity > best_similarity:
+                best, best_similarity = cluster, similarity
+        if best is not None and best_similarity >= self.similarity_threshold:
+            return best
+        return None
+
+    def _evict(self):
+        """模板数超出上限时淘汰最久未出现的模板，调用方持有锁"""
+        while len(self._clusters) > self.max_clusters:
+            _, cluster = self._clusters.popitem(last=False)
+            cluster.leaf.remove(cluster)
+            self.evictions += 1
+
+    def get_metrics(self) -> dict:
+        """
+        获取模板提取统计信息
+
+        Returns:
+            统计信息字典
+        """
+        return {
+            'lines': self.lines,
+            'templates': len(self._clusters),
+            'max_templates': self.max_clusters,
+            'evictions': self.evictions
+        }
@@ -3,22 +3,55 @@
 Web界面应用 - 提供错误监控仪表盘和配置管理
 """
 import os
+import base64
 import json
+import re
+import sqlite3
+import threading
+import time
 import yaml
+from collections import Counter
 from datetime import datetime, timedelta
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, g, render_template, jsonify, request
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
 import docker
 
+from container_cache import ContainerMetadataCache
+from event_stream import EventBroadcaster, StreamEvent
+from metrics import PROMETHEUS_CONTENT_TYPE, Histogram, ShardedCounter, counter, gauge, histogram, render_text
+from metrics_exporter import read_status_file, status_families
+
 app = Flask(__name__)
 CORS(app)
 
-# 配置数据库
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///logs.db'
+# 配置数据库（可通过 DATABASE_URL 环境变量覆盖）
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///logs.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
 
+# SQLite 连接参数: WAL 模式允许监控进程写入时 Web 界面并发读取，
+# synchronous=NORMAL 在 WAL 模式下只在检查点时 fsync，不再每个事务 fsync 一次
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000
+}
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """为每个新的 SQLite 连接设置 PRAGMA"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
 # 数据库模型
 class ErrorLog(db.Model):
     """错误日志模型"""
@@ -32,6 +65,19 @@ class ErrorLog(db.Model):
     ai_analysis = db.Column(db.Text)
     ai_solution = db.Column(db.Text)
     status = db.Column(db.String(20), default='new')  # new, investigating, resolved
+    template_id = db.Column(db.String(32))  # 日志模板 ID，同一模板的错误归为一组
+
+    __table_args__ = (
+        # 按时间倒序分页
+        db.Index('ix_error_log_timestamp_id', 'timestamp', 'id'),
+        # 按容器 / 严重度 / 状态过滤后按时间排序
+        db.Index('ix_error_log_container_timestamp', 'container_name', 'timestamp'),
+        db.Index('ix_error_log_severity_timestamp', 'severity', 'timestamp'),
+        db.Index('ix_error_log_status_timestamp', 'status', 'timestamp'),
+        db.Index('ix_error_log_error_type', 'error_type'),
+        # 按模板分组
+        db.Index('ix_error_log_template_timestamp', 'template_id', 'timestamp'),
+    )
     
     def to_dict(self):
         return {
@@ -44,12 +90,392 @@ class ErrorLog(db.Model):
             'severity': self.severity,
             'ai_analysis': self.ai_analysis,
             'ai_solution': self.ai_solution,
-            'status': self.status
+            'status': self.status,
+            'template_id': self.template_id
         }
 
+class ErrorStatsRollup(db.Model):
+    """错误统计汇总表，按 天 × 容器 × 错误类型 × 严重度 × 状态 增量维护计数"""
+    __tablename__ = 'error_stats_rollup'
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    container_name = db.Column(db.String(200), nullable=False)
+    # 以下字段用空字符串代替 NULL，保证唯一约束对缺失值同样生效
+    error_type = db.Column(db.String(100), nullable=False, default='')
+    severity = db.Column(db.String(20), nullable=False, default='')
+    status = db.Column(db.String(20), nullable=False, default='new')
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'container_name', 'error_type', 'severity', 'status',
+                            name='uq_error_stats_rollup_key'),
+    )
+
+ROLLUP_KEY_COLUMNS = ('day', 'container_name', 'error_type', 'severity', 'status')
+
+def rollup_key(timestamp, container_name, error_type, severity, status):
+    """生成汇总表的维度键"""
+    return (timestamp.date(), container_name, error_type or '', severity or '', status or 'new')
+
+def update_rollups(deltas):
+    """
+    按维度键累加汇总表计数（在调用方的事务中执行，由调用方提交）
+
+    Args:
+        deltas: 维度键到计数增量的映射
+    """
+    values = [dict(zip(ROLLUP_KEY_COLUMNS, key), count=delta)
+              for key, delta in deltas.items() if delta]
+    if not values:
+        return
+    stmt = sqlite_insert(ErrorStatsRollup).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(ROLLUP_KEY_COLUMNS),
+        set_={'count': ErrorStatsRollup.count + stmt.excluded.count}
+    )
+    db.session.execute(stmt)
+
+def rebuild_rollups():
+    """根据错误日志表全量重建汇总表（用于初始化已有数据或批量导入数据后）"""
+    rows = db.session.query(
+        ErrorLog.timestamp, ErrorLog.container_name, ErrorLog.error_type,
+        ErrorLog.severity, ErrorLog.status
+    ).yield_per(10000)
+    deltas = Counter(rollup_key(*row) for row in rows)
+    ErrorStatsRollup.query.delete()
+    update_rollups(deltas)
+    db.session.commit()
+
+# 全文索引: 外部内容 FTS5 表，通过触发器与 error_log 同步，ORM 写入、批量写入和删除都会自动更新
+# unicode61 分词器按空白和标点切词，prefix 选项为 2/3 字符前缀建立索引以加速前缀查询
+FTS_TABLE = 'error_log_fts'
+FTS_COLUMNS = ('error_message', 'log_content', 'ai_analysis', 'error_type')
+# bm25 列权重，与 FTS_COLUMNS 顺序一致: 错误消息和错误类型的命中比完整日志内容更相关
+FTS_RANK = 'bm25(4.0, 1.0, 1.0, 2.0)'
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {', '.join(FTS_COLUMNS)},
+        content='error_log', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS error_log_fts_insert AFTER INSERT ON error_log BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {', '.join(FTS_COLUMNS)})
+        VALUES (new.id, {', '.join('new.' + c for c in FTS_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS error_log_fts_delete AFTER DELETE ON error_log BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {', '.join(FTS_COLUMNS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in FTS_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS error_log_fts_update AFTER UPDATE OF {', '.join(FTS_COLUMNS)} ON error_log BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {', '.join(FTS_COLUMNS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in FTS_COLUMNS)});
+        INSERT INTO {FTS_TABLE}(rowid, {', '.join(FTS_COLUMNS)})
+        VALUES (new.id, {', '.join('new.' + c for c in FTS_COLUMNS)});
+    END""",
+]
+# 按时间排序时，命中数不超过该值则取出全部命中行排序，否则沿时间索引扫描
+FTS_JOIN_LIMIT = 5000
+# 全文索引不可用时（非 SQLite 数据库或 SQLite 未编译 FTS5）退回 LIKE 搜索
+fts_enabled = False
+
+FTS_TERM_PATTERN = re.compile(r'"([^"]*)"?|(\S+)')
+FTS_WORD_PATTERN = re.compile(r'\w+')
+
+def build_fts_query(search):
+    """
+    把搜索框输入转换为 FTS5 查询表达式
+
+    支持 "双引号短语" 和 word* 前缀查询，多个词之间为 AND 关系；
+    其余字符都按分词规则切开并加引号，用户输入不会产生 FTS5 语法错误
+
+    Args:
+        search: 用户输入的搜索内容
+
+    Returns:
+        FTS5 MATCH 表达式，没有可搜索的词时返回空字符串
+    """
+    terms = []
+    for phrase, word in FTS_TERM_PATTERN.findall(search):
+        words = FTS_WORD_PATTERN.findall(phrase or word)
+        if not words:
+            continue
+        term = '"' + ' '.join(words) + '"'
+        if not phrase and word.endswith('*'):
+            term += '*'
+        terms.append(term)
+    return ' '.join(terms)
+
+def rebuild_search_index():
+    """根据 error_log 表全量重建全文索引"""
+    db.session.execute(db.text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    db.session.commit()
+
+def init_search_index():
+    """创建全文索引表和同步触发器，首次创建时为已有数据建立索引"""
+    global fts_enabled
+    if db.engine.dialect.name != 'sqlite':
+        return
+    with db.engine.begin() as conn:
+        existed = conn.execute(
+            db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': FTS_TABLE}
+        ).first() is not None
+        try:
+            for statement in FTS_SCHEMA:
+                conn.execute(db.text(statement))
+        except OperationalError as e:
+            app.logger.warning(f"全文索引不可用，搜索将使用 LIKE: {e}")
+            return
+        conn.execute(
+            db.text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', :rank)"),
+            {'rank': FTS_RANK}
+        )
+    fts_enabled = True
+    if not existed and ErrorLog.query.first() is not None:
+        rebuild_search_index()
+
+def apply_search(query, search, sort='time'):
+    """
+    为错误日志查询添加搜索条件
+
+    Args:
+        query: ErrorLog 查询
+        search: 用户输入的搜索内容
+        sort: 排序方式，time 按时间倒序，relevance 按相关度（仅全文索引可用时生效）
+
+    Returns:
+        (添加了搜索条件的查询, 是否已按相关度排序, 全文索引命中数；使用 LIKE 搜索时为 None)
+    """
+    if not fts_enabled:
+        query = query.filter(
+            db.or_(
+                ErrorLog.error_message.like(f'%{search}%'),
+                ErrorLog.log_content.like(f'%{search}%')
+            )
+        )
+        return query, False, None
+
+    fts_query = build_fts_query(search)
+    if not fts_query:
+        return query, False, None
+    match = db.text(f'{FTS_TABLE} MATCH :fts_query').bindparams(fts_query=fts_query)
+    match_count = db.session.execute(
+        db.select(db.func.count()).select_from(db.text(FTS_TABLE)).where(match)
+    ).scalar()
+
+    if sort == 'relevance' or match_count <= FTS_JOIN_LIMIT:
+        # 命中较少: 按主键取出命中行后排序
+        matches = db.select(
+            db.literal_column('rowid').label('id'),
+            db.literal_column('rank').label('rank')
+        ).select_from(db.text(FTS_TABLE)).where(match).subquery()
+        query = query.join(matches, matches.c.id == ErrorLog.id)
+        if sort == 'relevance':
+            return query.order_by(matches.c.rank, ErrorLog.id.desc()), True, match_count
+        return query, False, match_count
+
+    # 命中较多: 沿时间索引倒序扫描并探测命中集合，取满一页即停止，不必对全部命中排序
+    # id 前的一元加号阻止规划器改用主键逐个查找 IN 列表
+    ids = db.select(db.literal_column('rowid')).select_from(db.text(FTS_TABLE)).where(match)
+    query = query.filter(db.literal_column(f'+{ErrorLog.__tablename__}.id').in_(ids))
+    return query, False, match_count
+
+def encode_cursor(error, direction='next'):
+    """
+    生成分页游标
+
+    Args:
+        error: 游标位置的错误记录（上一页的最后一条或下一页的第一条）
+        direction: next 取更早的记录，prev 取更新的记录
+
+    Returns:
+        不透明的游标字符串
+    """
+    payload = json.dumps([error.timestamp.isoformat(), error.id, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    """
+    解析分页游标
+
+    Args:
+        token: encode_cursor 生成的游标
+
+    Returns:
+        (时间戳, 记录ID, 方向)
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        timestamp, error_id, direction = json.loads(base64.urlsafe_b64decode(padded))
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return datetime.fromisoformat(timestamp), int(error_id), direction
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f'无效的分页游标: {token}') from e
+
+def count_errors(status='', severity='', container=''):
+    """
+    从统计汇总表计算符合过滤条件的错误数（不含搜索条件）
+
+    Returns:
+        错误记录数
+    """
+    query = db.session.query(db.func.coalesce(db.func.sum(ErrorStatsRollup.count), 0))
+    if status:
+        query = query.filter(ErrorStatsRollup.status == status)
+    if severity:
+        query = query.filter(ErrorStatsRollup.severity == severity)
+    if container:
+        query = query.filter(ErrorStatsRollup.container_name == container)
+    return query.scalar()
+
+def add_missing_columns(model):
+    """
+    为已有的表补充模型中新增的列（create_all 不会修改已存在的表）
+
+    新增的列都必须允许为空，已有记录的新列为 NULL
+
+    Args:
+        model: 数据库模型类
+    """
+    table = model.__table__
+    existing = {column['name'] for column in db.inspect(db.engine).get_columns(table.name)}
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        column_type = column.type.compile(db.engine.dialect)
+        db.session.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+        app.logger.info(f"数据库迁移: {table.name} 新增列 {column.name}")
+    db.session.commit()
+
+def init_db():
+    """创建数据库表，为已有的表补充列和索引，并在需要时初始化汇总表和全文索引"""
+    db.create_all()
+    add_missing_columns(ErrorLog)
+    for index in ErrorLog.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+    if ErrorStatsRollup.query.first() is None and ErrorLog.query.first() is not None:
+        rebuild_rollups()
+    init_search_index()
+
 # 创建数据库表
 with app.app_context():
-    db.create_all()
+    init_db()
+
+# 实时推送: 监控程序与 Web 是两个进程，由一个后台线程轮询新写入的错误记录后广播给所有连接
+STREAM_POLL_INTERVAL = 1.0      # 轮询间隔（秒）
+STREAM_HEARTBEAT = 15           # 无事件时发送心跳的间隔（秒），防止代理断开空闲连接
+STREAM_REPLAY_LIMIT = 500       # 断线重连最多补发的记录数，单次轮询新增超过该数时让客户端重新加载
+# 推送的错误记录只包含列表展示需要的字段，详情仍通过 /api/errors/<id> 获取
+STREAM_ERROR_FIELDS = ('id', 'timestamp', 'container_name', 'error_type', 'error_message', 'severity', 'status',
+                       'template_id')
+
+def stats_delta(errors):
+    """
+    计算一批新错误记录对仪表盘统计的增量，字段与 /api/stats 对应
+
+    Args:
+        errors: ErrorLog 列表
+
+    Returns:
+        统计增量字典
+    """
+    today = datetime.utcnow().date()
+    containers = Counter(e.container_name for e in errors)
+    error_types = Counter(e.error_type or 'Unknown' for e in errors)
+    daily = Counter(str(e.timestamp.date()) for e in errors)
+    return {
+        'total_errors': len(errors),
+        'today_errors': sum(1 for e in errors if e.timestamp.date() == today),
+        'unresolved': sum(1 for e in errors if e.status != 'resolved'),
+        'critical_errors': sum(1 for e in errors if e.severity == 'critical'),
+        'containers': dict(containers),
+        'error_types': dict(error_types),
+        'daily_trend': dict(daily)
+    }
+
+def load_stream_events(after_id, until_id=None, limit=STREAM_REPLAY_LIMIT):
+    """
+    读取指定 ID 之后的错误记录，生成 error_log 事件和一条 stats 增量事件
+
+    Args:
+        after_id: 起始记录 ID（不含）
+        until_id: 截止记录 ID（含），None 表示不限
+        limit: 最多读取的记录数
+
+    Returns:
+        (事件列表, 最后一条记录 ID, 记录数)
+    """
+    with app.app_context():
+        query = ErrorLog.query.filter(ErrorLog.id > after_id)
+        if until_id is not None:
+            query = query.filter(ErrorLog.id <= until_id)
+        errors = query.order_by(ErrorLog.id).limit(limit).all()
+        if not errors:
+            return [], after_id, 0
+        events = [StreamEvent('stats', json.dumps(stats_delta(errors)))]
+        for error in errors:
+            data = error.to_dict()
+            events.append(StreamEvent(
+                'error_log', json.dumps({k: data[k] for k in STREAM_ERROR_FIELDS}), error.id
+            ))
+        return events, errors[-1].id, len(errors)
+
+def latest_error_id():
+    """当前最大的错误记录 ID"""
+    with app.app_context():
+        return db.session.query(db.func.coalesce(db.func.max(ErrorLog.id), 0)).scalar()
+
+stream_broadcaster = EventBroadcaster(
+    load_stream_events, latest_error_id,
+    poll_interval=STREAM_POLL_INTERVAL, replay_limit=STREAM_REPLAY_LIMIT
+)
+
+# 监控进程定期写入的状态文件（两个进程共享 logs 目录，可通过 MONITOR_STATUS_FILE 环境变量覆盖），
+# 超过 STATUS_STALE_INTERVALS 个写入间隔没有更新时认为监控程序未运行
+MONITOR_STATUS_FILE = os.environ.get('MONITOR_STATUS_FILE', 'logs/monitor_status.json')
+STATUS_STALE_INTERVALS = 3
+
+# Web 界面自身的请求统计
+web_requests = ShardedCounter()
+web_request_latency = Histogram()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    started = g.get('request_started')
+    if started is not None:
+        web_request_latency.observe(time.perf_counter() - started)
+        web_requests.inc(request.url_rule.rule if request.url_rule else 'unmatched')
+    return response
+
+def monitor_liveness(status, now):
+    """
+    根据状态文件判断监控程序是否在运行
+
+    Returns:
+        (是否运行中, 距上次更新的秒数)
+    """
+    age = now - status.get('updated_at', 0)
+    running = not status.get('stopped') and age <= STATUS_STALE_INTERVALS * status.get('interval', 5)
+    return running, age
+
+def format_uptime(seconds):
+    """把秒数格式化为 "2d 3h" / "2h 15m" / "5m" 形式"""
+    minutes = int(seconds // 60)
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return f'{days}d {hours}h'
+    if hours:
+        return f'{hours}h {minutes}m'
+    return f'{minutes}m'
 
 # API 路由
 @app.route('/')
@@ -61,40 +487,44 @@ def index():
 def get_stats():
     """获取统计数据"""
     now = datetime.utcnow()
-    
+    today = now.date()
+    count_sum = db.func.coalesce(db.func.sum(ErrorStatsRollup.count), 0)
+
+    # 所有统计都来自汇总表，查询代价与错误日志表的行数无关
     # 总错误数
-    total_errors = ErrorLog.query.count()
+    total_errors = db.session.query(count_sum).scalar()
     
     # 今日错误数
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    today_errors = ErrorLog.query.filter(ErrorLog.timestamp >= today_start).count()
+    today_errors = db.session.query(count_sum).filter(ErrorStatsRollup.day == today).scalar()
     
     # 未解决错误数
-    unresolved = ErrorLog.query.filter(ErrorLog.status != 'resolved').count()
+    unresolved = db.session.query(count_sum).filter(ErrorStatsRollup.status != 'resolved').scalar()
     
     # 严重错误数
-    critical_errors = ErrorLog.query.filter(ErrorLog.severity == 'critical').count()
+    critical_errors = db.session.query(count_sum).filter(ErrorStatsRollup.severity == 'critical').scalar()
     
     # 按容器统计
     containers = db.session.query(
-        ErrorLog.container_name,
-        db.func.count(ErrorLog.id).label('count')
-    ).group_by(ErrorLog.container_name).all()
+        ErrorStatsRollup.container_name,
+        count_sum.label('count')
+    ).group_by(ErrorStatsRollup.container_name).having(count_sum > 0).all()
     
     # 按错误类型统计
     error_types = db.session.query(
-        ErrorLog.error_type,
-        db.func.count(ErrorLog.id).label('count')
-    ).group_by(ErrorLog.error_type).limit(10).all()
+        ErrorStatsRollup.error_type,
+        count_sum.label('count')
+    ).group_by(ErrorStatsRollup.error_type).having(count_sum > 0).order_by(
+        count_sum.desc()
+    ).limit(10).all()
     
     # 最近7天趋势
-    seven_days_ago = now - timedelta(days=7)
+    seven_days_ago = (now - timedelta(days=7)).date()
     daily_stats = db.session.query(
-        db.func.date(ErrorLog.timestamp).label('date'),
-        db.func.count(ErrorLog.id).label('count')
-    ).filter(ErrorLog.timestamp >= seven_days_ago).group_by(
-        db.func.date(ErrorLog.timestamp)
-    ).all()
+        ErrorStatsRollup.day,
+        count_sum.label('count')
+    ).filter(ErrorStatsRollup.day >= seven_days_ago).group_by(
+        ErrorStatsRollup.day
+    ).order_by(ErrorStatsRollup.day).all()
     
     return jsonify({
         'total_errors': total_errors,
@@ -108,15 +538,28 @@ def get_stats():
 
 @app.route('/api/errors')
 def get_errors():
-    """获取错误列表"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    """
+    获取错误列表
+
+    默认按 (timestamp, id) 倒序做游标分页: 第一页不带 cursor，之后传入响应中的 next_cursor / prev_cursor，
+    每页耗时与翻到第几页无关。传 page 参数或按相关度排序时使用 OFFSET 分页。
+
+    total 在不带搜索时由统计汇总表得出，只有搜索条件时为全文索引命中数；
+    其余组合（搜索或模板与其它过滤条件同时使用）只在 count=exact 时精确计数，否则为 null
+    """
+    per_page = max(1, min(request.args.get('per_page', 20, type=int), 100))
     status = request.args.get('status', '')
     severity = request.args.get('severity', '')
     container = request.args.get('container', '')
+    template_id = request.args.get('template_id', '')
     search = request.args.get('search', '')
+    sort = request.args.get('sort', 'time')
+    cursor = request.args.get('cursor', '')
+    exact_count = request.args.get('count') == 'exact'
     
     query = ErrorLog.query
+    ranked = False
+    match_count = None
     
     # 过滤条件
     if status:
@@ -125,24 +568,103 @@ def get_errors():
         query = query.filter(ErrorLog.severity == severity)
     if container:
         query = query.filter(ErrorLog.container_name == container)
+    if template_id:
+        query = query.filter(ErrorLog.template_id == template_id)
     if search:
-        query = query.filter(
-            db.or_(
-                ErrorLog.error_message.like(f'%{search}%'),
-                ErrorLog.log_content.like(f'%{search}%')
-            )
-        )
+        query, ranked, match_count = apply_search(query, search, sort)
     
-    # 分页
-    pagination = query.order_by(ErrorLog.timestamp.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # 总数
+    filtered = bool(status or severity or container or template_id)
+    if not search and not template_id:
+        total = count_errors(status, severity, container)
+    elif match_count is not None and not filtered:
+        total = match_count
+    elif exact_count:
+        total = query.order_by(None).count()
+    else:
+        total = None
+    
+    # OFFSET 分页（兼容旧参数，以及无法按游标定位的相关度排序）
+    if ranked or ('page' in request.args and not cursor):
+        page = request.args.get('page', 1, type=int)
+        if not ranked:
+            query = query.order_by(ErrorLog.timestamp.desc(), ErrorLog.id.desc())
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False, count=False)
+        pagination.total = total
+        return jsonify({
+            'errors': [e.to_dict() for e in pagination.items],
+            'total': total,
+            'pages': pagination.pages,
+            'current_page': page
+        })
+    
+    # 游标分页: 多取一条判断是否还有下一页
+    key = db.tuple_(ErrorLog.timestamp, ErrorLog.id)
+    direction = 'next'
+    if cursor:
+        try:
+            timestamp, error_id, direction = decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if direction == 'next':
+            query = query.filter(key < (timestamp, error_id))
+        else:
+            query = query.filter(key > (timestamp, error_id))
+    if direction == 'next':
+        query = query.order_by(ErrorLog.timestamp.desc(), ErrorLog.id.desc())
+    else:
+        query = query.order_by(ErrorLog.timestamp.asc(), ErrorLog.id.asc())
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    
+    if direction == 'next':
+        has_newer = bool(cursor)
+        has_older = has_more
+    else:
+        rows.reverse()
+        has_newer = has_more
+        has_older = True
+    
+    return jsonify({
+        'errors': [e.to_dict() for e in rows],
+        'total': total,
+        'next_cursor': encode_cursor(rows[-1], 'next') if rows and has_older else None,
+        'prev_cursor': encode_cursor(rows[0], 'prev') if rows and has_newer else None
+    })
+
+@app.route('/api/templates')
+def get_templates():
+    """
+    按日志模板分组统计最近的错误
+
+    参数 hours 指定统计的时间范围（默认 24 小时），limit 指定返回的分组数（默认 20）
+    """
+    hours = max(1, min(request.args.get('hours', 24, type=int), 24 * 30))
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    since = datetime.utcnow() - timedelta(hours=hours)
     
+    groups = db.session.query(
+        ErrorLog.template_id,
+        db.func.count(ErrorLog.id).label('count'),
+        db.func.count(db.distinct(ErrorLog.container_name)).label('containers'),
+        db.func.max(ErrorLog.timestamp).label('last_seen'),
+        db.func.max(ErrorLog.id).label('latest_id')
+    ).filter(
+        ErrorLog.timestamp >= since, ErrorLog.template_id.isnot(None)
+    ).group_by(ErrorLog.template_id).order_by(db.desc('count')).limit(limit).all()
+    
+    # 每组取最近一条错误作为示例
+    samples = {e.id: e for e in ErrorLog.query.filter(ErrorLog.id.in_([g.latest_id for g in groups]))}
     return jsonify({
-        'errors': [e.to_dict() for e in pagination.items],
-        'total': pagination.total,
-        'pages': pagination.pages,
-        'current_page': page
+        'templates': [{
+            'template_id': g.template_id,
+            'count': g.count,
+            'containers': g.containers,
+            'last_seen': g.last_seen.isoformat(),
+            'error_type': samples[g.latest_id].error_type,
+            'sample': samples[g.latest_id].error_message
+        } for g in groups]
     })
 
 @app.route('/api/errors/<int:error_id>')
@@ -156,26 +678,92 @@ def update_error_status(error_id):
     """更新错误状态"""
     error = ErrorLog.query.get_or_404(error_id)
     data = request.json
+    old_status = error.status
     error.status = data.get('status', error.status)
+    if error.status != old_status:
+        # 同一事务中把计数从旧状态移到新状态
+        update_rollups({
+            rollup_key(error.timestamp, error.container_name, error.error_type, error.severity, old_status): -1,
+            rollup_key(error.timestamp, error.container_name, error.error_type, error.severity, error.status): 1
+        })
     db.session.commit()
+    if error.status != old_status:
+        # 只有进出 resolved 状态才影响未解决数
+        unresolved_delta = int(old_status == 'resolved') - int(error.status == 'resolved')
+        stream_broadcaster.publish([
+            StreamEvent('stats', json.dumps({'unresolved': unresolved_delta})),
+            StreamEvent('status', json.dumps({'id': error.id, 'status': error.status}))
+        ])
     return jsonify({'success': True, 'error': error.to_dict()})
 
+@app.route('/api/stream')
+def stream_events():
+    """
+    Server-Sent Events 实时推送
+
+    事件类型:
+        error_log: 新的错误记录（事件 ID 为记录 ID，断线重连时浏览器通过 Last-Event-ID 请求头补发）
+        stats: 仪表盘统计增量，字段与 /api/stats 对应
+        status: 错误状态变更
+        reset: 客户端落后太多，应重新加载全部数据
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    subscription = stream_broadcaster.subscribe(last_event_id)
+    
+    def generate():
+        try:
+            # 断线后浏览器 3 秒后自动重连
+            yield 'retry: 3000\n\n'
+            while True:
+                event = subscription.get(timeout=STREAM_HEARTBEAT)
+                if event is None:
+                    yield ': keepalive\n\n'
+                    continue
+                yield event.encode()
+                if subscription.closed and event.name == 'reset':
+                    break
+        finally:
+            stream_broadcaster.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# 容器元数据缓存：与监控进程同进程时共用监控器的缓存，否则首次请求时创建并订阅 Docker 事件
+container_cache = None
+container_cache_lock = threading.Lock()
+
+def set_container_cache(cache):
+    """使用已有的容器元数据缓存（监控器启动后调用）"""
+    global container_cache
+    container_cache = cache
+
+def get_container_cache():
+    """获取容器元数据缓存，不存在时创建"""
+    global container_cache
+    with container_cache_lock:
+        if container_cache is None:
+            cache = ContainerMetadataCache(docker.from_env())
+            cache.start()
+            container_cache = cache
+        return container_cache
+
 @app.route('/api/containers')
 def get_containers():
-    """获取Docker容器列表"""
+    """获取Docker容器列表（从容器元数据缓存读取）"""
     try:
-        client = docker.from_env()
-        containers = client.containers.list(all=True)
-        
-        container_list = []
-        for container in containers:
-            container_list.append({
-                'id': container.id[:12],
-                'name': container.name,
-                'status': container.status,
-                'image': container.image.tags[0] if container.image.tags else 'unknown',
-                'created': container.attrs['Created']
-            })
+        container_list = [{
+            'id': info['id'],
+            'name': info['name'],
+            'status': info['status'],
+            'image': info['image'],
+            'created': info['created']
+        } for info in get_container_cache().list()]
         
         return jsonify({'containers': container_list})
     except Exception as e:
@@ -207,39 +795,137 @@ def update_config():
     """更新配置"""
     try:
         data = request.json
-        with open('config/config.yaml', 'w', encoding='utf-8') as f:
+        # 先写临时文件再原子替换，监控程序检测到修改后重新加载时不会读到写了一半的文件
+        tmp_path = 'config/config.yaml.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             yaml.dump(data['config'], f, allow_unicode=True)
-        return jsonify({'success': True, 'message': '配置已更新'})
+        os.replace(tmp_path, 'config/config.yaml')
+        return jsonify({'success': True, 'message': '配置已更新，监控程序将自动重新加载'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/monitor/status')
 def get_monitor_status():
-    """获取监控状态"""
-    # 检查监控进程是否运行
-    # 这里可以通过检查进程或日志文件来判断
-    return jsonify({
-        'running': True,  # 实际应该检查进程状态
-        'uptime': '2h 15m',
+    """获取监控状态（读取监控进程定期写入的状态文件）"""
+    status = read_status_file(MONITOR_STATUS_FILE)
+    if status is None:
+        return jsonify({
+            'running': False,
+            'message': '没有找到监控程序的状态文件，监控程序未启动或未开启 metrics',
+            'last_check': datetime.utcnow().isoformat()
+        })
+    now = time.time()
+    running, age = monitor_liveness(status, now)
+    result = {
+        'running': running,
+        'pid': status.get('pid'),
+        'hostname': status.get('hostname'),
+        'started_at': datetime.utcfromtimestamp(status['started_at']).isoformat(),
+        'uptime': format_uptime(now - status['started_at']) if running else None,
+        'uptime_seconds': round(now - status['started_at']) if running else None,
+        'last_update': datetime.utcfromtimestamp(status['updated_at']).isoformat(),
+        'last_update_age': round(age, 1),
         'last_check': datetime.utcnow().isoformat()
-    })
+    }
+    result.update(status.get('status', {}))
+    return jsonify(result)
+
+@app.route('/metrics')
+def get_prometheus_metrics():
+    """Prometheus 指标: 监控进程写入状态文件的指标，以及 Web 界面自身的请求统计"""
+    families = [
+        counter('log_monitor_web_requests_total', 'Web 界面处理的请求数', web_requests.values(), 'endpoint'),
+        histogram('log_monitor_web_request_seconds', 'Web 界面请求处理耗时（秒）', web_request_latency.snapshot())
+    ]
+    status = read_status_file(MONITOR_STATUS_FILE)
+    if status is None:
+        families.append(gauge('log_monitor_up', '监控程序是否在运行（状态文件在有效期内更新）', 0))
+    else:
+        running, age = monitor_liveness(status, time.time())
+        families += [
+            gauge('log_monitor_up', '监控程序是否在运行（状态文件在有效期内更新）', 1 if running else 0),
+            gauge('log_monitor_status_age_seconds', '距监控程序上次写入状态文件的秒数', age)
+        ]
+        families += status_families(status)
+    return Response(render_text(families), content_type=PROMETHEUS_CONTENT_TYPE)
 
 # 辅助函数：添加错误日志（供其他模块调用）
 def add_error_log(container_name, error_message, error_type=None, 
-                  log_content=None, severity='error', ai_analysis=None, ai_solution=None):
+                  log_content=None, severity='error', ai_analysis=None, ai_solution=None,
+                  timestamp=None, template_id=None):
     """添加错误日志到数据库"""
-    error = ErrorLog(
-        container_name=container_name,
-        error_message=error_message,
-        error_type=error_type,
-        log_content=log_content,
-        severity=severity,
-        ai_analysis=ai_analysis,
-        ai_solution=ai_solution
+    timestamp = timestamp or datetime.utcnow()
+    with app.app_context():
+        error = ErrorLog(
+            timestamp=timestamp,
+            container_name=container_name,
+            error_message=error_message,
+            error_type=error_type,
+            log_content=log_content,
+            severity=severity,
+            ai_analysis=ai_analysis,
+            ai_solution=ai_solution,
+            template_id=template_id
+        )
+        db.session.add(error)
+        update_rollups({rollup_key(timestamp, container_name, error_type, severity, 'new'): 1})
+        db.session.commit()
+        return error.id
+
+# 批量写入时每条记录包含的字段
+ERROR_LOG_FIELDS = ('timestamp', 'container_name', 'error_type', 'error_message', 'log_content',
+                    'severity', 'ai_analysis', 'ai_solution', 'status', 'template_id')
+
+def insert_error_logs(rows):
+    """
+    在一个事务中批量写入错误日志（供 BatchedDBWriter 调用）
+
+    Args:
+        rows: 错误日志字段字典列表，字段同 add_error_log
+
+    Returns:
+        写入条数
+    """
+    now = datetime.utcnow()
+    records = []
+    for row in rows:
+        record = {field: row.get(field) for field in ERROR_LOG_FIELDS}
+        record['timestamp'] = record['timestamp'] or now
+        record['severity'] = record['severity'] or 'error'
+        record['status'] = record['status'] or 'new'
+        records.append(record)
+
+    deltas = Counter(
+        rollup_key(r['timestamp'], r['container_name'], r['error_type'], r['severity'], r['status'])
+        for r in records
     )
-    db.session.add(error)
-    db.session.commit()
-    return error.id
+    with app.app_context():
+        db.session.execute(db.insert(ErrorLog), records)
+        update_rollups(deltas)
+        db.session.commit()
+    return len(records)
+
+def update_error_analysis(container_name, template_id, ai_analysis, ai_solution=None):
+    """
+    补写之前分析未完成的错误日志的 AI 分析结果（供暂存队列重放时调用）
+
+    Args:
+        container_name: 容器名称
+        template_id: 日志模板 ID
+        ai_analysis: 分析说明
+        ai_solution: 解决建议
+
+    Returns:
+        更新条数
+    """
+    with app.app_context():
+        count = ErrorLog.query.filter(
+            ErrorLog.container_name == container_name,
+            ErrorLog.template_id == template_id,
+            db.or_(ErrorLog.ai_analysis.is_(None), ErrorLog.ai_analysis.like('AI 分析%'))
+        ).update({'ai_analysis': ai_analysis, 'ai_solution': ai_solution}, synchronize_session=False)
+        db.session.commit()
+    return count
 
 if __name__ == '__main__':
     import argparse